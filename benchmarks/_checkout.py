@@ -0,0 +1,16 @@
+"""
+pg_statviz - stats visualization and time series analysis
+
+Imported by the benchmarks before pg_statviz, so they measure the code of
+this checkout (src/) whether or not pg_statviz is installed.
+"""
+
+__author__ = "Jimmy Angelakos"
+__copyright__ = "Copyright (c) 2026 Jimmy Angelakos"
+__license__ = "PostgreSQL License"
+
+import sys
+from pathlib import Path
+
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
@@ -0,0 +1,75 @@
+"""
+pg_statviz - stats visualization and time series analysis
+
+Chart encoding benchmark: renders a representative breakdown chart and
+reports the median time and file size of plot.save() for every output
+format, with and without PNG optimization, at a few resolutions.
+
+    python benchmarks/bench_encode.py [--runs N] [--series N] [--points N]
+"""
+
+__author__ = "Jimmy Angelakos"
+__copyright__ = "Copyright (c) 2026 Jimmy Angelakos"
+__license__ = "PostgreSQL License"
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import numpy
+from matplotlib.pyplot import close as mpclose
+from pandas import DataFrame, date_range
+import _checkout  # noqa: F401 (before pg_statviz)
+from pg_statviz.libs import plot
+
+
+CASES = [(fmt, False) for fmt in plot.FORMATS] + [('png', True)]
+
+
+# Draw a chart shaped like the module output: one line per series
+def render(series, points):
+    rng = numpy.random.default_rng(0)
+    index = date_range('2026-01-01', periods=points, freq='15min', tz='UTC')
+    frame = DataFrame(rng.random((points, series)).cumsum(axis=0),
+                      index=index,
+                      columns=[f"series{i}" for i in range(series)])
+    plt, fig = plot.setup()
+    plt.suptitle("pg_statviz · bench:5432", fontweight='semibold')
+    plt.title("Encoding benchmark")
+    for col in frame.columns:
+        plt.plot(frame.index, frame[col], label=col)
+    plt.xlabel("Timestamp", fontweight='semibold')
+    fig.legend()
+    fig.tight_layout()
+    return plt
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[3])
+    p.add_argument('--runs', type=int, default=5)
+    p.add_argument('--series', type=int, default=plot.MAX_SERIES + 1)
+    p.add_argument('--points', type=int, default=plot.MAX_POINTS)
+    p.add_argument('--dpi', type=int, nargs='+', default=[plot.DPI, 200])
+    args = p.parse_args()
+
+    print(f"{'format':<14}{'dpi':>5}{'median ms':>12}{'KiB':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for dpi in args.dpi:
+            for fmt, optimize in CASES:
+                outfile = os.path.join(tmp, f"chart.{fmt}")
+                times = []
+                for _ in range(args.runs):
+                    render(args.series, args.points)
+                    start = time.perf_counter()
+                    plot.save(outfile, dpi, optimize)
+                    times.append(time.perf_counter() - start)
+                    mpclose('all')
+                name = fmt + (" optimized" if optimize else "")
+                print(f"{name:<14}{dpi:>5}"
+                      f"{statistics.median(times) * 1000:>12.1f}"
+                      f"{os.path.getsize(outfile) / 1024:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
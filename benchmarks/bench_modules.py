@@ -0,0 +1,288 @@
+"""
+pg_statviz - stats visualization and time series analysis
+
+Module benchmark: times the calc functions, the DataFrame builders and the
+full render path of every module on synthetic snapshots (see synth.py),
+and compares the timings against a saved JSON baseline.
+
+    python benchmarks/bench_modules.py [--snapshots N] [--runs N]
+        [--only REGEX] [--no-render] [--save FILE] [--compare FILE]
+"""
+
+__author__ = "Jimmy Angelakos"
+__copyright__ = "Copyright (c) 2026 Jimmy Angelakos"
+__license__ = "PostgreSQL License"
+
+import argparse
+import json
+import logging
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+from matplotlib.pyplot import close as mpclose
+from pandas import DataFrame
+import _checkout  # noqa: F401 (before pg_statviz)
+from pg_statviz.libs import plot
+from pg_statviz.libs.pivot import pivot, pivot_frame, top_series
+from pg_statviz.modules import (blocking, buf, cache, checkp, checksum, conf,
+                                conn, io, lock, overhead, repl, slru, tuple,
+                                wait, wal, xact)
+from synth import FakeConnection, Snapshots
+
+
+# Renders are slower than the rest by orders of magnitude
+RENDER_RUNS = 1
+# A case is a regression when its median is this much slower than the
+# baseline's
+TOLERANCE = 0.25
+
+
+def io_rows(s):
+    # calc_iostats converts the counters in place, so every run gets its own
+    # copy of the io_stats entries
+    return [{**r, 'io_stats': [dict(e) for e in r['io_stats']]}
+            for r in s.rows('io')]
+
+
+def tstamps(s):
+    return [r['snapshot_tstamp'] for r in s.rows('db')]
+
+
+def io_stats(s):
+    data = io_rows(s)
+    stats, kinds = io.calc_iostats(data)
+    return data, stats, kinds
+
+
+def calc_cases(s):
+    """(name, setup, function) of the calc functions: setup(s) returns the
+    arguments of function, and isn't timed."""
+    return [
+        ('calc/buf.calc_buffers', lambda s: (s.rows('buf'),),
+         buf.calc_buffers),
+        ('calc/buf.calc_bufrates', lambda s: (s.rows('buf'),),
+         buf.calc_bufrates),
+        ('calc/cache.calc_ratio', lambda s: (s.rows('db'),),
+         cache.calc_ratio),
+        ('calc/checkp.calc_checkps', lambda s: (s.rows('buf'),),
+         checkp.calc_checkps),
+        ('calc/checkp.calc_checkprates', lambda s: (s.rows('buf'),),
+         checkp.calc_checkprates),
+        ('calc/wal.calc_wal', lambda s: (s.rows('wal'),), wal.calc_wal),
+        ('calc/wal.calc_walrates', lambda s: (s.rows('wal'),),
+         wal.calc_walrates),
+        ('calc/xact.xactdiff', lambda s: (s.rows('db'),),
+         lambda d: list(xact.xactdiff(d))),
+        ('calc/tuple.tuplediff', lambda s: (s.rows('db'),),
+         lambda d: list(tuple.tuplediff(d))),
+        ('calc/io.calc_iostats', lambda s: (io_rows(s),), io.calc_iostats),
+        ('calc/io.calc_iorates', lambda s: io_stats(s)[::2],
+         io.calc_iorates),
+        ('calc/conf.get_config_diff',
+         lambda s: ([r['conf'] for r in s.rows('conf')],),
+         lambda confs: [conf.get_config_diff(a, b)
+                        for a, b in zip(confs, confs[1:])]),
+        ('calc/blocking.count_by_locktype',
+         lambda s: ([r['blocking'] for r in s.rows('blocking')],),
+         lambda d: [blocking.count_by_locktype(d, lt)
+                    for lt in blocking.find_locktypes(d)]),
+    ]
+
+
+def frame_cases(s):
+    """(name, setup, function) of the DataFrame builders."""
+    def io_frame(s):
+        _, stats, kinds = io_stats(s)
+        return stats, kinds, tstamps(s), plot.MAX_SERIES
+
+    def iorate_frame(s):
+        data, _, kinds = io_stats(s)
+        return (io.calc_iorates(data, kinds), kinds, tstamps(s),
+                plot.MAX_SERIES)
+
+    def slru_frames(s):
+        names, hr, reads = pivot([r['slru_stats'] for r in s.rows('slru')],
+                                 'name', slru.hit_ratio, 'blks_read')
+        return (DataFrame(hr, index=tstamps(s), columns=names),
+                DataFrame(reads, index=tstamps(s), columns=names))
+
+    def lag_frames(s):
+        rows = s.rows('repl')
+        return (pivot_frame([r['standby_lag'] for r in rows], tstamps(s),
+                            'application_name', 'lag_bytes'),
+                pivot_frame([r['slot_stats'] for r in rows], tstamps(s),
+                            'slot_name', 'wal_bytes'))
+
+    def wide(s):
+        return (pivot_frame([r['conn_users'] for r in s.rows('conn')],
+                            tstamps(s), 'user', 'connections'),)
+
+    cases = [
+        ('frame/io.build_io_dataframe', io_frame, io.build_io_dataframe),
+        ('frame/io.build_iorate_dataframe', iorate_frame,
+         io.build_iorate_dataframe),
+        ('frame/lock.pivot_frame',
+         lambda s: ([r['locks'] for r in s.rows('lock')], tstamps(s),
+                    'lock_mode', 'lock_count'), pivot_frame),
+        ('frame/wait.pivot_frame',
+         lambda s: ([r['wait_events'] for r in s.rows('wait')], tstamps(s),
+                    wait.wait_kind, 'wait_event_count'), pivot_frame),
+        ('frame/conn.pivot_frame',
+         lambda s: ([r['conn_users'] for r in s.rows('conn')], tstamps(s),
+                    'user', 'connections'), pivot_frame),
+        ('frame/conn.top_series', lambda s: wide(s) + (plot.MAX_SERIES,),
+         top_series),
+        ('frame/repl.build_repl_dataframe', lag_frames,
+         repl.build_repl_dataframe),
+        ('frame/slru.build_slru_dataframe', slru_frames,
+         slru.build_slru_dataframe),
+    ]
+    for method in plot.DOWNSAMPLERS:
+        cases.append((f"frame/plot.downsample.{method}",
+                      wide,
+                      lambda f, m=method: plot.downsample(f, method=m)))
+    return cases
+
+
+MODULES = (blocking.blocking, buf.buf, cache.cache, checkp.checkp,
+           checksum.checksum, conf.conf, conn.conn, io.io, lock.lock,
+           overhead.overhead, repl.repl, slru.slru, tuple.tuple, wait.wait,
+           wal.wal, xact.xact)
+
+
+def render_cases(s, outputdir):
+    """(name, setup, function) of every module, run end to end against a
+    FakeConnection into outputdir, without AI analysis. The extension
+    version is set before server-side breakdowns, so the lock, wait and
+    slru snapshots are pivoted here too, except for the overhead module
+    which needs the snapshot_stats of 1.3. Their '.ext-1.3' cases read the
+    breakdowns instead (see Snapshots.breakdown)."""
+    info = {'hostname': 'bench', 'pg_version': '18', 'pg_role': 'primary',
+            'pg_started': s.tstamps[0], 'ext_version': '1.2'}
+    infos = {overhead.overhead: {**info, 'ext_version': '1.3'}}
+    return [(f"render/{mod.__name__}",
+             lambda s: (),
+             lambda mod=mod: mod(conn=FakeConnection(s),
+                                 info=infos.get(mod, info),
+                                 outputdir=outputdir))
+            for mod in MODULES] + [
+        (f"render/{mod.__name__}.heatmap",
+         lambda s: (),
+         lambda mod=mod: mod(conn=FakeConnection(s), info=info,
+                             outputdir=outputdir, heatmap=True))
+        for mod in (lock.lock, wait.wait)] + [
+        (f"render/{mod.__name__}.hour_of_week",
+         lambda s: (),
+         lambda mod=mod: mod(conn=FakeConnection(s), info=info,
+                             outputdir=outputdir, seasonal='hour-of-week'))
+        for mod in (buf.buf, conn.conn, tuple.tuple, wal.wal, xact.xact)] + [
+        (f"render/{mod.__name__}.ext-1.3",
+         lambda s: (),
+         lambda mod=mod: mod(conn=FakeConnection(s),
+                             info={**info, 'ext_version': '1.3'},
+                             outputdir=outputdir))
+        for mod in (lock.lock, slru.slru, wait.wait)]
+
+
+def measure(setup, function, s, runs):
+    """Median and fastest time of function(*setup(s)), in ms."""
+    times = []
+    for _ in range(runs):
+        args = setup(s)
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+        mpclose('all')
+    return {'median_ms': round(statistics.median(times) * 1000, 3),
+            'min_ms': round(min(times) * 1000, 3)}
+
+
+def compare(results, baseline, tolerance):
+    """Print every case next to its baseline, and return the names of the
+    ones more than tolerance slower."""
+    regressions = []
+    print(f"{'case':<44}{'median ms':>12}{'baseline':>12}{'ratio':>8}")
+    for name, r in results.items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            print(f"{name:<44}{r['median_ms']:>12.2f}{'-':>12}")
+            continue
+        ratio = r['median_ms'] / base['median_ms'] if base['median_ms'] \
+            else 1.0
+        flag = ''
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<44}{r['median_ms']:>12.2f}"
+              f"{base['median_ms']:>12.2f}{ratio:>8.2f}{flag}")
+    return regressions
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[3])
+    p.add_argument('--snapshots', type=int, default=1000,
+                   help="synthetic snapshots per table (default 1000)")
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--runs', type=int, default=5,
+                   help="runs per calc and frame case, reporting the "
+                        "median (renders run once)")
+    p.add_argument('--only', metavar='REGEX',
+                   help="only run the cases matching REGEX")
+    p.add_argument('--no-render', action='store_true',
+                   help="skip the full render of every module")
+    p.add_argument('--save', metavar='FILE',
+                   help="write the results to FILE as a JSON baseline")
+    p.add_argument('--compare', metavar='FILE',
+                   help="compare against the JSON baseline in FILE and "
+                        "exit with status 1 on regressions")
+    p.add_argument('--tolerance', type=float, default=TOLERANCE,
+                   help=f"slowdown counted as a regression (default "
+                        f"{TOLERANCE:.0%})")
+    args = p.parse_args()
+    logging.disable(logging.INFO)
+
+    start = time.perf_counter()
+    s = Snapshots(args.snapshots, seed=args.seed)
+    for table in ('db', 'buf', 'wal', 'conn', 'io', 'wait', 'lock',
+                  'blocking', 'slru', 'repl', 'conf', 'snapshot_stats'):
+        s.rows(table)
+    print(f"Generated {args.snapshots} snapshots in "
+          f"{time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = calc_cases(s) + frame_cases(s)
+        if not args.no_render:
+            cases += render_cases(s, tmp)
+        for name, setup, function in cases:
+            if args.only and not re.search(args.only, name):
+                continue
+            runs = RENDER_RUNS if name.startswith('render/') else args.runs
+            results[name] = measure(setup, function, s, runs)
+            if not args.compare:
+                print(f"{name:<44}{results[name]['median_ms']:>12.2f} ms")
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('snapshots') != args.snapshots:
+            print(f"Warning: the baseline was taken with "
+                  f"{baseline.get('snapshots')} snapshots", file=sys.stderr)
+        regressions = compare(results, baseline, args.tolerance)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'snapshots': args.snapshots, 'seed': args.seed,
+                       'python': platform.python_version(),
+                       'machine': platform.machine(),
+                       'results': results}, f, indent=1, sort_keys=True)
+    if regressions:
+        raise SystemExit(f"{len(regressions)} regression(s): "
+                         + ", ".join(regressions))
+
+
+if __name__ == "__main__":
+    main()
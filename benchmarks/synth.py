@@ -0,0 +1,387 @@
+"""
+pg_statviz - stats visualization and time series analysis
+
+Synthetic snapshot generator for the benchmarks: seeded, deterministic rows
+for every pgstatviz.* table, shaped like the ones psycopg returns (dicts,
+with the jsonb columns as lists of dicts), at any number of snapshots.
+
+The workload follows a daily cycle with noise, cumulative counters grow
+from it and are reset once (two thirds of the way in), and the jsonb
+columns have the cardinalities of a busy server: ~30 pg_stat_io rows, tens
+of wait events and users, a few lock modes, SLRUs, standbys and slots.
+FakeConnection serves them to the modules in place of a database.
+"""
+
+__author__ = "Jimmy Angelakos"
+__copyright__ = "Copyright (c) 2026 Jimmy Angelakos"
+__license__ = "PostgreSQL License"
+
+import re
+import zlib
+from datetime import datetime, timedelta, timezone
+import numpy
+
+
+BACKEND_TYPES = ('client backend', 'autovacuum worker', 'background worker',
+                 'background writer', 'checkpointer', 'standalone backend',
+                 'startup', 'walsender')
+IO_CONTEXTS = ('normal', 'vacuum', 'bulkread', 'bulkwrite')
+LOCK_MODES = ('AccessShareLock', 'RowShareLock', 'RowExclusiveLock',
+              'ShareUpdateExclusiveLock', 'ShareLock',
+              'ShareRowExclusiveLock', 'ExclusiveLock', 'AccessExclusiveLock')
+SLRUS = ('CommitTs', 'MultiXactMember', 'MultiXactOffset', 'Notify',
+         'Serial', 'Subtrans', 'Xact', 'other')
+WAIT_TYPES = {'LWLock': 30, 'Lock': 10, 'IO': 25, 'Client': 5, 'IPC': 10}
+# The jsonb column, key and value of the breakdowns of a table
+BREAKDOWNS = {'wait': ('wait_events', 'wait_event', 'wait_event_count'),
+              'lock': ('locks', 'lock_mode', 'lock_count'),
+              'slru': ('slru_stats', 'name', 'blks_read')}
+# Components of a snapshot, with their typical collection time in ms
+COMPONENTS = {'buf': 0.3, 'conf': 4.0, 'conn': 1.5, 'db': 0.5, 'io': 3.0,
+              'lock': 1.0, 'blocking': 0.8, 'repl': 0.5, 'slru': 0.4,
+              'wait': 2.0, 'wal': 0.2}
+SETTINGS = ('autovacuum', 'autovacuum_max_workers', 'autovacuum_naptime',
+            'bgwriter_delay', 'bgwriter_lru_maxpages', 'checkpoint_timeout',
+            'effective_cache_size', 'max_connections', 'max_wal_size',
+            'max_wal_senders', 'max_replication_slots', 'shared_buffers',
+            'wal_buffers', 'work_mem')
+
+
+class Snapshots:
+    """Synthetic pgstatviz.* rows for `count` snapshots taken every
+    `interval`, from `seed`. Table rows are generated on first use and kept.
+
+    users, standbys, slots and wait_events set the cardinality of the
+    conn_users, standby_lag, slot_stats and wait_events jsonb columns."""
+
+    def __init__(self, count, seed=0, interval=timedelta(minutes=5),
+                 users=40, standbys=3, slots=2, wait_events=80):
+        self.count = count
+        self.seed = seed
+        self.users = [f"app_user_{i}" for i in range(users)]
+        self.standbys = [f"standby{i}" for i in range(standbys)]
+        self.slots = [f"slot{i}" for i in range(slots)]
+        self.wait_events = [(t, f"{t}Event{i}")
+                            for t, n in WAIT_TYPES.items()
+                            for i in range(n)][:wait_events]
+        start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        self.tstamps = [start + interval * i for i in range(count)]
+        hours = numpy.arange(count) * interval.total_seconds() / 3600
+        # Daily workload cycle, peaking in the afternoon, with noise
+        rng = self._rng('load')
+        self.load = ((1.2 + numpy.sin((hours - 8) / 24 * 2 * numpy.pi))
+                     * rng.lognormal(0, 0.15, count))
+        self.resets = [start - timedelta(days=1)] * (2 * count // 3) \
+            + [self.tstamps[2 * count // 3]] * (count - 2 * count // 3)
+        self._tables = {}
+
+    def _rng(self, name):
+        # An independent stream per table, so generating one table doesn't
+        # change the others
+        return numpy.random.default_rng([self.seed, zlib.crc32(name.encode())])
+
+    def _counter(self, rng, scale):
+        """A cumulative counter growing with the load, reset with the
+        stats."""
+        steps = rng.poisson(self.load * scale)
+        total = numpy.cumsum(steps)
+        cut = 2 * self.count // 3
+        if cut < self.count:
+            total[cut:] -= total[cut] - steps[cut]
+        return total.tolist()
+
+    def rows(self, table):
+        """The rows of pgstatviz.<table>, in snapshot order."""
+        if table not in self._tables:
+            self._tables[table] = getattr(self, f"_{table}")(
+                self._rng(table))
+        return self._tables[table]
+
+    def breakdown(self, table, buckets, top_n):
+        """The rows of pgstatviz.<table>_breakdown() of extension 1.3 (wait,
+        lock or slru): the snapshots in `buckets` equal time intervals if
+        there are more, and per interval the average count of each wait
+        event or lock mode (the hit ratio and block reads of each SLRU),
+        the ones after the top_n busiest summed as 'other'."""
+        column, key, value = BREAKDOWNS[table]
+        rows = self.rows(table)
+        first, last = rows[0]['snapshot_tstamp'], rows[-1]['snapshot_tstamp']
+        width = (last - first) / buckets \
+            if len(rows) > buckets and last > first else None
+        grouped = {}
+        for r in rows:
+            t = r['snapshot_tstamp']
+            grouped.setdefault(first + width * ((t - first) // width)
+                               if width else t, []).append(r[column])
+        name = (lambda e: f"{e['wait_event_type']}/{e['wait_event']}") \
+            if table == 'wait' else (lambda e: e[key])
+        weight = {}
+        for entries in grouped.values():
+            for e in (e for snapshot in entries for e in snapshot):
+                weight[name(e)] = weight.get(name(e), 0) + e[value]
+        ranked = sorted(weight, key=lambda n: (-weight[n], n))
+        rank = {n: n if top_n is None or i < top_n else 'other'
+                for i, n in enumerate(ranked)}
+        result = []
+        for bucket, entries in grouped.items():
+            sums = {}
+            for e in (e for snapshot in entries for e in snapshot):
+                hit, read = sums.get(rank[name(e)], (0, 0))
+                sums[rank[name(e)]] = (hit + e.get('blks_hit', 0),
+                                       read + e[value])
+            for n, (hit, read) in sums.items():
+                result.append(
+                    {'bucket': bucket, 'name': n,
+                     'hit_ratio': hit * 100 / (hit + read) if hit + read
+                     else 0, 'blks_read': read} if table == 'slru'
+                    else {'bucket': bucket, key: n,
+                          value: read / len(entries)})
+        return result
+
+    def _base(self):
+        return [{'snapshot_tstamp': t, 'stats_reset': r}
+                for t, r in zip(self.tstamps, self.resets)]
+
+    def _columns(self, rows, **columns):
+        for name, values in columns.items():
+            for row, v in zip(rows, values):
+                row[name] = v
+        return rows
+
+    def _db(self, rng):
+        return self._columns(
+            self._base(),
+            xact_commit=self._counter(rng, 3000),
+            xact_rollback=self._counter(rng, 20),
+            blks_read=self._counter(rng, 2000),
+            blks_hit=self._counter(rng, 200000),
+            tup_returned=self._counter(rng, 100000),
+            tup_fetched=self._counter(rng, 40000),
+            tup_inserted=self._counter(rng, 3000),
+            tup_updated=self._counter(rng, 1500),
+            tup_deleted=self._counter(rng, 300),
+            temp_files=self._counter(rng, 1),
+            temp_bytes=self._counter(rng, 1 << 20),
+            block_size=[8192] * self.count,
+            checksum_failures=[0] * self.count,
+            checksum_last_failure=[None] * self.count)
+
+    def _buf(self, rng):
+        return self._columns(
+            self._base(),
+            checkpoints_timed=self._counter(rng, 0.02),
+            checkpoints_req=self._counter(rng, 0.002),
+            buffers_checkpoint=self._counter(rng, 5000),
+            buffers_clean=self._counter(rng, 800),
+            buffers_backend=self._counter(rng, 300),
+            buffers_alloc=self._counter(rng, 4000),
+            block_size=[8192] * self.count)
+
+    def _wal(self, rng):
+        return self._columns(self._base(),
+                             wal_records=self._counter(rng, 20000),
+                             wal_bytes=self._counter(rng, 30_000_000))
+
+    def _conn(self, rng):
+        active = rng.poisson(self.load * 8)
+        idle = rng.poisson(40, self.count)
+        rows = [{'snapshot_tstamp': t} for t in self.tstamps]
+        for i, row in enumerate(rows):
+            present = rng.choice(len(self.users),
+                                 rng.integers(len(self.users) // 4,
+                                              len(self.users) + 1),
+                                 replace=False)
+            row['conn_users'] = [{'user': self.users[u],
+                                  'connections': int(c)}
+                                 for u, c in zip(present, rng.integers(
+                                     1, 10, len(present)))]
+        return self._columns(
+            rows, conn_total=(active + idle + 2).tolist(),
+            conn_active=active.tolist(), conn_idle=idle.tolist(),
+            conn_idle_trans=rng.poisson(2, self.count).tolist(),
+            conn_idle_trans_abort=[0] * self.count,
+            conn_fastpath=[0] * self.count,
+            max_query_age_seconds=rng.exponential(5, self.count).tolist(),
+            max_xact_age_seconds=rng.exponential(30, self.count).tolist(),
+            max_backend_age_seconds=rng.exponential(3600,
+                                                    self.count).tolist())
+
+    def _io(self, rng):
+        kinds = [(b, o, c) for b in BACKEND_TYPES
+                 for o in ('relation', 'temp relation') for c in IO_CONTEXTS
+                 if o == 'relation' or b == 'client backend']
+        reads = {k: self._counter(rng, 300 / (1 + i))
+                 for i, k in enumerate(kinds)}
+        writes = {k: self._counter(rng, 100 / (1 + i))
+                  for i, k in enumerate(kinds)}
+        rows = self._base()
+        for i, row in enumerate(rows):
+            row['io_stats'] = [{'backend_type': b, 'object': o, 'context': c,
+                                'reads': reads[b, o, c][i],
+                                'writes': writes[b, o, c][i]}
+                               for b, o, c in kinds]
+            row['block_size'] = 8192
+        return rows
+
+    def _breakdown(self, rng, names, weights, value, low, high):
+        """Rows with a jsonb list of names (dicts) with a count in `value`,
+        for a weighted random subset of low to high of them in each
+        snapshot, plus the total count."""
+        p = numpy.asarray(weights, dtype=float)
+        p /= p.sum()
+        rows = []
+        for i, t in enumerate(self.tstamps):
+            n = int(rng.integers(low, high + 1))
+            picked = rng.choice(len(names), n, replace=False, p=p)
+            counts = rng.poisson(1 + self.load[i] * 3, n) + 1
+            rows.append({'snapshot_tstamp': t,
+                         'entries': [{**names[j], value: int(c)}
+                                     for j, c in zip(picked, counts)],
+                         'total': int(counts.sum())})
+        return rows
+
+    def _wait(self, rng):
+        names = [{'wait_event_type': t, 'wait_event': e}
+                 for t, e in self.wait_events]
+        return [{'snapshot_tstamp': r['snapshot_tstamp'],
+                 'wait_events': r['entries'],
+                 'wait_events_total': r['total']}
+                for r in self._breakdown(
+                    rng, names, 1 / numpy.arange(1, len(names) + 1),
+                    'wait_event_count', 5, min(25, len(names)))]
+
+    def _lock(self, rng):
+        names = [{'lock_mode': m} for m in LOCK_MODES]
+        return [{'snapshot_tstamp': r['snapshot_tstamp'],
+                 'locks': r['entries'], 'locks_total': r['total']}
+                for r in self._breakdown(
+                    rng, names, 1 / numpy.arange(1, len(names) + 1) ** 2,
+                    'lock_count', 2, 6)]
+
+    def _blocking(self, rng):
+        rows = []
+        for t in self.tstamps:
+            blocked = int(rng.poisson(0.2))
+            rows.append({'snapshot_tstamp': t, 'blocked_total': blocked,
+                         'blockers_total': min(blocked, 1),
+                         'blocking': [{'lock_type': lt,
+                                       'blocked_count': blocked}
+                                      for lt in ('relation', 'tuple')[
+                                          :min(blocked, 2)]]})
+        return rows
+
+    def _slru(self, rng):
+        hits = {s: self._counter(rng, 500 / (1 + i))
+                for i, s in enumerate(SLRUS)}
+        reads = {s: self._counter(rng, 5 / (1 + i))
+                 for i, s in enumerate(SLRUS)}
+        rows = self._base()
+        for i, row in enumerate(rows):
+            row['slru_stats'] = [{'name': s, 'blks_hit': hits[s][i],
+                                  'blks_read': reads[s][i],
+                                  'blks_zeroed': 0, 'blks_written': 0,
+                                  'blks_exists': 0, 'flushes': 0,
+                                  'truncates': 0}
+                                 for s in SLRUS]
+        return rows
+
+    def _repl(self, rng):
+        rows = []
+        for i, t in enumerate(self.tstamps):
+            lag = rng.exponential(self.load[i] * 1e6, len(self.standbys))
+            retained = rng.exponential(1e8, len(self.slots))
+            rows.append({
+                'snapshot_tstamp': t,
+                'standby_lag': [{'application_name': s, 'state': 'streaming',
+                                 'sync_state': 'async',
+                                 'lag_bytes': float(b),
+                                 'lag_seconds': float(b) / 5e7}
+                                for s, b in zip(self.standbys, lag)],
+                'slot_stats': [{'slot_name': s, 'slot_type': 'physical',
+                                'active': True, 'wal_bytes': float(b)}
+                               for s, b in zip(self.slots, retained)]})
+        return rows
+
+    def _conf(self, rng):
+        # Only changes are snapshotted: a few over the period
+        conf = {s: str(rng.integers(1, 1000)) for s in SETTINGS}
+        rows = []
+        for t in self.tstamps[::max(1, self.count // 5)]:
+            conf = {**conf, SETTINGS[rng.integers(len(SETTINGS))]:
+                    str(rng.integers(1, 1000))}
+            rows.append({'snapshot_tstamp': t, 'conf': conf})
+        return rows
+
+    def _snapshot_stats(self, rng):
+        # One row per component of each snapshot, plus their total, with
+        # the snapshot time also as the bucket the overhead module reads
+        rows = []
+        for i, t in enumerate(self.tstamps):
+            ms = {c: float(rng.gamma(4, m / 4) * self.load[i])
+                  for c, m in COMPONENTS.items()}
+            wal = {c: int(rng.integers(200, 2000) * (1 + (c == 'conf')))
+                   for c in COMPONENTS}
+            for c in sorted(COMPONENTS):
+                rows.append({'snapshot_tstamp': t, 'bucket': t,
+                             'component': c, 'duration_ms': ms[c],
+                             'wal_bytes': wal[c], 'skipped': None})
+            rows.append({'snapshot_tstamp': t, 'bucket': t,
+                         'component': 'total',
+                         'duration_ms': sum(ms.values()) * 1.1,
+                         'wal_bytes': sum(wal.values()), 'skipped': None})
+        return rows
+
+
+class FakeCursor:
+    """Answers the queries of the modules from Snapshots rows."""
+
+    def __init__(self, snapshots):
+        self.snapshots = snapshots
+        self.result = []
+
+    def execute(self, query, params=None):
+        m = re.search(r"FROM\s+pgstatviz\.(\w+)", query)
+        if 'version_ok' in query:
+            self.result = [{'version_ok': True}]
+        elif m and m.group(1).endswith('_breakdown'):
+            # (from, to, buckets[, top_n], source)
+            self.result = self.snapshots.breakdown(
+                m.group(1).removesuffix('_breakdown'), params[2],
+                params[3] if len(params) == 5 else 10)
+        elif not m:
+            self.result = []
+        elif 'count(*)' in query:
+            rows = self.snapshots.rows(m.group(1))
+            self.result = [{'count': len(rows),
+                            'latest': rows[-1]['snapshot_tstamp']
+                            if rows else None}]
+        elif 'DESC' in query:
+            self.result = self.snapshots.rows(m.group(1))[-1:]
+        else:
+            self.result = self.snapshots.rows(m.group(1))
+
+    def fetchall(self):
+        return self.result
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """A stand-in for the psycopg connection of the modules, serving
+    Snapshots rows. Transactions are no-ops."""
+
+    def __init__(self, snapshots):
+        self.snapshots = snapshots
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self.snapshots)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
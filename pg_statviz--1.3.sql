@@ -0,0 +1,1123 @@
+/*
+// pg_statviz - stats visualization and time series analysis
+//
+// Copyright (c) 2026 Jimmy Angelakos
+// This software is released under the PostgreSQL Licence
+//
+// pg_statviz 1.3
+*/
+
+-- complain if script is sourced in psql, rather than via CREATE EXTENSION
+\echo Use "CREATE EXTENSION pg_statviz" to load this file. \quit
+
+
+-- Snapshots taken here have no source; those loaded by the collector from
+-- other servers (e.g. read-only standbys) name the host they came from
+CREATE TABLE IF NOT EXISTS @extschema@.snapshots(
+    snapshot_tstamp timestamptz PRIMARY KEY,
+    source text
+);
+CREATE INDEX IF NOT EXISTS snapshots_source_idx
+ON @extschema@.snapshots (source, snapshot_tstamp);
+
+
+-- Buffers and checkpoints
+CREATE TABLE IF NOT EXISTS @extschema@.buf(
+    snapshot_tstamp timestamptz REFERENCES @extschema@.snapshots(snapshot_tstamp) ON DELETE CASCADE PRIMARY KEY,
+    checkpoints_timed bigint,
+    checkpoints_req bigint,
+    checkpoint_write_time double precision,
+    checkpoint_sync_time double precision,
+    buffers_checkpoint bigint,
+    buffers_clean bigint,
+    maxwritten_clean bigint,
+    buffers_backend bigint,
+    buffers_backend_fsync bigint,
+    buffers_alloc bigint,
+    stats_reset timestamptz);
+
+-- PG17+ moved things out of pg_stat_bgwriter
+DO $block$
+BEGIN
+    IF (SELECT current_setting('server_version_num')::int >= 170000) THEN
+        CREATE OR REPLACE FUNCTION @extschema@.snapshot_buf(snapshot_tstamp timestamptz)
+        RETURNS void
+        AS $$
+            INSERT INTO @extschema@.buf (
+                snapshot_tstamp,
+                checkpoints_timed,
+                checkpoints_req,
+                checkpoint_write_time,
+                checkpoint_sync_time,
+                buffers_checkpoint,
+                buffers_clean,
+                maxwritten_clean,
+                buffers_backend,
+                buffers_backend_fsync,
+                buffers_alloc,
+                stats_reset)
+            SELECT
+                snapshot_tstamp,
+                c.num_timed,
+                c.num_requested,
+                c.write_time,
+                c.sync_time,
+                c.buffers_written,
+                b.buffers_clean,
+                b.maxwritten_clean,
+                i.writes,
+                i.fsyncs,
+                b.buffers_alloc,
+                b.stats_reset
+            FROM pg_stat_bgwriter b, pg_stat_checkpointer c, pg_stat_io i
+            WHERE i.backend_type = 'client backend'
+            AND i.context = 'normal'
+            AND i.object = 'relation';
+        $$ LANGUAGE SQL;
+    ELSE
+        CREATE OR REPLACE FUNCTION @extschema@.snapshot_buf(snapshot_tstamp timestamptz)
+        RETURNS void
+        AS $$
+            INSERT INTO @extschema@.buf (
+                snapshot_tstamp,
+                checkpoints_timed,
+                checkpoints_req,
+                checkpoint_write_time,
+                checkpoint_sync_time,
+                buffers_checkpoint,
+                buffers_clean,
+                maxwritten_clean,
+                buffers_backend,
+                buffers_backend_fsync,
+                buffers_alloc,
+                stats_reset)
+            SELECT
+                snapshot_tstamp,
+                checkpoints_timed,
+                checkpoints_req,
+                checkpoint_write_time,
+                checkpoint_sync_time,
+                buffers_checkpoint,
+                buffers_clean,
+                maxwritten_clean,
+                buffers_backend,
+                buffers_backend_fsync,
+                buffers_alloc,
+                stats_reset
+            FROM pg_stat_bgwriter;
+        $$ LANGUAGE SQL;
+    END IF;
+END
+$block$ LANGUAGE PLPGSQL;
+
+
+-- Configuration
+CREATE TABLE IF NOT EXISTS @extschema@.conf(
+    snapshot_tstamp timestamptz REFERENCES @extschema@.snapshots(snapshot_tstamp) ON DELETE CASCADE PRIMARY KEY,
+    conf jsonb);
+
+CREATE OR REPLACE FUNCTION @extschema@.snapshot_conf(snapshot_tstamp timestamptz)
+RETURNS void
+AS $$
+DECLARE
+    current_conf jsonb;
+    previous_conf jsonb;
+BEGIN
+    SELECT jsonb_object_agg("variable", "value")
+    INTO current_conf
+    FROM (
+        SELECT "name" AS "variable",
+               "setting" AS "value"
+        FROM pg_settings
+        WHERE "name" IN (
+            'autovacuum',
+            'autovacuum_max_workers',
+            'autovacuum_naptime',
+            'autovacuum_work_mem',
+            'bgwriter_delay',
+            'bgwriter_lru_maxpages',
+            'bgwriter_lru_multiplier',
+            'checkpoint_completion_target',
+            'checkpoint_timeout',
+            'max_connections',
+            'max_wal_size',
+            'max_wal_senders',
+            'work_mem',
+            'maintenance_work_mem',
+            'max_replication_slots',
+            'max_parallel_workers',
+            'max_parallel_maintenance_workers',
+            'server_version_num',
+            'shared_buffers',
+            'vacuum_cost_delay',
+            'vacuum_cost_limit',
+            'effective_wal_level',
+            'io_min_workers',
+            'io_max_workers',
+            'io_worker_idle_timeout',
+            'io_worker_launch_interval',
+            'autovacuum_max_parallel_workers',
+            'autovacuum_vacuum_score_weight',
+            'autovacuum_vacuum_insert_score_weight',
+            'autovacuum_analyze_score_weight',
+            'autovacuum_freeze_score_weight',
+            'autovacuum_multixact_freeze_score_weight')) s;
+
+    SELECT c1.conf INTO previous_conf
+    FROM @extschema@.conf c1
+    WHERE c1.snapshot_tstamp = (SELECT MAX(c2.snapshot_tstamp)
+                                FROM @extschema@.conf c2
+                                JOIN @extschema@.snapshots n
+                                    ON n.snapshot_tstamp = c2.snapshot_tstamp
+                                WHERE n.source IS NULL);
+
+    IF previous_conf IS NULL OR current_conf IS DISTINCT FROM previous_conf THEN
+        INSERT INTO @extschema@.conf (snapshot_tstamp, conf)
+        VALUES (snapshot_conf.snapshot_tstamp, current_conf);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- Connections
+CREATE TABLE IF NOT EXISTS @extschema@.conn(
+    snapshot_tstamp timestamptz REFERENCES @extschema@.snapshots(snapshot_tstamp) ON DELETE CASCADE PRIMARY KEY,
+    conn_total int,
+    conn_active int,
+    conn_idle int,
+    conn_idle_trans int,
+    conn_idle_trans_abort int,
+    conn_fastpath int,
+    conn_users jsonb,
+    max_query_age_seconds double precision,
+    max_xact_age_seconds double precision,
+    max_backend_age_seconds double precision);
+
+CREATE OR REPLACE FUNCTION @extschema@.snapshot_conn(snapshot_tstamp timestamptz)
+RETURNS void
+AS $$
+    WITH
+        pgsa AS (
+            SELECT *
+            FROM pg_stat_activity
+            WHERE datname = current_database()
+            AND state IS NOT NULL),
+        userconns AS (
+            SELECT jsonb_agg(uc)
+            FROM (
+                SELECT usename AS user, count(*) AS connections
+                FROM pgsa
+                WHERE usename IS NOT NULL
+                GROUP BY usename) uc),
+        maxages AS (
+            SELECT
+                date_part('epoch', max(clock_timestamp() - query_start)) AS max_query_age,
+                date_part('epoch', max(clock_timestamp() - xact_start)) AS max_xact_age,
+                date_part('epoch', max(clock_timestamp() - backend_start)) AS max_backend_age
+            FROM pgsa
+            WHERE state != 'idle')
+    INSERT INTO @extschema@.conn (
+        snapshot_tstamp,
+        conn_total,
+        conn_active,
+        conn_idle,
+        conn_idle_trans,
+        conn_idle_trans_abort,
+        conn_fastpath,
+        conn_users,
+        max_query_age_seconds,
+        max_xact_age_seconds,
+        max_backend_age_seconds)
+    SELECT
+        snapshot_tstamp,
+        count(*) AS conn_total,
+        count(*) FILTER (WHERE state = 'active') AS conn_active,
+        count(*) FILTER (WHERE state = 'idle') AS conn_idle,
+        count(*) FILTER (WHERE state = 'idle in transaction') AS conn_idle_trans,
+        count(*) FILTER (WHERE state = 'idle in transaction (aborted)') AS conn_idle_trans_abort,
+        count(*) FILTER (WHERE state = 'fastpath function call') AS conn_fastpath,
+        (SELECT * from userconns) AS conn_users,
+        (SELECT max_query_age FROM maxages),
+        (SELECT max_xact_age FROM maxages),
+        (SELECT max_backend_age FROM maxages)
+    FROM pgsa;
+$$ LANGUAGE SQL;
+
+
+-- Locks
+CREATE TABLE IF NOT EXISTS @extschema@.lock(
+    snapshot_tstamp timestamptz REFERENCES @extschema@.snapshots(snapshot_tstamp) ON DELETE CASCADE PRIMARY KEY,
+    locks_total int,
+    locks jsonb);
+
+CREATE OR REPLACE FUNCTION @extschema@.snapshot_lock(snapshot_tstamp timestamptz)
+RETURNS void
+AS $$
+    WITH
+        pgl AS (
+            SELECT *
+            FROM pg_locks l, pg_database d
+            WHERE d.datname = current_database()
+            AND l.database = oid
+            AND locktype = 'relation'
+            AND pid != pg_backend_pid()), -- ignore snapshot session
+        lcks AS (
+            SELECT coalesce(jsonb_agg(l), '[]'::jsonb)
+            FROM (
+                SELECT mode AS lock_mode, count(*) AS lock_count
+                FROM pgl
+                GROUP BY lock_mode) l)
+    INSERT INTO @extschema@.lock (
+        snapshot_tstamp,
+        locks_total,
+        locks)
+    SELECT
+        snapshot_tstamp,
+        count(*) AS locks_total,
+        (SELECT * from lcks) AS locks
+    FROM pgl;
+$$ LANGUAGE SQL;
+
+
+-- Blocking locks
+CREATE TABLE IF NOT EXISTS @extschema@.blocking(
+    snapshot_tstamp timestamptz REFERENCES @extschema@.snapshots(snapshot_tstamp) ON DELETE CASCADE PRIMARY KEY,
+    blocked_total int,
+    blockers_total int,
+    blocking jsonb);
+
+CREATE OR REPLACE FUNCTION @extschema@.snapshot_blocking(snapshot_tstamp timestamptz)
+RETURNS void
+AS $$
+    DECLARE
+        -- Set by snapshot() from the blocking budget
+        deadline timestamptz := nullif(current_setting('pgstatviz.deadline', true), '')::timestamptz;
+        waiter record;
+        blocker int;
+        blocked_pids int[] := '{}';
+        lock_types text[] := '{}';
+        blocking_pids int[] := '{}';
+    BEGIN
+        FOR waiter IN
+            SELECT DISTINCT blocked.pid, l.locktype
+            FROM pg_catalog.pg_stat_activity blocked
+            JOIN pg_catalog.pg_locks l
+                ON l.pid = blocked.pid AND NOT l.granted
+            WHERE blocked.datname = current_database()
+            AND blocked.pid != pg_backend_pid() -- ignore snapshot session
+        LOOP
+            -- Every pg_blocking_pids() call locks the whole lock table, so
+            -- the budget is checked between them
+            IF clock_timestamp() > deadline THEN
+                RAISE EXCEPTION 'blocking snapshot cut short at its budget'
+                    USING ERRCODE = 'lock_not_available';
+            END IF;
+            -- pg_blocking_pids() resolves the wait graph itself, including
+            -- soft blocks from sessions merely ahead in the lock queue
+            FOREACH blocker IN ARRAY pg_blocking_pids(waiter.pid) LOOP
+                blocked_pids := blocked_pids || waiter.pid;
+                lock_types := lock_types || waiter.locktype;
+                blocking_pids := blocking_pids || blocker;
+            END LOOP;
+        END LOOP;
+        WITH
+            blk AS (
+                SELECT DISTINCT *
+                FROM unnest(blocked_pids, lock_types, blocking_pids)
+                    AS b(blocked_pid, lock_type, blocking_pid)),
+            blocks AS (
+                SELECT coalesce(jsonb_agg(b), '[]'::jsonb)
+                FROM (
+                    SELECT lock_type, count(DISTINCT blocked_pid) AS blocked_count
+                    FROM blk
+                    GROUP BY lock_type) b)
+        INSERT INTO @extschema@.blocking (
+            snapshot_tstamp,
+            blocked_total,
+            blockers_total,
+            blocking)
+        SELECT
+            snapshot_tstamp,
+            count(DISTINCT blocked_pid) AS blocked_total,
+            count(DISTINCT blocking_pid) AS blockers_total,
+            (SELECT * from blocks) AS blocking
+        FROM blk;
+    END
+$$ LANGUAGE PLPGSQL;
+
+
+-- Replication
+CREATE TABLE IF NOT EXISTS @extschema@.repl(
+    snapshot_tstamp timestamptz REFERENCES @extschema@.snapshots(snapshot_tstamp) ON DELETE CASCADE PRIMARY KEY,
+    standby_lag jsonb,
+    slot_stats jsonb);
+
+CREATE OR REPLACE FUNCTION @extschema@.snapshot_repl(snapshot_tstamp timestamptz)
+RETURNS void
+AS $$
+    WITH
+        standbys AS (
+            SELECT jsonb_agg(jsonb_build_object(
+                'application_name', application_name,
+                'state', state,
+                'sync_state', sync_state,
+                'lag_bytes', pg_wal_lsn_diff(pg_current_wal_lsn(), sent_lsn),
+                'lag_seconds', date_part('epoch', clock_timestamp() - reply_time)
+            )) AS standby_lag
+            FROM pg_stat_replication),
+        slots AS (
+            SELECT jsonb_agg(jsonb_build_object(
+                'slot_name', slot_name,
+                'slot_type', slot_type,
+                'active', active,
+                'wal_bytes', CASE
+                    WHEN pg_is_in_recovery() THEN NULL
+                    ELSE pg_wal_lsn_diff(pg_current_wal_lsn(), restart_lsn)
+                END
+            )) AS slot_stats
+            FROM pg_replication_slots
+            WHERE slot_type = 'physical'
+               OR database = current_database())
+    INSERT INTO @extschema@.repl (
+        snapshot_tstamp,
+        standby_lag,
+        slot_stats)
+    SELECT
+        snapshot_tstamp,
+        (SELECT standby_lag FROM standbys),
+        (SELECT slot_stats FROM slots);
+$$ LANGUAGE SQL;
+
+
+-- SLRU
+CREATE TABLE IF NOT EXISTS @extschema@.slru(
+    snapshot_tstamp timestamptz REFERENCES @extschema@.snapshots(snapshot_tstamp) ON DELETE CASCADE PRIMARY KEY,
+    slru_stats jsonb);
+
+CREATE OR REPLACE FUNCTION @extschema@.snapshot_slru(snapshot_tstamp timestamptz)
+RETURNS void
+AS $$
+    INSERT INTO @extschema@.slru (
+        snapshot_tstamp,
+        slru_stats)
+    SELECT
+        snapshot_tstamp,
+        jsonb_agg(jsonb_build_object(
+            'name', name,
+            'blks_zeroed', blks_zeroed,
+            'blks_hit', blks_hit,
+            'blks_read', blks_read,
+            'blks_written', blks_written,
+            'blks_exists', blks_exists,
+            'flushes', flushes,
+            'truncates', truncates
+        ))
+    FROM pg_stat_slru;
+$$ LANGUAGE SQL;
+
+
+-- Wait events
+CREATE TABLE IF NOT EXISTS @extschema@.wait(
+    snapshot_tstamp timestamptz REFERENCES @extschema@.snapshots(snapshot_tstamp) ON DELETE CASCADE PRIMARY KEY,
+    wait_events_total int,
+    wait_events jsonb);
+
+CREATE OR REPLACE FUNCTION @extschema@.snapshot_wait(snapshot_tstamp timestamptz)
+RETURNS void
+AS $$
+    WITH
+        pgsa AS (
+            SELECT *
+            FROM pg_stat_activity
+            WHERE datname = current_database()
+            AND state = 'active'
+            AND wait_event IS NOT NULL),
+        waitevents AS (
+            SELECT coalesce(jsonb_agg(we), '[]'::jsonb)
+            FROM (
+                SELECT wait_event_type, wait_event, count(*) AS wait_event_count
+                FROM pgsa
+                GROUP BY wait_event_type, wait_event) we)
+    INSERT INTO @extschema@.wait (
+        snapshot_tstamp,
+        wait_events_total,
+        wait_events)
+    SELECT
+        snapshot_tstamp,
+        count(*) AS wait_events_total,
+        (SELECT * from waitevents) AS wait_events
+    FROM pgsa;
+$$ LANGUAGE SQL;
+
+-- Wait events and ages of the active sessions, sampled many times a second
+-- by the pg_statviz sample command and aggregated per window: the average
+-- sessions waiting on each event over the window's samples, and histograms
+-- of query and transaction ages (counts per bucket of the bounds in seconds,
+-- over all samples)
+CREATE TABLE IF NOT EXISTS @extschema@.wait_sample(
+    snapshot_tstamp timestamptz REFERENCES @extschema@.snapshots(snapshot_tstamp) ON DELETE CASCADE PRIMARY KEY,
+    samples int,
+    window_seconds double precision,
+    wait_events_total double precision,
+    wait_events jsonb,
+    query_age_hist jsonb,
+    xact_age_hist jsonb);
+
+
+-- WAL
+CREATE TABLE IF NOT EXISTS @extschema@.wal(
+    snapshot_tstamp timestamptz REFERENCES @extschema@.snapshots(snapshot_tstamp) ON DELETE CASCADE PRIMARY KEY,
+    wal_records bigint,
+    wal_fpi bigint,
+    wal_fpi_bytes bigint,
+    wal_bytes numeric,
+    wal_buffers_full bigint,
+    wal_write bigint,
+    wal_sync bigint,
+    wal_write_time double precision,
+    wal_sync_time double precision,
+    stats_reset timestamptz);
+
+-- pg_stat_wal only exists in PG14+
+DO $block$
+BEGIN
+    IF (SELECT current_setting('server_version_num')::int >= 190000) THEN
+        -- PG19 adds wal_fpi_bytes to pg_stat_wal
+        CREATE OR REPLACE FUNCTION @extschema@.snapshot_wal(snapshot_tstamp timestamptz)
+        RETURNS void
+        AS $$
+            INSERT INTO @extschema@.wal (
+                    snapshot_tstamp,
+                    wal_records,
+                    wal_fpi,
+                    wal_fpi_bytes,
+                    wal_bytes,
+                    wal_buffers_full,
+                    wal_write,
+                    wal_sync,
+                    wal_write_time,
+                    wal_sync_time,
+                    stats_reset)
+                SELECT
+                    snapshot_tstamp,
+                    w.wal_records,
+                    w.wal_fpi,
+                    w.wal_fpi_bytes,
+                    w.wal_bytes,
+                    w.wal_buffers_full,
+                    SUM(io.writes),
+                    SUM(io.fsyncs),
+                    SUM(io.write_time),
+                    SUM(io.fsync_time),
+                    w.stats_reset
+                FROM pg_stat_wal w, pg_stat_io io
+                WHERE io.object = 'wal'
+                GROUP BY w.wal_records, w.wal_fpi, w.wal_fpi_bytes, w.wal_bytes, w.wal_buffers_full, w.stats_reset;
+        $$ LANGUAGE SQL;
+    ELSIF (SELECT current_setting('server_version_num')::int >= 180000) THEN
+        -- PG18 moved wal_write/wal_sync statistics to pg_stat_io (object = 'wal')
+        CREATE OR REPLACE FUNCTION @extschema@.snapshot_wal(snapshot_tstamp timestamptz)
+        RETURNS void
+        AS $$
+            INSERT INTO @extschema@.wal (
+                    snapshot_tstamp,
+                    wal_records,
+                    wal_fpi,
+                    wal_bytes,
+                    wal_buffers_full,
+                    wal_write,
+                    wal_sync,
+                    wal_write_time,
+                    wal_sync_time,
+                    stats_reset)
+                SELECT
+                    snapshot_tstamp,
+                    w.wal_records,
+                    w.wal_fpi,
+                    w.wal_bytes,
+                    w.wal_buffers_full,
+                    SUM(io.writes),
+                    SUM(io.fsyncs),
+                    SUM(io.write_time),
+                    SUM(io.fsync_time),
+                    w.stats_reset
+                FROM pg_stat_wal w, pg_stat_io io
+                WHERE io.object = 'wal'
+                GROUP BY w.wal_records, w.wal_fpi, w.wal_bytes, w.wal_buffers_full, w.stats_reset;
+        $$ LANGUAGE SQL;
+    ELSIF (SELECT current_setting('server_version_num')::int >= 140000) THEN
+        -- PG14-17 has all WAL stats in pg_stat_wal
+        CREATE OR REPLACE FUNCTION @extschema@.snapshot_wal(snapshot_tstamp timestamptz)
+        RETURNS void
+        AS $$
+            INSERT INTO @extschema@.wal (
+                    snapshot_tstamp,
+                    wal_records,
+                    wal_fpi,
+                    wal_bytes,
+                    wal_buffers_full,
+                    wal_write,
+                    wal_sync,
+                    wal_write_time,
+                    wal_sync_time,
+                    stats_reset)
+                SELECT
+                    snapshot_tstamp,
+                    wal_records,
+                    wal_fpi,
+                    wal_bytes,
+                    wal_buffers_full,
+                    wal_write,
+                    wal_sync,
+                    wal_write_time,
+                    wal_sync_time,
+                    stats_reset
+                FROM pg_stat_wal;
+        $$ LANGUAGE SQL;
+    END IF;
+END
+$block$ LANGUAGE PLPGSQL;
+
+
+-- DB
+CREATE TABLE IF NOT EXISTS @extschema@.db(
+    snapshot_tstamp timestamptz REFERENCES @extschema@.snapshots(snapshot_tstamp) ON DELETE CASCADE PRIMARY KEY,
+    xact_commit bigint,
+    xact_rollback bigint,
+    blks_read bigint,
+    blks_hit bigint,
+    tup_returned bigint,
+    tup_fetched bigint,
+    tup_inserted bigint,
+    tup_updated bigint,
+    tup_deleted bigint,
+    temp_files bigint,
+    temp_bytes bigint,
+    block_size int,
+    stats_reset timestamptz,
+    postmaster_start_time timestamptz,
+    checksum_failures bigint,
+    checksum_last_failure timestamptz);
+
+CREATE OR REPLACE FUNCTION @extschema@.snapshot_db(snapshot_tstamp timestamptz)
+RETURNS void
+AS $$
+    INSERT INTO @extschema@.db (
+            snapshot_tstamp,
+            xact_commit,
+            xact_rollback,
+            blks_read,
+            blks_hit,
+            tup_returned,
+            tup_fetched,
+            tup_inserted,
+            tup_updated,
+            tup_deleted,
+            temp_files,
+            temp_bytes,
+            stats_reset,
+            block_size,
+            postmaster_start_time,
+            checksum_failures,
+            checksum_last_failure)
+        SELECT
+            snapshot_tstamp,
+            xact_commit,
+            xact_rollback,
+            blks_read,
+            blks_hit,
+            tup_returned,
+            tup_fetched,
+            tup_inserted,
+            tup_updated,
+            tup_deleted,
+            temp_files,
+            temp_bytes,
+            stats_reset,
+            current_setting('block_size')::int,
+            pg_postmaster_start_time(),
+            checksum_failures,
+            checksum_last_failure
+        FROM pg_stat_database
+        WHERE datname = current_database();
+$$ LANGUAGE SQL;
+
+
+-- I/O
+CREATE TABLE IF NOT EXISTS @extschema@.io(
+    snapshot_tstamp timestamptz REFERENCES @extschema@.snapshots(snapshot_tstamp) ON DELETE CASCADE PRIMARY KEY,
+    io_stats jsonb,
+    stats_reset timestamptz);
+
+-- pg_stat_io only exists in PG16+
+DO $block$
+BEGIN
+    IF (SELECT current_setting('server_version_num')::int >= 180000) THEN
+        -- PG18+ uses byte-based metrics (read_bytes, write_bytes, extend_bytes)
+        CREATE OR REPLACE FUNCTION @extschema@.snapshot_io(snapshot_tstamp timestamptz)
+        RETURNS void
+        AS $$
+            WITH
+                pgsi AS (
+                    SELECT
+                        backend_type,
+                        object,
+                        context,
+                        reads,
+                        read_time,
+                        read_bytes,
+                        writes,
+                        write_time,
+                        write_bytes,
+                        writebacks,
+                        writeback_time,
+                        extends,
+                        extend_time,
+                        extend_bytes,
+                        hits,
+                        evictions,
+                        reuses,
+                        fsyncs,
+                        fsync_time,
+                        stats_reset
+                    FROM pg_stat_io
+                    WHERE NOT (reads = 0 AND writes = 0)),
+                ioagg AS (
+                    SELECT jsonb_agg(io)
+                    FROM (SELECT *
+                          FROM pgsi) io)
+            INSERT INTO @extschema@.io (
+                    snapshot_tstamp,
+                    io_stats,
+                    stats_reset)
+            SELECT snapshot_tstamp,
+                   (SELECT * FROM ioagg) AS io_stats,
+                   (SELECT stats_reset FROM pgsi LIMIT 1) AS stats_reset;
+        $$ LANGUAGE SQL;
+    ELSIF (SELECT current_setting('server_version_num')::int >= 160000) THEN
+        -- PG16-17 uses operation counts without byte metrics
+        CREATE OR REPLACE FUNCTION @extschema@.snapshot_io(snapshot_tstamp timestamptz)
+        RETURNS void
+        AS $$
+            WITH
+                pgsi AS (
+                    SELECT
+                        backend_type,
+                        object,
+                        context,
+                        reads,
+                        read_time,
+                        writes,
+                        write_time,
+                        writebacks,
+                        writeback_time,
+                        extends,
+                        extend_time,
+                        hits,
+                        evictions,
+                        reuses,
+                        fsyncs,
+                        fsync_time,
+                        stats_reset
+                    FROM pg_stat_io
+                    WHERE NOT (reads = 0 AND writes = 0)),
+                ioagg AS (
+                    SELECT jsonb_agg(io)
+                    FROM (SELECT *
+                          FROM pgsi) io)
+            INSERT INTO @extschema@.io (
+                    snapshot_tstamp,
+                    io_stats,
+                    stats_reset)
+            SELECT snapshot_tstamp,
+                   (SELECT * FROM ioagg) AS io_stats,
+                   (SELECT stats_reset FROM pgsi LIMIT 1) AS stats_reset;
+        $$ LANGUAGE SQL;
+    END IF;
+END
+$block$ LANGUAGE PLPGSQL;
+
+
+-- Snapshot collection cost: how long each component of a snapshot took to
+-- collect, and the rows, bytes and WAL it wrote, or why it was skipped
+CREATE TABLE IF NOT EXISTS @extschema@.snapshot_stats(
+    snapshot_tstamp timestamptz REFERENCES @extschema@.snapshots(snapshot_tstamp) ON DELETE CASCADE,
+    component text,
+    duration_ms double precision,
+    rows_written int,
+    bytes_written bigint,
+    wal_bytes numeric,
+    skipped text,
+    PRIMARY KEY (snapshot_tstamp, component));
+
+
+-- Snapshots
+-- Every component is timed with clock_timestamp() and recorded in
+-- snapshot_stats with the rows and bytes it wrote and the WAL it generated,
+-- followed by a 'total' for the whole snapshot.
+-- Components run in their own subtransaction, so one failing is skipped
+-- (and recorded as such) without losing the others. budgets gives the time
+-- limits in ms of the expensive ones. statement_timeout only times the
+-- statement that called snapshot(), so they are enforced where the work can
+-- be cut: lock waits time out at the limit, and blocking stops between its
+-- pg_blocking_pids() calls. pg_locks is read in a single call that can't be
+-- interrupted, so lock can only be stopped from running again: a component
+-- whose last run went over its limit sits snapshots out, probing again every
+-- probe_every-th one until a run comes in under it
+CREATE OR REPLACE FUNCTION @extschema@.snapshot(
+    budgets jsonb DEFAULT '{"lock": 1000, "blocking": 1000}')
+RETURNS timestamptz
+AS $$
+    DECLARE
+        ts timestamptz;
+        server_version int := current_setting('server_version_num')::int;
+        saved_lock_timeout text := current_setting('lock_timeout');
+        components text[] := ARRAY['buf', 'conf', 'conn', 'db'];
+        comp text;
+        budget double precision;
+        probe_every int := 10;
+        reason text;
+        started timestamptz;
+        elapsed double precision;
+        first_lsn pg_lsn;
+        lsn pg_lsn;
+        wal numeric;
+        row_count int;
+        row_bytes bigint;
+        total_rows int := 0;
+        total_bytes bigint := 0;
+    BEGIN
+        ts := clock_timestamp();
+        -- WAL positions can't be read during recovery
+        IF NOT pg_is_in_recovery() THEN
+            first_lsn := pg_current_wal_insert_lsn();
+        END IF;
+        INSERT INTO @extschema@.snapshots
+        VALUES (ts);
+        -- pg_stat_io only exists in PG16+
+        IF server_version >= 160000 THEN
+            components := components || 'io'::text;
+        END IF;
+        components := components
+            || ARRAY['lock', 'blocking', 'repl', 'slru', 'wait'];
+        -- pg_stat_wal only exists in PG14+
+        IF server_version >= 140000 THEN
+            components := components || 'wal'::text;
+        END IF;
+        FOREACH comp IN ARRAY components LOOP
+            budget := (budgets ->> comp)::double precision;
+            reason := NULL;
+            elapsed := NULL;
+            wal := NULL;
+            row_count := 0;
+            row_bytes := 0;
+            -- Over budget the last time it ran (sat out snapshots have no
+            -- duration), and not yet due for a probe
+            IF budget IS NOT NULL AND EXISTS (
+                SELECT
+                FROM (SELECT s.snapshot_tstamp, s.duration_ms
+                      FROM @extschema@.snapshot_stats s
+                      JOIN @extschema@.snapshots n USING (snapshot_tstamp)
+                      WHERE s.component = comp
+                      AND s.snapshot_tstamp < ts
+                      AND s.duration_ms IS NOT NULL
+                      AND n.source IS NULL
+                      ORDER BY s.snapshot_tstamp DESC
+                      LIMIT 1) prev
+                WHERE prev.duration_ms > budget
+                AND (SELECT count(*)
+                     FROM @extschema@.snapshot_stats s
+                     JOIN @extschema@.snapshots n USING (snapshot_tstamp)
+                     WHERE s.component = comp
+                     AND s.snapshot_tstamp > prev.snapshot_tstamp
+                     AND s.snapshot_tstamp < ts
+                     AND n.source IS NULL) < probe_every - 1) THEN
+                reason := 'over budget';
+            ELSE
+                IF first_lsn IS NOT NULL THEN
+                    lsn := pg_current_wal_insert_lsn();
+                END IF;
+                started := clock_timestamp();
+                BEGIN
+                    IF budget IS NOT NULL THEN
+                        PERFORM set_config('lock_timeout',
+                                           greatest(ceil(budget), 1)::bigint || 'ms',
+                                           true);
+                        PERFORM set_config('pgstatviz.deadline',
+                                           (started + budget * interval '1 ms')::text,
+                                           true);
+                    END IF;
+                    EXECUTE format('SELECT @extschema@.%I($1)', 'snapshot_' || comp)
+                    USING ts;
+                EXCEPTION
+                    WHEN lock_not_available THEN
+                        reason := CASE WHEN budget IS NULL THEN 'error: ' || SQLERRM
+                                       ELSE 'over budget' END;
+                    WHEN OTHERS THEN
+                        reason := 'error: ' || SQLERRM;
+                END;
+                PERFORM set_config('lock_timeout', saved_lock_timeout, true);
+                PERFORM set_config('pgstatviz.deadline', '', true);
+                elapsed := 1000 * date_part('epoch', clock_timestamp() - started);
+                IF first_lsn IS NOT NULL THEN
+                    wal := pg_wal_lsn_diff(pg_current_wal_insert_lsn(), lsn);
+                END IF;
+            END IF;
+            IF reason IS NULL THEN
+                EXECUTE format('SELECT count(*), coalesce(sum(pg_column_size(t.*)), 0)
+                                FROM @extschema@.%I t
+                                WHERE t.snapshot_tstamp = $1', comp)
+                INTO row_count, row_bytes
+                USING ts;
+            ELSE
+                RAISE WARNING 'pg_statviz snapshot skipped %: %', comp, reason;
+            END IF;
+            INSERT INTO @extschema@.snapshot_stats
+            VALUES (ts, comp, elapsed, row_count, row_bytes, wal, reason);
+            total_rows := total_rows + row_count;
+            total_bytes := total_bytes + row_bytes;
+        END LOOP;
+        IF first_lsn IS NOT NULL THEN
+            wal := pg_wal_lsn_diff(pg_current_wal_insert_lsn(), first_lsn);
+        END IF;
+        INSERT INTO @extschema@.snapshot_stats
+        VALUES (ts, 'total', 1000 * date_part('epoch', clock_timestamp() - ts),
+                total_rows, total_bytes, wal, NULL);
+        RAISE NOTICE 'created pg_statviz snapshot';
+        RETURN ts;
+    END
+$$ LANGUAGE PLPGSQL;
+
+CREATE OR REPLACE FUNCTION @extschema@.delete_snapshots()
+RETURNS void
+AS $$
+    BEGIN
+        RAISE NOTICE 'truncating table "snapshots"';
+        TRUNCATE @extschema@.snapshots CASCADE;
+    END
+$$ LANGUAGE PLPGSQL;
+
+
+-- Breakdowns: unnest the per-snapshot JSONB arrays server-side and return
+-- (bucket, key, value) rows averaged over at most `buckets` time buckets,
+-- keeping the top_n keys by total and summing the rest into 'other'. Buckets
+-- without any entries come back as a single row with a NULL key. source
+-- limits them to the snapshots collected from that host (NULL: those
+-- taken here)
+CREATE OR REPLACE FUNCTION @extschema@.wait_breakdown(
+    from_tstamp timestamptz,
+    to_tstamp timestamptz,
+    buckets int DEFAULT 100,
+    top_n int DEFAULT 10,
+    source text DEFAULT NULL)
+RETURNS TABLE(bucket timestamptz, wait_event text, wait_event_count double precision)
+AS $$
+    WITH
+        snaps AS (
+            SELECT w.snapshot_tstamp, w.wait_events
+            FROM @extschema@.wait w
+            WHERE w.snapshot_tstamp BETWEEN from_tstamp AND to_tstamp
+            AND EXISTS (
+                SELECT
+                FROM @extschema@.snapshots n
+                WHERE n.snapshot_tstamp = w.snapshot_tstamp
+                AND n.source IS NOT DISTINCT FROM wait_breakdown.source)),
+        span AS (
+            SELECT
+                min(s.snapshot_tstamp) AS first_tstamp,
+                CASE WHEN count(*) > buckets
+                          AND max(s.snapshot_tstamp) > min(s.snapshot_tstamp)
+                     THEN (max(s.snapshot_tstamp) - min(s.snapshot_tstamp)) / buckets
+                END AS width
+            FROM snaps s),
+        bucketed AS (
+            SELECT
+                s.wait_events,
+                CASE WHEN p.width IS NULL THEN s.snapshot_tstamp
+                     ELSE p.first_tstamp + p.width * floor(
+                         date_part('epoch', s.snapshot_tstamp - p.first_tstamp)
+                         / date_part('epoch', p.width))
+                END AS bucket
+            FROM snaps s, span p),
+        sizes AS (
+            SELECT b.bucket, count(*) AS snapshots
+            FROM bucketed b
+            GROUP BY b.bucket),
+        entries AS (
+            SELECT
+                b.bucket,
+                e.wait_event_type || '/' || e.wait_event AS wait_event,
+                e.wait_event_count
+            FROM bucketed b
+            CROSS JOIN LATERAL jsonb_to_recordset(b.wait_events)
+                AS e(wait_event_type text, wait_event text, wait_event_count int)
+            WHERE e.wait_event IS NOT NULL),
+        ranked AS (
+            SELECT
+                e.wait_event,
+                row_number() OVER (ORDER BY sum(e.wait_event_count) DESC, e.wait_event) AS rank
+            FROM entries e
+            GROUP BY e.wait_event)
+    SELECT
+        z.bucket,
+        CASE WHEN r.rank > top_n THEN 'other' ELSE e.wait_event END,
+        coalesce(sum(e.wait_event_count), 0)::double precision / z.snapshots
+    FROM sizes z
+    LEFT JOIN entries e USING (bucket)
+    LEFT JOIN ranked r USING (wait_event)
+    GROUP BY z.bucket, 2, z.snapshots
+    ORDER BY z.bucket, min(r.rank);
+$$ LANGUAGE SQL STABLE;
+
+CREATE OR REPLACE FUNCTION @extschema@.lock_breakdown(
+    from_tstamp timestamptz,
+    to_tstamp timestamptz,
+    buckets int DEFAULT 100,
+    top_n int DEFAULT 10,
+    source text DEFAULT NULL)
+RETURNS TABLE(bucket timestamptz, lock_mode text, lock_count double precision)
+AS $$
+    WITH
+        snaps AS (
+            SELECT l.snapshot_tstamp, l.locks
+            FROM @extschema@.lock l
+            WHERE l.snapshot_tstamp BETWEEN from_tstamp AND to_tstamp
+            AND EXISTS (
+                SELECT
+                FROM @extschema@.snapshots n
+                WHERE n.snapshot_tstamp = l.snapshot_tstamp
+                AND n.source IS NOT DISTINCT FROM lock_breakdown.source)),
+        span AS (
+            SELECT
+                min(s.snapshot_tstamp) AS first_tstamp,
+                CASE WHEN count(*) > buckets
+                          AND max(s.snapshot_tstamp) > min(s.snapshot_tstamp)
+                     THEN (max(s.snapshot_tstamp) - min(s.snapshot_tstamp)) / buckets
+                END AS width
+            FROM snaps s),
+        bucketed AS (
+            SELECT
+                s.locks,
+                CASE WHEN p.width IS NULL THEN s.snapshot_tstamp
+                     ELSE p.first_tstamp + p.width * floor(
+                         date_part('epoch', s.snapshot_tstamp - p.first_tstamp)
+                         / date_part('epoch', p.width))
+                END AS bucket
+            FROM snaps s, span p),
+        sizes AS (
+            SELECT b.bucket, count(*) AS snapshots
+            FROM bucketed b
+            GROUP BY b.bucket),
+        entries AS (
+            SELECT b.bucket, e.lock_mode, e.lock_count
+            FROM bucketed b
+            CROSS JOIN LATERAL jsonb_to_recordset(b.locks)
+                AS e(lock_mode text, lock_count int)
+            WHERE e.lock_mode IS NOT NULL),
+        ranked AS (
+            SELECT
+                e.lock_mode,
+                row_number() OVER (ORDER BY sum(e.lock_count) DESC, e.lock_mode) AS rank
+            FROM entries e
+            GROUP BY e.lock_mode)
+    SELECT
+        z.bucket,
+        CASE WHEN r.rank > top_n THEN 'other' ELSE e.lock_mode END,
+        coalesce(sum(e.lock_count), 0)::double precision / z.snapshots
+    FROM sizes z
+    LEFT JOIN entries e USING (bucket)
+    LEFT JOIN ranked r USING (lock_mode)
+    GROUP BY z.bucket, 2, z.snapshots
+    ORDER BY z.bucket, min(r.rank);
+$$ LANGUAGE SQL STABLE;
+
+-- SLRU hit ratio is recomputed from the summed block counts per bucket so
+-- that it stays meaningful for the folded 'other' series
+CREATE OR REPLACE FUNCTION @extschema@.slru_breakdown(
+    from_tstamp timestamptz,
+    to_tstamp timestamptz,
+    buckets int DEFAULT 100,
+    top_n int DEFAULT 10,
+    source text DEFAULT NULL)
+RETURNS TABLE(bucket timestamptz, name text, hit_ratio double precision, blks_read numeric)
+AS $$
+    WITH
+        snaps AS (
+            SELECT s.snapshot_tstamp, s.slru_stats
+            FROM @extschema@.slru s
+            WHERE s.snapshot_tstamp BETWEEN from_tstamp AND to_tstamp
+            AND EXISTS (
+                SELECT
+                FROM @extschema@.snapshots n
+                WHERE n.snapshot_tstamp = s.snapshot_tstamp
+                AND n.source IS NOT DISTINCT FROM slru_breakdown.source)),
+        span AS (
+            SELECT
+                min(s.snapshot_tstamp) AS first_tstamp,
+                CASE WHEN count(*) > buckets
+                          AND max(s.snapshot_tstamp) > min(s.snapshot_tstamp)
+                     THEN (max(s.snapshot_tstamp) - min(s.snapshot_tstamp)) / buckets
+                END AS width
+            FROM snaps s),
+        bucketed AS (
+            SELECT
+                s.slru_stats,
+                CASE WHEN p.width IS NULL THEN s.snapshot_tstamp
+                     ELSE p.first_tstamp + p.width * floor(
+                         date_part('epoch', s.snapshot_tstamp - p.first_tstamp)
+                         / date_part('epoch', p.width))
+                END AS bucket
+            FROM snaps s, span p),
+        sizes AS (
+            SELECT DISTINCT b.bucket
+            FROM bucketed b),
+        entries AS (
+            SELECT b.bucket, e.name, e.blks_hit, e.blks_read
+            FROM bucketed b
+            CROSS JOIN LATERAL jsonb_to_recordset(b.slru_stats)
+                AS e(name text, blks_hit bigint, blks_read bigint)
+            WHERE e.name IS NOT NULL),
+        ranked AS (
+            SELECT
+                e.name,
+                row_number() OVER (ORDER BY sum(e.blks_read) DESC, e.name) AS rank
+            FROM entries e
+            GROUP BY e.name)
+    SELECT
+        z.bucket,
+        CASE WHEN r.rank > top_n THEN 'other' ELSE e.name END,
+        coalesce(sum(e.blks_hit)::double precision * 100
+                 / nullif(sum(e.blks_hit) + sum(e.blks_read), 0), 0),
+        coalesce(sum(e.blks_read), 0)
+    FROM sizes z
+    LEFT JOIN entries e USING (bucket)
+    LEFT JOIN ranked r USING (name)
+    GROUP BY z.bucket, 2
+    ORDER BY z.bucket, min(r.rank);
+$$ LANGUAGE SQL STABLE;
+
+
+-- Make tables dumpable
+SELECT pg_catalog.pg_extension_config_dump('pgstatviz.blocking', '');
+SELECT pg_catalog.pg_extension_config_dump('pgstatviz.buf', '');
+SELECT pg_catalog.pg_extension_config_dump('pgstatviz.conf', '');
+SELECT pg_catalog.pg_extension_config_dump('pgstatviz.conn', '');
+SELECT pg_catalog.pg_extension_config_dump('pgstatviz.db', '');
+SELECT pg_catalog.pg_extension_config_dump('pgstatviz.io', '');
+SELECT pg_catalog.pg_extension_config_dump('pgstatviz.lock', '');
+SELECT pg_catalog.pg_extension_config_dump('pgstatviz.repl', '');
+SELECT pg_catalog.pg_extension_config_dump('pgstatviz.slru', '');
+SELECT pg_catalog.pg_extension_config_dump('pgstatviz.snapshot_stats', '');
+SELECT pg_catalog.pg_extension_config_dump('pgstatviz.snapshots', '');
+SELECT pg_catalog.pg_extension_config_dump('pgstatviz.wait', '');
+SELECT pg_catalog.pg_extension_config_dump('pgstatviz.wait_sample', '');
+SELECT pg_catalog.pg_extension_config_dump('pgstatviz.wal', '');
+
+
+-- Permissions
+GRANT USAGE ON SCHEMA @extschema@ TO pg_monitor;
+GRANT EXECUTE ON ALL FUNCTIONS IN SCHEMA @extschema@ TO pg_monitor;
+GRANT SELECT ON ALL TABLES IN SCHEMA @extschema@ TO pg_monitor;
+GRANT INSERT ON ALL TABLES IN SCHEMA @extschema@ TO pg_monitor;
+GRANT DELETE ON ALL TABLES IN SCHEMA @extschema@ TO pg_monitor;
+GRANT TRUNCATE ON ALL TABLES IN SCHEMA @extschema@ TO pg_monitor;
@@ -3,3 +3,35 @@ SELECT 1 FROM pgstatviz.snapshot();
 SELECT count(*)
     FROM pgstatviz.conn t
     JOIN pgstatviz.snapshots s USING (snapshot_tstamp);
+SELECT count(*) AS snapshots, bool_and(duration_ms >= 0) AS timed
+    FROM pgstatviz.snapshot_stats
+    WHERE component = 'total';
+SELECT count(*) > 0 AS ok
+    FROM pgstatviz.lock_breakdown('-infinity', now());
+SELECT count(*) > 0 AS ok
+    FROM pgstatviz.wait_breakdown('-infinity', now(), 10, 3);
+SELECT count(*) > 0 AS ok
+    FROM pgstatviz.slru_breakdown('-infinity', now());
+SELECT 1 FROM pgstatviz.snapshot('{"lock": 0}');
+SELECT component, skipped
+    FROM pgstatviz.snapshot_stats
+    WHERE skipped IS NOT NULL;
+SELECT 1 FROM pgstatviz.snapshot('{"lock": 0}');
+SELECT component, count(*) AS sat_out
+    FROM pgstatviz.snapshot_stats
+    WHERE skipped IS NOT NULL
+    AND duration_ms IS NULL
+    GROUP BY component;
+INSERT INTO pgstatviz.snapshots VALUES ('2000-01-01', 'standby1');
+INSERT INTO pgstatviz.lock
+    VALUES ('2000-01-01', 3, '[{"lock_mode": "AccessShareLock", "lock_count": 3}]');
+SELECT lock_mode, lock_count
+    FROM pgstatviz.lock_breakdown('-infinity', now(), 100, 10, 'standby1');
+SELECT count(*) AS collected
+    FROM pgstatviz.lock_breakdown('-infinity', now())
+    WHERE bucket = '2000-01-01';
+INSERT INTO pgstatviz.snapshots VALUES ('2000-01-02', 'standby1');
+INSERT INTO pgstatviz.wait_sample (snapshot_tstamp, samples, window_seconds, wait_events_total)
+    VALUES ('2000-01-02', 150, 15, 0.5);
+SELECT samples, wait_events_total
+    FROM pgstatviz.wait_sample;
@@ -0,0 +1,185 @@
+"""
+pg_statviz - stats visualization and time series analysis
+
+Local anomaly detection: vectorized statistical checks of the series of a
+chart, run before AI analysis so charts where nothing happened don't need
+to be sent to a provider. Spikes are values far from the rolling median of
+the ones before them (and, over two days or more, from the usual value at
+that hour of the day); shifts are changepoints where the mean level of a
+series moves for good. Neither says whether a level is acceptable: charts
+are only routine within the absolute limits their module gives.
+"""
+
+__author__ = "Jimmy Angelakos"
+__copyright__ = "Copyright (c) 2026 Jimmy Angelakos"
+__license__ = "PostgreSQL License"
+
+import fnmatch
+import numpy
+import pandas as pd
+
+
+# A spike is this many robust standard deviations from both baselines
+Z_THRESHOLD = 5.0
+# A shift moves the mean by this many pooled standard deviations, with at
+# least this t statistic
+SHIFT_EFFECT = 1.0
+SHIFT_T = 6.0
+# Series with fewer snapshots than this aren't checked
+MIN_POINTS = 12
+
+_MAD_SIGMA = 1.4826
+_RESOLUTION = 1e-6
+
+
+def _prepare(df: pd.DataFrame) -> pd.DataFrame:
+    """The numeric columns of df as floats, with cumulative counters (series
+    that grow and almost never decrease) turned into per-snapshot
+    increments, as their growth is expected and only its rate can be
+    anomalous."""
+    frame = df.select_dtypes(include=['number']).astype(float)
+    frame = frame.replace([numpy.inf, -numpy.inf], numpy.nan)
+    steps = frame.diff()
+    # Rounding errors aren't steps
+    steps = steps.mask(steps.abs() <= _RESOLUTION * frame.abs().median(), 0)
+    n = frame.notna().sum()
+    counters = (((steps < 0).sum() <= numpy.maximum(1, n // 50))
+                & (steps > 0).any())
+    # A counter reset (negative step) is not an increment
+    increments = steps.loc[:, counters]
+    frame.loc[:, counters] = increments.where(increments >= 0)
+    return frame
+
+
+def _sigma(frame: pd.DataFrame) -> pd.Series:
+    """Robust noise level of each series: the MAD of its successive
+    differences (insensitive to trends and to isolated spikes), or a tenth
+    of its range for series that are mostly flat. Never below a millionth
+    of the series' typical magnitude, so rounding errors in a constant
+    rate don't count as deviations."""
+    sigma = _MAD_SIGMA * frame.diff().abs().median() / numpy.sqrt(2)
+    spread = (frame.max() - frame.min()) / 10
+    floor = _RESOLUTION * frame.abs().median()
+    return numpy.maximum(sigma.where(sigma > 0, spread), floor)
+
+
+def spikes(df: pd.DataFrame, window: int | None = None) -> list:
+    """Values of df's series more than Z_THRESHOLD robust standard deviations
+    from the rolling median of the `window` snapshots before them (default:
+    a twentieth of the series, at least 6). Over two days or more, they must
+    also be that far from the median at the same hour of the day, so daily
+    batch jobs and the like aren't spikes.
+
+    Returns [{'series', 'kind': 'spike', 'time', 'score'}] where score is the
+    (smaller) z-score."""
+    frame = _prepare(df)
+    if len(frame) < MIN_POINTS or frame.empty:
+        return []
+    window = window or max(6, len(frame) // 20)
+    sigma = _sigma(frame)
+    baseline = frame.rolling(window, min_periods=window // 2).median()
+    z = (frame - baseline.shift(1)).abs() / sigma
+    index = frame.index
+    if (isinstance(index, pd.DatetimeIndex)
+            and index[-1] - index[0] >= pd.Timedelta(days=2)):
+        profile = frame.groupby(index.hour).transform('median')
+        resid = frame - profile
+        resid_sigma = _MAD_SIGMA * (resid - resid.median()).abs().median()
+        resid_sigma = resid_sigma.where(resid_sigma > 0, sigma)
+        z = numpy.minimum(z, resid.abs() / resid_sigma)
+    hits = z.where(z > Z_THRESHOLD).stack()
+    return [{'series': str(col), 'kind': 'spike', 'time': t,
+             'score': round(float(score), 1)}
+            for (t, col), score in hits.items()]
+
+
+def changepoints(df: pd.DataFrame) -> list:
+    """The most significant mean shift of every series of df: the split of
+    the series into a before and an after with the largest t statistic,
+    computed for all splits and series at once from cumulative sums. Steps
+    a linear trend explains better are not shifts.
+
+    Returns [{'series', 'kind': 'shift', 'time', 'score', 'effect',
+    'before', 'after'}] for the shifts of at least SHIFT_EFFECT pooled
+    standard deviations and SHIFT_T, where time is the first snapshot
+    after the shift, score its t statistic, effect its size and before and
+    after the mean values on either side."""
+    frame = _prepare(df).ffill().bfill()
+    frame = frame.loc[:, frame.notna().all()]
+    n = len(frame)
+    if n < MIN_POINTS or frame.empty:
+        return []
+    x = frame.to_numpy()
+    # k = number of snapshots before the split, with at least a tenth of
+    # the series (and 3 snapshots) on each side, so a burst at either end
+    # is left to spikes()
+    edge = max(3, n // 10)
+    k = numpy.arange(edge, n - edge + 1)[:, None]
+    c1, c2 = numpy.cumsum(x, axis=0), numpy.cumsum(x * x, axis=0)
+    s1, s2 = c1[k[:, 0] - 1], c2[k[:, 0] - 1]
+    before, after = s1 / k, (c1[-1] - s1) / (n - k)
+    ss = (s2 - s1 * before) + (c2[-1] - s2 - (c1[-1] - s1) * after)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        sd = numpy.maximum(numpy.sqrt(numpy.maximum(ss, 0) / (n - 2)),
+                           _RESOLUTION * numpy.abs(numpy.median(x, axis=0)))
+        effect = numpy.abs(after - before) / sd
+        t = effect / numpy.sqrt(1 / k + 1 / (n - k))
+    t = numpy.nan_to_num(t, nan=0.0, posinf=numpy.finfo(float).max)
+    best = t.argmax(axis=0)
+    # Steady growth (or decline) splits into a low and a high half too, but
+    # a straight line fits it better than a step does
+    linear = numpy.polyfit(numpy.arange(n), x, 1, full=True)[1]
+    if len(linear) < x.shape[1]:
+        linear = numpy.full(x.shape[1], numpy.inf)
+    found = []
+    for j, col in enumerate(frame.columns):
+        i = best[j]
+        if (t[i, j] >= SHIFT_T and effect[i, j] >= SHIFT_EFFECT
+                and ss[i, j] < linear[j]):
+            found.append({'series': str(col), 'kind': 'shift',
+                          'time': frame.index[k[i, 0]],
+                          'score': round(float(min(t[i, j], 1e6)), 1),
+                          'effect': round(float(min(effect[i, j], 1e6)), 1),
+                          'before': float(before[i, j]),
+                          'after': float(after[i, j])})
+    return found
+
+
+def detect(df: pd.DataFrame) -> list:
+    """All spikes and shifts in df's series, most significant first."""
+    found = spikes(df) + changepoints(df)
+    return sorted(found, key=lambda a: a['score'], reverse=True)
+
+
+def over_limits(df: pd.DataFrame, limits: dict) -> list:
+    """The series of df that go above their limit: `limits` maps series
+    name patterns (fnmatch, e.g. '*_lag_bytes' or '*') to the highest
+    value still healthy, the first matching pattern applying. Values are
+    compared as they are, so a steady level or a counter that grew past
+    its limit counts, unlike in detect().
+
+    Returns [{'series', 'kind': 'limit', 'time', 'score'}] where time is
+    the first value over the limit and score the highest value."""
+    found = []
+    frame = df.select_dtypes(include=['number']).astype(float)
+    for col in frame.columns:
+        limit = next((v for pattern, v in limits.items()
+                      if fnmatch.fnmatchcase(str(col), pattern)), None)
+        if limit is None:
+            continue
+        over = frame[col][frame[col] > limit]
+        if not over.empty:
+            found.append({'series': str(col), 'kind': 'limit',
+                          'time': over.index[0],
+                          'score': round(float(over.max()), 1)})
+    return found
+
+
+def is_routine(df: pd.DataFrame, limits: dict | None = None) -> bool:
+    """Whether df has enough numeric data to tell, nothing in it is
+    anomalous and no series goes over its limit in `limits` (see
+    over_limits())."""
+    frame = df.select_dtypes(include=['number'])
+    if frame.empty or len(frame) < MIN_POINTS:
+        return False
+    return not detect(df) and not over_limits(df, limits or {})
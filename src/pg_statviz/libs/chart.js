@@ -0,0 +1,396 @@
+/*
+ * pg_statviz - stats visualization and time series analysis
+ *
+ * Interactive chart renderer for --format json. Every element with class
+ * "pgsv-chart" holds its chart data (see libs/interactive.py) in a
+ * <script type="application/json"> child. The mouse wheel zooms the time
+ * axis around the pointer, dragging pans it and double-clicking resets it;
+ * all panels of a chart share the time axis. Clicking a legend entry hides
+ * or shows its series. Series longer than the plot is wide are reduced to
+ * their minimum and maximum per pixel column when drawn.
+ *
+ * Copyright (c) 2026 Jimmy Angelakos - PostgreSQL License
+ */
+(function () {
+  'use strict';
+
+  const PAD = {left: 84, right: 24, top: 12, bottom: 52};
+  const HEIGHT = 440;
+  const FONT = '13px "Noto Sans", -apple-system, "Segoe UI", Arial, sans-serif';
+  const MIN_SPAN = 60e3;
+  const SECOND = 1e3, MINUTE = 60e3, HOUR = 3600e3, DAY = 86400e3;
+  const TIME_STEPS = [SECOND, 5 * SECOND, 15 * SECOND, 30 * SECOND, MINUTE,
+    5 * MINUTE, 15 * MINUTE, 30 * MINUTE, HOUR, 3 * HOUR, 6 * HOUR,
+    12 * HOUR, DAY, 2 * DAY, 7 * DAY, 14 * DAY, 30 * DAY, 91 * DAY,
+    365 * DAY];
+
+  function niceStep(span, count) {
+    const raw = span / count;
+    const mag = Math.pow(10, Math.floor(Math.log10(raw)));
+    const f = raw / mag;
+    return (f < 1.5 ? 1 : f < 3 ? 2 : f < 7 ? 5 : 10) * mag;
+  }
+
+  function fmtNum(v) {
+    return Number(v.toPrecision(6)).toLocaleString('en-US',
+      {maximumFractionDigits: 3});
+  }
+
+  function fmtTime(t, step) {
+    const iso = new Date(t).toISOString();
+    if (step >= DAY) return iso.slice(0, 10);
+    if (step >= MINUTE) return iso.slice(0, 10) + ' ' + iso.slice(11, 16);
+    return iso.slice(0, 10) + ' ' + iso.slice(11, 19);
+  }
+
+  // First index i with xs[i] >= t (xs ascending)
+  function lowerBound(xs, t) {
+    let lo = 0, hi = xs.length;
+    while (lo < hi) {
+      const mid = (lo + hi) >> 1;
+      if (xs[mid] < t) lo = mid + 1; else hi = mid;
+    }
+    return lo;
+  }
+
+  function el(tag, style, text) {
+    const e = document.createElement(tag);
+    if (style) e.style.cssText = style;
+    if (text) e.textContent = text;
+    return e;
+  }
+
+  class Chart {
+    constructor(root) {
+      this.root = root;
+      this.data = JSON.parse(
+        root.querySelector('script[type="application/json"]').textContent);
+      this.panels = [];
+      let lo = Infinity, hi = -Infinity;
+      for (const ax of this.data.axes) {
+        for (const s of ax.series) {
+          s.x = s.x || ax.x;
+          s.hidden = false;
+          if (s.x.length) {
+            lo = Math.min(lo, s.x[0]);
+            hi = Math.max(hi, s.x[s.x.length - 1]);
+          }
+        }
+        for (const v of ax.vlines) {
+          lo = Math.min(lo, v.x);
+          hi = Math.max(hi, v.x);
+        }
+      }
+      if (!isFinite(lo)) { lo = 0; hi = DAY; }
+      // Pad like matplotlib's default margins
+      const pad = Math.max((hi - lo) * 0.05, MIN_SPAN);
+      this.full = [lo - pad, hi + pad];
+      this.view = this.full.slice();
+      this.build();
+      this.draw();
+    }
+
+    build() {
+      const root = this.root;
+      root.style.position = 'relative';
+      if (this.data.title) {
+        root.appendChild(el('div', 'font: 600 16px sans-serif; ' +
+          'text-align: center; margin: .5em 0', this.data.title));
+      }
+      for (const ax of this.data.axes) {
+        const panel = {ax: ax};
+        const box = el('div', 'margin: .5em 0 1em');
+        if (ax.title) {
+          box.appendChild(el('div', 'font: 600 14px sans-serif; ' +
+            'text-align: center', ax.title));
+        }
+        panel.canvas = el('canvas', 'display: block; width: 100%; ' +
+          'height: ' + HEIGHT + 'px; cursor: grab');
+        box.appendChild(panel.canvas);
+        box.appendChild(this.legend(ax));
+        root.appendChild(box);
+        this.listen(panel);
+        this.panels.push(panel);
+      }
+      root.appendChild(el('div', 'font-size: 12px; color: #888; ' +
+        'text-align: right', 'Scroll to zoom, drag to pan, ' +
+        'double-click to reset'));
+      this.tip = el('div', 'position: absolute; display: none; ' +
+        'pointer-events: none; background: rgba(255,255,255,.95); ' +
+        'border: 1px solid #ccc; border-radius: 4px; padding: .3em .6em; ' +
+        'font-size: 12px; white-space: nowrap; z-index: 1');
+      root.appendChild(this.tip);
+      window.addEventListener('resize', () => this.draw());
+    }
+
+    legend(ax) {
+      const div = el('div', 'font-size: 13px; line-height: 1.8');
+      const items = ax.series.concat(ax.vlines);
+      for (const s of items) {
+        if (!s.label) continue;
+        const item = el('span', 'display: inline-block; ' +
+          'margin-right: 1.2em; cursor: pointer; user-select: none');
+        item.appendChild(el('span', 'display: inline-block; width: 14px; ' +
+          'height: 4px; vertical-align: middle; margin-right: .4em; ' +
+          'background: ' + s.color));
+        item.appendChild(document.createTextNode(s.label));
+        item.addEventListener('click', () => {
+          s.hidden = !s.hidden;
+          item.style.opacity = s.hidden ? 0.35 : 1;
+          this.draw();
+        });
+        div.appendChild(item);
+      }
+      return div;
+    }
+
+    // Time at a canvas x position (CSS pixels)
+    timeAt(panel, px) {
+      const w = panel.canvas.clientWidth - PAD.left - PAD.right;
+      const [x0, x1] = this.view;
+      return x0 + (px - PAD.left) / w * (x1 - x0);
+    }
+
+    setView(x0, x1) {
+      const [f0, f1] = this.full;
+      let span = Math.min(Math.max(x1 - x0, MIN_SPAN), f1 - f0);
+      if (x0 < f0) x0 = f0;
+      if (x0 + span > f1) x0 = f1 - span;
+      this.view = [x0, x0 + span];
+      this.draw();
+    }
+
+    listen(panel) {
+      const c = panel.canvas;
+      c.addEventListener('wheel', (e) => {
+        e.preventDefault();
+        const t = this.timeAt(panel, e.offsetX);
+        const k = Math.exp(e.deltaY * 0.002);
+        const [x0, x1] = this.view;
+        this.setView(t - (t - x0) * k, t + (x1 - t) * k);
+      }, {passive: false});
+      c.addEventListener('mousedown', (e) => {
+        const start = e.clientX, [x0, x1] = this.view;
+        const w = c.clientWidth - PAD.left - PAD.right;
+        c.style.cursor = 'grabbing';
+        const move = (m) => {
+          const dt = (m.clientX - start) / w * (x1 - x0);
+          this.setView(x0 - dt, x1 - dt);
+        };
+        const up = () => {
+          c.style.cursor = 'grab';
+          window.removeEventListener('mousemove', move);
+          window.removeEventListener('mouseup', up);
+        };
+        window.addEventListener('mousemove', move);
+        window.addEventListener('mouseup', up);
+      });
+      c.addEventListener('dblclick', () => this.setView(...this.full));
+      c.addEventListener('mousemove', (e) => this.hover(panel, e));
+      c.addEventListener('mouseleave', () => {
+        this.tip.style.display = 'none';
+      });
+    }
+
+    hover(panel, e) {
+      const t = this.timeAt(panel, e.offsetX);
+      let best = null;
+      const rows = [];
+      for (const s of panel.ax.series) {
+        if (s.hidden || !s.x.length) continue;
+        let i = lowerBound(s.x, t);
+        if (i > 0 && (i === s.x.length || t - s.x[i - 1] < s.x[i] - t)) i--;
+        if (best === null || Math.abs(s.x[i] - t) < Math.abs(best - t)) {
+          best = s.x[i];
+        }
+        if (s.y[i] !== null) rows.push([s, s.y[i], s.x[i]]);
+      }
+      if (best === null) { this.tip.style.display = 'none'; return; }
+      this.tip.textContent = '';
+      this.tip.appendChild(el('div', 'font-weight: 600',
+        fmtTime(best, SECOND)));
+      for (const [s, y, x] of rows) {
+        if (x !== best) continue;
+        this.tip.appendChild(el('div', 'color: ' + s.color,
+          (s.label ? s.label + ': ' : '') + fmtNum(y)));
+      }
+      const r = this.root.getBoundingClientRect();
+      const cr = panel.canvas.getBoundingClientRect();
+      let left = cr.left - r.left + e.offsetX + 14;
+      if (left > r.width - 220) left -= 240;
+      this.tip.style.left = left + 'px';
+      this.tip.style.top = (cr.top - r.top + e.offsetY + 14) + 'px';
+      this.tip.style.display = 'block';
+    }
+
+    // Visible y range of a panel's shown series within the current view
+    yRange(ax) {
+      if (ax.ylim) return ax.ylim;
+      const [x0, x1] = this.view;
+      let lo = Infinity, hi = -Infinity;
+      for (const s of ax.series) {
+        if (s.hidden) continue;
+        const i0 = Math.max(lowerBound(s.x, x0) - 1, 0);
+        const i1 = Math.min(lowerBound(s.x, x1) + 1, s.x.length);
+        for (let i = i0; i < i1; i++) {
+          const y = s.y[i];
+          if (y === null) continue;
+          if (y < lo) lo = y;
+          if (y > hi) hi = y;
+        }
+      }
+      if (!isFinite(lo)) return [0, 1];
+      if (lo === hi) return [lo - (Math.abs(lo) || 1) * 0.1,
+        hi + (Math.abs(hi) || 1) * 0.1];
+      const pad = (hi - lo) * 0.05;
+      return [lo - pad, hi + pad];
+    }
+
+    draw() {
+      if (this.pending) return;
+      this.pending = true;
+      requestAnimationFrame(() => {
+        this.pending = false;
+        for (const p of this.panels) this.drawPanel(p);
+      });
+    }
+
+    drawPanel(panel) {
+      const c = panel.canvas, ax = panel.ax;
+      const dpr = window.devicePixelRatio || 1;
+      const W = c.clientWidth, H = c.clientHeight;
+      c.width = W * dpr;
+      c.height = H * dpr;
+      const ctx = c.getContext('2d');
+      ctx.setTransform(dpr, 0, 0, dpr, 0, 0);
+      ctx.clearRect(0, 0, W, H);
+      ctx.font = FONT;
+      const w = W - PAD.left - PAD.right, h = H - PAD.top - PAD.bottom;
+      const [x0, x1] = this.view;
+      const [y0, y1] = this.yRange(ax);
+      const px = (t) => PAD.left + (t - x0) / (x1 - x0) * w;
+      const py = (v) => PAD.top + h - (v - y0) / (y1 - y0) * h;
+
+      // Grid and ticks
+      ctx.strokeStyle = '#e5e5e5';
+      ctx.fillStyle = '#444';
+      ctx.lineWidth = 1;
+      const tstep = TIME_STEPS.find((s) => (x1 - x0) / s <= 8) ||
+        TIME_STEPS[TIME_STEPS.length - 1];
+      ctx.textAlign = 'center';
+      ctx.textBaseline = 'top';
+      for (let t = Math.ceil(x0 / tstep) * tstep; t <= x1; t += tstep) {
+        const x = Math.round(px(t)) + 0.5;
+        ctx.beginPath();
+        ctx.moveTo(x, PAD.top);
+        ctx.lineTo(x, PAD.top + h);
+        ctx.stroke();
+        ctx.fillText(fmtTime(t, tstep), x, PAD.top + h + 6);
+      }
+      if (ax.yvisible) {
+        const ystep = niceStep(y1 - y0, 6);
+        ctx.textAlign = 'right';
+        ctx.textBaseline = 'middle';
+        for (let v = Math.ceil(y0 / ystep) * ystep; v <= y1; v += ystep) {
+          const y = Math.round(py(v)) + 0.5;
+          ctx.beginPath();
+          ctx.moveTo(PAD.left, y);
+          ctx.lineTo(PAD.left + w, y);
+          ctx.stroke();
+          ctx.fillText(fmtNum(v), PAD.left - 8, y);
+        }
+      }
+      ctx.strokeStyle = '#999';
+      ctx.strokeRect(PAD.left + 0.5, PAD.top + 0.5, w, h);
+
+      // Axis labels
+      ctx.fillStyle = '#222';
+      ctx.font = '600 ' + FONT;
+      ctx.textAlign = 'center';
+      ctx.textBaseline = 'bottom';
+      if (ax.xlabel) ctx.fillText(ax.xlabel, PAD.left + w / 2, H - 2);
+      if (ax.ylabel && ax.yvisible) {
+        ctx.save();
+        ctx.translate(14, PAD.top + h / 2);
+        ctx.rotate(-Math.PI / 2);
+        ctx.textBaseline = 'middle';
+        ctx.fillText(ax.ylabel, 0, 0);
+        ctx.restore();
+      }
+
+      ctx.save();
+      ctx.beginPath();
+      ctx.rect(PAD.left, PAD.top, w, h);
+      ctx.clip();
+      ctx.lineWidth = 1.5;
+      ctx.setLineDash([6, 4]);
+      for (const v of ax.vlines) {
+        if (v.hidden) continue;
+        ctx.strokeStyle = v.color;
+        ctx.beginPath();
+        ctx.moveTo(px(v.x), PAD.top);
+        ctx.lineTo(px(v.x), PAD.top + h);
+        ctx.stroke();
+      }
+      ctx.setLineDash([]);
+      for (const s of ax.series) {
+        if (!s.hidden) this.drawSeries(ctx, s, px, py, w);
+      }
+      ctx.restore();
+    }
+
+    drawSeries(ctx, s, px, py, w) {
+      const [x0, x1] = this.view;
+      const i0 = Math.max(lowerBound(s.x, x0) - 1, 0);
+      const i1 = Math.min(lowerBound(s.x, x1) + 1, s.x.length);
+      ctx.strokeStyle = ctx.fillStyle = s.color;
+      ctx.beginPath();
+      let pen = false;
+      if (i1 - i0 > 2 * w) {
+        // Min-max decimation: one vertical stroke per pixel column
+        let col = null, lo = 0, hi = 0;
+        const flush = () => {
+          if (col === null) return;
+          if (pen) ctx.lineTo(col, py(lo)); else ctx.moveTo(col, py(lo));
+          ctx.lineTo(col, py(hi));
+          pen = true;
+        };
+        for (let i = i0; i < i1; i++) {
+          const y = s.y[i];
+          if (y === null) { flush(); col = null; pen = false; continue; }
+          const x = Math.round(px(s.x[i]));
+          if (x !== col) { flush(); col = x; lo = hi = y; }
+          if (y < lo) lo = y;
+          if (y > hi) hi = y;
+        }
+        flush();
+        ctx.stroke();
+        return;
+      }
+      for (let i = i0; i < i1; i++) {
+        const y = s.y[i];
+        if (y === null) { pen = false; continue; }
+        if (pen) ctx.lineTo(px(s.x[i]), py(y));
+        else ctx.moveTo(px(s.x[i]), py(y));
+        pen = true;
+      }
+      ctx.stroke();
+      // Markers, as on the static charts, while they don't crowd the line
+      if (i1 - i0 <= w / 8) {
+        for (let i = i0; i < i1; i++) {
+          if (s.y[i] === null) continue;
+          ctx.beginPath();
+          ctx.arc(px(s.x[i]), py(s.y[i]), 3, 0, 2 * Math.PI);
+          ctx.fill();
+        }
+      }
+    }
+  }
+
+  for (const root of document.querySelectorAll('.pgsv-chart')) {
+    if (!root.dataset.rendered) {
+      root.dataset.rendered = '1';
+      new Chart(root);
+    }
+  }
+})();
@@ -0,0 +1,314 @@
+"""
+pg_statviz - stats visualization and time series analysis
+
+Cross-module correlation. Every module charts its own metrics, but trouble
+rarely stays in one: connections surge, the WAL rate jumps, checkpoints get
+requested and the cache hit ratio drops together. This reads the key series
+of the db, buf, wal, conn, wait, lock and io snapshots onto one resampled
+time grid (a single wide matrix), finds the spikes and level shifts of all
+of them at once with libs.anomaly, and groups the ones close in time that
+span several modules into events, together with the lag at which their
+series move together.
+"""
+
+__author__ = "Jimmy Angelakos"
+__copyright__ = "Copyright (c) 2026 Jimmy Angelakos"
+__license__ = "PostgreSQL License"
+
+import logging
+import numpy
+import pandas as pd
+import psycopg
+from dateutil.parser import isoparse
+from pg_statviz.libs import anomaly, profiler, snapcache
+from pg_statviz.libs.info import source_filter
+
+
+# The series compared, per table: (name, column, counter) where counters
+# are charted as per-second rates
+SERIES = {
+    'db': (("commits/s", 'xact_commit', True),
+           ("rollbacks/s", 'xact_rollback', True),
+           ("blocks read/s", 'blks_read', True),
+           ("blocks hit/s", 'blks_hit', True)),
+    'buf': (("checkpoint writes/s", 'buffers_checkpoint', True),
+            ("backend writes/s", 'buffers_backend', True),
+            ("requested checkpoints/s", 'checkpoints_req', True)),
+    'wal': (("WAL bytes/s", 'wal_bytes', True),),
+    'conn': (("connections", 'conn_total', False),
+             ("active connections", 'conn_active', False),
+             ("idle in transaction", 'conn_idle_trans', False),
+             ("longest query (s)", 'max_query_age_seconds', False)),
+    'wait': (("waiting backends", 'wait_events_total', False),),
+    'lock': (("locks held", 'locks_total', False),),
+    'io': (("I/O bytes read/s", 'io_read_bytes', True),
+           ("I/O bytes written/s", 'io_write_bytes', True)),
+}
+# The grid has at most this many steps, and no finer than the snapshots
+GRID_POINTS = 500
+# Events of different series at most this many grid steps apart co-occur
+CLUSTER_STEPS = 3
+# Series pairs correlated at least this much (at their best lag, up to
+# MAX_LAG_STEPS grid steps) are reported with an event
+CORRELATION = 0.5
+MAX_LAG_STEPS = 6
+# Events reported, the ones spanning most modules first
+MAX_EVENTS = 5
+
+logging.basicConfig()
+_logger = logging.getLogger(__name__)
+_logger.setLevel(logging.INFO)
+
+
+def _io_totals(row):
+    """Total bytes read and written in an io snapshot, over every backend
+    type, object and context (PG18+ reports bytes, older releases
+    blocks)."""
+    totals = {'io_read_bytes': 0, 'io_write_bytes': 0}
+    for entry in row['io_stats'] or []:
+        for op in ('read', 'write'):
+            key = f"io_{op}_bytes"
+            if entry.get(f"{op}_bytes") is not None:
+                totals[key] += int(entry[f"{op}_bytes"])
+            elif entry.get(f"{op}s"):
+                totals[key] += int(entry[f"{op}s"]) * int(row['block_size'])
+    return totals
+
+
+def _fetch(conn, table, daterange, info=None, cache_dir=None):
+    """The rows of a table within daterange (of the source host in `info`,
+    if any), in snapshot order, or none if they can't be read (e.g. a table
+    of a newer extension release). With `cache_dir`, through the snapshot
+    cache."""
+    columns = ', '.join(c for _, c, _ in SERIES[table])
+    if table == 'io':
+        query = """SELECT io_stats, block_size, snapshot_tstamp
+                   FROM pgstatviz.io
+                   JOIN pgstatviz.db USING (snapshot_tstamp)"""
+    else:
+        query = f"""SELECT {columns}, snapshot_tstamp
+                    FROM pgstatviz.{table}"""
+    where, params = source_filter(info)
+    try:
+        rows = snapcache.fetch(conn, info, f"correlate_{table}",
+                               query + f"""
+                               WHERE snapshot_tstamp BETWEEN %s AND %s{where}
+                               ORDER BY snapshot_tstamp""",
+                               daterange, params, cache_dir)
+    except psycopg.Error as e:
+        conn.rollback()
+        _logger.warning(f"Not correlating {table} snapshots: {e}")
+        return []
+    if table == 'io':
+        rows = [{**_io_totals(r), 'snapshot_tstamp': r['snapshot_tstamp']}
+                for r in rows]
+    return rows
+
+
+def table_frame(table, rows) -> pd.DataFrame:
+    """The SERIES of a table as a DataFrame indexed by snapshot time, with
+    counters turned into per-second rates (NaN across a stats reset), and
+    the db table's cache hit ratio."""
+    if not rows:
+        return pd.DataFrame()
+    raw = pd.DataFrame(rows).set_index('snapshot_tstamp').sort_index()
+    raw.index = pd.to_datetime(raw.index, utc=True)
+    seconds = raw.index.to_series().diff().dt.total_seconds().to_numpy()
+    frame = pd.DataFrame(index=raw.index)
+    for name, column, counter in SERIES[table]:
+        values = pd.to_numeric(raw[column], errors='coerce').astype(float)
+        if counter:
+            values = values.diff() / seconds
+            values = values.where(values >= 0)
+        frame[f"{table}: {name}"] = values
+    if table == 'db':
+        hit, read = frame.pop("db: blocks hit/s"), frame["db: blocks read/s"]
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            frame["db: cache hit ratio %"] = 100 * hit / (hit + read)
+    return frame
+
+
+def grid(frames) -> pd.DataFrame:
+    """The series of frames resampled onto one time grid: at most
+    GRID_POINTS steps over the span they cover together, no finer than
+    their median snapshot interval. Short gaps are interpolated."""
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    wide = pd.concat(frames, axis=1).sort_index()
+    span = wide.index[-1] - wide.index[0]
+    interval = numpy.median([f.index.to_series().diff().median()
+                             / pd.Timedelta(seconds=1)
+                             for f in frames if len(f) > 1] or [60])
+    step = max(pd.Timedelta(seconds=max(interval, 1)),
+               span / GRID_POINTS).ceil('s')
+    wide = wide.resample(step).mean()
+    return wide.interpolate(limit=CLUSTER_STEPS, limit_area='inside')
+
+
+def lagged_correlation(x: numpy.ndarray, max_lag: int):
+    """For a (time x series) matrix, the correlation of every pair of
+    series at the lag (-max_lag to max_lag steps) where it is strongest, as
+    two (series x series) matrices: r, and lag, where a positive lag[i, j]
+    means series j follows series i.
+
+    The series are compared without their linear trends, so two that merely
+    grow over the period don't correlate, and standardized once, with gaps
+    counting as their mean: one matrix product per lag."""
+    n, width = x.shape
+    pos = numpy.arange(n, dtype=float)
+    filled = numpy.where(numpy.isnan(x), numpy.nanmean(x, axis=0), x)
+    filled = numpy.nan_to_num(filled)
+    slope, intercept = numpy.polyfit(pos, filled, 1)
+    resid = filled - (pos[:, None] * slope + intercept)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        z = resid / resid.std(axis=0)
+    z = numpy.nan_to_num(z, nan=0.0, posinf=0.0, neginf=0.0)
+    best_r = numpy.zeros((width, width))
+    best_lag = numpy.zeros((width, width), dtype=int)
+    for lag in range(-max_lag, max_lag + 1):
+        if n - abs(lag) < 2:
+            continue
+        a = z[:n - lag] if lag >= 0 else z[-lag:]
+        b = z[lag:] if lag >= 0 else z[:n + lag]
+        r = a.T @ b / len(a)
+        better = numpy.abs(r) > numpy.abs(best_r) + 1e-9
+        best_r = numpy.where(better, r, best_r)
+        best_lag = numpy.where(better, lag, best_lag)
+    return best_r, best_lag
+
+
+def _module(series: str) -> str:
+    return series.split(':')[0]
+
+
+def events(wide: pd.DataFrame) -> list:
+    """Spikes and level shifts of the series of wide that co-occur across
+    modules: anomalies at most CLUSTER_STEPS grid steps apart, in series of
+    two modules or more.
+
+    Returns [{'start', 'end', 'modules', 'anomalies', 'pairs'}] for at most
+    MAX_EVENTS events (the ones spanning most modules), in time order.
+    anomalies are the first anomaly of each series in the event, as given
+    by libs.anomaly plus its 'module', with 'before' (the median of the
+    series over the MAX_LAG_STEPS before it, for spikes) and 'after' (the
+    value, for spikes) levels; pairs are the series of different modules
+    in the event that correlate at least CORRELATION, [{'a', 'b', 'r',
+    'lag'}] where b follows a by lag (a Timedelta)."""
+    if wide.empty or len(wide) < anomaly.MIN_POINTS:
+        return []
+    step = wide.index[1] - wide.index[0]
+    found = sorted(anomaly.detect(wide), key=lambda a: a['time'])
+    clusters, current = [], []
+    for a in found:
+        if current and a['time'] - current[-1]['time'] > CLUSTER_STEPS * step:
+            clusters.append(current)
+            current = []
+        current.append(a)
+    if current:
+        clusters.append(current)
+
+    r, lag = lagged_correlation(wide.to_numpy(), MAX_LAG_STEPS)
+    position = {c: i for i, c in enumerate(wide.columns)}
+    result = []
+    for cluster in clusters:
+        onsets = {}
+        for a in cluster:
+            onsets.setdefault(a['series'], a)
+        modules = {_module(s) for s in onsets}
+        if len(modules) < 2:
+            continue
+        anomalies = []
+        for series, a in onsets.items():
+            a = {**a, 'module': _module(series),
+                 'score': max(b['score'] for b in cluster
+                              if b['series'] == series)}
+            if a['kind'] == 'spike':
+                column = wide[series]
+                prior = column[column.index < a['time']].tail(MAX_LAG_STEPS)
+                a['before'] = float(prior.median())
+                a['after'] = float(column[a['time']])
+            anomalies.append(a)
+        names = list(onsets)
+        pairs = []
+        for i, s1 in enumerate(names):
+            for s2 in names[i + 1:]:
+                p, q = position[s1], position[s2]
+                if (_module(s1) == _module(s2)
+                        or abs(r[p, q]) < CORRELATION):
+                    continue
+                first, then = (s1, s2) if lag[p, q] >= 0 else (s2, s1)
+                pairs.append({'a': first, 'b': then,
+                              'r': round(float(r[p, q]), 2),
+                              'lag': abs(int(lag[p, q])) * step})
+        result.append({'start': anomalies[0]['time'],
+                       'end': max(a['time'] for a in anomalies),
+                       'modules': sorted(modules),
+                       'anomalies': anomalies,
+                       'pairs': sorted(pairs, key=lambda p: -abs(p['r']))})
+    result.sort(key=lambda e: (len(e['modules']),
+                               sum(a['score'] for a in e['anomalies'])),
+                reverse=True)
+    return sorted(result[:MAX_EVENTS], key=lambda e: e['start'])
+
+
+@profiler.traced()
+def correlate(conn, daterange, info=None, cache_dir=None) -> list:
+    """The cross-module events (see events()) in the snapshots of daterange
+    (ISO 8601 strings, or empty for all of them) of the source host in
+    `info`, if any, read through the snapshot cache in `cache_dir`, if any.
+    Tables without snapshots are left out."""
+    if daterange:
+        daterange = sorted(isoparse(d) for d in daterange)
+    else:
+        daterange = ['-infinity', 'now()']
+    frames = [table_frame(t, _fetch(conn, t, daterange, info, cache_dir))
+              for t in SERIES]
+    wide = grid(frames)
+    found = events(wide)
+    _logger.info(f"Correlated {wide.shape[1]} series of "
+                 f"{sum(not f.empty for f in frames)} modules on "
+                 f"{len(wide)} time steps: {len(found)} cross-module events")
+    return found
+
+
+def _fmt(v) -> str:
+    return f"{v:.4g}"
+
+
+def _when(t) -> str:
+    return f"{t:%Y-%m-%d %H:%M}"
+
+
+def _duration(td) -> str:
+    minutes = round(td.total_seconds() / 60)
+    if minutes < 120:
+        return f"{minutes} min"
+    return f"{minutes / 60:.3g} h"
+
+
+def describe(found: list) -> str:
+    """Markdown bullet list of events, one line each, for the index report
+    and the overview prompt."""
+    lines = []
+    for e in found:
+        when = _when(e['start'])
+        if e['end'] > e['start']:
+            when += f" to {e['end']:%H:%M}"
+        parts = []
+        for a in e['anomalies']:
+            what = ("level shift" if a['kind'] == 'shift'
+                    else "jump" if a['after'] > a['before'] else "drop")
+            parts.append(f"{a['series']} {_fmt(a['before'])} → "
+                         f"{_fmt(a['after'])} at {a['time']:%H:%M} ({what})")
+        for p in e['pairs'][:3]:
+            lag = p['lag']
+            if lag:
+                parts.append(f"{p['b']} follows {p['a']} by "
+                             f"{_duration(lag)} (r={p['r']})")
+            else:
+                parts.append(f"{p['a']} and {p['b']} move together "
+                             f"(r={p['r']})")
+        lines.append(f"- **{when}** ({', '.join(e['modules'])}): "
+                     + "; ".join(parts))
+    return "\n".join(lines)
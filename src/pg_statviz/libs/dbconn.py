@@ -10,6 +10,7 @@ import getpass
 import logging
 import psycopg
 from psycopg.rows import dict_row
+from pg_statviz.libs import profiler
 
 
 logging.basicConfig()
@@ -17,13 +18,15 @@ _logger = logging.getLogger(__name__)
 _logger.setLevel(logging.INFO)
 
 
+@profiler.traced('db')
 def dbconn(dbname, user, password, host, port):
 
     conn_details = {'dbname': dbname, 'user': user,
                     'password': password, 'host': host, 'port': port}
     while True:
         try:
-            conn = psycopg.connect(**conn_details, row_factory=dict_row)
+            conn = psycopg.connect(**conn_details, row_factory=dict_row,
+                                   cursor_factory=profiler.Cursor)
             return conn
         except psycopg.errors.OperationalError as e:
             if "auth" in str(e):
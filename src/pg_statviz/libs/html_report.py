@@ -2,20 +2,29 @@
 pg_statviz - HTML report generation for AI analysis.
 
 Produces one consolidated HTML per analysis module, embedding references to
-the sibling chart PNGs and rendering the LLM's markdown output.
+the sibling chart PNGs and rendering the LLM's markdown output, plus a JSON
+findings sidecar per module that the cross-module index is built from.
 """
 
 __author__ = "Jimmy Angelakos"
 __copyright__ = "Copyright (c) 2026 Jimmy Angelakos"
 __license__ = "PostgreSQL License"
 
+import base64
 import html
+import json
 import logging
 import re
+from io import BytesIO
 from pathlib import Path
+from pg_statviz.libs import interactive, profiler
+from pg_statviz.libs.plot import optimize_png
 
 _logger = logging.getLogger(__name__)
 
+SINGLE_FILE_HELP = ("embed the charts in the HTML reports, so each report "
+                    "is a single self-contained file (needs --ai)")
+
 
 # ---------------------------------------------------------------------------
 # Tiny markdown -> HTML renderer
@@ -131,8 +140,9 @@ _CSS = """
   section { margin: 2em 0; }
   section h2 { color: #336791; font-size: 1.25em;
                border-bottom: 1px solid #e0e0e0; padding-bottom: .2em; }
-  img { max-width: 100%; height: auto; display: block;
-        margin: 1em 0; }
+  section { content-visibility: auto; contain-intrinsic-size: auto 720px; }
+  img, .chart svg { max-width: 100%; height: auto; display: block;
+                    margin: 1em 0; }
   .analysis { margin-top: 1em; }
   .analysis p { margin: .6em 0; }
   .analysis ul, .analysis ol { margin: .6em 0 .6em 1.5em; }
@@ -156,24 +166,80 @@ _CSS = """
 """
 
 
-def _render_section(section: dict) -> str:
+_MIME_TYPES = {'.png': 'image/png', '.webp': 'image/webp'}
+
+
+def _embed_chart(path: Path, alt: str) -> str | None:
+    """Inline the chart at path: SVG as markup, JSON chart data as an
+    interactive chart, PNG (palette-quantized) and WebP as a base64 data:
+    URI. Returns None if it can't be read."""
+    try:
+        data = path.read_bytes()
+        if path.suffix == '.json':
+            return interactive.chart_html(data.decode('utf-8'), alt)
+        if path.suffix == '.svg':
+            svg = data.decode('utf-8')
+            # Drop the XML declaration and DOCTYPE, keep the <svg> element
+            svg = svg[svg.index('<svg'):]
+            return (f'<div class="chart" role="img" aria-label="{alt}">'
+                    f'{svg}</div>')
+        if path.suffix == '.png':
+            buf = BytesIO()
+            optimize_png(BytesIO(data), buf)
+            data = buf.getvalue()
+        mime = _MIME_TYPES.get(path.suffix)
+        if mime is None:
+            return None
+    except (OSError, ValueError) as e:
+        _logger.warning(f"Could not embed {path}: {e}")
+        return None
+    b64 = base64.b64encode(data).decode('ascii')
+    return (f'<img src="data:{mime};base64,{b64}" alt="{alt}" '
+            'loading="lazy" decoding="async">')
+
+
+def _render_section(section: dict, imagedir, level: int = 2,
+                    embed: bool = False) -> str:
+    """Render one chart section, its chart read from imagedir. Images are
+    referenced by file name unless `embed`; JSON charts are always
+    embedded, as browsers won't load them from local files."""
     title = html.escape(section.get('title', ''))
-    image_basename = html.escape(section.get('image_basename', ''))
+    image_basename = section.get('image_basename', '')
     analysis_md = section.get('analysis_md')
 
+    path = Path(imagedir) / image_basename
+    chart = None
+    if embed or path.suffix == '.json':
+        chart = _embed_chart(path, title)
+    if chart is None and path.suffix == '.json':
+        page = html.escape(path.stem + interactive.PAGE_SUFFIX)
+        chart = f'<p><a href="{page}">{title}</a></p>'
+    elif chart is None:
+        chart = (f'<img src="{html.escape(image_basename)}" alt="{title}" '
+                 'loading="lazy" decoding="async">')
     parts = ['<section>',
-             f'  <h2>{title}</h2>',
-             f'  <img src="{image_basename}" alt="{title}">']
+             f'  <h{level}>{title}</h{level}>',
+             f'  {chart}']
     if analysis_md:
         parts.append(
             f'  <div class="analysis">{md_to_html(analysis_md)}</div>')
-    else:
+    if section.get('streaming'):
+        parts.append('  <p class="missing">AI analysis in progress…</p>')
+    elif not analysis_md:
         parts.append('  <p class="missing">AI analysis unavailable '
                      'for this chart.</p>')
     parts.append('</section>')
     return '\n'.join(parts)
 
 
+def _with_renderer(body: str) -> str:
+    """Append the interactive chart renderer to a page body that embeds
+    JSON charts."""
+    if 'class="pgsv-chart"' not in body:
+        return body
+    return f'{body}\n<script>{interactive.renderer_js()}</script>'
+
+
 def _output_prefix(outputdir, info, port) -> str:
     """The shared `<dir>/pg_statviz_<host>_<port>_` path prefix used by
     every chart PNG and every HTML report."""
@@ -182,9 +248,21 @@ def _output_prefix(outputdir, info, port) -> str:
     return f"{head}pg_statviz_{host}_{port}_"
 
 
+def check_single_file(single_file: bool, ai) -> None:
+    """Reject --single-file without --ai up front: the HTML reports it
+    applies to are only written with AI analysis, so it would otherwise
+    leave just the loose charts without saying why."""
+    if single_file and not ai:
+        raise SystemExit("--single-file needs --ai: the HTML reports are "
+                         "only written with AI analysis")
+
+
+@profiler.traced('report')
 def finalize_module_report(outputdir, info, port, module_name: str,
-                           sections: list) -> None:
-    """Write the consolidated per-module HTML next to the chart PNGs.
+                           sections: list, single_file: bool = False) -> None:
+    """Write the consolidated per-module HTML next to the chart PNGs, plus
+    its machine-readable findings sidecar (see write_findings). With
+    single_file, the charts are embedded in the HTML.
 
     No-op when sections is empty (which happens when --ai was off or the
     module short-circuited before generating any chart). Called once at the
@@ -193,17 +271,36 @@ def finalize_module_report(outputdir, info, port, module_name: str,
     """
     if not sections:
         return
-    html_out = f"{_output_prefix(outputdir, info, port)}{module_name}.html"
-    write_module_report(
-        html_out,
-        title=f"pg_statviz · {module_name}",
-        subtitle=f"{info['hostname']}:{port}",
-        sections=sections,
-    )
+    prefix = _output_prefix(outputdir, info, port)
+    html_out = f"{prefix}{module_name}.html"
+
+    def write():
+        write_module_report(
+            html_out,
+            title=f"pg_statviz · {module_name}",
+            subtitle=f"{info['hostname']}:{port}",
+            sections=sections,
+            single_file=single_file,
+        )
+        write_findings(
+            f"{prefix}{module_name}{FINDINGS_SUFFIX}",
+            module_name=module_name,
+            module_html=Path(html_out).name,
+            host=f"{info['hostname']}:{port}",
+            sections=sections,
+        )
+
+    # Charts queued for batched analysis (--ai-batch) are analysed first.
+    # When they wait for a batch filled by later modules, the reports are
+    # written now without their analysis and rewritten once it arrives.
+    from pg_statviz.libs.ai import when_analyzed
+    if when_analyzed(sections, write):
+        write()
 
 
 def write_module_report(output_path, title: str, subtitle: str,
-                        sections: list) -> None:
+                        sections: list, single_file: bool = False,
+                        in_progress: bool = False) -> None:
     """Write a consolidated HTML report for one analysis module.
 
     Args:
@@ -212,24 +309,33 @@ def write_module_report(output_path, title: str, subtitle: str,
         subtitle: Sub-line under the title, typically "host:port".
         sections: List of dicts with keys:
             - 'title' (str): section heading
-            - 'image_basename' (str): PNG filename in the same directory
+            - 'image_basename' (str): chart image filename in the same dir
             - 'analysis_md' (str | None): raw LLM markdown, or None if the
               AI analysis for this chart failed/was skipped
+        single_file: Embed the chart images (read from the report's dir)
+            instead of linking them, so the report is self-contained.
+        in_progress: Whether this is a snapshot of a report whose analysis
+            is still streaming in: the page then reloads itself every few
+            seconds, and the write isn't logged.
 
     Never raises. File-write errors are logged at ERROR level.
     """
     if not sections:
         return
 
-    body_sections = '\n'.join(_render_section(s) for s in sections)
+    imagedir = Path(output_path).parent
+    body_sections = _with_renderer('\n'.join(
+        _render_section(s, imagedir, embed=single_file) for s in sections))
     esc_title = html.escape(title)
     esc_subtitle = html.escape(subtitle)
+    refresh = ('\n<meta http-equiv="refresh" content="3">' if in_progress
+               else '')
 
     doc = f"""<!DOCTYPE html>
 <html lang="en">
 <head>
 <meta charset="utf-8">
-<title>{esc_title}</title>
+<title>{esc_title}</title>{refresh}
 <style>{_CSS}</style>
 </head>
 <body>
@@ -245,54 +351,164 @@ def write_module_report(output_path, title: str, subtitle: str,
 
     try:
         Path(output_path).write_text(doc, encoding='utf-8')
-        _logger.info(f"HTML report saved to {output_path}")
+        if not in_progress:
+            _logger.info(f"HTML report saved to {output_path}")
     except OSError as e:
         _logger.error(f"Could not write {output_path}: {e}")
 
 
+# Report names never contain underscores (variants of a module's report
+# like wait-sampled use hyphens), so the one after the port in a chart's
+# name, up to its own suffix, is the report's
+_CHART_NAME_RE = re.compile(r"(\d+)_([^_.]+)[_.]")
+
+
+@profiler.traced('report')
+def write_partial_report(chart_path, info, sections: list) -> None:
+    """Rewrite the report of the module chart_path belongs to from its
+    sections so far, while the analysis of one of them is streaming in.
+    finalize_module_report writes the final report. No-op for charts not
+    named after _output_prefix()."""
+    path = Path(chart_path)
+    host = f"pg_statviz_{info['hostname'].replace('/', '-')}_"
+    m = _CHART_NAME_RE.match(path.name[len(host):])
+    if not path.name.startswith(host) or not m:
+        return
+    port, module_name = m.groups()
+    write_module_report(
+        path.with_name(f"{host}{port}_{module_name}.html"),
+        title=f"pg_statviz · {module_name}",
+        subtitle=f"{info['hostname']}:{port}",
+        sections=sections,
+        in_progress=True,
+    )
+
+
 # ---------------------------------------------------------------------------
 # Cross-module index report
 # ---------------------------------------------------------------------------
 
-# Match per-section: <h2>title</h2> ... [VERDICT] ... summary up to </p>.
-# Captures the title, verdict tag, and the analysis paragraph as raw HTML
-# (which is then tag-stripped to a plain-text summary).
+# Findings sidecars (pg_statviz_<host>_<port>_<module>.findings.json) are
+# written next to every per-module HTML so the index -- or a rollup across
+# many hosts sharing one output dir -- can merge verdicts without parsing
+# HTML back.
+FINDINGS_SUFFIX = '.findings.json'
+
+# The verdict tag and the rest of its paragraph, in the LLM's markdown.
 _VERDICT_RE = re.compile(
-    r'<h2>([^<]+)</h2>.*?'
-    r'\[(HEALTHY|WARNING|CRITICAL)\]\s*(.+?)</p>',
-    re.DOTALL,
+    r'\[\s*(HEALTHY|WARNING|CRITICAL)\s*\]\**\s*(.*?)(?:\n\s*\n|\Z)',
+    re.DOTALL | re.IGNORECASE,
 )
-_HTML_TAG_RE = re.compile(r'<[^>]+>')
+_MD_MARKUP_RE = re.compile(r'[*`#]')
 
 
-def _scan_module_reports(outputdir, info, port, exclude_basenames=()):
-    """Walk per-module HTMLs in the output dir and extract one finding
-    per chart section: (title, verdict, summary). Returns [] when no
-    reports exist (e.g. --ai was disabled).
+def _verdict(md: str | None) -> tuple[str | None, str]:
+    """Extract (verdict, plain-text summary) from a section's markdown.
+    The summary is the remainder of the paragraph holding the verdict tag.
+    Returns (None, '') when the analysis is missing or has no tag."""
+    m = _VERDICT_RE.search(md or '')
+    if not m:
+        return None, ''
+    summary = ' '.join(_MD_MARKUP_RE.sub('', m.group(2)).split())
+    return m.group(1).upper(), summary
+
+
+def write_findings(output_path, module_name: str, module_html: str,
+                   host: str, sections: list) -> None:
+    """Write the compact JSON findings sidecar for one module report.
+
+    Args:
+        output_path: Destination path, normally ending in FINDINGS_SUFFIX.
+        module_name: Module name (e.g. "buf").
+        module_html: Basename of the module's HTML report.
+        host: "host:port" the report was generated for.
+        sections: The module's report sections (see write_module_report);
+            the analysis markdown and their optional 'findings'
+            (deterministic rule findings) and 'stats' ({column: {min, mean,
+            max, last}}) keys are carried over.
+
+    Never raises. File-write errors are logged at ERROR level.
     """
-    prefix = _output_prefix(outputdir, info, port)
-    excluded_full = {f"{Path(prefix).name}{n}" for n in exclude_basenames}
-    sections = []
-    for path in sorted(Path(prefix).parent.glob(
-            f"{Path(prefix).name}*.html")):
-        if path.name in excluded_full:
-            continue
+    doc = {'module': module_name, 'module_html': module_html, 'host': host,
+           'sections': []}
+    for s in sections:
+        verdict, summary = _verdict(s.get('analysis_md'))
+        doc['sections'].append({
+            'title': s.get('title', ''),
+            'image_basename': s.get('image_basename', ''),
+            'verdict': verdict,
+            'summary': summary,
+            'findings': s.get('findings') or [],
+            'stats': s.get('stats') or {},
+            'analysis_md': s.get('analysis_md'),
+        })
+    try:
+        Path(output_path).write_text(
+            json.dumps(doc, separators=(',', ':'), default=str),
+            encoding='utf-8')
+        _logger.info(f"Findings saved to {output_path}")
+    except (OSError, TypeError, ValueError) as e:
+        _logger.error(f"Could not write {output_path}: {e}")
+
+
+def _read_sidecars(paths) -> list:
+    """Load findings sidecars, logging and skipping unreadable or malformed
+    files."""
+    docs = []
+    for path in paths:
         try:
-            content = path.read_text(encoding='utf-8')
-        except OSError:
+            doc = json.loads(Path(path).read_text(encoding='utf-8'))
+            if not isinstance(doc['sections'], list):
+                raise ValueError("'sections' is not a list")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            _logger.warning(f"Skipping findings file {path}: {e}")
             continue
-        for m in _VERDICT_RE.finditer(content):
-            title = html.unescape(m.group(1)).strip()
-            verdict = m.group(2).upper()
-            raw = _HTML_TAG_RE.sub('', m.group(3))
-            summary = ' '.join(html.unescape(raw).split())
-            sections.append({
-                'module_html': path.name,
-                'title': title,
-                'verdict': verdict,
-                'summary': summary,
+        docs.append(doc)
+    return docs
+
+
+def _sidecar_paths(outputdir, info, port) -> list:
+    """Findings sidecars written for this host and port, in module order."""
+    prefix = _output_prefix(outputdir, info, port)
+    return sorted(Path(prefix).parent.glob(
+        f"{Path(prefix).name}*{FINDINGS_SUFFIX}"))
+
+
+def read_findings(paths) -> list:
+    """Merge findings sidecars into one flat list with one entry per chart
+    section that produced a verdict: {'module', 'module_html', 'host',
+    'title', 'verdict', 'summary', 'findings', 'stats'}. Unreadable or
+    malformed files are logged and skipped; sections without a verdict
+    (failed or skipped analysis) are left out.
+    """
+    return _flatten_findings(_read_sidecars(paths))
+
+
+def _flatten_findings(docs) -> list:
+    merged = []
+    for doc in docs:
+        for s in doc['sections']:
+            if not s.get('verdict'):
+                continue
+            merged.append({
+                'module': doc.get('module', ''),
+                'module_html': doc.get('module_html', ''),
+                'host': doc.get('host', ''),
+                'title': s.get('title', ''),
+                'verdict': s['verdict'],
+                'summary': s.get('summary', ''),
+                'findings': s.get('findings', []),
+                'stats': s.get('stats', {}),
             })
-    return sections
+    return merged
+
+
+def _scan_module_reports(outputdir, info, port):
+    """Merge the findings sidecars of every per-module report written for
+    this host and port. Returns [] when there are none (e.g. --ai was
+    disabled).
+    """
+    return read_findings(_sidecar_paths(outputdir, info, port))
 
 
 def _verdict_badge(verdict: str) -> str:
@@ -301,22 +517,38 @@ def _verdict_badge(verdict: str) -> str:
     return f'<span class="status {cls}">[{verdict}]</span>'
 
 
+def _module_anchor(module: str) -> str:
+    return f"module-{module}"
+
+
 def write_index_report(output_path, title: str, subtitle: str,
-                       findings: list, overview_md: str | None) -> None:
+                       findings: list, overview_md: str | None,
+                       modules: list | None = None,
+                       correlations: str | None = None) -> None:
     """Write an index.html cross-module summary.
 
     Args:
         output_path: index.html absolute path.
         title: page title (e.g. "pg_statviz overview").
         subtitle: e.g. "host:port".
-        findings: list of {'module_html', 'title', 'verdict', 'summary'}.
+        findings: list of {'module', 'module_html', 'title', 'verdict',
+            'summary'}.
         overview_md: optional LLM-generated synthesis paragraph (markdown).
+        modules: optional list of findings sidecar documents. When given,
+            every module's sections are embedded below the summary, charts
+            included (read from the index's dir), and the findings link to
+            them, so the index is a single self-contained report.
+        correlations: optional markdown list of the events seen across
+            modules, shown after the findings.
 
     Never raises.
     """
     items = []
     for f in findings:
-        href = html.escape(f['module_html'])
+        if modules:
+            href = '#' + html.escape(_module_anchor(f.get('module', '')))
+        else:
+            href = html.escape(f['module_html'])
         ftitle = html.escape(f['title'])
         badge = _verdict_badge(f['verdict'])
         items.append(
@@ -326,6 +558,19 @@ def write_index_report(output_path, title: str, subtitle: str,
                      '<p class="missing">No module reports found.</p>')
     overview_html = (f'<div class="summary">{md_to_html(overview_md)}</div>'
                      if overview_md else '')
+    correlations_html = ''
+    if correlations:
+        correlations_html = ('\n<section>\n  <h2>Correlated events</h2>\n  '
+                             + md_to_html(correlations) + '\n</section>')
+    modules_html = ''
+    for m in modules or []:
+        anchor = html.escape(_module_anchor(m.get('module', '')))
+        name = html.escape(m.get('module', ''))
+        modules_html += f'\n<h2 id="{anchor}">{name}</h2>\n' + '\n'.join(
+            _render_section(s, Path(output_path).parent, level=3,
+                            embed=True)
+            for s in m['sections'])
+    modules_html = _with_renderer(modules_html)
     esc_title = html.escape(title)
     esc_subtitle = html.escape(subtitle)
     doc = f"""<!DOCTYPE html>
@@ -344,7 +589,7 @@ def write_index_report(output_path, title: str, subtitle: str,
 <section>
   <h2>Per-module findings</h2>
   {list_html}
-</section>
+</section>{correlations_html}{modules_html}
 <footer>Generated by pg_statviz</footer>
 </body>
 </html>
@@ -356,22 +601,29 @@ def write_index_report(output_path, title: str, subtitle: str,
         _logger.error(f"Could not write {output_path}: {e}")
 
 
-def finalize_index_report(outputdir, info, port, ai) -> None:
-    """Scan per-module HTMLs, optionally call the LLM for an overview,
-    and write index.html. Called once at the end of `analyze`.
+@profiler.traced('report')
+def finalize_index_report(outputdir, info, port, ai,
+                          single_file: bool = False,
+                          correlations: str | None = None) -> None:
+    """Merge per-module findings sidecars, optionally call the LLM for an
+    overview, and write index.html. Called once at the end of `analyze`.
+    With single_file, the index also embeds every module report, charts
+    included. correlations (markdown, from libs.correlate) lists the events
+    seen across modules, for both the overview and the index.
 
     No-op when ai is None (no per-module reports were generated).
     """
     if not ai:
         return
-    findings = _scan_module_reports(outputdir, info, port,
-                                    exclude_basenames=('index.html',))
+    modules = _read_sidecars(_sidecar_paths(outputdir, info, port))
+    findings = _flatten_findings(modules)
     if not findings:
         return
     # Lazy import to avoid circular dep with libs.ai (which imports nothing
     # from html_report, but keep the import here for clarity).
     from pg_statviz.libs.ai import analyze_overview
-    overview_md = analyze_overview(findings, info=info, mode=ai)
+    overview_md = analyze_overview(findings, info=info, mode=ai,
+                                   correlations=correlations)
     out_path = f"{_output_prefix(outputdir, info, port)}index.html"
     write_index_report(
         out_path,
@@ -379,4 +631,6 @@ def finalize_index_report(outputdir, info, port, ai) -> None:
         subtitle=f"{info['hostname']}:{port}",
         findings=findings,
         overview_md=overview_md,
+        modules=modules if single_file else None,
+        correlations=correlations,
     )
@@ -7,7 +7,9 @@ __copyright__ = "Copyright (c) 2026 Jimmy Angelakos"
 __license__ = "PostgreSQL License"
 
 import logging
+from packaging.version import Version
 from psycopg.errors import ExternalRoutineException, InsufficientPrivilege
+from pg_statviz.libs import profiler
 
 
 logging.basicConfig()
@@ -15,17 +17,25 @@ _logger = logging.getLogger(__name__)
 _logger.setLevel(logging.INFO)
 
 
-def getinfo(conn):
+SOURCE_HOST_HELP = ("only analyze the snapshots collected from this host "
+                    "into a repository database by the collect or ingest "
+                    "commands")
+
+
+@profiler.traced('db')
+def getinfo(conn, source=None):
 
     info = {}
     try:
         cur = conn.cursor()
-        cur.execute("""SELECT 1
+        cur.execute("""SELECT extversion
                        FROM pg_extension
                        WHERE extname='pg_statviz'""")
-        if not cur.fetchone():
+        row = cur.fetchone()
+        if not row:
             raise SystemExit("pg_statviz extension is not installed in this "
                              + "database")
+        info['ext_version'] = row['extversion']
         cur.execute("""CREATE TEMP TABLE _info(hostname text)""")
         cur.execute("""COPY _info
                        FROM PROGRAM 'hostname'""")
@@ -53,25 +63,104 @@ def getinfo(conn):
     info['pg_role'] = 'standby' if row['in_recovery'] else 'primary'
     info['pg_started'] = row['started']
     cur.close()
+    if source:
+        set_source(conn, info, source)
     return info
 
 
-def get_settings(conn, names):
+def set_source(conn, info, source):
+    """Point `info` at the snapshots collected from host `source` into this
+    repository database: charts and reports are named after it, and
+    source_filter() restricts queries to its snapshots. The server details
+    getinfo() found describe the repository, so they are dropped."""
+    if not ext_version_at_least(info, '1.3'):
+        raise SystemExit("Snapshots by source host are only available from "
+                         + "pg_statviz extension 1.3 onwards")
+    cur = conn.cursor()
+    cur.execute("""SELECT count(*) AS count
+                   FROM pgstatviz.snapshots
+                   WHERE source = %s""", (source,))
+    if not cur.fetchone()['count']:
+        raise SystemExit(f"No pg_statviz snapshots collected from {source} "
+                         + "in this database")
+    cur.close()
+    for k in ('pg_version', 'pg_role', 'pg_started'):
+        info.pop(k, None)
+    info['hostname'] = info['source'] = source
+
+
+def source_filter(info, column='snapshot_tstamp'):
+    """SQL condition (starting with AND) and its parameters limiting
+    `column` to the snapshots of the source host set by set_source(), to
+    append to a query's WHERE clause. Without a source, to the snapshots
+    taken by this server itself, so a repository's own charts don't mix in
+    the servers collected into it; empty before 1.3, which has no sources,
+    so queries still run against older extensions."""
+    if info and info.get('source'):
+        condition, params = "source = %s", (info['source'],)
+    elif ext_version_at_least(info, '1.3'):
+        condition, params = "source IS NULL", ()
+    else:
+        return "", ()
+    return (f"""
+                   AND {column} IN (SELECT snapshot_tstamp
+                                    FROM pgstatviz.snapshots
+                                    WHERE {condition})""", params)
+
+
+def ext_version_at_least(info, version):
+    """True when the installed pg_statviz extension recorded by getinfo() is
+    at least `version`. Lets modules use server-side helpers added in newer
+    extension releases while still working against older installs."""
+    if not info or not info.get('ext_version'):
+        return False
+    return Version(info['ext_version']) >= Version(version)
+
+
+@profiler.traced('db')
+def get_settings(conn, names, info=None):
     """Return {name: value} for requested GUCs from the most recent
     pgstatviz.conf snapshot. Names absent from the snapshot are omitted.
     Returns {} if no snapshot exists or none of the names are present.
 
     Used by leaf modules to give the LLM the relevant configuration context
     for the chart it's analysing (e.g. shared_buffers for cache hit ratio,
-    checkpoint_timeout for checkpoint analysis).
+    checkpoint_timeout for checkpoint analysis). With `info`, only the
+    snapshots of its source host are considered.
     """
+    where, params = source_filter(info)
     cur = conn.cursor()
-    cur.execute("""SELECT conf
-                   FROM pgstatviz.conf
-                   ORDER BY snapshot_tstamp DESC
-                   LIMIT 1""")
+    cur.execute(f"""SELECT conf
+                    FROM pgstatviz.conf
+                    WHERE TRUE{where}
+                    ORDER BY snapshot_tstamp DESC
+                    LIMIT 1""", params)
     row = cur.fetchone()
     cur.close()
     if not row or not row['conf']:
         return {}
     return {n: row['conf'][n] for n in names if n in row['conf']}
+
+
+@profiler.traced('db')
+def get_skipped(conn, info, component, daterange):
+    """Return the timestamps of snapshots in `daterange` where
+    pgstatviz.snapshot() skipped `component` (over its time budget, or it
+    failed). Those snapshots have no row in the component's table, so
+    modules pass them to plot.downsample() as gaps instead of drawing a line
+    across them. Returns [] for extensions older than 1.3, which record
+    every component or none."""
+    if not ext_version_at_least(info, '1.3'):
+        return []
+    where, params = source_filter(info)
+    cur = conn.cursor()
+    cur.execute(f"""SELECT snapshot_tstamp
+                    FROM pgstatviz.snapshot_stats
+                    WHERE component = %s
+                    AND skipped IS NOT NULL
+                    AND snapshot_tstamp BETWEEN %s AND %s{where}
+                    ORDER BY snapshot_tstamp""",
+                (component, daterange[0], daterange[1], *params))
+    skipped = [row['snapshot_tstamp'] for row in cur.fetchall()]
+    cur.close()
+    return skipped
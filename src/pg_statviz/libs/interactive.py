@@ -0,0 +1,148 @@
+"""
+pg_statviz - stats visualization and time series analysis
+
+Interactive chart output (--format json): instead of rasterizing a figure,
+the series drawn on it are written as compact columnar JSON, together with
+a standalone HTML page that renders them in the browser with zooming and
+panning (see chart.js).
+"""
+
+__author__ = "Jimmy Angelakos"
+__copyright__ = "Copyright (c) 2026 Jimmy Angelakos"
+__license__ = "PostgreSQL License"
+
+import functools
+import html
+import importlib.resources
+import json
+import math
+import os
+import numpy
+from matplotlib import dates as mdates
+from matplotlib.colors import to_hex
+
+
+PAGE_SUFFIX = '.chart.html'
+
+_MS_PER_DAY = 86_400_000
+
+
+def _epoch_offset():
+    """Days between the Unix epoch and matplotlib's date epoch."""
+    offset = numpy.datetime64(mdates.get_epoch(), 'ms') \
+        - numpy.datetime64('1970-01-01T00:00', 'ms')
+    return offset.astype(float) / _MS_PER_DAY
+
+
+def _times(xdata):
+    """matplotlib date numbers -> integer milliseconds since the epoch."""
+    days = numpy.asarray(xdata, dtype=float) + _epoch_offset()
+    return [round(d * _MS_PER_DAY) for d in days.tolist()]
+
+
+def _values(ydata):
+    """Floats rounded to 6 significant digits, NaN/inf -> None (gaps)."""
+    return [float(f"{v:.6g}") if math.isfinite(v) else None
+            for v in numpy.asarray(ydata, dtype=float).tolist()]
+
+
+def _label(artist):
+    # Unlabelled artists get matplotlib's "_child0"-style names
+    label = artist.get_label()
+    return None if not label or label.startswith('_') else label
+
+
+def _axes_data(ax):
+    """Titles, labels, fixed y limits and the data of every line of ax.
+    Vertical reference lines (axvline) are kept apart from the series."""
+    series, vlines = [], []
+    for line in ax.get_lines():
+        if line.get_transform() == ax.get_xaxis_transform():
+            vlines.append({'x': _times(line.get_xdata(orig=False)[:1])[0],
+                           'label': _label(line),
+                           'color': to_hex(line.get_color())})
+            continue
+        series.append({'label': _label(line),
+                       'color': to_hex(line.get_color()),
+                       'x': _times(line.get_xdata(orig=False)),
+                       'y': _values(line.get_ydata(orig=False))})
+    data = {'title': ax.get_title(), 'xlabel': ax.get_xlabel(),
+            'ylabel': ax.get_ylabel(),
+            'yvisible': ax.get_yaxis().get_visible(),
+            'ylim': None if ax.get_autoscaley_on()
+            else [float(v) for v in ax.get_ylim()]}
+    # Columnar: series sharing one time column (the usual case, as every
+    # series of a chart comes from the same resampled frame) store it once
+    if series and all(s['x'] == series[0]['x'] for s in series):
+        data['x'] = series[0]['x']
+        for s in series:
+            del s['x']
+    data['series'] = series
+    data['vlines'] = vlines
+    return data
+
+
+def _suptitle(fig):
+    # Figure.get_suptitle() is only in matplotlib >= 3.8
+    if hasattr(fig, 'get_suptitle'):
+        return fig.get_suptitle()
+    return fig._suptitle.get_text() if fig._suptitle else ''
+
+
+def figure_data(fig):
+    """Describe a pg_statviz figure as a JSON-serializable dict:
+    {'version', 'title', 'axes': [{'title', 'xlabel', 'ylabel', 'yvisible',
+    'ylim', 'x', 'series': [{'label', 'color', 'y'}], 'vlines'}]}.
+
+    Times are milliseconds since the Unix epoch (UTC). 'x' is stored per
+    axes when all its series share it, otherwise per series. Axes without
+    any lines (e.g. the placeholder axes of an unused figure) are skipped.
+    """
+    return {'version': 1,
+            'title': _suptitle(fig),
+            'axes': [_axes_data(ax) for ax in fig.axes if ax.get_lines()]}
+
+
+@functools.cache
+def renderer_js():
+    """The chart.js renderer source, loaded once from the package."""
+    return importlib.resources.files("pg_statviz.libs") \
+        .joinpath("chart.js").read_text(encoding='utf-8')
+
+
+def chart_html(data_json, alt):
+    """An inline chart element holding data_json (the text of a chart JSON
+    file), drawn by the renderer_js() script, which the page must include
+    once after its last chart."""
+    # A "</" inside the data would end the <script> element early
+    data_json = data_json.replace('</', '<\\/')
+    return (f'<div class="pgsv-chart" role="img" aria-label="{alt}">'
+            f'<script type="application/json">{data_json}</script></div>')
+
+
+def write_chart(fig, outfile):
+    """Write the figure's data to outfile as compact JSON, plus a standalone
+    interactive page next to it (outfile with PAGE_SUFFIX instead of
+    .json). Nothing is rasterized."""
+    data = json.dumps(figure_data(fig), separators=(',', ':'))
+    with open(outfile, 'w', encoding='utf-8') as f:
+        f.write(data)
+    title = html.escape(_suptitle(fig) or 'pg_statviz')
+    page = f"{os.path.splitext(outfile)[0]}{PAGE_SUFFIX}"
+    with open(page, 'w', encoding='utf-8') as f:
+        f.write(f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+  body {{ font-family: "Noto Sans", -apple-system, BlinkMacSystemFont,
+         "Segoe UI", Arial, sans-serif; margin: 1em 2em; color: #222; }}
+</style>
+</head>
+<body>
+{chart_html(data, title)}
+<script>{renderer_js()}</script>
+</body>
+</html>
+""")
@@ -0,0 +1,126 @@
+"""
+pg_statviz - stats visualization and time series analysis
+
+Output manifest for incremental report regeneration. Every module records
+the fingerprint of the inputs its charts and reports were generated from
+(row count and latest snapshot of each table it reads, the date range and
+its options) in pg_statviz_manifest.json in the output directory. With
+--incremental, a module whose fingerprint hasn't changed and whose outputs
+are all still there is skipped entirely.
+"""
+
+__author__ = "Jimmy Angelakos"
+__copyright__ = "Copyright (c) 2026 Jimmy Angelakos"
+__license__ = "PostgreSQL License"
+
+import json
+import logging
+import os
+from importlib.metadata import PackageNotFoundError
+from importlib.metadata import version as pkg_version
+from pathlib import Path
+from pg_statviz.libs.html_report import _output_prefix
+from pg_statviz.libs.info import source_filter
+
+
+MANIFEST = 'pg_statviz_manifest.json'
+INCREMENTAL_HELP = ("skip the analysis when the snapshots and options are "
+                    "unchanged since the last run into the same output "
+                    "directory")
+
+_logger = logging.getLogger(__name__)
+
+
+def _version():
+    try:
+        return pkg_version('pg_statviz')
+    except PackageNotFoundError:
+        return None
+
+
+def _manifest_path(outputdir):
+    return Path(outputdir or '.') / MANIFEST
+
+
+def _load(outputdir):
+    path = _manifest_path(outputdir)
+    try:
+        manifest = json.loads(path.read_text(encoding='utf-8'))
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        _logger.warning(f"Ignoring unreadable manifest {path}: {e}")
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+
+def _key(outputdir, info, port, name):
+    """Manifest key and output file name stem of a module's outputs, e.g.
+    pg_statviz_<host>_<port>_buf."""
+    return f"{Path(_output_prefix(outputdir, info, port)).name}{name}"
+
+
+def fingerprint(conn, tables, daterange, info=None, **options):
+    """Fingerprint of a module's inputs: the row count and latest
+    snapshot_tstamp of each pgstatviz table it reads within daterange (of
+    the source host in `info`, if any), the date range itself, the module
+    options that shape its output and the pg_statviz version.
+    JSON-serializable and comparable with ==."""
+    fp = {'version': _version(),
+          'daterange': [str(d) for d in daterange],
+          'options': {k: options[k] for k in sorted(options)},
+          'tables': {}}
+    where, params = source_filter(info)
+    cur = conn.cursor()
+    for table in tables:
+        cur.execute(f"""SELECT count(*) AS count,
+                               max(snapshot_tstamp) AS latest
+                        FROM pgstatviz.{table}
+                        WHERE snapshot_tstamp BETWEEN %s AND %s{where}""",
+                    (daterange[0], daterange[1], *params))
+        row = cur.fetchone()
+        fp['tables'][table] = [row['count'], str(row['latest'])]
+    cur.close()
+    # Round-trip so tuples, dates etc. compare equal to the stored copy
+    return json.loads(json.dumps(fp, default=str))
+
+
+def recorded(outputdir, info, port, names):
+    """The recorded fingerprints of `names` ({name: fingerprint or None}),
+    to fingerprint outputs built from theirs, like the index report."""
+    manifest = _load(outputdir)
+    return {n: manifest.get(_key(outputdir, info, port, n), {})
+            .get('fingerprint') for n in names}
+
+
+def unchanged(outputdir, info, port, name, fp):
+    """Whether the outputs of `name` (a module, or 'index') were generated
+    from the same fingerprint by the last run and all of them still
+    exist."""
+    entry = _load(outputdir).get(_key(outputdir, info, port, name))
+    if not entry or entry.get('fingerprint') != fp:
+        return False
+    head = Path(outputdir or '.')
+    return all((head / f).exists() for f in entry.get('outputs', []))
+
+
+def record(outputdir, info, port, name, fp):
+    """Record the fingerprint the outputs of `name` were just generated
+    from, together with the list of those outputs (every file in the
+    output directory named after it, e.g. pg_statviz_<host>_<port>_buf.png
+    or pg_statviz_<host>_<port>_buf_rate.png, but not those of a variant
+    like wait-sampled). Never raises."""
+    key = _key(outputdir, info, port, name)
+    head = Path(outputdir or '.')
+    outputs = sorted({p.name for p in head.glob(f"{key}.*")}
+                     | {p.name for p in head.glob(f"{key}_*")})
+    manifest = _load(outputdir)
+    manifest[key] = {'fingerprint': fp, 'outputs': outputs}
+    path = _manifest_path(outputdir)
+    tmp = path.with_name(f".{MANIFEST}.{os.getpid()}")
+    try:
+        tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True),
+                       encoding='utf-8')
+        os.replace(tmp, path)
+    except OSError as e:
+        _logger.error(f"Could not write {path}: {e}")
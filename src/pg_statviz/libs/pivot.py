@@ -0,0 +1,135 @@
+"""
+pg_statviz - stats visualization and time series analysis
+
+Single-pass pivot of the per-snapshot JSONB arrays (pgstatviz.lock.locks,
+pgstatviz.wait.wait_events, pgstatviz.slru.slru_stats, ...) into dense
+(snapshot x key) matrices, so breakdown charts don't rescan every snapshot
+once per key.
+"""
+
+__author__ = "Jimmy Angelakos"
+__copyright__ = "Copyright (c) 2026 Jimmy Angelakos"
+__license__ = "PostgreSQL License"
+
+import numpy
+from pandas import DataFrame
+from pg_statviz.libs import profiler
+
+
+def _key_extractor(spec):
+    """A callable is used as-is; a field name reads that JSONB key. Entries
+    whose key comes back None are skipped."""
+    if callable(spec):
+        return spec
+    return lambda entry: entry.get(spec)
+
+
+def _value_extractor(spec):
+    """A callable is used as-is; a field name reads that JSONB key, with a
+    missing key or JSON null reading as 0."""
+    if callable(spec):
+        return spec
+    return lambda entry: entry.get(spec) or 0
+
+
+@profiler.traced()
+def pivot(snapshots, key, *values, keys=None, combine='sum'):
+    """Pivot a list of JSONB arrays into dense (snapshot x key) matrices.
+
+    Args:
+        snapshots: One JSONB array (list of dicts, or None) per snapshot.
+        key: Field name or callable(entry) giving the series key of an entry.
+        values: One or more field names or callable(entry) extractors; each
+            produces its own matrix from the same pass over the entries.
+        keys: Optional fixed key list. Entries with other keys are ignored
+            and keys never seen stay as all-zero columns.
+        combine: How several entries with the same key in one snapshot are
+            combined: 'sum' adds them up, 'max' keeps the largest (for
+            values that don't add up, like the lag of standbys sharing an
+            application_name).
+
+    Returns (keys, matrix, ...) with keys in first-seen order (or as given)
+    and one float matrix of shape (len(snapshots), len(keys)) per value
+    extractor. Snapshots lacking a key read as 0.
+    """
+    key = _key_extractor(key)
+    combine = numpy.maximum if combine == 'max' else numpy.add
+    values = [_value_extractor(v) for v in values]
+    fixed = keys is not None
+    keys = list(keys) if fixed else []
+    cols = {k: j for j, k in enumerate(keys)}
+
+    rows, idx, vals = [], [], []
+    for i, snapshot in enumerate(snapshots):
+        for entry in snapshot or []:
+            k = key(entry)
+            if k is None:
+                continue
+            j = cols.get(k)
+            if j is None:
+                if fixed:
+                    continue
+                j = cols[k] = len(keys)
+                keys.append(k)
+            rows.append(i)
+            idx.append(j)
+            vals.append([v(entry) for v in values])
+
+    matrices = [numpy.zeros((len(snapshots), len(keys)))
+                for _ in values]
+    if rows:
+        vals = numpy.asarray(vals, dtype=float)
+        for n, m in enumerate(matrices):
+            combine.at(m, (rows, idx), vals[:, n])
+    return (keys, *matrices)
+
+
+@profiler.traced()
+def pivot_frame(snapshots, index, key, value, keys=None, combine='sum'):
+    """Pivot a list of JSONB arrays into a DataFrame with one column per key,
+    indexed by snapshot timestamp. See pivot() for the arguments."""
+    keys, matrix = pivot(snapshots, key, value, keys=keys, combine=combine)
+    return DataFrame(data=matrix, index=index, columns=keys, copy=False)
+
+
+def breakdown_frame(rows, key, value):
+    """Pivot the (bucket, key, value) rows returned by the extension's
+    pgstatviz.*_breakdown() functions into a DataFrame indexed by bucket,
+    with one column per key. Rows must be ordered by bucket."""
+    index, buckets = [], []
+    for row in rows:
+        if not index or row['bucket'] != index[-1]:
+            index.append(row['bucket'])
+            buckets.append([])
+        buckets[-1].append(row)
+    return pivot_frame(buckets, index, key, value)
+
+
+@profiler.traced()
+def top_series(frame, n, by='total', other='other'):
+    """Keep the n columns of `frame` contributing most over its whole range
+    and fold the rest into a single `other` column.
+
+    Columns are ranked by their sum (by='total') or their maximum
+    (by='peak'); the folded column is the per-row sum or maximum of the
+    remaining columns respectively. Kept columns come back in rank order.
+    An n of 0 or None keeps every column. If a column is already named like
+    `other` (e.g. a user called other), the folded one is named `(other)`
+    instead.
+    """
+    if not n or len(frame.columns) <= n:
+        return frame
+    if by == 'peak':
+        score = frame.max()
+    else:
+        score = frame.sum()
+    while other in frame.columns:
+        other = f"({other})"
+    keep = score.sort_values(ascending=False, kind='stable').index[:n]
+    rest = frame.drop(columns=keep)
+    result = frame[keep].copy()
+    if by == 'peak':
+        result[other] = rest.max(axis=1)
+    else:
+        result[other] = rest.sum(axis=1, min_count=1)
+    return result
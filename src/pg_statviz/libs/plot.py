@@ -7,14 +7,57 @@ __copyright__ = "Copyright (c) 2026 Jimmy Angelakos"
 __license__ = "PostgreSQL License"
 
 import importlib.resources
+import os
+import math
 import matplotlib.pyplot as plt
 import matplotlib.font_manager as fnt
+import numpy
+from datetime import datetime, timedelta
+from matplotlib import dates as mdates
+from matplotlib.colors import PowerNorm
+from mpl_toolkits.axes_grid1 import make_axes_locatable
+from io import BytesIO
+from pandas import DataFrame, DatetimeIndex
 from PIL import Image
+from pg_statviz.libs import interactive, profiler
 
 
 MAX_POINTS = 100
+MAX_SERIES = 10
+DOWNSAMPLERS = ('mean', 'minmax', 'lttb')
+DOWNSAMPLE = 'mean'
+DPI = 100
+FORMATS = ('png', 'webp', 'svg', 'json')
+FORMAT = 'png'
+MAX_POINTS_HELP = "maximum number of plot points per series"
+MAX_SERIES_HELP = ("plot at most N series per breakdown chart, folding the "
+                   "rest into 'other' (0 for no limit)")
+DOWNSAMPLE_HELP = ("downsampling method when there are more snapshots than "
+                   "plot points: 'mean' averages fixed time intervals, "
+                   "'minmax' keeps each interval's lowest and highest values, "
+                   "'lttb' keeps the visually most significant snapshots "
+                   "(Largest-Triangle-Three-Buckets); only 'mean' lets "
+                   "extension 1.3 bucket breakdowns server-side")
+DPI_HELP = "chart resolution in dots per inch (charts are 19.2x10.8 inches)"
+FORMAT_HELP = ("chart format: an image, or 'json' for the chart data plus an "
+               "interactive, zoomable HTML page (no image rendering)")
+OPTIMIZE_HELP = ("quantize PNG charts to a 256-colour palette and optimize "
+                 "their compression (smaller files, slower to encode)")
+HEATMAP_HELP = ("draw the breakdown as a heatmap under the total, a row per "
+                "series coloured by its value over time, busiest first, "
+                "instead of a line per series (image formats only)")
+# Rows of a heatmap with a label on the y axis, evenly spread over them
+HEATMAP_LABELS = 40
+SEASONS = ('hour-of-week',)
+SEASONAL_HELP = ("instead of timelines, fold the rates of the date range "
+                 "into a typical week: the median and 95th percentile of "
+                 "each hour of the week")
+HOURS_OF_WEEK = 168
+# Hour-of-week profiles are drawn over this week, starting on a Monday
+SEASONAL_WEEK = datetime(2024, 1, 1)
 
 
+@profiler.traced('render')
 def setup():
     for f in ["NotoSans-Regular.ttf", "NotoSans-SemiBold.ttf"]:
         f = importlib.resources.files("pg_statviz.libs").joinpath(f)
@@ -34,6 +77,7 @@ def setup():
     return plt, fig
 
 
+@profiler.traced('render')
 def setupdouble():
     plt = setup()[0]
     fig, (splt1, splt2) = plt.subplots(2, figsize=(19.2, 10.8))
@@ -46,3 +90,309 @@ def setupdouble():
         s.grid(visible=True)
         s.ticklabel_format(axis='y', style='plain')
     return plt, fig, splt1, splt2
+
+
+@profiler.traced('render')
+def heatmap(frame, total, title, label):
+    """Chart a time-indexed frame with a column per series (e.g. wait
+    event) as a heatmap: time across, a row per series sorted by its total
+    weight, coloured by value (`label`), under a line chart of `total`
+    titled `title`. The cells are drawn as a single mesh, so rendering
+    takes as long for hundreds of series as for a few. Each cell reaches
+    halfway to its neighbours, or half the usual spacing of the frame's
+    rows across a longer gap, which is left blank like zeros. Returns
+    plt, fig like setup()."""
+    plt = setup()[0]
+    fig, (top, ax) = plt.subplots(2, figsize=(19.2, 10.8), sharex=True,
+                                  gridspec_kw={'height_ratios': [1, 3]})
+    base_image_path = importlib.resources.files("pg_statviz.libs")\
+        .joinpath("pg_statviz.png")
+    im = Image.open(str(base_image_path))
+    fig.figimage(im, 0, fig.bbox.ymax - im.size[1], zorder=3)
+    top.grid(visible=True)
+    top.ticklabel_format(axis='y', style='plain')
+    top.set_title(title)
+    top.plot(total.index, total, label='Total')
+    top.set_ylim(bottom=0)
+    top.set_ylabel("Total", fontweight='semibold')
+
+    frame = frame[frame.sum().sort_values(ascending=False,
+                                          kind='stable').index]
+    if len(frame) and len(frame.columns):
+        values = frame.to_numpy(dtype=float).T
+        edges, holes = _cells(mdates.date2num(frame.index))
+        values = numpy.insert(values, holes, numpy.nan, axis=1)
+        image = ax.pcolormesh(edges, numpy.arange(len(frame.columns) + 1),
+                              numpy.ma.masked_where(~(values > 0), values),
+                              cmap='viridis', norm=PowerNorm(0.5, vmin=0))
+        ax.set_ylim(len(frame.columns), 0)
+        # The top chart keeps an empty slot as wide as the colour bar, to
+        # line up with the heatmap
+        bars = [make_axes_locatable(a).append_axes('right', size='1%',
+                                                   pad=0.1)
+                for a in (top, ax)]
+        bars[0].set_axis_off()
+        fig.colorbar(image, cax=bars[1], label=label)
+        step = math.ceil(len(frame.columns) / HEATMAP_LABELS)
+        rows = numpy.arange(0, len(frame.columns), step)
+        ax.set_yticks(rows + 0.5, [str(c) for c in frame.columns[rows]],
+                      fontsize=9)
+    else:
+        ax.set_yticks([])
+    ax.xaxis_date()
+    ax.set_xlabel("Timestamp", fontweight='semibold')
+    fig.autofmt_xdate()
+    return plt, fig
+
+
+def _cells(x):
+    """Cell edges along the sorted times x (as date numbers): halfway
+    between rows up to 1.5 times their median spacing apart, else half that
+    spacing either side of each, with the positions of x before which the
+    blank cells across those gaps go. Returns edges, holes."""
+    spacing = numpy.diff(x)
+    step = numpy.median(spacing[spacing > 0]) if any(spacing > 0) \
+        else 1 / 1440
+    apart = spacing > 1.5 * step
+    half = numpy.where(apart, step, spacing) / 2
+    left = x - numpy.concatenate(([step / 2], half))
+    right = x + numpy.concatenate((half, [step / 2]))
+    holes = numpy.flatnonzero(apart) + 1
+    edges = numpy.insert(numpy.concatenate((left[:1], right)), holes + 1,
+                         left[holes])
+    return edges, holes
+
+
+@profiler.traced()
+def hour_of_week(frame):
+    """Fold a time-indexed frame into the hours of the week, in the time
+    zone of its timestamps: the median and 95th percentile of each column
+    per hour, as the columns '<column>' and '<column> p95'. The result is
+    indexed by the HOURS_OF_WEEK hours of SEASONAL_WEEK, NaN where there
+    were no values."""
+    index = DatetimeIndex(frame.index)
+    grouped = frame.groupby(numpy.asarray(index.dayofweek * 24
+                                          + index.hour))
+    median, p95 = grouped.median(), grouped.quantile(0.95)
+    p95.columns = [f"{c} p95" for c in p95.columns]
+    folded = median.join(p95)[[c for m, q in zip(median.columns,
+                                                 p95.columns)
+                               for c in (m, q)]]
+    folded = folded.reindex(range(HOURS_OF_WEEK))
+    folded.index = DatetimeIndex([SEASONAL_WEEK + timedelta(hours=h)
+                                  for h in folded.index])
+    return folded
+
+
+@profiler.traced('render')
+def profile(ax, folded, series):
+    """Draw the hour_of_week() profile of each column of `series`
+    ({column: label}) on ax: the median as a line, and its 95th percentile
+    as a dashed line bounding a band, with the days of the week across."""
+    for column, label in series.items():
+        line, = ax.plot(folded.index, folded[column], label=label)
+        ax.plot(folded.index, folded[f"{column} p95"], label=f"{label} p95",
+                color=line.get_color(), linestyle='--', marker='')
+        ax.fill_between(folded.index, folded[column],
+                        folded[f"{column} p95"], color=line.get_color(),
+                        alpha=0.2)
+    ax.set_xlim(SEASONAL_WEEK, SEASONAL_WEEK + timedelta(days=7))
+    ax.xaxis.set_major_locator(mdates.DayLocator())
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%a'))
+    ax.xaxis.set_minor_locator(mdates.HourLocator(byhour=range(0, 24, 6)))
+    ax.set_xlabel("Hour of the week", fontweight='semibold')
+
+
+def typical_week(frame, panels, ylabel, info, port):
+    """Fold a time-indexed frame with hour_of_week() and chart it with a
+    profile() per panel ((title, {column: label}), one or two panels).
+    Returns plt, fig and the folded frame."""
+    folded = hour_of_week(frame)
+    if len(panels) > 1:
+        plt, fig, *axes = setupdouble()
+    else:
+        plt, fig = setup()
+        axes = [fig.gca()]
+    plt.suptitle(f"pg_statviz · {info['hostname']}:{port}",
+                 fontweight='semibold')
+    for ax, (subtitle, series) in zip(axes, panels):
+        ax.set_title(subtitle)
+        profile(ax, folded, series)
+        ax.set_ylabel(ylabel, fontweight='semibold')
+        ax.set_ylim(bottom=0)
+        ax.legend()
+    fig.autofmt_xdate()
+    fig.tight_layout()
+    return plt, fig, folded
+
+
+def save(outfile, dpi=None, optimize=False):
+    """Save the current figure to outfile, in the format given by its
+    extension (see FORMATS), at `dpi` (default DPI). WebP is saved lossless;
+    PNG is quantized to a 256-colour palette and optimized if `optimize`.
+    The logo keeps its size and stays anchored to the top left corner.
+    JSON writes the plotted series and an interactive page instead of an
+    image (see interactive.write_chart)."""
+    with profiler.span('plot.save', 'render') as s:
+        _save(outfile, dpi, optimize)
+        if profiler.recording() and os.path.exists(outfile):
+            s['bytes'] = os.path.getsize(outfile)
+
+
+def _save(outfile, dpi, optimize):
+    fig = plt.gcf()
+    ext = os.path.splitext(outfile)[1].lower()
+    if ext == '.json':
+        interactive.write_chart(fig, outfile)
+        return
+    dpi = dpi or DPI
+    # Figure images are placed in pixels, so re-anchor them for this dpi
+    for im in fig.images:
+        im.oy = fig.get_figheight() * dpi - im.get_size()[0]
+    if ext == '.png' and optimize:
+        buf = BytesIO()
+        fig.savefig(buf, format='png', dpi=dpi)
+        buf.seek(0)
+        optimize_png(buf, outfile)
+    elif ext == '.webp':
+        fig.savefig(outfile, dpi=dpi, pil_kwargs={'lossless': True})
+    else:
+        fig.savefig(outfile, dpi=dpi)
+
+
+def optimize_png(src, dst):
+    """Quantize the PNG read from src to a 256-colour palette and write it
+    with optimized compression to dst (paths or file objects). Images that
+    already have a palette are only recompressed."""
+    with Image.open(src) as im:
+        if im.mode != 'P':
+            im = im.convert('RGB').quantize(
+                colors=256, method=Image.Quantize.FASTOCTREE)
+        im.save(dst, format='png', optimize=True)
+
+
+@profiler.traced()
+def downsample(frame, agg='mean', method=None, points=None, gaps=None):
+    """Reduce a time-indexed DataFrame to at most `points` rows (default
+    MAX_POINTS) for plotting. Frames already within budget are returned
+    unchanged.
+
+    gaps lists snapshot timestamps the frame has no row for because the
+    snapshot skipped its component (see info.get_skipped). They become NaN
+    rows, so lines break there instead of joining across missing data:
+    every gap when they fit in the budget, else one between any two rows
+    kept with gaps between them.
+
+    method (default DOWNSAMPLE) is one of:
+        mean: aggregate fixed time intervals with `agg` ('mean', 'max',
+            'sum', ...). Intervals without snapshots come back as NaN, so
+            gaps only break lines when they span an interval.
+        minmax: per time interval, keep the lowest and highest value of
+            every column, in the order they occurred, so spikes survive.
+        lttb: keep the snapshots chosen by Largest-Triangle-Three-Buckets,
+            scoring all columns together so they share one index.
+    `agg` only applies to 'mean'; the other methods keep real values.
+    """
+    points = points or MAX_POINTS
+    method = method or DOWNSAMPLE
+    if gaps and len(frame):
+        gaps = DatetimeIndex([g for g in gaps
+                              if frame.index[0] < g < frame.index[-1]])
+        gaps = gaps.difference(frame.index)
+        gapped = frame.reindex(frame.index.union(gaps))
+        if len(gapped) <= points:
+            return gapped
+    else:
+        gaps = DatetimeIndex([])
+    if len(frame) <= points:
+        kept = frame
+    elif method == 'lttb' and points >= 3:
+        kept = frame.iloc[_lttb(_seconds(frame), _values(frame), points)]
+    elif method == 'minmax' and points >= 2:
+        kept = _minmax(frame, points)
+    else:
+        q = str(round(
+            (frame.index[-1] - frame.index[0]).total_seconds() / points, 2))
+        return getattr(frame.resample(q + "s"), agg)()
+    return _break(kept, gaps) if len(gaps) else kept
+
+
+def _break(frame, gaps):
+    """frame with a NaN row at the first of the (sorted) gaps between any
+    two consecutive rows, so the lines through them break."""
+    after = frame.index.searchsorted(gaps)
+    first = numpy.unique(after, return_index=True)[1]
+    return frame.reindex(frame.index.union(gaps[first]))
+
+
+# Seconds since the first row of a time-indexed frame
+def _seconds(frame):
+    return numpy.asarray((frame.index - frame.index[0]).total_seconds(),
+                         dtype=float)
+
+
+# Frame values as a float matrix, one column per series
+def _values(frame):
+    return frame.to_numpy(dtype=float, na_value=numpy.nan).reshape(
+        len(frame), -1)
+
+
+def _lttb(x, y, points):
+    """Row positions picked by Largest-Triangle-Three-Buckets. Columns of y
+    are rescaled to [0, 1] and their triangle areas summed, so every series
+    weighs the same when the rows are shared."""
+    n = len(x)
+    nan = numpy.isnan(y)
+    low = numpy.where(nan, numpy.inf, y).min(axis=0, initial=numpy.inf)
+    high = numpy.where(nan, -numpy.inf, y).max(axis=0, initial=-numpy.inf)
+    low = numpy.where(numpy.isfinite(low), low, 0)
+    span = numpy.where(high > low, high - low, 1)
+    y = numpy.where(nan, 0, (y - low) / span)
+
+    # points - 2 buckets between the first and last rows, which always stay
+    edges = numpy.linspace(1, n - 1, points - 1).astype(int)
+    picked = numpy.empty(points, dtype=int)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[hi:nxt].mean()
+        avg_y = y[hi:nxt].mean(axis=0)
+        area = numpy.abs((x[a] - avg_x) * (y[lo:hi] - y[a])
+                         - (x[a] - x[lo:hi])[:, None] * (avg_y - y[a]))
+        a = lo + int(numpy.argmax(area.sum(axis=1)))
+        picked[i + 1] = a
+    return picked
+
+
+def _minmax(frame, points):
+    """Min-max envelope: points // 2 equal time intervals, each reduced to
+    two rows holding every column's extremes in order of occurrence. Empty
+    intervals are dropped rather than filled with NaN."""
+    x = _seconds(frame)
+    y = _values(frame)
+    buckets = points // 2
+    width = x[-1] / buckets if x[-1] > 0 else 1
+    bounds = numpy.searchsorted(
+        numpy.minimum((x / width).astype(int), buckets - 1),
+        numpy.arange(buckets + 1))
+    cols = numpy.arange(y.shape[1])
+    rows, index = [], []
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        if lo == hi:
+            continue
+        chunk = y[lo:hi]
+        mins = numpy.argmin(numpy.where(numpy.isnan(chunk), numpy.inf,
+                                        chunk), axis=0)
+        maxs = numpy.argmax(numpy.where(numpy.isnan(chunk), -numpy.inf,
+                                        chunk), axis=0)
+        first = numpy.minimum(mins, maxs)
+        second = numpy.maximum(mins, maxs)
+        rows.append(chunk[first, cols])
+        index.append(frame.index[lo + first.min()])
+        if hi - lo > 1:
+            rows.append(chunk[second, cols])
+            index.append(frame.index[lo + max(second.max(), first.min() + 1)])
+    return DataFrame(data=numpy.asarray(rows), index=index,
+                     columns=frame.columns)
@@ -0,0 +1,297 @@
+"""
+pg_statviz - stats visualization and time series analysis
+
+Run profiling (--profile). Connecting, every query and fetch, the calc and
+DataFrame functions, chart setup and saving, AI analysis and report writing
+run in spans recording their wall time, rows, bytes and peak memory. At the
+end of the run the spans are written as a Chrome trace (chrome://tracing,
+Perfetto) and summarized per stage and per span in the log.
+
+Spans cost a flag check when no run is being profiled. Tracing memory
+allocations slows pure Python code down noticeably, so it can be turned off
+with PG_STATVIZ_PROFILE_MEMORY=off for more faithful timings.
+"""
+
+__author__ = "Jimmy Angelakos"
+__copyright__ = "Copyright (c) 2026 Jimmy Angelakos"
+__license__ = "PostgreSQL License"
+
+import functools
+import json
+import logging
+import os
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+import psycopg
+
+
+logging.basicConfig()
+_logger = logging.getLogger(__name__)
+_logger.setLevel(logging.INFO)
+
+
+PROFILE_HELP = ("write a Chrome trace of where the run spends its time (and "
+                "memory) to FILE, and log a summary at the end (slows the "
+                "run down somewhat)")
+# Spans listed in the summary, slowest first
+SUMMARY_SPANS = 25
+# Rows of a query result whose sizes are added up to estimate its bytes
+SAMPLE_ROWS = 100
+# Stages, in pipeline order, for the summary
+STAGES = ('module', 'db', 'compute', 'render', 'ai', 'report')
+
+_lock = threading.Lock()
+_local = threading.local()
+_run = {'spans': None, 'open': [], 'tracing': False}
+
+
+def recording() -> bool:
+    """Whether a profiled run is in progress."""
+    return _run['spans'] is not None
+
+
+def _memory() -> bool:
+    """Whether profiled runs trace memory (PG_STATVIZ_PROFILE_MEMORY isn't
+    off)."""
+    value = os.environ.get("PG_STATVIZ_PROFILE_MEMORY", "on")
+    return value.strip().lower() not in ("0", "off", "no", "false")
+
+
+def _stack() -> list:
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def _checkpoint() -> int | None:
+    """Credit the traced memory peak since the last checkpoint to every
+    open span, and start measuring a new one. tracemalloc has a single
+    peak for the process, so spans share it through these checkpoints."""
+    if not tracemalloc.is_tracing():
+        return None
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    for s in _run['open']:
+        s['top'] = max(s['top'], peak)
+    return current
+
+
+@contextmanager
+def span(name: str, cat: str = 'compute', **args):
+    """Record the block as a span of stage cat. Yields a dict the block can
+    add 'rows' and 'bytes' (or any other detail) to; it ends up in the
+    span's trace event args."""
+    if not recording():
+        yield args
+        return
+    stack = _stack()
+    with _lock:
+        memory = _checkpoint()
+        s = {'name': name, 'cat': cat, 'args': args, 'mem': memory,
+             'top': memory, 'tid': threading.get_ident(),
+             'parent': stack[-1] if stack else None, 'children': 0}
+        _run['open'].append(s)
+    stack.append(s)
+    s['start'] = time.perf_counter_ns()
+    try:
+        yield args
+    finally:
+        s['dur'] = time.perf_counter_ns() - s['start']
+        stack.pop()
+        with _lock:
+            _checkpoint()
+            _run['open'].remove(s)
+            if s['parent']:
+                s['parent']['children'] += s['dur']
+            if recording():
+                _run['spans'].append(s)
+
+
+def _size(result):
+    # Rows of a function result, when it has rows
+    if isinstance(result, (list, dict)) or hasattr(result, 'shape'):
+        return len(result)
+    return None
+
+
+def traced(cat: str = 'compute'):
+    """Decorator running every call of a function in a span of stage cat,
+    named after its module and itself, with the rows of its result."""
+    def decorator(func):
+        name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not recording():
+                return func(*args, **kwargs)
+            with span(name, cat) as s:
+                result = func(*args, **kwargs)
+                rows = _size(result)
+                if rows is not None:
+                    s['rows'] = rows
+                return result
+        return wrapper
+    return decorator
+
+
+def command(func):
+    """Decorator for the module and analyze commands: runs them in a span,
+    and profiles the whole run when called with profile=FILE."""
+    traced_func = traced('module')(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        path = kwargs.get('profile')
+        if not path or recording():
+            return traced_func(*args, **kwargs)
+        start()
+        try:
+            return traced_func(*args, **kwargs)
+        finally:
+            spans = stop()
+            write_trace(path, spans)
+            for line in summary(spans).splitlines():
+                _logger.info(line)
+    return wrapper
+
+
+def start() -> None:
+    """Start recording spans (and tracing memory allocations, unless
+    turned off)."""
+    # Leave alone tracing started elsewhere (e.g. PYTHONTRACEMALLOC)
+    started = _memory() and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    _run.update(spans=[], open=[], tracing=started)
+
+
+def stop() -> list:
+    """Stop recording, and return the spans recorded."""
+    spans = _run['spans'] or []
+    if _run['tracing']:
+        tracemalloc.stop()
+    _run.update(spans=None, open=[], tracing=False)
+    return spans
+
+
+def _details(s) -> dict:
+    # Trace event args of span s
+    details = dict(s['args'])
+    if s['top'] is not None:
+        details['peak_bytes'] = max(s['top'] - s['mem'], 0)
+    return details
+
+
+def trace_events(spans: list) -> dict:
+    """The spans as a Chrome trace-event document: one complete ('X')
+    event per span, timed in microseconds from the start of the run, with
+    its rows, bytes and peak memory in args."""
+    base = min((s['start'] for s in spans), default=0)
+    threads = {tid: n for n, tid in enumerate(
+        dict.fromkeys(s['tid'] for s in spans))}
+    events = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(),
+               'tid': n, 'args': {'name': 'main' if n == 0
+                                  else f"worker {n}"}}
+              for n in threads.values()]
+    for s in sorted(spans, key=lambda s: s['start']):
+        events.append({'name': s['name'], 'cat': s['cat'], 'ph': 'X',
+                       'ts': (s['start'] - base) / 1000,
+                       'dur': s['dur'] / 1000, 'pid': os.getpid(),
+                       'tid': threads[s['tid']], 'args': _details(s)})
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def write_trace(path, spans: list) -> None:
+    """Write trace_events(spans) to path as JSON."""
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(trace_events(spans), f, default=str)
+        _logger.info(f"Trace saved to {path}")
+    except OSError as e:
+        _logger.error(f"Could not write {path}: {e}")
+
+
+def _mb(n) -> str:
+    return f"{n / 1048576:.1f}"
+
+
+def summary(spans: list) -> str:
+    """A plain-text table of the time spent in each stage (self time, so
+    stages add up to the run) and in the slowest spans, grouped by name."""
+    if not spans:
+        return "No spans recorded"
+    wall = max(s['start'] + s['dur'] for s in spans) \
+        - min(s['start'] for s in spans)
+    stages, names = {}, {}
+    for s in spans:
+        own = s['dur'] - s['children']
+        stages[s['cat']] = stages.get(s['cat'], 0) + own
+        n = names.setdefault(s['name'], {'calls': 0, 'total': 0, 'self': 0,
+                                         'rows': 0, 'bytes': 0, 'peak': 0})
+        n['calls'] += 1
+        n['total'] += s['dur']
+        n['self'] += own
+        n['rows'] += s['args'].get('rows') or 0
+        n['bytes'] += s['args'].get('bytes') or 0
+        n['peak'] = max(n['peak'], _details(s).get('peak_bytes', 0))
+    lines = [f"Profile of {wall / 1e9:.2f}s run, by stage (self time):"]
+    for cat in sorted(stages, key=lambda c: (STAGES + (c,)).index(c)):
+        lines.append(f"  {cat:<10}{stages[cat] / 1e9:>10.2f}s"
+                     f"{stages[cat] / wall if wall else 0:>8.1%}")
+    lines.append(f"{'span':<40}{'calls':>6}{'total s':>9}{'self s':>9}"
+                 f"{'rows':>9}{'MB':>8}{'peak MB':>9}")
+    slowest = sorted(names.items(), key=lambda i: i[1]['total'],
+                     reverse=True)[:SUMMARY_SPANS]
+    for name, n in slowest:
+        lines.append(f"{name[:39]:<40}{n['calls']:>6}"
+                     f"{n['total'] / 1e9:>9.2f}{n['self'] / 1e9:>9.2f}"
+                     f"{n['rows']:>9}{_mb(n['bytes']):>8}"
+                     f"{_mb(n['peak']):>9}")
+    return "\n".join(lines)
+
+
+# The pgstatviz table a query reads, to name its spans
+_TABLE_RE = re.compile(r"\bFROM\s+(?:pgstatviz\.)?(\w+)", re.IGNORECASE)
+
+
+def _result_bytes(pgresult) -> int:
+    # Size of a query result as sent by the server, scaled up from up to
+    # 2 * SAMPLE_ROWS rows spread evenly over it (exact for smaller results)
+    if pgresult is None or not pgresult.ntuples:
+        return 0
+    rows = range(0, pgresult.ntuples, max(pgresult.ntuples // SAMPLE_ROWS, 1))
+    sampled = sum(pgresult.get_length(r, c) for r in rows
+                  for c in range(pgresult.nfields))
+    return round(sampled * pgresult.ntuples / len(rows))
+
+
+class Cursor(psycopg.Cursor):
+    """Cursor running its queries and fetches in spans, with the rows and
+    bytes they return. dbconn() makes it the connections' cursor class."""
+
+    _table = 'query'
+
+    def execute(self, query, params=None, **kwargs):
+        if not recording():
+            return super().execute(query, params, **kwargs)
+        m = _TABLE_RE.search(str(query))
+        self._table = m.group(1) if m else 'query'
+        with span(f"query {self._table}", 'db') as s:
+            result = super().execute(query, params, **kwargs)
+        # Sized after the span ends, so as not to count towards its time
+        s['rows'] = max(self.rowcount, 0)
+        s['bytes'] = _result_bytes(self.pgresult)
+        return result
+
+    def fetchone(self):
+        with span(f"fetch {self._table}", 'db'):
+            return super().fetchone()
+
+    def fetchall(self):
+        with span(f"fetch {self._table}", 'db') as s:
+            rows = super().fetchall()
+            s['rows'] = len(rows)
+        return rows
@@ -0,0 +1,59 @@
+"""
+pg_statviz - stats visualization and time series analysis
+
+Seasonal reports (see plot.SEASONS): a module's rates folded into a typical
+week and charted in place of its timelines, with their own analysis, report
+and manifest entry.
+"""
+
+__author__ = "Jimmy Angelakos"
+__copyright__ = "Copyright (c) 2026 Jimmy Angelakos"
+__license__ = "PostgreSQL License"
+
+import logging
+from matplotlib.pyplot import close as mpclose
+from pg_statviz.libs import manifest, plot
+from pg_statviz.libs.ai import run_chart_analysis
+from pg_statviz.libs.html_report import finalize_module_report
+
+
+SEASONAL_DESCRIPTION = ("Folded into a typical week: the line is the median "
+                        "of each hour of the week over the date range, the "
+                        "dashed line and band reach its 95th percentile. "
+                        "Describe the weekly pattern and its busiest hours "
+                        "for capacity planning. A p95 far above the median "
+                        "marks irregular peaks. Default to [HEALTHY].")
+
+_logger = logging.getLogger(__name__)
+_logger.setLevel(logging.INFO)
+
+
+def report_seasonal(frame, panels, ylabel, title, description, *, name, fp,
+                    info, port, outputdir=None, format=plot.FORMAT,
+                    dpi=None, optimize=False, ai=None, ai_batch=0,
+                    single_file=False, settings=None, limits=None):
+    """Chart a module's time-indexed frame as a typical week with
+    plot.typical_week() (see there for `panels`), and save the chart, its
+    analysis (`title`, `description` of the metric, `limits`; see
+    ai.run_chart_analysis), report and manifest entry under `name`."""
+    report_sections = []
+    plt, fig, folded = plot.typical_week(frame, panels, ylabel, info, port)
+    outfile = f"""{
+        outputdir.rstrip("/") + "/" if outputdir
+        else ''}pg_statviz_{info['hostname']
+                            .replace("/", "-")}_{port}_{name}.{format}"""
+    _logger.info(f"Saving {outfile}")
+    plot.save(outfile, dpi, optimize)
+    run_chart_analysis(
+        report_sections, ai, folded, title,
+        metric_description=f"{description} {SEASONAL_DESCRIPTION}",
+        outfile=outfile,
+        info=info,
+        settings=settings,
+        batch=ai_batch,
+        limits=limits,
+    )
+    finalize_module_report(outputdir, info, port, name, report_sections,
+                           single_file)
+    manifest.record(outputdir, info, port, name, fp)
+    mpclose('all')
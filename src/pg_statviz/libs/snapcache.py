@@ -0,0 +1,217 @@
+"""
+pg_statviz - stats visualization and time series analysis
+
+Client-side snapshot cache. With --cache-dir, the rows a module reads are
+kept in that directory in one gzipped columnar JSON file per query and
+server, along with the range of snapshots they cover, up to the latest
+snapshot_tstamp fetched. Later runs only fetch the rows after it and merge
+them in, so analyzing a 30-day window every hour only transfers the last
+hour's snapshots. Cached rows are checked against a count of the rows the
+server has for them, and fetched again whole if snapshots were deleted or
+inserted out of order since. Files unused for PG_STATVIZ_CACHE_MAX_AGE
+days are evicted, then the least recently used ones while the directory
+is larger than PG_STATVIZ_CACHE_MAX_SIZE MB. Being data only, a cache file
+can't run code when read, whoever wrote it.
+"""
+
+__author__ = "Jimmy Angelakos"
+__copyright__ = "Copyright (c) 2026 Jimmy Angelakos"
+__license__ = "PostgreSQL License"
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+from zoneinfo import ZoneInfo
+from pg_statviz.libs import profiler
+
+
+CACHE_DIR_HELP = ("keep the snapshots read in DIR, and only fetch the ones "
+                  "taken since on later runs")
+MAX_AGE = 35
+MAX_SIZE = 256
+
+_logger = logging.getLogger(__name__)
+
+
+def _limit(var, default):
+    try:
+        return float(os.environ.get(var, default))
+    except ValueError:
+        _logger.warning(f"Ignoring invalid {var}")
+        return default
+
+
+def _path(cache_dir, conn, info, name, sql, params):
+    """File of a query's rows: a directory per server and database, and a
+    file per module query and source host, named after a digest of the
+    query so a changed query doesn't read the rows of the old one."""
+    server = f"{conn.info.host}_{conn.info.port}_{conn.info.dbname}"
+    source = f"_{info['source']}" if info and info.get('source') else ''
+    digest = hashlib.sha256(repr((sql, params)).encode()).hexdigest()[:12]
+    return (Path(cache_dir) / server.replace('/', '-')
+            / f"{name}{source.replace('/', '-')}_{digest}.json.gz")
+
+
+def _dump(cached):
+    """cached as JSON: timestamps and numerics as strings, with the types
+    of their columns and the time zone of the timestamps."""
+    types, columns, tz = {}, {}, None
+    for c, values in cached['columns'].items():
+        first = next((v for v in values if v is not None), None)
+        if isinstance(first, datetime):
+            types[c], tz = 'timestamptz', first.tzinfo
+            values = [v if v is None else v.isoformat() for v in values]
+        elif isinstance(first, Decimal):
+            types[c] = 'numeric'
+            values = [v if v is None else str(v) for v in values]
+        columns[c] = values
+    return {'start': cached['start'] and cached['start'].isoformat(),
+            'latest': cached['latest'].isoformat(),
+            'tz': getattr(tz, 'key', None), 'types': types,
+            'columns': columns}
+
+
+def _undump(dumped):
+    tz = ZoneInfo(dumped['tz']) if dumped['tz'] else None
+
+    def timestamp(v):
+        if v is None:
+            return None
+        t = datetime.fromisoformat(v)
+        return t.astimezone(tz) if tz else t
+
+    columns = dumped['columns']
+    for c, kind in dumped['types'].items():
+        columns[c] = [timestamp(v) if kind == 'timestamptz'
+                      else v if v is None else Decimal(v)
+                      for v in columns[c]]
+    return {'start': timestamp(dumped['start']),
+            'latest': timestamp(dumped['latest']), 'columns': columns}
+
+
+def _load(path):
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            cached = _undump(json.load(f))
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, ValueError, KeyError, TypeError) as e:
+        _logger.warning(f"Ignoring unreadable cache file {path}: {e}")
+        return None
+    # Used now, for least-recently-used eviction
+    os.utime(path)
+    return cached
+
+
+def _save(path, cached):
+    # The cache holds server statistics: keep it to this user
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as f:
+        # Fast over small, as it's rewritten on every run with new rows
+        with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=1) as z:
+            z.write(json.dumps(_dump(cached)).encode())
+    os.replace(f.name, path)
+
+
+def _columns(rows):
+    return {c: [r[c] for r in rows] for c in rows[0]}
+
+
+def _rows(columns):
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+
+def evict(cache_dir, max_age=None, max_size=None):
+    """Remove the cache files not used for `max_age` days, then the least
+    recently used ones until the cache is under `max_size` MB. Pickles of
+    earlier versions are never read, and removed."""
+    max_age = _limit('PG_STATVIZ_CACHE_MAX_AGE', MAX_AGE) \
+        if max_age is None else max_age
+    max_size = _limit('PG_STATVIZ_CACHE_MAX_SIZE', MAX_SIZE) \
+        if max_size is None else max_size
+    for path in Path(cache_dir).glob('*/*.pickle'):
+        path.unlink(missing_ok=True)
+    files = sorted((st.st_mtime, st.st_size, p)
+                   for p in Path(cache_dir).glob('*/*.json.gz')
+                   for st in (p.stat(),))
+    size = sum(s for _, s, _ in files)
+    for mtime, fsize, path in files:
+        if mtime >= time.time() - max_age * 86400 and \
+                size <= max_size * 1048576:
+            break
+        path.unlink(missing_ok=True)
+        size -= fsize
+
+
+@profiler.traced('db')
+def fetch(conn, info, name, sql, daterange, params=(), cache_dir=None,
+          key='snapshot_tstamp'):
+    """The rows of a module query selecting snapshots `BETWEEN %s AND %s`
+    of daterange, with `params` after those, like cursor.fetchall() would
+    return them. `key` is the column holding the snapshot_tstamp of each
+    row. With `cache_dir`, only the rows newer than the cached ones are
+    fetched."""
+    cur = conn.cursor()
+    if not cache_dir:
+        cur.execute(sql, (daterange[0], daterange[1], *params))
+        rows = cur.fetchall()
+        cur.close()
+        return rows
+
+    # Have the server resolve the range ('now()', time zones) so it
+    # compares with the snapshot timestamps
+    cur.execute("""SELECT nullif(%s::timestamptz, '-infinity')
+                              AS range_from,
+                          %s::timestamptz AS range_to""",
+                (daterange[0], daterange[1]))
+    row = cur.fetchone()
+    start, end = row['range_from'], row['range_to']
+    path = _path(cache_dir, conn, info, name, sql, params)
+    cached = _load(path)
+    if cached and (cached['start'] is None
+                   or start is not None and cached['start'] <= start):
+        rows = [r for r in _rows(cached['columns'])
+                if (start is None or r[key] >= start) and r[key] <= end]
+        cur.execute(f"SELECT count(*) AS count FROM ({sql}) q",
+                    (start or '-infinity', min(end, cached['latest']),
+                     *params))
+        if cur.fetchone()['count'] != len(rows):
+            _logger.info(f"Snapshots changed since cached in {path}, "
+                         + "fetching them again")
+            cached = None
+    else:
+        cached = None
+
+    if cached is None:
+        cur.execute(sql, (start or '-infinity', end, *params))
+        rows = cur.fetchall()
+        cur.close()
+        if rows:
+            _save(path, {'start': start,
+                         'latest': max(r[key] for r in rows),
+                         'columns': _columns(rows)})
+            evict(cache_dir)
+        return rows
+
+    if end <= cached['latest']:
+        cur.close()
+        return rows
+    cur.execute(sql, (cached['latest'], end, *params))
+    new = [r for r in cur.fetchall() if r[key] > cached['latest']]
+    cur.close()
+    if new:
+        columns = cached['columns']
+        for c, values in _columns(new).items():
+            columns[c] += values
+        _save(path, {'start': cached['start'],
+                     'latest': max(r[key] for r in new),
+                     'columns': columns})
+        evict(cache_dir)
+    return rows + new
@@ -9,8 +9,11 @@ __license__ = "PostgreSQL License"
 import getpass
 import logging
 from argh.decorators import arg
-from pg_statviz.libs.ai import (AI_HELP, AI_PROVIDERS,
-                                DEFAULT_AI_PROVIDER)
+from pg_statviz.libs import (correlate, manifest, plot, profiler,
+                             snapcache)
+from pg_statviz.libs.ai import (AI_BATCH, AI_BATCH_HELP, AI_HELP,
+                                AI_PROVIDERS, DEFAULT_AI_PROVIDER,
+                                batching)
 from pg_statviz.modules.blocking import blocking
 from pg_statviz.modules.buf import buf
 from pg_statviz.modules.cache import cache
@@ -20,6 +23,7 @@ from pg_statviz.modules.conf import conf
 from pg_statviz.modules.conn import conn
 from pg_statviz.modules.io import io
 from pg_statviz.modules.lock import lock
+from pg_statviz.modules.overhead import overhead
 from pg_statviz.modules.repl import repl
 from pg_statviz.modules.slru import slru
 from pg_statviz.modules.tuple import tuple
@@ -27,8 +31,9 @@ from pg_statviz.modules.wait import wait
 from pg_statviz.modules.wal import wal
 from pg_statviz.modules.xact import xact
 from pg_statviz.libs.dbconn import dbconn
-from pg_statviz.libs.html_report import finalize_index_report
-from pg_statviz.libs.info import getinfo
+from pg_statviz.libs.html_report import (SINGLE_FILE_HELP, check_single_file,
+                                         finalize_index_report)
+from pg_statviz.libs.info import SOURCE_HOST_HELP, getinfo
 
 
 @arg('-d', '--dbname', help="database name to analyze")
@@ -45,24 +50,74 @@ from pg_statviz.libs.info import getinfo
 @arg('--ai', nargs='?', const=DEFAULT_AI_PROVIDER, default=None,
      choices=AI_PROVIDERS, metavar='PROVIDER',
      help=AI_HELP)
+@arg('--ai-batch', type=int, nargs='?', const=AI_BATCH, metavar='N',
+     help=AI_BATCH_HELP)
+@arg('--max-series', type=int, metavar='N', help=plot.MAX_SERIES_HELP)
+@arg('--max-points', type=int, metavar='N', help=plot.MAX_POINTS_HELP)
+@arg('--downsample', choices=plot.DOWNSAMPLERS, help=plot.DOWNSAMPLE_HELP)
+@arg('--dpi', type=int, help=plot.DPI_HELP)
+@arg('--format', choices=plot.FORMATS, help=plot.FORMAT_HELP)
+@arg('--optimize', action='store_true', help=plot.OPTIMIZE_HELP)
+@arg('--single-file', action='store_true', help=SINGLE_FILE_HELP)
+@arg('--incremental', action='store_true', help=manifest.INCREMENTAL_HELP)
+@arg('--cache-dir', metavar='DIR', help=snapcache.CACHE_DIR_HELP)
+@arg('--source-host', metavar='HOSTNAME', help=SOURCE_HOST_HELP)
+@arg('--profile', metavar='FILE', help=profiler.PROFILE_HELP)
+@profiler.command
 def analyze(*, dbname=getpass.getuser(), host="/var/run/postgresql",
             port="5432", username=getpass.getuser(), password=None,
-            daterange=[], outputdir=None, ai=None):
+            daterange=[], outputdir=None, ai=None, ai_batch=0,
+            max_series=plot.MAX_SERIES, max_points=plot.MAX_POINTS,
+            downsample=plot.DOWNSAMPLE, dpi=plot.DPI, format=plot.FORMAT,
+            optimize=False, single_file=False, incremental=False,
+            cache_dir=None,
+            source_host=None, profile=None):
     "run all analysis modules"
 
+    check_single_file(single_file, ai)
     conn_details = {'dbname': dbname, 'user': username,
                     'password': getpass.getpass("Password: ") if password
                     else password, 'host': host, 'port': port}
     connx = dbconn(**conn_details)
-    info = getinfo(connx)
+    info = getinfo(connx, source_host)
     _logger = logging.getLogger(__name__)
     common = dict(daterange=daterange, outputdir=outputdir, ai=ai,
-                  info=info, conn=connx)
-    for mod in (blocking, buf, checkp, cache, checksum, conf, conn, io,
-                lock, repl, slru, tuple, wait, wal, xact):
-        try:
-            mod(**common)
-        except SystemExit as e:
-            _logger.warning(f"{mod.__name__}: {e}")
-            continue
-    finalize_index_report(outputdir, info, port, ai)
+                  ai_batch=ai_batch, info=info, conn=connx, dpi=dpi,
+                  format=format, optimize=optimize, incremental=incremental,
+                  cache_dir=cache_dir)
+    plotting = dict(max_points=max_points, downsample=downsample)
+    modules = (blocking, buf, checkp, cache, checksum, conf, conn, io, lock,
+               overhead, repl, slru, tuple, wait, wal, xact)
+    # With --ai-batch, charts from consecutive modules share requests, and
+    # the module reports are completed as their batches come back
+    with batching():
+        for mod in modules:
+            try:
+                kwargs = dict(common)
+                if mod is not conf:
+                    kwargs.update(plotting)
+                if mod in (conn, io, repl, wait):
+                    kwargs['max_series'] = max_series
+                mod(**kwargs)
+            except SystemExit as e:
+                _logger.warning(f"{mod.__name__}: {e}")
+                continue
+    # The index is built from the module outputs, so it only needs
+    # regenerating (and its overview re-synthesising) when one changed
+    fp = {'modules': manifest.recorded(outputdir, info, port,
+                                       [m.__name__ for m in modules]),
+          'ai': ai, 'single_file': single_file}
+    if incremental and manifest.unchanged(outputdir, info, port, 'index', fp):
+        _logger.info("Module outputs unchanged since the last run, "
+                     + "keeping the index report")
+        return
+    # Events spanning several modules, read from all of them at once on a
+    # common time grid, for the overview and the index
+    correlations = (correlate.describe(
+        correlate.correlate(connx, daterange, info, cache_dir))
+        if ai else None)
+    # The index embeds every module report, so the module reports
+    # themselves keep linking their charts
+    finalize_index_report(outputdir, info, port, ai, single_file,
+                          correlations)
+    manifest.record(outputdir, info, port, 'index', fp)
@@ -14,13 +14,16 @@ from dateutil.parser import isoparse
 from matplotlib.pyplot import close as mpclose
 from matplotlib.ticker import MaxNLocator
 from pandas import DataFrame
-from pg_statviz.libs import plot
-from pg_statviz.libs.ai import (AI_HELP, AI_PROVIDERS,
+from pg_statviz.libs import manifest, plot, profiler, snapcache
+from pg_statviz.libs.ai import (AI_BATCH, AI_BATCH_HELP, AI_HELP,
+                                AI_PROVIDERS,
                                 DEFAULT_AI_PROVIDER,
                                 run_chart_analysis)
 from pg_statviz.libs.dbconn import dbconn
-from pg_statviz.libs.html_report import finalize_module_report
-from pg_statviz.libs.info import getinfo, get_settings
+from pg_statviz.libs.html_report import (SINGLE_FILE_HELP, check_single_file,
+                                         finalize_module_report)
+from pg_statviz.libs.info import (SOURCE_HOST_HELP, getinfo, get_settings,
+                                  get_skipped, source_filter)
 
 
 @arg('-d', '--dbname', help="database name to analyze")
@@ -37,24 +40,43 @@ from pg_statviz.libs.info import getinfo, get_settings
 @arg('--ai', nargs='?', const=DEFAULT_AI_PROVIDER, default=None,
      choices=AI_PROVIDERS, metavar='PROVIDER',
      help=AI_HELP)
+@arg('--ai-batch', type=int, nargs='?', const=AI_BATCH, metavar='N',
+     help=AI_BATCH_HELP)
 @arg('--info', help=argparse.SUPPRESS)
 @arg('--conn', help=argparse.SUPPRESS)
+@arg('--max-points', type=int, metavar='N', help=plot.MAX_POINTS_HELP)
+@arg('--downsample', choices=plot.DOWNSAMPLERS, help=plot.DOWNSAMPLE_HELP)
+@arg('--dpi', type=int, help=plot.DPI_HELP)
+@arg('--format', choices=plot.FORMATS, help=plot.FORMAT_HELP)
+@arg('--optimize', action='store_true', help=plot.OPTIMIZE_HELP)
+@arg('--single-file', action='store_true', help=SINGLE_FILE_HELP)
+@arg('--incremental', action='store_true', help=manifest.INCREMENTAL_HELP)
+@arg('--cache-dir', metavar='DIR', help=snapcache.CACHE_DIR_HELP)
+@arg('--source-host', metavar='HOSTNAME', help=SOURCE_HOST_HELP)
+@arg('--profile', metavar='FILE', help=profiler.PROFILE_HELP)
+@profiler.command
 def blocking(*, dbname=getpass.getuser(), host="/var/run/postgresql",
              port="5432", username=getpass.getuser(), password=None,
-             daterange=[], outputdir=None, ai=None, info=None, conn=None):
+             daterange=[], outputdir=None, ai=None, ai_batch=0,
+             info=None, conn=None, max_points=plot.MAX_POINTS,
+             downsample=plot.DOWNSAMPLE, dpi=plot.DPI, format=plot.FORMAT,
+             optimize=False, single_file=False, incremental=False,
+             cache_dir=None,
+             source_host=None, profile=None):
     "run blocking locks analysis module"
 
     logging.basicConfig()
     _logger = logging.getLogger(__name__)
     _logger.setLevel(logging.INFO)
 
+    check_single_file(single_file, ai)
     if not conn:
         conn_details = {'dbname': dbname, 'user': username,
                         'password': getpass.getpass("Password: ") if password
                         else password, 'host': host, 'port': port}
         conn = dbconn(**conn_details)
     if not info:
-        info = getinfo(conn)
+        info = getinfo(conn, source_host)
 
     _logger.info("Running blocking locks analysis")
 
@@ -65,26 +87,39 @@ def blocking(*, dbname=getpass.getuser(), host="/var/run/postgresql",
     else:
         daterange = ['-infinity', 'now()']
 
+    fp = manifest.fingerprint(conn, ['blocking'], daterange, ai=ai,
+                              max_points=max_points, downsample=downsample,
+                              dpi=dpi, format=format, optimize=optimize,
+                              single_file=single_file, info=info)
+    if incremental and manifest.unchanged(outputdir, info, port,
+                                          'blocking', fp):
+        _logger.info("Snapshots and options unchanged since the last run, "
+                     + "skipping")
+        return
+
     # Retrieve the snapshots from DB
-    cur = conn.cursor()
-    cur.execute("""SELECT blocked_total, blockers_total, blocking,
-                          snapshot_tstamp
-                   FROM pgstatviz.blocking
-                   WHERE snapshot_tstamp BETWEEN %s AND %s
-                   ORDER BY snapshot_tstamp""",
-                (daterange[0], daterange[1]))
-    data = cur.fetchall()
+    where, params = source_filter(info)
+    data = snapcache.fetch(
+        conn, info, 'blocking',
+        f"""SELECT blocked_total, blockers_total, blocking,
+                   snapshot_tstamp
+            FROM pgstatviz.blocking
+            WHERE snapshot_tstamp BETWEEN %s AND %s{where}
+            ORDER BY snapshot_tstamp""",
+        daterange, params, cache_dir)
     if not data:
         raise SystemExit("No pg_statviz snapshots found in this database")
 
     tstamps = [ts['snapshot_tstamp'] for ts in data]
+    # Snapshots that skipped the blocking component, drawn as gaps
+    skipped = get_skipped(conn, info, 'blocking', daterange)
     blocked = [b['blocked_total'] or 0 for b in data]
     blockers = [b['blockers_total'] or 0 for b in data]
     details = [d['blocking'] for d in data]
     settings = get_settings(conn, ['deadlock_timeout',
                                    'lock_timeout',
                                    'idle_in_transaction_session_timeout',
-                                   'max_locks_per_transaction'])
+                                   'max_locks_per_transaction'], info)
 
     report_sections = []
 
@@ -93,12 +128,8 @@ def blocking(*, dbname=getpass.getuser(), host="/var/run/postgresql",
                                    'Blocking sessions': blockers},
                              index=tstamps, copy=False)
     # Downsample if needed
-    if len(tstamps) > plot.MAX_POINTS:
-        q = str(round(
-            (tstamps[-1] - tstamps[0]).total_seconds() / plot.MAX_POINTS, 2))
-        r = counts_frame.resample(q + "s").mean()
-    else:
-        r = counts_frame
+    r = plot.downsample(counts_frame, method=downsample, points=max_points,
+                        gaps=skipped)
 
     plt, fig = plot.setup()
     plt.suptitle(f"pg_statviz · {info['hostname']}:{port}",
@@ -113,11 +144,11 @@ def blocking(*, dbname=getpass.getuser(), host="/var/run/postgresql",
     outfile = f"""{
         outputdir.rstrip("/") + "/" if outputdir
         else ''}pg_statviz_{info['hostname']
-                            .replace("/", "-")}_{port}_blocking.png"""
+                            .replace("/", "-")}_{port}_blocking.{format}"""
     _logger.info(f"Saving {outfile}")
     fig.legend()
     fig.tight_layout()
-    plt.savefig(outfile)
+    plot.save(outfile, dpi, optimize)
     run_chart_analysis(
         report_sections, ai, r, "Blocking Locks",
         metric_description="POINT-IN-TIME session counts caught waiting on "
@@ -134,6 +165,9 @@ def blocking(*, dbname=getpass.getuser(), host="/var/run/postgresql",
         info=info,
         settings=settings,
         findings=calc_findings(blocked, blockers),
+        batch=ai_batch,
+        # calc_findings flags any blocked session
+        limits={},
     )
 
     # Plot the breakdown by lock type, when there is any blocking at all
@@ -146,13 +180,8 @@ def blocking(*, dbname=getpass.getuser(), host="/var/run/postgresql",
         types_frame = DataFrame(
             data={lt: count_by_locktype(details, lt) for lt in locktypes},
             index=tstamps, copy=False)
-        if len(tstamps) > plot.MAX_POINTS:
-            q = str(round(
-                (tstamps[-1] - tstamps[0]).total_seconds()
-                / plot.MAX_POINTS, 2))
-            rr = types_frame.resample(q + "s").mean()
-        else:
-            rr = types_frame
+        rr = plot.downsample(types_frame, method=downsample, points=max_points,
+                             gaps=skipped)
         for lt in locktypes:
             if not all(c == 0 for c in rr[lt]):
                 plt.plot(rr.index, rr[lt], label=lt)
@@ -163,11 +192,11 @@ def blocking(*, dbname=getpass.getuser(), host="/var/run/postgresql",
         outfile = f"""{
             outputdir.rstrip("/") + "/" if outputdir
             else ''}pg_statviz_{info['hostname'].replace("/", "-")
-                                }_{port}_blocking_types.png"""
+                                }_{port}_blocking_types.{format}"""
         _logger.info(f"Saving {outfile}")
         fig.legend()
         fig.tight_layout()
-        plt.savefig(outfile)
+        plot.save(outfile, dpi, optimize)
         run_chart_analysis(
             report_sections, ai, rr, "Blocking Locks by Type",
             metric_description="Blocking events split by pg_locks.locktype. "
@@ -180,10 +209,13 @@ def blocking(*, dbname=getpass.getuser(), host="/var/run/postgresql",
             outfile=outfile,
             info=info,
             settings=settings,
+            batch=ai_batch,
+            limits={'*': 0},
         )
 
     finalize_module_report(outputdir, info, port, 'blocking',
-                           report_sections)
+                           report_sections, single_file)
+    manifest.record(outputdir, info, port, 'blocking', fp)
     mpclose('all')
 
 
@@ -207,6 +239,7 @@ def count_by_locktype(details, locktype):
 
 
 # Deterministic rule findings handed to the LLM and used as a severity floor
+@profiler.traced()
 def calc_findings(blocked, blockers):
     findings = []
     if not blocked:
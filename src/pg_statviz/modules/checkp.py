@@ -15,13 +15,16 @@ from dateutil.parser import isoparse
 from matplotlib.pyplot import close as mpclose
 from matplotlib.ticker import MaxNLocator
 from pandas import DataFrame
-from pg_statviz.libs import plot
-from pg_statviz.libs.ai import (AI_HELP, AI_PROVIDERS,
+from pg_statviz.libs import manifest, plot, profiler, snapcache
+from pg_statviz.libs.ai import (AI_BATCH, AI_BATCH_HELP, AI_HELP,
+                                AI_PROVIDERS,
                                 DEFAULT_AI_PROVIDER,
                                 run_chart_analysis)
 from pg_statviz.libs.dbconn import dbconn
-from pg_statviz.libs.html_report import finalize_module_report
-from pg_statviz.libs.info import getinfo, get_settings
+from pg_statviz.libs.html_report import (SINGLE_FILE_HELP, check_single_file,
+                                         finalize_module_report)
+from pg_statviz.libs.info import (SOURCE_HOST_HELP, getinfo, get_settings,
+                                  get_skipped, source_filter)
 
 
 @arg('-d', '--dbname', help="database name to analyze")
@@ -38,24 +41,43 @@ from pg_statviz.libs.info import getinfo, get_settings
 @arg('--ai', nargs='?', const=DEFAULT_AI_PROVIDER, default=None,
      choices=AI_PROVIDERS, metavar='PROVIDER',
      help=AI_HELP)
+@arg('--ai-batch', type=int, nargs='?', const=AI_BATCH, metavar='N',
+     help=AI_BATCH_HELP)
 @arg('--info', help=argparse.SUPPRESS)
 @arg('--conn', help=argparse.SUPPRESS)
+@arg('--max-points', type=int, metavar='N', help=plot.MAX_POINTS_HELP)
+@arg('--downsample', choices=plot.DOWNSAMPLERS, help=plot.DOWNSAMPLE_HELP)
+@arg('--dpi', type=int, help=plot.DPI_HELP)
+@arg('--format', choices=plot.FORMATS, help=plot.FORMAT_HELP)
+@arg('--optimize', action='store_true', help=plot.OPTIMIZE_HELP)
+@arg('--single-file', action='store_true', help=SINGLE_FILE_HELP)
+@arg('--incremental', action='store_true', help=manifest.INCREMENTAL_HELP)
+@arg('--cache-dir', metavar='DIR', help=snapcache.CACHE_DIR_HELP)
+@arg('--source-host', metavar='HOSTNAME', help=SOURCE_HOST_HELP)
+@arg('--profile', metavar='FILE', help=profiler.PROFILE_HELP)
+@profiler.command
 def checkp(*, dbname=getpass.getuser(), host="/var/run/postgresql",
            port="5432", username=getpass.getuser(), password=None,
-           daterange=[], outputdir=None, ai=None, info=None, conn=None):
+           daterange=[], outputdir=None, ai=None, ai_batch=0,
+           info=None, conn=None, max_points=plot.MAX_POINTS,
+           downsample=plot.DOWNSAMPLE, dpi=plot.DPI, format=plot.FORMAT,
+           optimize=False, single_file=False, incremental=False,
+           cache_dir=None,
+           source_host=None, profile=None):
     "run checkpoint analysis module"
 
     logging.basicConfig()
     _logger = logging.getLogger(__name__)
     _logger.setLevel(logging.INFO)
 
+    check_single_file(single_file, ai)
     if not conn:
         conn_details = {'dbname': dbname, 'user': username,
                         'password': getpass.getpass("Password: ") if password
                         else password, 'host': host, 'port': port}
         conn = dbconn(**conn_details)
     if not info:
-        info = getinfo(conn)
+        info = getinfo(conn, source_host)
 
     _logger.info("Running checkpoint analysis")
 
@@ -66,24 +88,36 @@ def checkp(*, dbname=getpass.getuser(), host="/var/run/postgresql",
     else:
         daterange = ['-infinity', 'now()']
 
+    fp = manifest.fingerprint(conn, ['buf'], daterange, ai=ai,
+                              max_points=max_points, downsample=downsample,
+                              dpi=dpi, format=format, optimize=optimize,
+                              single_file=single_file, info=info)
+    if incremental and manifest.unchanged(outputdir, info, port, 'checkp', fp):
+        _logger.info("Snapshots and options unchanged since the last run, "
+                     + "skipping")
+        return
+
     # Retrieve the snapshots from DB
-    cur = conn.cursor()
-    cur.execute("""SELECT checkpoints_req, checkpoints_timed,
-                          snapshot_tstamp, stats_reset
-                   FROM pgstatviz.buf
-                   WHERE snapshot_tstamp BETWEEN %s AND %s
-                   ORDER BY snapshot_tstamp""",
-                (daterange[0], daterange[1]))
-    data = cur.fetchall()
+    where, params = source_filter(info)
+    data = snapcache.fetch(
+        conn, info, 'checkp',
+        f"""SELECT checkpoints_req, checkpoints_timed,
+                   snapshot_tstamp, stats_reset
+            FROM pgstatviz.buf
+            WHERE snapshot_tstamp BETWEEN %s AND %s{where}
+            ORDER BY snapshot_tstamp""",
+        daterange, params, cache_dir)
     if not data:
         raise SystemExit("No pg_statviz snapshots found in this database")
 
     tstamps = [t['snapshot_tstamp'] for t in data]
+    # Snapshots that skipped the buf component, drawn as gaps
+    skipped = get_skipped(conn, info, 'buf', daterange)
     checkps = calc_checkps(data)
     checkprates = calc_checkprates(data)
     settings = get_settings(conn, ['checkpoint_timeout',
                                    'checkpoint_completion_target',
-                                   'max_wal_size'])
+                                   'max_wal_size'], info)
     # Rate-based rule: only the per-minute rate is meaningful here.
     # checkps['req'] is a cumulative counter, so its mean is not.
     rate_findings = []
@@ -104,14 +138,11 @@ def checkp(*, dbname=getpass.getuser(), host="/var/run/postgresql",
     # Downsample if needed
     checkps_frame = DataFrame(data=checkps, index=tstamps, copy=False)
     checkprates_frame = DataFrame(data=checkprates, index=tstamps, copy=False)
-    if len(tstamps) > plot.MAX_POINTS:
-        q = str(round(
-            (tstamps[-1] - tstamps[0]).total_seconds() / plot.MAX_POINTS, 2))
-        r = checkps_frame.resample(q + "s").mean()
-        rr = checkprates_frame.resample(q + "s").mean()
-    else:
-        r = checkps_frame
-        rr = checkprates_frame
+    r = plot.downsample(checkps_frame, method=downsample, points=max_points,
+                        gaps=skipped)
+    rr = plot.downsample(checkprates_frame,
+                         method=downsample, points=max_points,
+                         gaps=skipped)
 
     report_sections = []
 
@@ -132,9 +163,9 @@ def checkp(*, dbname=getpass.getuser(), host="/var/run/postgresql",
     outfile = f"""{
         outputdir.rstrip("/") + "/" if outputdir
         else ''}pg_statviz_{info['hostname']
-                            .replace("/", "-")}_{port}_checkp.png"""
+                            .replace("/", "-")}_{port}_checkp.{format}"""
     _logger.info(f"Saving {outfile}")
-    plt.savefig(outfile)
+    plot.save(outfile, dpi, optimize)
     if ai:
         # Only pass requested column - the cumulative total at the end gives
         # a sense of scale, but no rule is applied here (rate-based judgement
@@ -154,6 +185,8 @@ def checkp(*, dbname=getpass.getuser(), host="/var/run/postgresql",
             outfile=outfile,
             info=info,
             settings=settings,
+            batch=ai_batch,
+            limits={},
         )
 
     # Plot WAL rates
@@ -170,9 +203,9 @@ def checkp(*, dbname=getpass.getuser(), host="/var/run/postgresql",
     outfile = f"""{
         outputdir.rstrip("/") + "/" if outputdir
         else ''}pg_statviz_{info['hostname']
-                            .replace("/", "-")}_{port}_checkp_rate.png"""
+                            .replace("/", "-")}_{port}_checkp_rate.{format}"""
     _logger.info(f"Saving {outfile}")
-    plt.savefig(outfile)
+    plot.save(outfile, dpi, optimize)
     run_chart_analysis(
         report_sections, ai, rr, "Checkpoint Rate",
         metric_description="Checkpoint rate per minute. Steady 'timed' with "
@@ -183,20 +216,26 @@ def checkp(*, dbname=getpass.getuser(), host="/var/run/postgresql",
         info=info,
         settings=settings,
         findings=rate_findings,
+        batch=ai_batch,
+        # rate_findings check the requested share
+        limits={},
     )
 
     finalize_module_report(outputdir, info, port, 'checkp',
-                           report_sections)
+                           report_sections, single_file)
+    manifest.record(outputdir, info, port, 'checkp', fp)
     mpclose('all')
 
 
 # Gather checkpoint data
+@profiler.traced()
 def calc_checkps(data):
     return {'req': [c['checkpoints_req'] for c in data],
             'timed': [c['checkpoints_timed'] for c in data]}
 
 
 # Calculate checkpoint rates
+@profiler.traced()
 def calc_checkprates(data):
 
     # Checkpoint diff generator - yields tuple list of the rates in
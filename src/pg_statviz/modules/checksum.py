@@ -14,13 +14,16 @@ from dateutil.parser import isoparse
 from matplotlib.pyplot import close as mpclose
 from matplotlib.ticker import MaxNLocator
 from pandas import DataFrame
-from pg_statviz.libs import plot
-from pg_statviz.libs.ai import (AI_HELP, AI_PROVIDERS,
+from pg_statviz.libs import manifest, plot, profiler, snapcache
+from pg_statviz.libs.ai import (AI_BATCH, AI_BATCH_HELP, AI_HELP,
+                                AI_PROVIDERS,
                                 DEFAULT_AI_PROVIDER,
                                 run_chart_analysis)
 from pg_statviz.libs.dbconn import dbconn
-from pg_statviz.libs.html_report import finalize_module_report
-from pg_statviz.libs.info import getinfo
+from pg_statviz.libs.html_report import (SINGLE_FILE_HELP, check_single_file,
+                                         finalize_module_report)
+from pg_statviz.libs.info import (SOURCE_HOST_HELP, getinfo, get_skipped,
+                                  source_filter)
 
 
 @arg('-d', '--dbname', help="database name to analyze")
@@ -37,24 +40,43 @@ from pg_statviz.libs.info import getinfo
 @arg('--ai', nargs='?', const=DEFAULT_AI_PROVIDER, default=None,
      choices=AI_PROVIDERS, metavar='PROVIDER',
      help=AI_HELP)
+@arg('--ai-batch', type=int, nargs='?', const=AI_BATCH, metavar='N',
+     help=AI_BATCH_HELP)
 @arg('--info', help=argparse.SUPPRESS)
 @arg('--conn', help=argparse.SUPPRESS)
+@arg('--max-points', type=int, metavar='N', help=plot.MAX_POINTS_HELP)
+@arg('--downsample', choices=plot.DOWNSAMPLERS, help=plot.DOWNSAMPLE_HELP)
+@arg('--dpi', type=int, help=plot.DPI_HELP)
+@arg('--format', choices=plot.FORMATS, help=plot.FORMAT_HELP)
+@arg('--optimize', action='store_true', help=plot.OPTIMIZE_HELP)
+@arg('--single-file', action='store_true', help=SINGLE_FILE_HELP)
+@arg('--incremental', action='store_true', help=manifest.INCREMENTAL_HELP)
+@arg('--cache-dir', metavar='DIR', help=snapcache.CACHE_DIR_HELP)
+@arg('--source-host', metavar='HOSTNAME', help=SOURCE_HOST_HELP)
+@arg('--profile', metavar='FILE', help=profiler.PROFILE_HELP)
+@profiler.command
 def checksum(*, dbname=getpass.getuser(), host="/var/run/postgresql",
              port="5432", username=getpass.getuser(), password=None,
-             daterange=[], outputdir=None, ai=None, info=None, conn=None):
+             daterange=[], outputdir=None, ai=None, ai_batch=0,
+             info=None, conn=None, max_points=plot.MAX_POINTS,
+             downsample=plot.DOWNSAMPLE, dpi=plot.DPI, format=plot.FORMAT,
+             optimize=False, single_file=False, incremental=False,
+             cache_dir=None,
+             source_host=None, profile=None):
     "run checksum failure analysis module"
 
     logging.basicConfig()
     _logger = logging.getLogger(__name__)
     _logger.setLevel(logging.INFO)
 
+    check_single_file(single_file, ai)
     if not conn:
         conn_details = {'dbname': dbname, 'user': username,
                         'password': getpass.getpass("Password: ") if password
                         else password, 'host': host, 'port': port}
         conn = dbconn(**conn_details)
     if not info:
-        info = getinfo(conn)
+        info = getinfo(conn, source_host)
 
     _logger.info("Running checksum failure analysis")
 
@@ -65,18 +87,31 @@ def checksum(*, dbname=getpass.getuser(), host="/var/run/postgresql",
     else:
         daterange = ['-infinity', 'now()']
 
-    cur = conn.cursor()
-    cur.execute("""SELECT checksum_failures, checksum_last_failure,
-                          snapshot_tstamp
-                   FROM pgstatviz.db
-                   WHERE snapshot_tstamp BETWEEN %s AND %s
-                   ORDER BY snapshot_tstamp""",
-                (daterange[0], daterange[1]))
-    data = cur.fetchall()
+    fp = manifest.fingerprint(conn, ['db'], daterange, ai=ai,
+                              max_points=max_points, downsample=downsample,
+                              dpi=dpi, format=format, optimize=optimize,
+                              single_file=single_file, info=info)
+    if incremental and manifest.unchanged(outputdir, info, port,
+                                          'checksum', fp):
+        _logger.info("Snapshots and options unchanged since the last run, "
+                     + "skipping")
+        return
+
+    where, params = source_filter(info)
+    data = snapcache.fetch(
+        conn, info, 'checksum',
+        f"""SELECT checksum_failures, checksum_last_failure,
+                   snapshot_tstamp
+            FROM pgstatviz.db
+            WHERE snapshot_tstamp BETWEEN %s AND %s{where}
+            ORDER BY snapshot_tstamp""",
+        daterange, params, cache_dir)
     if not data:
         raise SystemExit("No pg_statviz snapshots found in this database")
 
     tstamps = [t['snapshot_tstamp'] for t in data]
+    # Snapshots that skipped the db component, drawn as gaps
+    skipped = get_skipped(conn, info, 'db', daterange)
     failures = [t['checksum_failures'] if t['checksum_failures'] is not None
                 else 0 for t in data]
     findings = []
@@ -92,12 +127,9 @@ def checksum(*, dbname=getpass.getuser(), host="/var/run/postgresql",
     checksum_frame = DataFrame(
         data={'failures': failures},
         index=tstamps, copy=False)
-    if len(tstamps) > plot.MAX_POINTS:
-        q = str(round(
-            (tstamps[-1] - tstamps[0]).total_seconds() / plot.MAX_POINTS, 2))
-        r = checksum_frame.resample(q + "s").max()
-    else:
-        r = checksum_frame
+    r = plot.downsample(checksum_frame, 'max',
+                        method=downsample, points=max_points,
+                        gaps=skipped)
 
     report_sections = []
 
@@ -117,9 +149,9 @@ def checksum(*, dbname=getpass.getuser(), host="/var/run/postgresql",
     outfile = f"""{
         outputdir.rstrip("/") + "/" if outputdir
         else ''}pg_statviz_{info['hostname']
-                            .replace("/", "-")}_{port}_checksum.png"""
+                            .replace("/", "-")}_{port}_checksum.{format}"""
     _logger.info(f"Saving {outfile}")
-    plt.savefig(outfile)
+    plot.save(outfile, dpi, optimize)
     run_chart_analysis(
         report_sections, ai, r, "Checksum Failures",
         metric_description="Data page checksum failures. ANY non-zero value "
@@ -130,8 +162,11 @@ def checksum(*, dbname=getpass.getuser(), host="/var/run/postgresql",
         outfile=outfile,
         info=info,
         findings=findings,
+        batch=ai_batch,
+        limits={'*': 0},
     )
 
     finalize_module_report(outputdir, info, port, 'checksum',
-                           report_sections)
+                           report_sections, single_file)
+    manifest.record(outputdir, info, port, 'checksum', fp)
     mpclose('all')
@@ -0,0 +1,499 @@
+"""
+pg_statviz - stats visualization and time series analysis
+
+Collector for servers that can't take their own snapshots, such as
+read-only hot standbys: it runs the catalog queries of the snapshot_*
+functions of the extension against the server without writing to it, and
+bulk-loads the results with COPY into a repository database (where
+pg_statviz 1.3+ is installed) as snapshots of that source host. The
+analysis modules then read them with --source-host.
+"""
+
+__author__ = "Jimmy Angelakos"
+__copyright__ = "Copyright (c) 2026 Jimmy Angelakos"
+__license__ = "PostgreSQL License"
+
+import getpass
+import logging
+import socket
+import time
+import psycopg
+from argh.decorators import arg
+from psycopg.conninfo import conninfo_to_dict
+from psycopg.types.json import Jsonb
+from pg_statviz.libs import profiler
+from pg_statviz.libs.dbconn import dbconn
+from pg_statviz.libs.info import ext_version_at_least
+
+
+logging.basicConfig()
+_logger = logging.getLogger(__name__)
+_logger.setLevel(logging.INFO)
+
+
+# Settings recorded by snapshot_conf()
+CONF_SETTINGS = (
+    'autovacuum', 'autovacuum_max_workers', 'autovacuum_naptime',
+    'autovacuum_work_mem', 'bgwriter_delay', 'bgwriter_lru_maxpages',
+    'bgwriter_lru_multiplier', 'checkpoint_completion_target',
+    'checkpoint_timeout', 'max_connections', 'max_wal_size',
+    'max_wal_senders', 'work_mem', 'maintenance_work_mem',
+    'max_replication_slots', 'max_parallel_workers',
+    'max_parallel_maintenance_workers', 'server_version_num',
+    'shared_buffers', 'vacuum_cost_delay', 'vacuum_cost_limit',
+    'effective_wal_level', 'io_min_workers', 'io_max_workers',
+    'io_worker_idle_timeout', 'io_worker_launch_interval',
+    'autovacuum_max_parallel_workers', 'autovacuum_vacuum_score_weight',
+    'autovacuum_vacuum_insert_score_weight',
+    'autovacuum_analyze_score_weight', 'autovacuum_freeze_score_weight',
+    'autovacuum_multixact_freeze_score_weight')
+
+# The WAL position replication is measured against: pg_current_wal_lsn()
+# can't be called during recovery, where WAL is replayed rather than written
+CURRENT_LSN = """CASE WHEN pg_is_in_recovery()
+                      THEN pg_last_wal_replay_lsn()
+                      ELSE pg_current_wal_lsn()
+                 END"""
+
+# The SELECT of each snapshot_* function, as (minimum server_version_num,
+# query) from the newest server release down, returning the columns of the
+# pgstatviz table of the same name except snapshot_tstamp
+QUERIES = {
+    'buf': [
+        (170000, """
+            SELECT
+                c.num_timed AS checkpoints_timed,
+                c.num_requested AS checkpoints_req,
+                c.write_time AS checkpoint_write_time,
+                c.sync_time AS checkpoint_sync_time,
+                c.buffers_written AS buffers_checkpoint,
+                b.buffers_clean,
+                b.maxwritten_clean,
+                i.writes AS buffers_backend,
+                i.fsyncs AS buffers_backend_fsync,
+                b.buffers_alloc,
+                b.stats_reset
+            FROM pg_stat_bgwriter b, pg_stat_checkpointer c, pg_stat_io i
+            WHERE i.backend_type = 'client backend'
+            AND i.context = 'normal'
+            AND i.object = 'relation'"""),
+        (0, """
+            SELECT
+                checkpoints_timed,
+                checkpoints_req,
+                checkpoint_write_time,
+                checkpoint_sync_time,
+                buffers_checkpoint,
+                buffers_clean,
+                maxwritten_clean,
+                buffers_backend,
+                buffers_backend_fsync,
+                buffers_alloc,
+                stats_reset
+            FROM pg_stat_bgwriter""")],
+    'conf': [
+        (0, """
+            SELECT jsonb_object_agg("name", "setting") AS conf
+            FROM pg_settings
+            WHERE "name" = ANY(%s)""")],
+    'conn': [
+        (0, """
+            WITH
+                pgsa AS (
+                    SELECT *
+                    FROM pg_stat_activity
+                    WHERE datname = current_database()
+                    AND state IS NOT NULL),
+                userconns AS (
+                    SELECT jsonb_agg(uc)
+                    FROM (
+                        SELECT usename AS user, count(*) AS connections
+                        FROM pgsa
+                        WHERE usename IS NOT NULL
+                        GROUP BY usename) uc),
+                maxages AS (
+                    SELECT
+                        date_part('epoch', max(clock_timestamp()
+                                               - query_start))
+                            AS max_query_age,
+                        date_part('epoch', max(clock_timestamp()
+                                               - xact_start))
+                            AS max_xact_age,
+                        date_part('epoch', max(clock_timestamp()
+                                               - backend_start))
+                            AS max_backend_age
+                    FROM pgsa
+                    WHERE state != 'idle')
+            SELECT
+                count(*) AS conn_total,
+                count(*) FILTER (WHERE state = 'active') AS conn_active,
+                count(*) FILTER (WHERE state = 'idle') AS conn_idle,
+                count(*) FILTER (WHERE state = 'idle in transaction')
+                    AS conn_idle_trans,
+                count(*) FILTER (WHERE state = 'idle in transaction (aborted)')
+                    AS conn_idle_trans_abort,
+                count(*) FILTER (WHERE state = 'fastpath function call')
+                    AS conn_fastpath,
+                (SELECT * FROM userconns) AS conn_users,
+                (SELECT max_query_age FROM maxages) AS max_query_age_seconds,
+                (SELECT max_xact_age FROM maxages) AS max_xact_age_seconds,
+                (SELECT max_backend_age FROM maxages)
+                    AS max_backend_age_seconds
+            FROM pgsa""")],
+    'db': [
+        (0, """
+            SELECT
+                xact_commit,
+                xact_rollback,
+                blks_read,
+                blks_hit,
+                tup_returned,
+                tup_fetched,
+                tup_inserted,
+                tup_updated,
+                tup_deleted,
+                temp_files,
+                temp_bytes,
+                stats_reset,
+                current_setting('block_size')::int AS block_size,
+                pg_postmaster_start_time() AS postmaster_start_time,
+                checksum_failures,
+                checksum_last_failure
+            FROM pg_stat_database
+            WHERE datname = current_database()""")],
+    'io': [
+        (180000, """
+            WITH
+                pgsi AS (
+                    SELECT
+                        backend_type, object, context,
+                        reads, read_time, read_bytes,
+                        writes, write_time, write_bytes,
+                        writebacks, writeback_time,
+                        extends, extend_time, extend_bytes,
+                        hits, evictions, reuses, fsyncs, fsync_time,
+                        stats_reset
+                    FROM pg_stat_io
+                    WHERE NOT (reads = 0 AND writes = 0))
+            SELECT
+                (SELECT jsonb_agg(io) FROM pgsi io) AS io_stats,
+                (SELECT stats_reset FROM pgsi LIMIT 1) AS stats_reset"""),
+        (160000, """
+            WITH
+                pgsi AS (
+                    SELECT
+                        backend_type, object, context,
+                        reads, read_time,
+                        writes, write_time,
+                        writebacks, writeback_time,
+                        extends, extend_time,
+                        hits, evictions, reuses, fsyncs, fsync_time,
+                        stats_reset
+                    FROM pg_stat_io
+                    WHERE NOT (reads = 0 AND writes = 0))
+            SELECT
+                (SELECT jsonb_agg(io) FROM pgsi io) AS io_stats,
+                (SELECT stats_reset FROM pgsi LIMIT 1) AS stats_reset""")],
+    'lock': [
+        (0, """
+            WITH
+                pgl AS (
+                    SELECT *
+                    FROM pg_locks l, pg_database d
+                    WHERE d.datname = current_database()
+                    AND l.database = oid
+                    AND locktype = 'relation'
+                    AND pid != pg_backend_pid()),
+                lcks AS (
+                    SELECT coalesce(jsonb_agg(l), '[]'::jsonb)
+                    FROM (
+                        SELECT mode AS lock_mode, count(*) AS lock_count
+                        FROM pgl
+                        GROUP BY lock_mode) l)
+            SELECT
+                count(*) AS locks_total,
+                (SELECT * FROM lcks) AS locks
+            FROM pgl""")],
+    'blocking': [
+        (0, """
+            WITH
+                blk AS (
+                    SELECT DISTINCT
+                        blocked.pid AS blocked_pid,
+                        l.locktype AS lock_type,
+                        bp.pid AS blocking_pid
+                    FROM pg_catalog.pg_stat_activity blocked
+                    JOIN pg_catalog.pg_locks l
+                        ON l.pid = blocked.pid AND NOT l.granted
+                    CROSS JOIN LATERAL unnest(pg_blocking_pids(blocked.pid))
+                        AS bp(pid)
+                    WHERE blocked.datname = current_database()
+                    AND blocked.pid != pg_backend_pid()),
+                blocks AS (
+                    SELECT coalesce(jsonb_agg(b), '[]'::jsonb)
+                    FROM (
+                        SELECT lock_type,
+                               count(DISTINCT blocked_pid) AS blocked_count
+                        FROM blk
+                        GROUP BY lock_type) b)
+            SELECT
+                count(DISTINCT blocked_pid) AS blocked_total,
+                count(DISTINCT blocking_pid) AS blockers_total,
+                (SELECT * FROM blocks) AS blocking
+            FROM blk""")],
+    'repl': [
+        (0, f"""
+            SELECT
+                (SELECT jsonb_agg(jsonb_build_object(
+                    'application_name', application_name,
+                    'state', state,
+                    'sync_state', sync_state,
+                    'lag_bytes', pg_wal_lsn_diff({CURRENT_LSN}, sent_lsn),
+                    'lag_seconds', date_part('epoch',
+                                             clock_timestamp() - reply_time)))
+                 FROM pg_stat_replication) AS standby_lag,
+                (SELECT jsonb_agg(jsonb_build_object(
+                    'slot_name', slot_name,
+                    'slot_type', slot_type,
+                    'active', active,
+                    'wal_bytes', pg_wal_lsn_diff({CURRENT_LSN}, restart_lsn)))
+                 FROM pg_replication_slots
+                 WHERE slot_type = 'physical'
+                    OR database = current_database()) AS slot_stats""")],
+    'slru': [
+        (0, """
+            SELECT jsonb_agg(jsonb_build_object(
+                'name', name,
+                'blks_zeroed', blks_zeroed,
+                'blks_hit', blks_hit,
+                'blks_read', blks_read,
+                'blks_written', blks_written,
+                'blks_exists', blks_exists,
+                'flushes', flushes,
+                'truncates', truncates)) AS slru_stats
+            FROM pg_stat_slru""")],
+    'wait': [
+        (0, """
+            WITH
+                pgsa AS (
+                    SELECT *
+                    FROM pg_stat_activity
+                    WHERE datname = current_database()
+                    AND state = 'active'
+                    AND wait_event IS NOT NULL),
+                waitevents AS (
+                    SELECT coalesce(jsonb_agg(we), '[]'::jsonb)
+                    FROM (
+                        SELECT wait_event_type, wait_event,
+                               count(*) AS wait_event_count
+                        FROM pgsa
+                        GROUP BY wait_event_type, wait_event) we)
+            SELECT
+                count(*) AS wait_events_total,
+                (SELECT * FROM waitevents) AS wait_events
+            FROM pgsa""")],
+    'wal': [
+        (190000, """
+            SELECT
+                w.wal_records,
+                w.wal_fpi,
+                w.wal_fpi_bytes,
+                w.wal_bytes,
+                w.wal_buffers_full,
+                sum(io.writes) AS wal_write,
+                sum(io.fsyncs) AS wal_sync,
+                sum(io.write_time) AS wal_write_time,
+                sum(io.fsync_time) AS wal_sync_time,
+                w.stats_reset
+            FROM pg_stat_wal w, pg_stat_io io
+            WHERE io.object = 'wal'
+            GROUP BY w.wal_records, w.wal_fpi, w.wal_fpi_bytes, w.wal_bytes,
+                     w.wal_buffers_full, w.stats_reset"""),
+        (180000, """
+            SELECT
+                w.wal_records,
+                w.wal_fpi,
+                w.wal_bytes,
+                w.wal_buffers_full,
+                sum(io.writes) AS wal_write,
+                sum(io.fsyncs) AS wal_sync,
+                sum(io.write_time) AS wal_write_time,
+                sum(io.fsync_time) AS wal_sync_time,
+                w.stats_reset
+            FROM pg_stat_wal w, pg_stat_io io
+            WHERE io.object = 'wal'
+            GROUP BY w.wal_records, w.wal_fpi, w.wal_bytes,
+                     w.wal_buffers_full, w.stats_reset"""),
+        (140000, """
+            SELECT
+                wal_records,
+                wal_fpi,
+                wal_bytes,
+                wal_buffers_full,
+                wal_write,
+                wal_sync,
+                wal_write_time,
+                wal_sync_time,
+                stats_reset
+            FROM pg_stat_wal""")],
+}
+
+
+@arg('-d', '--dbname', help="database name to collect from")
+@arg('-h', '--host', metavar="HOSTNAME",
+     help="database server host or socket directory to collect from")
+@arg('-p', '--port', help="database server port")
+@arg('-U', '--username', help="database user name")
+@arg('-W', '--password', action='store_true',
+     help="force password prompt (should happen automatically)")
+@arg('-R', '--repository', metavar='CONNINFO', required=True,
+     help="connection string of the repository database to load the "
+          + "snapshots into, e.g. 'host=central dbname=stats'")
+@arg('--source-host', metavar='HOSTNAME',
+     help="name to record the snapshots under in the repository, if not "
+          + "the host (or this machine's name, for a socket directory)")
+@arg('--interval', type=int, metavar='SECONDS',
+     help="keep collecting a snapshot every SECONDS until interrupted")
+@arg('--profile', metavar='FILE', help=profiler.PROFILE_HELP)
+@profiler.command
+def collect(*, dbname=getpass.getuser(), host="/var/run/postgresql",
+            port="5432", username=getpass.getuser(), password=None,
+            repository=None, source_host=None, interval=None, profile=None):
+    "collect snapshots from a server, e.g. a standby, into a repository"
+
+    conn_details = {'dbname': dbname, 'user': username,
+                    'password': getpass.getpass("Password: ") if password
+                    else password, 'host': host, 'port': port}
+    source = dbconn(**conn_details)
+    # Never write to the source: it may be a hot standby
+    source.read_only = True
+    repo = conninfo_conn(repository)
+    check_repository(repo)
+    source_host = source_host or source_name(host)
+
+    while True:
+        tstamp = collect_snapshot(source, repo, source_host)
+        _logger.info(f"Collected snapshot {tstamp} from {source_host}")
+        if not interval:
+            break
+        try:
+            time.sleep(interval)
+        except KeyboardInterrupt:
+            break
+
+
+# A connection from a libpq connection string, e.g. 'host=central dbname=x'
+def conninfo_conn(conninfo):
+    details = {'dbname': None, 'user': None, 'password': None, 'host': None,
+               'port': None}
+    details.update(conninfo_to_dict(conninfo))
+    return dbconn(**details)
+
+
+# Snapshots are recorded under the server's host name, or this machine's
+# for a socket directory
+def source_name(host):
+    return socket.gethostname() if not host or host.startswith('/') \
+        else host
+
+
+# The repository must have the source column of pg_statviz 1.3
+def check_repository(repo):
+    cur = repo.cursor()
+    cur.execute("""SELECT extversion AS ext_version
+                   FROM pg_extension
+                   WHERE extname = 'pg_statviz'""")
+    row = cur.fetchone()
+    cur.close()
+    if not ext_version_at_least(row, '1.3'):
+        raise SystemExit("The repository database needs pg_statviz extension "
+                         + "1.3 or later installed")
+
+
+def queries(version):
+    """{component: query} of the snapshot components a server with
+    server_version_num `version` has, in the order snapshot() takes them."""
+    found = {}
+    for component, candidates in QUERIES.items():
+        for since, query in candidates:
+            if version >= since:
+                found[component] = query
+                break
+    return found
+
+
+# Like snapshot_conf(), the configuration is only kept when it changed since
+# the last snapshot of the same source
+def last_conf(repo, source_host):
+    cur = repo.cursor()
+    cur.execute("""SELECT c.conf
+                   FROM pgstatviz.conf c
+                   JOIN pgstatviz.snapshots s USING (snapshot_tstamp)
+                   WHERE s.source = %s
+                   ORDER BY c.snapshot_tstamp DESC
+                   LIMIT 1""", (source_host,))
+    row = cur.fetchone()
+    cur.close()
+    return row['conf'] if row else None
+
+
+# jsonb values come back as Python objects and need wrapping to be copied
+def _adapt(value):
+    return Jsonb(value) if isinstance(value, (dict, list)) else value
+
+
+@profiler.traced('db')
+def collect_snapshot(source, repo, source_host):
+    """Take one snapshot of `source` with the snapshot_* queries, each timed
+    and skipped on error like snapshot() does, and load it into `repo` as a
+    snapshot of `source_host`. Returns its timestamp."""
+    cur = source.cursor()
+    cur.execute("""SELECT clock_timestamp() AS tstamp,
+                          current_setting('server_version_num')::int
+                              AS version""")
+    row = cur.fetchone()
+    tstamp = row['tstamp']
+    rows, stats = {}, []
+    for component, query in queries(row['version']).items():
+        started = time.perf_counter()
+        skipped = None
+        try:
+            cur.execute(query, (list(CONF_SETTINGS),)
+                        if component == 'conf' else None)
+            rows[component] = cur.fetchall()
+            if component == 'conf' and \
+                    rows['conf'][0]['conf'] == last_conf(repo, source_host):
+                rows['conf'] = []
+        except psycopg.Error as e:
+            source.rollback()
+            skipped = f"error: {str(e).splitlines()[0]}"
+            _logger.warning(f"pg_statviz snapshot skipped {component}: {e}")
+        stats.append([component, 1000 * (time.perf_counter() - started),
+                      len(rows.get(component, [])), skipped])
+    # End the read-only transaction, so the next snapshot sees fresh stats
+    source.rollback()
+    cur.close()
+
+    rcur = repo.cursor()
+    rcur.execute("""INSERT INTO pgstatviz.snapshots (snapshot_tstamp, source)
+                    VALUES (%s, %s)""", (tstamp, source_host))
+    for component, data in rows.items():
+        if not data:
+            continue
+        columns = list(data[0])
+        with rcur.copy(f"""COPY pgstatviz.{component}
+                           (snapshot_tstamp, {', '.join(columns)})
+                           FROM STDIN""") as copy:
+            for r in data:
+                copy.write_row([tstamp, *(_adapt(r[c]) for c in columns)])
+    stats.append(['total', sum(s[1] for s in stats),
+                  sum(s[2] for s in stats), None])
+    with rcur.copy("""COPY pgstatviz.snapshot_stats
+                      (snapshot_tstamp, component, duration_ms, rows_written,
+                       skipped)
+                      FROM STDIN""") as copy:
+        for s in stats:
+            copy.write_row([tstamp, *s])
+    repo.commit()
+    rcur.close()
+    return tstamp
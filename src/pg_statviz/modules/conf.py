@@ -12,13 +12,15 @@ import logging
 from argh.decorators import arg
 from dateutil.parser import isoparse
 from matplotlib.pyplot import close as mpclose
-from pg_statviz.libs import plot
-from pg_statviz.libs.ai import (AI_HELP, AI_PROVIDERS,
+from pg_statviz.libs import manifest, plot, profiler, snapcache
+from pg_statviz.libs.ai import (AI_BATCH, AI_BATCH_HELP, AI_HELP,
+                                AI_PROVIDERS,
                                 DEFAULT_AI_PROVIDER,
                                 run_chart_analysis)
 from pg_statviz.libs.dbconn import dbconn
-from pg_statviz.libs.html_report import finalize_module_report
-from pg_statviz.libs.info import getinfo
+from pg_statviz.libs.html_report import (SINGLE_FILE_HELP, check_single_file,
+                                         finalize_module_report)
+from pg_statviz.libs.info import SOURCE_HOST_HELP, getinfo, source_filter
 
 
 def get_config_diff(prev_conf, curr_conf):
@@ -50,24 +52,39 @@ def get_config_diff(prev_conf, curr_conf):
 @arg('--ai', nargs='?', const=DEFAULT_AI_PROVIDER, default=None,
      choices=AI_PROVIDERS, metavar='PROVIDER',
      help=AI_HELP)
+@arg('--ai-batch', type=int, nargs='?', const=AI_BATCH, metavar='N',
+     help=AI_BATCH_HELP)
 @arg('--info', help=argparse.SUPPRESS)
 @arg('--conn', help=argparse.SUPPRESS)
+@arg('--dpi', type=int, help=plot.DPI_HELP)
+@arg('--format', choices=plot.FORMATS, help=plot.FORMAT_HELP)
+@arg('--optimize', action='store_true', help=plot.OPTIMIZE_HELP)
+@arg('--single-file', action='store_true', help=SINGLE_FILE_HELP)
+@arg('--incremental', action='store_true', help=manifest.INCREMENTAL_HELP)
+@arg('--cache-dir', metavar='DIR', help=snapcache.CACHE_DIR_HELP)
+@arg('--source-host', metavar='HOSTNAME', help=SOURCE_HOST_HELP)
+@arg('--profile', metavar='FILE', help=profiler.PROFILE_HELP)
+@profiler.command
 def conf(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
          username=getpass.getuser(), password=None, daterange=[],
-         outputdir=None, ai=None, info=None, conn=None):
+         outputdir=None, ai=None, ai_batch=0, info=None, conn=None,
+         dpi=plot.DPI, format=plot.FORMAT, optimize=False,
+         single_file=False, incremental=False, cache_dir=None,
+         source_host=None, profile=None):
     "run configuration changes analysis module"
 
     logging.basicConfig()
     _logger = logging.getLogger(__name__)
     _logger.setLevel(logging.INFO)
 
+    check_single_file(single_file, ai)
     if not conn:
         conn_details = {'dbname': dbname, 'user': username,
                         'password': getpass.getpass("Password: ") if password
                         else password, 'host': host, 'port': port}
         conn = dbconn(**conn_details)
     if not info:
-        info = getinfo(conn)
+        info = getinfo(conn, source_host)
 
     _logger.info("Running configuration changes analysis")
 
@@ -78,24 +95,34 @@ def conf(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
     else:
         daterange = ['-infinity', 'now()']
 
+    fp = manifest.fingerprint(conn, ['conf'], daterange, ai=ai, dpi=dpi,
+                              format=format, optimize=optimize,
+                              single_file=single_file, info=info)
+    if incremental and manifest.unchanged(outputdir, info, port, 'conf', fp):
+        _logger.info("Snapshots and options unchanged since the last run, "
+                     + "skipping")
+        return
+
+    where, params = source_filter(info)
     cur = conn.cursor()
 
     # Get baseline config (first config <= start of range)
-    cur.execute("""SELECT conf, snapshot_tstamp
-                   FROM pgstatviz.conf
-                   WHERE snapshot_tstamp <= %s
-                   ORDER BY snapshot_tstamp DESC
-                   LIMIT 1""",
-                (daterange[0],))
+    cur.execute(f"""SELECT conf, snapshot_tstamp
+                    FROM pgstatviz.conf
+                    WHERE snapshot_tstamp <= %s{where}
+                    ORDER BY snapshot_tstamp DESC
+                    LIMIT 1""",
+                (daterange[0], *params))
     baseline = cur.fetchone()
 
     # Get config changes within the date range
-    cur.execute("""SELECT conf, snapshot_tstamp
-                   FROM pgstatviz.conf
-                   WHERE snapshot_tstamp BETWEEN %s AND %s
-                   ORDER BY snapshot_tstamp""",
-                (daterange[0], daterange[1]))
-    data = cur.fetchall()
+    data = snapcache.fetch(
+        conn, info, 'conf',
+        f"""SELECT conf, snapshot_tstamp
+            FROM pgstatviz.conf
+            WHERE snapshot_tstamp BETWEEN %s AND %s{where}
+            ORDER BY snapshot_tstamp""",
+        daterange, params, cache_dir)
 
     if not data and not baseline:
         _logger.warning("No config snapshots found, skipping")
@@ -152,9 +179,9 @@ def conf(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
     outfile = f"""{
         outputdir.rstrip("/") + "/" if outputdir
         else ''}pg_statviz_{info['hostname']
-                            .replace("/", "-")}_{port}_conf.png"""
+                            .replace("/", "-")}_{port}_conf.{format}"""
     _logger.info(f"Saving {outfile}")
-    plt.savefig(outfile)
+    plot.save(outfile, dpi, optimize)
 
     report_sections = []
     if ai:
@@ -182,8 +209,10 @@ def conf(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
                                    "lowered.",
                 outfile=outfile,
                 info=info,
+                batch=ai_batch,
             )
 
     finalize_module_report(outputdir, info, port, 'conf',
-                           report_sections)
+                           report_sections, single_file)
+    manifest.record(outputdir, info, port, 'conf', fp)
     mpclose('all')
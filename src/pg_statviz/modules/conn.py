@@ -14,13 +14,18 @@ from dateutil.parser import isoparse
 from matplotlib.pyplot import close as mpclose
 from matplotlib.ticker import MaxNLocator
 from pandas import DataFrame
-from pg_statviz.libs import plot
-from pg_statviz.libs.ai import (AI_HELP, AI_PROVIDERS,
+from pg_statviz.libs import manifest, plot, profiler, snapcache
+from pg_statviz.libs.ai import (AI_BATCH, AI_BATCH_HELP, AI_HELP,
+                                AI_PROVIDERS,
                                 DEFAULT_AI_PROVIDER,
                                 run_chart_analysis)
 from pg_statviz.libs.dbconn import dbconn
-from pg_statviz.libs.html_report import finalize_module_report
-from pg_statviz.libs.info import getinfo, get_settings
+from pg_statviz.libs.html_report import (SINGLE_FILE_HELP, check_single_file,
+                                         finalize_module_report)
+from pg_statviz.libs.info import (SOURCE_HOST_HELP, getinfo, get_settings,
+                                  get_skipped, source_filter)
+from pg_statviz.libs.pivot import pivot_frame, top_series
+from pg_statviz.libs.seasonal import report_seasonal
 
 
 @arg('-d', '--dbname', help="database name to analyze")
@@ -37,28 +42,51 @@ from pg_statviz.libs.info import getinfo, get_settings
 @arg('--ai', nargs='?', const=DEFAULT_AI_PROVIDER, default=None,
      choices=AI_PROVIDERS, metavar='PROVIDER',
      help=AI_HELP)
+@arg('--ai-batch', type=int, nargs='?', const=AI_BATCH, metavar='N',
+     help=AI_BATCH_HELP)
 @arg('--info', help=argparse.SUPPRESS)
 @arg('--conn', help=argparse.SUPPRESS)
 @arg('-u', '--users', help="user name(s) to plot in analysis",
      nargs='*', type=str)
+@arg('--max-series', type=int, metavar='N', help=plot.MAX_SERIES_HELP)
+@arg('--max-points', type=int, metavar='N', help=plot.MAX_POINTS_HELP)
+@arg('--downsample', choices=plot.DOWNSAMPLERS, help=plot.DOWNSAMPLE_HELP)
+@arg('--dpi', type=int, help=plot.DPI_HELP)
+@arg('--format', choices=plot.FORMATS, help=plot.FORMAT_HELP)
+@arg('--optimize', action='store_true', help=plot.OPTIMIZE_HELP)
+@arg('--single-file', action='store_true', help=SINGLE_FILE_HELP)
+@arg('--incremental', action='store_true', help=manifest.INCREMENTAL_HELP)
+@arg('--cache-dir', metavar='DIR', help=snapcache.CACHE_DIR_HELP)
+@arg('--source-host', metavar='HOSTNAME', help=SOURCE_HOST_HELP)
+@arg('--seasonal', choices=plot.SEASONS, help=plot.SEASONAL_HELP)
+@arg('--profile', metavar='FILE', help=profiler.PROFILE_HELP)
+@profiler.command
 def conn(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
          username=getpass.getuser(), password=None, daterange=[],
-         outputdir=None, ai=None, info=None, conn=None, users=[]):
+         outputdir=None, ai=None, ai_batch=0, info=None, conn=None, users=[],
+         max_series=plot.MAX_SERIES, max_points=plot.MAX_POINTS,
+         downsample=plot.DOWNSAMPLE,
+         dpi=plot.DPI, format=plot.FORMAT, optimize=False,
+         single_file=False, incremental=False, cache_dir=None,
+         source_host=None, seasonal=None, profile=None):
     "run connection count analysis module"
 
     logging.basicConfig()
     _logger = logging.getLogger(__name__)
     _logger.setLevel(logging.INFO)
 
+    check_single_file(single_file, ai)
     if not conn:
         conn_details = {'dbname': dbname, 'user': username,
                         'password': getpass.getpass("Password: ") if password
                         else password, 'host': host, 'port': port}
         conn = dbconn(**conn_details)
     if not info:
-        info = getinfo(conn)
+        info = getinfo(conn, source_host)
 
     _logger.info("Running connection count analysis")
+    # Seasonal charts are reported apart from the timelines
+    name = f"conn-{seasonal}" if seasonal else 'conn'
 
     if daterange:
         daterange = [isoparse(d) for d in daterange]
@@ -67,22 +95,35 @@ def conn(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
     else:
         daterange = ['-infinity', 'now()']
 
+    fp = manifest.fingerprint(conn, ['conn'], daterange, ai=ai, users=users,
+                              max_series=max_series, max_points=max_points,
+                              downsample=downsample, dpi=dpi, format=format,
+                              optimize=optimize, single_file=single_file,
+                              seasonal=seasonal, info=info)
+    if incremental and manifest.unchanged(outputdir, info, port, name, fp):
+        _logger.info("Snapshots and options unchanged since the last run, "
+                     + "skipping")
+        return
+
     # Retrieve the snapshots from DB
-    cur = conn.cursor()
-    cur.execute("""SELECT conn_total, conn_active, conn_idle, conn_idle_trans,
-                          conn_idle_trans_abort, conn_fastpath, conn_users,
-                          max_query_age_seconds, max_xact_age_seconds,
-                          max_backend_age_seconds, snapshot_tstamp
-                   FROM pgstatviz.conn
-                   WHERE snapshot_tstamp BETWEEN %s AND %s
-                   ORDER BY snapshot_tstamp""",
-                (daterange[0], daterange[1]))
-    data = cur.fetchall()
+    where, params = source_filter(info)
+    data = snapcache.fetch(
+        conn, info, 'conn',
+        f"""SELECT conn_total, conn_active, conn_idle, conn_idle_trans,
+                   conn_idle_trans_abort, conn_fastpath, conn_users,
+                   max_query_age_seconds, max_xact_age_seconds,
+                   max_backend_age_seconds, snapshot_tstamp
+            FROM pgstatviz.conn
+            WHERE snapshot_tstamp BETWEEN %s AND %s{where}
+            ORDER BY snapshot_tstamp""",
+        daterange, params, cache_dir)
     if not data:
         raise SystemExit("No pg_statviz snapshots found in this database")
 
     tstamps = [t['snapshot_tstamp'] for t in data]
-    settings = get_settings(conn, ['max_connections'])
+    # Snapshots that skipped the conn component, drawn as gaps
+    skipped = get_skipped(conn, info, 'conn', daterange)
+    settings = get_settings(conn, ['max_connections'], info)
     total = [c['conn_total'] for c in data]
     ca = [c['conn_active'] for c in data]
     ci = [c['conn_idle'] for c in data]
@@ -99,6 +140,13 @@ def conn(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
                        if c['max_backend_age_seconds'] is not None else 0
                        for c in data]
 
+    # Pivot connections per user in one pass, limited to the requested
+    # users if any were given, or else to the busiest ones
+    uc_frame = pivot_frame([d['conn_users'] for d in data], tstamps, 'user',
+                           'connections', keys=users or None)
+    if not users:
+        uc_frame = top_series(uc_frame, max_series)
+
     # Downsample if needed
     conn_frame = DataFrame(
         data={'total': total,
@@ -108,19 +156,32 @@ def conn(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
               'cita': cita,
               'cf': cf},
         index=tstamps, copy=False)
-    if len(tstamps) > plot.MAX_POINTS:
-        q = str(round(
-            (tstamps[-1] - tstamps[0]).total_seconds() / plot.MAX_POINTS, 2))
-        r = conn_frame.resample(q + "s").mean()
-    else:
-        r = conn_frame
 
-    # Get user names to plot
-    if not users:
-        for d in data:
-            for c in d['conn_users']:
-                if c['user'] not in users:
-                    users += c['user'],
+    if seasonal:
+        # A typical week of the connection counts at full resolution,
+        # instead of the timelines
+        report_seasonal(
+            conn_frame,
+            [("Connection/status count by hour of the week",
+              {c: label for c, label in (
+                  ('total', 'total'), ('ca', 'active'), ('ci', 'idle'),
+                  ('cit', 'idle in transaction'),
+                  ('cita', 'idle in transaction (aborted)'),
+                  ('cf', 'fastpath function call'))
+               if c == 'total' or any(conn_frame[c])})],
+            "No. of connections",
+            "Connection Status by Hour of the Week",
+            "Connection counts (point-in-time).",
+            name=name, fp=fp, info=info, port=port, outputdir=outputdir,
+            format=format, dpi=dpi, optimize=optimize, ai=ai,
+            ai_batch=ai_batch, single_file=single_file, settings=settings,
+            limits={})
+        return
+
+    r = plot.downsample(conn_frame, method=downsample, points=max_points,
+                        gaps=skipped)
+    ru = plot.downsample(uc_frame, method=downsample, points=max_points,
+                         gaps=skipped)
 
     report_sections = []
 
@@ -156,9 +217,9 @@ def conn(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
     outfile = f"""{
         outputdir.rstrip("/") + "/" if outputdir
         else ''}pg_statviz_{info['hostname']
-                            .replace("/", "-")}_{port}_conn_status.png"""
+                            .replace("/", "-")}_{port}_conn_status.{format}"""
     _logger.info(f"Saving {outfile}")
-    plt.savefig(outfile)
+    plot.save(outfile, dpi, optimize)
     if ai:
         # Only pass idle_in_transaction columns - those determine health status
         ai_df = r[['cit', 'cita']].rename(columns={
@@ -176,6 +237,8 @@ def conn(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
             outfile=outfile,
             info=info,
             settings=settings,
+            batch=ai_batch,
+            limits={'*': 1},
         )
 
     # Connection/user count plot
@@ -183,27 +246,9 @@ def conn(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
     plt.suptitle(f"pg_statviz · {info['hostname']}:{port}",
                  fontweight='semibold')
     plt.title('Connection/user count')
-    for u in users:
-        uc = []
-        for d in data:
-            found = False
-            for c in d['conn_users']:
-                if c['user'] == u:
-                    found = True
-                    uc += c['connections'],
-            if not found:
-                uc += 0,
-        # Downsample if needed
-        uc_frame = DataFrame(data={u: uc}, index=tstamps, copy=False)
-        if len(tstamps) > plot.MAX_POINTS:
-            q = str(round(
-                (tstamps[-1] - tstamps[0]).total_seconds()
-                / plot.MAX_POINTS, 2))
-            rr = uc_frame.resample(q + "s").mean()
-        else:
-            rr = uc_frame
-        if not all(c == 0 for c in rr[u]):
-            plt.plot(rr.index, rr[u], label=u)
+    for u in ru.columns:
+        if not all(c == 0 for c in ru[u]):
+            plt.plot(ru.index, ru[u], label=u)
     plt.xlabel("Timestamp", fontweight='semibold')
     plt.ylabel("No. of connections", fontweight='semibold')
     fig.axes[0].set_ylim(bottom=0)
@@ -213,9 +258,9 @@ def conn(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
     outfile = f"""{
         outputdir.rstrip("/") + "/" if outputdir
         else ''}pg_statviz_{info['hostname']
-                            .replace("/", "-")}_{port}_conn_user.png"""
+                            .replace("/", "-")}_{port}_conn_user.{format}"""
     _logger.info(f"Saving {outfile}")
-    plt.savefig(outfile)
+    plot.save(outfile, dpi, optimize)
     # Note: conn_user uses dynamic per-user DataFrames, skip AI here
 
     # Session activity age plot
@@ -225,12 +270,9 @@ def conn(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
               'max_xact_age': max_xact_age,
               'max_backend_age': max_backend_age},
         index=tstamps, copy=False)
-    if len(tstamps) > plot.MAX_POINTS:
-        q = str(round(
-            (tstamps[-1] - tstamps[0]).total_seconds() / plot.MAX_POINTS, 2))
-        ra = age_frame.resample(q + "s").max()
-    else:
-        ra = age_frame
+    ra = plot.downsample(age_frame, 'max',
+                         method=downsample, points=max_points,
+                         gaps=skipped)
 
     plt, fig = plot.setup()
     plt.suptitle(f"pg_statviz · {info['hostname']}:{port}",
@@ -253,9 +295,9 @@ def conn(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
     outfile = f"""{
         outputdir.rstrip("/") + "/" if outputdir
         else ''}pg_statviz_{info['hostname']
-                            .replace("/", "-")}_{port}_conn_age.png"""
+                            .replace("/", "-")}_{port}_conn_age.{format}"""
     _logger.info(f"Saving {outfile}")
-    plt.savefig(outfile)
+    plot.save(outfile, dpi, optimize)
     age_findings = []
     max_q = max(max_query_age) if max_query_age else 0
     max_x = max(max_xact_age) if max_xact_age else 0
@@ -288,8 +330,12 @@ def conn(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
         info=info,
         settings=settings,
         findings=age_findings,
+        batch=ai_batch,
+        # age_findings check the ages
+        limits={},
     )
 
-    finalize_module_report(outputdir, info, port, 'conn',
-                           report_sections)
+    finalize_module_report(outputdir, info, port, name,
+                           report_sections, single_file)
+    manifest.record(outputdir, info, port, name, fp)
     mpclose('all')
@@ -0,0 +1,230 @@
+"""
+pg_statviz - stats visualization and time series analysis
+
+Ingestion of the snapshots servers take themselves into a central
+repository database (where pg_statviz 1.3+ is installed), so their history
+doesn't have to stay on the production server it measures and several
+servers can be analyzed from one place with --source-host. Each run only
+copies the snapshots taken since the last one seen from that server. A
+server that can't be ingested is reported and the others still are.
+"""
+
+__author__ = "Jimmy Angelakos"
+__copyright__ = "Copyright (c) 2026 Jimmy Angelakos"
+__license__ = "PostgreSQL License"
+
+import logging
+import psycopg
+from datetime import timedelta
+from argh.decorators import arg
+from psycopg.conninfo import conninfo_to_dict
+from psycopg.rows import tuple_row
+from pg_statviz.libs import profiler
+from pg_statviz.modules.collect import (check_repository, conninfo_conn,
+                                        source_name)
+
+
+logging.basicConfig()
+_logger = logging.getLogger(__name__)
+_logger.setLevel(logging.INFO)
+
+
+# Snapshots read from a server and held in memory per COPY into the
+# repository
+BATCH = 1000
+
+# Tables holding the components of a snapshot, in the order they're copied
+TABLES = ('buf', 'conf', 'conn', 'db', 'io', 'lock', 'blocking', 'repl',
+          'slru', 'wait', 'wal', 'snapshot_stats', 'wait_sample')
+
+
+@arg('servers', nargs='+', metavar='SERVER',
+     help="connection string of a database with pg_statviz installed to "
+          + "ingest the snapshots of, e.g. 'host=db1 dbname=app'; they're "
+          + "recorded under its host name")
+@arg('-R', '--repository', metavar='CONNINFO', required=True,
+     help="connection string of the repository database to load the "
+          + "snapshots into, e.g. 'host=central dbname=stats'")
+@arg('--batch', type=int, metavar='N',
+     help="snapshots to copy at a time")
+@arg('--profile', metavar='FILE', help=profiler.PROFILE_HELP)
+@profiler.command
+def ingest(*servers, repository=None, batch=BATCH, profile=None):
+    "ingest new snapshots of several servers into a repository"
+
+    names = {}
+    for server in servers:
+        name = source_name(conninfo_to_dict(server).get('host'))
+        if name in names.values():
+            raise SystemExit(f"More than one server is named {name}: give "
+                             + "them distinct host names")
+        names[server] = name
+
+    repo = conninfo_conn(repository)
+    check_repository(repo)
+    repo_tables = columns(repo)
+    failed = []
+    for server, name in names.items():
+        source = None
+        try:
+            source = conninfo_conn(server)
+            source.read_only = True
+            count = ingest_server(source, repo, name, repo_tables, batch)
+        # Not connecting, or pg_statviz missing, exits with a message
+        except (psycopg.Error, SystemExit) as e:
+            repo.rollback()
+            _logger.error(f"Ingesting from {name} stopped: {e}")
+            failed.append(name)
+            continue
+        finally:
+            if source:
+                source.close()
+        _logger.info(f"Ingested {count} new snapshots from {name}")
+    if failed:
+        raise SystemExit(f"Could not ingest from {', '.join(failed)}")
+
+
+def columns(conn):
+    """{table: {column: type OID}} of the pgstatviz tables of `conn`, as the
+    extension version installed there has them."""
+    cur = conn.cursor(row_factory=tuple_row)
+    cur.execute("""SELECT c.relname, a.attname, a.atttypid
+                   FROM pg_attribute a
+                   JOIN pg_class c ON c.oid = a.attrelid
+                   JOIN pg_namespace n ON n.oid = c.relnamespace
+                   WHERE n.nspname = 'pgstatviz'
+                   AND c.relkind = 'r'
+                   AND a.attnum > 0
+                   AND NOT a.attisdropped
+                   ORDER BY c.relname, a.attnum""")
+    found = {}
+    for table, column, oid in cur.fetchall():
+        found.setdefault(table, {})[column] = oid
+    cur.close()
+    return found
+
+
+def plan(source_tables, repo_tables):
+    """{table: [column]} to copy: the component tables both sides have, with
+    the columns they share, so servers on older extension versions (or newer
+    ones than the repository) can still be ingested."""
+    return {table: [c for c in repo_tables[table]
+                    if c in source_tables[table]]
+            for table in TABLES
+            if table in source_tables and table in repo_tables}
+
+
+# The newest snapshot of `name` already in the repository
+def last_seen(repo, name):
+    cur = repo.cursor(row_factory=tuple_row)
+    cur.execute("""SELECT max(snapshot_tstamp)
+                   FROM pgstatviz.snapshots
+                   WHERE source = %s""", (name,))
+    tstamp = cur.fetchone()[0]
+    cur.close()
+    return tstamp
+
+
+def ingest_server(source, repo, name, repo_tables, batch=BATCH):
+    """Copy the snapshots `source` took after the newest one of `name` in
+    `repo`, `batch` at a time. Returns how many were copied."""
+    source_tables = columns(source)
+    if 'snapshots' not in source_tables:
+        raise SystemExit(f"pg_statviz is not installed on {name}")
+    tables = plan(source_tables, repo_tables)
+    # Only the server's own snapshots, not those it holds as a repository
+    local = 'source' in source_tables['snapshots']
+    since, count = last_seen(repo, name), 0
+    while True:
+        tstamps, data = fetch_batch(source, tables, since, local, batch)
+        if not tstamps:
+            return count
+        moved = dodge(repo, tstamps)
+        if moved:
+            _logger.warning(f"{len(moved)} snapshots of {name} were taken "
+                            + "at the same time as others in the "
+                            + "repository, recording them 1µs later")
+        write_batch(repo, name, tstamps, data, tables, repo_tables, moved)
+        since, count = tstamps[-1], count + len(tstamps)
+
+
+def dodge(repo, tstamps):
+    """{snapshot_tstamp: free snapshot_tstamp} for those of `tstamps` that
+    the repository already has a snapshot of another server at: the next
+    microsecond not taken. Snapshots are keyed on their timestamp alone, so
+    these would otherwise fail every batch they're in."""
+    step = timedelta(microseconds=1)
+    cur = repo.cursor(row_factory=tuple_row)
+    origin = {t: t for t in tstamps}
+    used, moved, pending = set(tstamps), {}, list(tstamps)
+    while pending:
+        cur.execute("""SELECT snapshot_tstamp
+                       FROM pgstatviz.snapshots
+                       WHERE snapshot_tstamp = ANY(%s)""", (pending,))
+        pending = []
+        for (taken,) in cur.fetchall():
+            free = taken + step
+            while free in used:
+                free += step
+            used.add(free)
+            origin[free] = origin.pop(taken)
+            moved[origin[free]] = free
+            pending.append(free)
+    cur.close()
+    return moved
+
+
+@profiler.traced('db')
+def fetch_batch(source, tables, since, local, batch=BATCH):
+    """The timestamps of up to `batch` snapshots after `since` and
+    {table: [row]} of their components, as `tables` columns."""
+    cur = source.cursor(row_factory=tuple_row)
+    cur.execute(f"""SELECT snapshot_tstamp
+                    FROM pgstatviz.snapshots
+                    WHERE snapshot_tstamp > %s{
+                        " AND source IS NULL" if local else ""}
+                    ORDER BY snapshot_tstamp
+                    LIMIT %s""", (since or '-infinity', batch))
+    tstamps = [r[0] for r in cur.fetchall()]
+    data = {}
+    for table, cols in tables.items():
+        if not tstamps:
+            break
+        cur.execute(f"""SELECT {', '.join(cols)}
+                        FROM pgstatviz.{table}
+                        WHERE snapshot_tstamp = ANY(%s)""", (tstamps,))
+        data[table] = cur.fetchall()
+    # End the read-only transaction rather than hold back vacuum on the
+    # server between batches
+    source.rollback()
+    cur.close()
+    return tstamps, data
+
+
+@profiler.traced('db')
+def write_batch(repo, name, tstamps, data, tables, types, moved=None):
+    """Load a batch into `repo` with binary COPY, as snapshots of `name`,
+    in one transaction. `types` is {table: {column: type OID}} of the
+    repository, which binary COPY needs the rows dumped as. `moved` maps
+    the snapshot_tstamp of snapshots to record at another (see dodge)."""
+    moved = moved or {}
+    cur = repo.cursor()
+    with cur.copy("""COPY pgstatviz.snapshots (snapshot_tstamp, source)
+                     FROM STDIN (FORMAT BINARY)""") as copy:
+        copy.set_types([types['snapshots']['snapshot_tstamp'],
+                        types['snapshots']['source']])
+        for tstamp in tstamps:
+            copy.write_row((moved.get(tstamp, tstamp), name))
+    for table, rows in data.items():
+        if not rows:
+            continue
+        with cur.copy(f"""COPY pgstatviz.{table} ({', '.join(tables[table])})
+                          FROM STDIN (FORMAT BINARY)""") as copy:
+            copy.set_types([types[table][c] for c in tables[table]])
+            key = tables[table].index('snapshot_tstamp')
+            for row in rows:
+                if row[key] in moved:
+                    row = (*row[:key], moved[row[key]], *row[key + 1:])
+                copy.write_row(row)
+    repo.commit()
+    cur.close()
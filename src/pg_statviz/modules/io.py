@@ -14,14 +14,18 @@ from argh.decorators import arg
 from dateutil.parser import isoparse
 from matplotlib.pyplot import close as mpclose
 from matplotlib.ticker import MaxNLocator
-from pandas import DataFrame
-from pg_statviz.libs import plot
-from pg_statviz.libs.ai import (AI_HELP, AI_PROVIDERS,
+from pandas import DataFrame, concat
+from pg_statviz.libs import manifest, plot, profiler, snapcache
+from pg_statviz.libs.ai import (AI_BATCH, AI_BATCH_HELP, AI_HELP,
+                                AI_PROVIDERS,
                                 DEFAULT_AI_PROVIDER,
                                 run_chart_analysis)
 from pg_statviz.libs.dbconn import dbconn
-from pg_statviz.libs.html_report import finalize_module_report
-from pg_statviz.libs.info import getinfo
+from pg_statviz.libs.html_report import (SINGLE_FILE_HELP, check_single_file,
+                                         finalize_module_report)
+from pg_statviz.libs.info import (SOURCE_HOST_HELP, getinfo, get_skipped,
+                                  source_filter)
+from pg_statviz.libs.pivot import pivot, top_series
 
 
 @arg('-d', '--dbname', help="database name to analyze")
@@ -38,24 +42,44 @@ from pg_statviz.libs.info import getinfo
 @arg('--ai', nargs='?', const=DEFAULT_AI_PROVIDER, default=None,
      choices=AI_PROVIDERS, metavar='PROVIDER',
      help=AI_HELP)
+@arg('--ai-batch', type=int, nargs='?', const=AI_BATCH, metavar='N',
+     help=AI_BATCH_HELP)
 @arg('--info', help=argparse.SUPPRESS)
 @arg('--conn', help=argparse.SUPPRESS)
+@arg('--max-series', type=int, metavar='N', help=plot.MAX_SERIES_HELP)
+@arg('--max-points', type=int, metavar='N', help=plot.MAX_POINTS_HELP)
+@arg('--downsample', choices=plot.DOWNSAMPLERS, help=plot.DOWNSAMPLE_HELP)
+@arg('--dpi', type=int, help=plot.DPI_HELP)
+@arg('--format', choices=plot.FORMATS, help=plot.FORMAT_HELP)
+@arg('--optimize', action='store_true', help=plot.OPTIMIZE_HELP)
+@arg('--single-file', action='store_true', help=SINGLE_FILE_HELP)
+@arg('--incremental', action='store_true', help=manifest.INCREMENTAL_HELP)
+@arg('--cache-dir', metavar='DIR', help=snapcache.CACHE_DIR_HELP)
+@arg('--source-host', metavar='HOSTNAME', help=SOURCE_HOST_HELP)
+@arg('--profile', metavar='FILE', help=profiler.PROFILE_HELP)
+@profiler.command
 def io(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
        username=getpass.getuser(), password=None, daterange=[],
-       outputdir=None, ai=None, info=None, conn=None):
+       outputdir=None, ai=None, ai_batch=0, info=None, conn=None,
+       max_series=plot.MAX_SERIES, max_points=plot.MAX_POINTS,
+       downsample=plot.DOWNSAMPLE,
+       dpi=plot.DPI, format=plot.FORMAT, optimize=False,
+       single_file=False, incremental=False, cache_dir=None, source_host=None,
+       profile=None):
     "run I/O analysis module"
 
     logging.basicConfig()
     _logger = logging.getLogger(__name__)
     _logger.setLevel(logging.INFO)
 
+    check_single_file(single_file, ai)
     if not conn:
         conn_details = {'dbname': dbname, 'user': username,
                         'password': getpass.getpass("Password: ") if password
                         else password, 'host': host, 'port': port}
         conn = dbconn(**conn_details)
     if not info:
-        info = getinfo(conn)
+        info = getinfo(conn, source_host)
 
     _logger.info("Running I/O analysis")
 
@@ -66,16 +90,27 @@ def io(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
     else:
         daterange = ['-infinity', 'now()']
 
+    fp = manifest.fingerprint(conn, ['io', 'db'], daterange, ai=ai,
+                              max_series=max_series, max_points=max_points,
+                              downsample=downsample, dpi=dpi, format=format,
+                              optimize=optimize, single_file=single_file,
+                              info=info)
+    if incremental and manifest.unchanged(outputdir, info, port, 'io', fp):
+        _logger.info("Snapshots and options unchanged since the last run, "
+                     + "skipping")
+        return
+
     # Retrieve the snapshots from DB
+    where, params = source_filter(info)
     cur = conn.cursor()
-    cur.execute("""SELECT io_stats, block_size, i.stats_reset, snapshot_tstamp
-                   FROM pgstatviz.io i
-                   JOIN pgstatviz.db USING (snapshot_tstamp)
-                   WHERE snapshot_tstamp BETWEEN %s AND %s
-                   ORDER BY snapshot_tstamp""",
-                (daterange[0], daterange[1]))
-
-    data = cur.fetchall()
+    data = snapcache.fetch(
+        conn, info, 'io',
+        f"""SELECT io_stats, block_size, i.stats_reset, snapshot_tstamp
+            FROM pgstatviz.io i
+            JOIN pgstatviz.db USING (snapshot_tstamp)
+            WHERE snapshot_tstamp BETWEEN %s AND %s{where}
+            ORDER BY snapshot_tstamp""",
+        daterange, params, cache_dir)
     if not data:
         cur.execute("""SELECT
                     (current_setting('server_version_num')::int >= 160000)
@@ -89,15 +124,28 @@ def io(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
             raise SystemExit("No pg_statviz snapshots found in this database")
 
     tstamps = [ts['snapshot_tstamp'] for ts in data]
+    # Snapshots that skipped the io component, drawn as gaps
+    skipped = get_skipped(conn, info, 'io', daterange)
     blcksz = int(data[0]['block_size'])
     iostats, iokinds = calc_iostats(data, blcksz)
     iorates = calc_iorates(data, iokinds, blcksz)
 
     # Build a flattened DataFrame for AI analysis
-    io_df = build_io_dataframe(iostats, iokinds, tstamps)
+    io_df = build_io_dataframe(iostats, iokinds, tstamps, max_series)
 
     report_sections = []
 
+    # GB read and written per I/O kind, limited to the busiest kinds
+    reads = top_series(calc_iogb(iostats, iokinds, tstamps, 'reads'),
+                       max_series)
+    writes = top_series(calc_iogb(iostats, iokinds, tstamps, 'writes'),
+                        max_series)
+    # Downsample if needed
+    r = plot.downsample(reads, method=downsample, points=max_points,
+                        gaps=skipped)
+    rw = plot.downsample(writes, method=downsample, points=max_points,
+                         gaps=skipped)
+
     # Plot as many of each I/O kinds we have per snapshot
     plt, fig, splt1, splt2 = plot.setupdouble()
     plt.suptitle(f"pg_statviz · {info['hostname']}:{port}",
@@ -105,38 +153,12 @@ def io(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
 
     # Plot Reads
     splt1.set_title("I/O Reads")
-    for iokind in iokinds:
-        iobytes = []
-        for snapshot in iostats:
-            found = False
-            for entry in snapshot:
-                if {'backend_type': entry['backend_type'],
-                        'object': entry['object'],
-                        'context': entry['context']} == iokind:
-                    found = True
-                    r = entry['reads']
-                    if r:
-                        iobytes += round(r / 1073741824, 1 if r >= 100 else 2),
-                    else:
-                        found = False
-            if not found:
-                iobytes += 0,
-        if not all(b == 0 for b in iobytes):
-            # Downsample if needed
-            _frame = DataFrame(data=iobytes, index=tstamps, copy=False)
-            if len(tstamps) > plot.MAX_POINTS:
-                q = str(round(
-                    (tstamps[-1] - tstamps[0]).total_seconds()
-                    / plot.MAX_POINTS, 2))
-                r = _frame.resample(q + "s").mean()
-            else:
-                r = _frame
-            splt1.plot(r.index, r,
-                       label=f"{iokind['object']}/"
-                             if {iokind['object']} == 'temp relation'
-                             else ""
-                             f"{iokind['backend_type']}/"
-                             f"{iokind['context']}")
+    for k in reads.columns:
+        if not all(b == 0 for b in reads[k]):
+            splt1.plot(r.index, r[k],
+                       label=k if k == 'other'
+                       else f"{iokinds[k]['backend_type']}/"
+                            f"{iokinds[k]['context']}")
     splt1.set_xlabel("Timestamp", fontweight='semibold')
     splt1.set_ylabel("GB read (at time of snapshot)", fontweight='semibold')
     splt1.set_ylim(bottom=0)
@@ -144,36 +166,13 @@ def io(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
 
     # Plot Writes
     splt2.set_title("I/O Writes")
-    for iokind in iokinds:
-        iobytes = []
-        for snapshot in iostats:
-            found = False
-            for entry in snapshot:
-                if {'backend_type': entry['backend_type'],
-                        'object': entry['object'],
-                        'context': entry['context']} == iokind:
-                    found = True
-                    w = entry['writes']
-                    if w:
-                        iobytes += round(w / 1073741824, 1 if w >= 100 else 2),
-                    else:
-                        found = False
-            if not found:
-                iobytes += 0,
-        if not all(b == 0 for b in iobytes):
-            # Downsample if needed
-            _frame = DataFrame(data=iobytes, index=tstamps, copy=False)
-            if len(tstamps) > plot.MAX_POINTS:
-                q = str(round(
-                    (tstamps[-1] - tstamps[0]).total_seconds()
-                    / plot.MAX_POINTS, 2))
-                r = _frame.resample(q + "s").mean()
-            else:
-                r = _frame
-            splt2.plot(r.index, r,
-                       label=f"{iokind['object']}/"
-                             f"{iokind['backend_type']}/"
-                             f"{iokind['context']}")
+    for k in writes.columns:
+        if not all(b == 0 for b in writes[k]):
+            splt2.plot(rw.index, rw[k],
+                       label=k if k == 'other'
+                       else f"{iokinds[k]['object']}/"
+                            f"{iokinds[k]['backend_type']}/"
+                            f"{iokinds[k]['context']}")
     splt2.set_xlabel("Timestamp", fontweight='semibold')
     splt2.set_ylabel("GB written (at time of snapshot)",
                      fontweight='semibold')
@@ -184,11 +183,11 @@ def io(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
     outfile = f"""{
         outputdir.rstrip("/") + "/" if outputdir
         else ''}pg_statviz_{info['hostname']
-                            .replace("/", "-")}_{port}_io.png"""
+                            .replace("/", "-")}_{port}_io.{format}"""
     _logger.info(f"Saving {outfile}")
     plt.gcf().autofmt_xdate()
     fig.tight_layout()
-    plt.savefig(outfile)
+    plot.save(outfile, dpi, optimize)
     run_chart_analysis(
         report_sections, ai, io_df, "I/O Statistics",
         metric_description="CUMULATIVE COUNTER — rising values are "
@@ -199,10 +198,21 @@ def io(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
                            "threshold. Default to [HEALTHY].",
         outfile=outfile,
         info=info,
+        batch=ai_batch,
+        limits={},
     )
 
     # Build rate DataFrame for AI analysis
-    rate_df = build_iorate_dataframe(iorates, iokinds, tstamps)
+    rate_df = build_iorate_dataframe(iorates, iokinds, tstamps, max_series)
+
+    # MB/s read and written per I/O kind, limited to the busiest kinds
+    rrates = top_series(calc_iomb(iorates, tstamps, 'reads'), max_series)
+    wrates = top_series(calc_iomb(iorates, tstamps, 'writes'), max_series)
+    # Downsample if needed
+    r = plot.downsample(rrates, method=downsample, points=max_points,
+                        gaps=skipped)
+    rw = plot.downsample(wrates, method=downsample, points=max_points,
+                         gaps=skipped)
 
     # Plot I/O Rates
     plt, fig, splt1, splt2 = plot.setupdouble()
@@ -211,27 +221,9 @@ def io(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
 
     # Plot Read Rates
     splt1.set_title("I/O Read Rate")
-    for iokind in iokinds:
-        iokindname = (f"{iokind['object']}/"
-                      if {iokind['object']} == 'temp relation'
-                      else ""
-                      f"{iokind['backend_type']}/"
-                      f"{iokind['context']}")
-        if not all(numpy.isnan(v) or v == 0
-                   for v in iorates['reads'][iokindname]):
-            # Downsample if needed
-            _frame = DataFrame(
-                data=[round(v / 1048576, 1 if v >= 100 else 2)
-                      for v in iorates['reads'][iokindname]],
-                index=tstamps, copy=False)
-            if len(tstamps) > plot.MAX_POINTS:
-                q = str(round(
-                    (tstamps[-1] - tstamps[0]).total_seconds()
-                    / plot.MAX_POINTS, 2))
-                r = _frame.resample(q + "s").mean()
-            else:
-                r = _frame
-            splt1.plot(r.index, r, label=iokindname)
+    for iokindname in rrates.columns:
+        if not all(numpy.isnan(v) or v == 0 for v in rrates[iokindname]):
+            splt1.plot(r.index, r[iokindname], label=iokindname)
     splt1.set_xlabel("Timestamp", fontweight='semibold')
     splt1.set_ylabel("Avg. read rate in MB/s", fontweight='semibold')
     splt1.set_ylim(bottom=0)
@@ -239,27 +231,9 @@ def io(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
 
     # Plot Write Rates
     splt2.set_title("I/O Write Rate")
-    for iokind in iokinds:
-        iokindname = (f"{iokind['object']}/"
-                      if {iokind['object']} == 'temp relation'
-                      else ""
-                      f"{iokind['backend_type']}/"
-                      f"{iokind['context']}")
-        if not all(numpy.isnan(v) or v == 0
-                   for v in iorates['writes'][iokindname]):
-            # Downsample if needed
-            _frame = DataFrame(
-                data=[round(v / 1048576, 1 if v >= 100 else 2)
-                      for v in iorates['writes'][iokindname]],
-                index=tstamps, copy=False)
-            if len(tstamps) > plot.MAX_POINTS:
-                q = str(round(
-                    (tstamps[-1] - tstamps[0]).total_seconds()
-                    / plot.MAX_POINTS, 2))
-                r = _frame.resample(q + "s").mean()
-            else:
-                r = _frame
-            splt2.plot(r.index, r, label=iokindname)
+    for iokindname in wrates.columns:
+        if not all(numpy.isnan(v) or v == 0 for v in wrates[iokindname]):
+            splt2.plot(rw.index, rw[iokindname], label=iokindname)
     splt2.set_xlabel("Timestamp", fontweight='semibold')
     splt2.set_ylabel("Avg. write rate in MB/s", fontweight='semibold')
     splt2.legend()
@@ -270,9 +244,9 @@ def io(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
     outfile = f"""{
         outputdir.rstrip("/") + "/" if outputdir
         else ''}pg_statviz_{info['hostname']
-                            .replace("/", "-")}_{port}_io_rate.png"""
+                            .replace("/", "-")}_{port}_io_rate.{format}"""
     _logger.info(f"Saving {outfile}")
-    plt.savefig(outfile)
+    plot.save(outfile, dpi, optimize)
     run_chart_analysis(
         report_sections, ai, rate_df, "I/O Rate",
         metric_description="I/O RATES in MB/s (derived from cumulative "
@@ -284,14 +258,18 @@ def io(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
                            "Default to [HEALTHY].",
         outfile=outfile,
         info=info,
+        batch=ai_batch,
+        limits={},
     )
 
     finalize_module_report(outputdir, info, port, 'io',
-                           report_sections)
+                           report_sections, single_file)
+    manifest.record(outputdir, info, port, 'io', fp)
     mpclose('all')
 
 
 # Gather I/O stats and convert to bytes
+@profiler.traced()
 def calc_iostats(data, blcksz=8192):
     iostats = [io['io_stats'] for io in data]
     iokinds = []
@@ -325,108 +303,135 @@ def calc_iostats(data, blcksz=8192):
     return iostats, iokinds
 
 
-# Calculate I/O rates
+# Name of an I/O kind in the rate and AI analysis series
+def kindname(iokind):
+    return (f"{iokind['object']}/"
+            if {iokind['object']} == 'temp relation'
+            else ""
+            f"{iokind['backend_type']}/"
+            f"{iokind['context']}")
+
+
+# Position of each entry's I/O kind in iokinds, for pivot()
+def kindindex(iokinds):
+    kinds = {(k['backend_type'], k['object'], k['context']): i
+             for i, k in enumerate(iokinds)}
+
+    def kind(entry):
+        return kinds.get((entry['backend_type'], entry['object'],
+                          entry['context']))
+    return kind
+
+
+# Calculate I/O rates in bytes/s, pivoting every snapshot once rather than
+# rescanning all of them per I/O kind
+@profiler.traced()
 def calc_iorates(data, iokinds, blcksz=8192):
 
-    rates = {}
+    # Counter in bytes - PG18+ has read_bytes/write_bytes columns
+    def counter(rw):
+        rw_bytes = f"{rw[:-1]}_bytes"
+
+        def value(entry):
+            if rw_bytes in entry:
+                return entry[rw_bytes] or 0
+            v = entry.get(rw)
+            return int(v) * blcksz if v else 0
+        return value
+
+    _, reads, writes = pivot([d['io_stats'] for d in data],
+                             kindindex(iokinds), counter('reads'),
+                             counter('writes'), keys=range(len(iokinds)))
+    secs = numpy.array([(b['snapshot_tstamp'] - a['snapshot_tstamp'])
+                        .total_seconds() for a, b in zip(data, data[1:])])
+    same = numpy.array([b['stats_reset'] == a['stats_reset']
+                        for a, b in zip(data, data[1:])], dtype=bool)
 
-    # I/O diff generator - yields tuple list of I/O rates in bytes/s
-    def iodiff(data, iokind, rw):
-        yield numpy.nan
-        for i, item in enumerate(data):
-            if i + 1 < len(data):
-                if (data[i + 1]['stats_reset'] == data[i]['stats_reset']):
-                    s = ((data[i + 1]['snapshot_tstamp']
-                         - data[i]['snapshot_tstamp'])
-                         .total_seconds())
-                    v1, v2 = 0, 0
-                    # PG18+ has read_bytes/write_bytes columns
-                    rw_bytes = f"{rw[:-1]}_bytes"
-                    for entry in data[i]['io_stats']:
-                        if {'backend_type': entry['backend_type'],
-                                'object': entry['object'],
-                                'context': entry['context']} == iokind:
-                            if rw_bytes in entry:
-                                v1 = entry[rw_bytes]
-                            elif rw in entry:
-                                v1 = entry[rw]
-                                if v1:
-                                    v1 = int(v1) * blcksz
-                    for entry in data[i + 1]['io_stats']:
-                        if {'backend_type': entry['backend_type'],
-                                'object': entry['object'],
-                                'context': entry['context']} == iokind:
-                            if rw_bytes in entry:
-                                v2 = entry[rw_bytes]
-                            elif rw in entry:
-                                v2 = entry[rw]
-                                if v2:
-                                    v2 = int(v2) * blcksz
-                    yield (v2 - v1) / s if v1 else numpy.nan
-                else:
-                    yield numpy.nan
-
-    for rw in ['reads', 'writes']:
+    rates = {}
+    for rw, counters in [('reads', reads), ('writes', writes)]:
+        diff = numpy.full(counters.shape, numpy.nan)
+        # No rate across a stats reset or from a zero counter
+        valid = same[:, None] & (counters[:-1] != 0)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            diff[1:] = numpy.where(
+                valid, (counters[1:] - counters[:-1]) / secs[:, None],
+                numpy.nan)
         rates[rw] = {}
-        for iokind in iokinds:
-            rates[rw][f"{iokind['object']}/"
-                      if {iokind['object']} == 'temp relation'
-                      else ""
-                      f"{iokind['backend_type']}/"
-                      f"{iokind['context']}"] = list(iodiff(data, iokind, rw))
+        for j, iokind in enumerate(iokinds):
+            # numpy.nan itself where there is no rate, as the generators did
+            rates[rw][kindname(iokind)] = [
+                numpy.nan if numpy.isnan(v) else v
+                for v in diff[:, j].tolist()]
     return rates
 
 
-# Build a flattened DataFrame from I/O stats for AI analysis
-def build_io_dataframe(iostats, iokinds, tstamps):
-    data = {}
-    for iokind in iokinds:
-        kindname = (f"{iokind['object']}/"
-                    if {iokind['object']} == 'temp relation'
-                    else ""
-                    f"{iokind['backend_type']}/"
-                    f"{iokind['context']}")
-        reads = []
-        writes = []
-        for snapshot in iostats:
-            found = False
-            for entry in snapshot:
-                if {'backend_type': entry['backend_type'],
-                        'object': entry['object'],
-                        'context': entry['context']} == iokind:
-                    found = True
-                    r = entry.get('reads', 0) or 0
-                    w = entry.get('writes', 0) or 0
-                    reads.append(round(r / 1073741824, 2))
-                    writes.append(round(w / 1073741824, 2))
-                    break
-            if not found:
-                reads.append(0)
-                writes.append(0)
-        if not all(v == 0 for v in reads):
-            data[f"{kindname}_read_GB"] = reads
-        if not all(v == 0 for v in writes):
-            data[f"{kindname}_write_GB"] = writes
-    return DataFrame(data=data, index=tstamps, copy=False)
-
-
-# Build a flattened DataFrame from I/O rates for AI analysis
-def build_iorate_dataframe(iorates, iokinds, tstamps):
-    data = {}
+# GB read or written per I/O kind, one column per position in iokinds
+@profiler.traced()
+def calc_iogb(iostats, iokinds, tstamps, rw):
+
+    def gb(entry):
+        v = entry[rw]
+        return round(v / 1073741824, 1 if v >= 100 else 2) if v else 0
+
+    keys, iogb = pivot(iostats, kindindex(iokinds), gb,
+                       keys=range(len(iokinds)))
+    return DataFrame(data=iogb, index=tstamps, columns=keys, copy=False)
+
+
+# MB/s read or written per I/O kind name from calc_iorates()
+@profiler.traced()
+def calc_iomb(iorates, tstamps, rw):
+    return DataFrame(
+        data={name: [round(v / 1048576, 1 if v >= 100 else 2)
+                     for v in rates]
+              for name, rates in iorates[rw].items()},
+        index=tstamps, copy=False)
+
+
+# Build a flattened DataFrame from I/O stats for AI analysis, limited to the
+# max_series busiest kinds for reads and for writes
+@profiler.traced()
+def build_io_dataframe(iostats, iokinds, tstamps, max_series=0):
+
+    def gb(rw):
+        return lambda entry: round((entry.get(rw, 0) or 0) / 1073741824, 2)
+
+    _, reads, writes = pivot(iostats, kindindex(iokinds), gb('reads'),
+                             gb('writes'), keys=range(len(iokinds)))
+    reads_data, writes_data = {}, {}
+    for j, iokind in enumerate(iokinds):
+        if reads[:, j].any():
+            reads_data[f"{kindname(iokind)}_read_GB"] = reads[:, j]
+        if writes[:, j].any():
+            writes_data[f"{kindname(iokind)}_write_GB"] = writes[:, j]
+    return concat(
+        [top_series(DataFrame(data=reads_data, index=tstamps, copy=False),
+                    max_series, other='other_read_GB'),
+         top_series(DataFrame(data=writes_data, index=tstamps, copy=False),
+                    max_series, other='other_write_GB')],
+        axis=1)
+
+
+# Build a flattened DataFrame from I/O rates for AI analysis, limited to the
+# max_series busiest kinds for reads and for writes
+@profiler.traced()
+def build_iorate_dataframe(iorates, iokinds, tstamps, max_series=0):
+    reads_data, writes_data = {}, {}
     for iokind in iokinds:
-        kindname = (f"{iokind['object']}/"
-                    if {iokind['object']} == 'temp relation'
-                    else ""
-                    f"{iokind['backend_type']}/"
-                    f"{iokind['context']}")
-        if kindname in iorates['reads']:
+        name = kindname(iokind)
+        if name in iorates['reads']:
             reads = [round(v / 1048576, 2) if not numpy.isnan(v) else 0
-                     for v in iorates['reads'][kindname]]
+                     for v in iorates['reads'][name]]
             if not all(v == 0 for v in reads):
-                data[f"{kindname}_read_MBps"] = reads
-        if kindname in iorates['writes']:
+                reads_data[f"{name}_read_MBps"] = reads
+        if name in iorates['writes']:
             writes = [round(v / 1048576, 2) if not numpy.isnan(v) else 0
-                      for v in iorates['writes'][kindname]]
+                      for v in iorates['writes'][name]]
             if not all(v == 0 for v in writes):
-                data[f"{kindname}_write_MBps"] = writes
-    return DataFrame(data=data, index=tstamps, copy=False)
+                writes_data[f"{name}_write_MBps"] = writes
+    return concat(
+        [top_series(DataFrame(data=reads_data, index=tstamps, copy=False),
+                    max_series, other='other_read_MBps'),
+         top_series(DataFrame(data=writes_data, index=tstamps, copy=False),
+                    max_series, other='other_write_MBps')],
+        axis=1)
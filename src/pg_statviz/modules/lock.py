@@ -14,13 +14,17 @@ from dateutil.parser import isoparse
 from matplotlib.pyplot import close as mpclose
 from matplotlib.ticker import MaxNLocator
 from pandas import DataFrame
-from pg_statviz.libs import plot
-from pg_statviz.libs.ai import (AI_HELP, AI_PROVIDERS,
+from pg_statviz.libs import manifest, plot, profiler, snapcache
+from pg_statviz.libs.ai import (AI_BATCH, AI_BATCH_HELP, AI_HELP,
+                                AI_PROVIDERS,
                                 DEFAULT_AI_PROVIDER,
                                 run_chart_analysis)
 from pg_statviz.libs.dbconn import dbconn
-from pg_statviz.libs.html_report import finalize_module_report
-from pg_statviz.libs.info import getinfo
+from pg_statviz.libs.html_report import (SINGLE_FILE_HELP, check_single_file,
+                                         finalize_module_report)
+from pg_statviz.libs.info import (SOURCE_HOST_HELP, ext_version_at_least,
+                                  getinfo, get_skipped, source_filter)
+from pg_statviz.libs.pivot import breakdown_frame, pivot_frame
 
 
 @arg('-d', '--dbname', help="database name to analyze")
@@ -37,26 +41,48 @@ from pg_statviz.libs.info import getinfo
 @arg('--ai', nargs='?', const=DEFAULT_AI_PROVIDER, default=None,
      choices=AI_PROVIDERS, metavar='PROVIDER',
      help=AI_HELP)
+@arg('--ai-batch', type=int, nargs='?', const=AI_BATCH, metavar='N',
+     help=AI_BATCH_HELP)
 @arg('--info', help=argparse.SUPPRESS)
 @arg('--conn', help=argparse.SUPPRESS)
+@arg('--max-points', type=int, metavar='N', help=plot.MAX_POINTS_HELP)
+@arg('--downsample', choices=plot.DOWNSAMPLERS, help=plot.DOWNSAMPLE_HELP)
+@arg('--dpi', type=int, help=plot.DPI_HELP)
+@arg('--format', choices=plot.FORMATS, help=plot.FORMAT_HELP)
+@arg('--optimize', action='store_true', help=plot.OPTIMIZE_HELP)
+@arg('--single-file', action='store_true', help=SINGLE_FILE_HELP)
+@arg('--incremental', action='store_true', help=manifest.INCREMENTAL_HELP)
+@arg('--cache-dir', metavar='DIR', help=snapcache.CACHE_DIR_HELP)
+@arg('--source-host', metavar='HOSTNAME', help=SOURCE_HOST_HELP)
+@arg('--heatmap', action='store_true', help=plot.HEATMAP_HELP)
+@arg('--profile', metavar='FILE', help=profiler.PROFILE_HELP)
+@profiler.command
 def lock(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
          username=getpass.getuser(), password=None, daterange=[],
-         outputdir=None, ai=None, info=None, conn=None):
+         outputdir=None, ai=None, ai_batch=0, info=None, conn=None,
+         max_points=plot.MAX_POINTS, downsample=plot.DOWNSAMPLE,
+         dpi=plot.DPI, format=plot.FORMAT, optimize=False,
+         single_file=False, incremental=False, cache_dir=None,
+         source_host=None, heatmap=False, profile=None):
     "run locks analysis module"
 
     logging.basicConfig()
     _logger = logging.getLogger(__name__)
     _logger.setLevel(logging.INFO)
 
+    check_single_file(single_file, ai)
     if not conn:
         conn_details = {'dbname': dbname, 'user': username,
                         'password': getpass.getpass("Password: ") if password
                         else password, 'host': host, 'port': port}
         conn = dbconn(**conn_details)
     if not info:
-        info = getinfo(conn)
+        info = getinfo(conn, source_host)
 
     _logger.info("Running locks analysis")
+    if heatmap and format == 'json':
+        _logger.info("Heatmaps are images, exporting the series instead")
+        heatmap = False
 
     if daterange:
         daterange = [isoparse(d) for d in daterange]
@@ -65,84 +91,88 @@ def lock(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
     else:
         daterange = ['-infinity', 'now()']
 
-    # Retrieve the snapshots from DB
+    fp = manifest.fingerprint(conn, ['lock'], daterange, ai=ai,
+                              max_points=max_points, downsample=downsample,
+                              dpi=dpi, format=format, optimize=optimize,
+                              single_file=single_file, heatmap=heatmap,
+                              info=info)
+    if incremental and manifest.unchanged(outputdir, info, port, 'lock', fp):
+        _logger.info("Snapshots and options unchanged since the last run, "
+                     + "skipping")
+        return
+
+    # Retrieve the snapshots from DB, with their lock counts per mode when
+    # the extension can't bucket them server-side, or only by averaging
+    pivot = (downsample != 'mean'
+             or not ext_version_at_least(info, '1.3'))
+    where, params = source_filter(info)
     cur = conn.cursor()
-    cur.execute("""SELECT locks_total, locks, snapshot_tstamp
-                   FROM pgstatviz.lock
-                   WHERE snapshot_tstamp BETWEEN %s AND %s
-                   ORDER BY snapshot_tstamp""",
-                (daterange[0], daterange[1]))
-    data = cur.fetchall()
+    data = snapcache.fetch(
+        conn, info, 'lock',
+        f"""SELECT locks_total, snapshot_tstamp{', locks' if pivot else ''}
+            FROM pgstatviz.lock
+            WHERE snapshot_tstamp BETWEEN %s AND %s{where}
+            ORDER BY snapshot_tstamp""",
+        daterange, params, cache_dir)
     if not data:
         raise SystemExit("No pg_statviz snapshots found in this database")
 
     tstamps = [ts['snapshot_tstamp'] for ts in data]
-    locks = [lo['locks'] for lo in data]
+    # Snapshots that skipped the lock component, drawn as gaps
+    skipped = get_skipped(conn, info, 'lock', daterange)
     total = [tl['locks_total'] for tl in data]
 
-    # Determine all lock modes for plotting
-    lockmodes = []
-    for snapshot in locks:
-        for entry in snapshot:
-            if 'lock_mode' in entry:
-                lm = entry['lock_mode']
-                if lm not in lockmodes:
-                    lockmodes += lm,
-
-    # Plot as many of each lock mode we have per snapshot
-    plt, fig = plot.setup()
-    plt.suptitle(f"pg_statviz · {info['hostname']}:{port}",
-                 fontweight='semibold')
-    plt.title("Locks")
-    for lm in lockmodes:
-        lc = []
-        for lo in locks:
-            found = False
-            for c in lo:
-                if c['lock_mode'] == lm:
-                    found = True
-                    lc += c['lock_count'],
-            if not found:
-                lc += 0,
-        lc_frame = DataFrame(data={lm: lc}, index=tstamps, copy=False)
+    # Lock counts per mode, bucketed server-side if the extension can,
+    # otherwise pivoted here in one pass over the snapshots and downsampled
+    if not pivot:
+        cur.execute("""SELECT bucket, lock_mode, lock_count
+                       FROM pgstatviz.lock_breakdown(
+                           %s, %s, %s, source => %s)""",
+                    (daterange[0], daterange[1], max_points,
+                     info.get('source')))
+        r = breakdown_frame(cur.fetchall(), 'lock_mode', 'lock_count')
+    else:
+        locks = [lo['locks'] for lo in data]
+        lc_frame = pivot_frame(locks, tstamps, 'lock_mode', 'lock_count')
         # Downsample if needed
-        if len(tstamps) > plot.MAX_POINTS:
-            q = str(round(
-                (tstamps[-1] - tstamps[0]).total_seconds()
-                / plot.MAX_POINTS, 2))
-            r = lc_frame.resample(q + "s").mean()
-        else:
-            r = lc_frame
-        if not all(c == 0 for c in r[lm]):
-            plt.plot(r.index, r[lm],
-                     label=lm)
-
-    # Plot total locks
+        r = plot.downsample(lc_frame, method=downsample, points=max_points,
+                            gaps=skipped)
+
+    # Total locks
     # # Downsample if needed
     total_frame = DataFrame(data=total, index=tstamps, copy=False)
-    if len(tstamps) > plot.MAX_POINTS:
-        q = str(round(
-            (tstamps[-1] - tstamps[0]).total_seconds()
-            / plot.MAX_POINTS, 2))
-        rr = total_frame.resample(q + "s").mean()
-    else:
-        rr = total_frame
+    rr = plot.downsample(total_frame, method=downsample, points=max_points,
+                         gaps=skipped)
 
     report_sections = []
 
-    plt.plot(rr.index, rr, label='Total')
-    fig.axes[0].set_ylim(bottom=0)
-    fig.gca().yaxis.set_major_locator(MaxNLocator(integer=True))
-    plt.xlabel("Timestamp", fontweight='semibold')
-    plt.ylabel("Lock count (at time of snapshot)", fontweight='semibold')
+    if heatmap:
+        # Every lock mode as a row of one image, busiest first
+        plt, fig = plot.heatmap(r, rr, "Locks",
+                                "Lock count (at time of snapshot)")
+    else:
+        # Plot as many of each lock mode we have per snapshot
+        plt, fig = plot.setup()
+        plt.title("Locks")
+        for lm in r.columns:
+            if not all(c == 0 for c in r[lm]):
+                plt.plot(r.index, r[lm],
+                         label=lm)
+        plt.plot(rr.index, rr, label='Total')
+        fig.axes[0].set_ylim(bottom=0)
+        fig.gca().yaxis.set_major_locator(MaxNLocator(integer=True))
+        plt.xlabel("Timestamp", fontweight='semibold')
+        plt.ylabel("Lock count (at time of snapshot)", fontweight='semibold')
+        fig.legend()
+    plt.suptitle(f"pg_statviz · {info['hostname']}:{port}",
+                 fontweight='semibold')
     outfile = f"""{
         outputdir.rstrip("/") + "/" if outputdir
         else ''}pg_statviz_{info['hostname']
-                            .replace("/", "-")}_{port}_lock.png"""
+                            .replace("/", "-")}_{port}_lock.{format}"""
     _logger.info(f"Saving {outfile}")
-    fig.legend()
     fig.tight_layout()
-    plt.savefig(outfile)
+    plot.save(outfile, dpi, optimize)
     run_chart_analysis(
         report_sections, ai, rr, "Locks",
         metric_description="Active locks (point-in-time snapshots). Low "
@@ -152,8 +182,11 @@ def lock(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
                            "or 'AccessExclusive' locks blocking operations.",
         outfile=outfile,
         info=info,
+        batch=ai_batch,
+        limits={'*': 50},
     )
 
     finalize_module_report(outputdir, info, port, 'lock',
-                           report_sections)
+                           report_sections, single_file)
+    manifest.record(outputdir, info, port, 'lock', fp)
     mpclose('all')
@@ -0,0 +1,251 @@
+"""
+pg_statviz - stats visualization and time series analysis
+"""
+
+__author__ = "Jimmy Angelakos"
+__copyright__ = "Copyright (c) 2026 Jimmy Angelakos"
+__license__ = "PostgreSQL License"
+
+import argparse
+import getpass
+import logging
+import statistics
+from argh.decorators import arg
+from dateutil.parser import isoparse
+from matplotlib.pyplot import close as mpclose
+from pg_statviz.libs import manifest, plot, profiler, snapcache
+from pg_statviz.libs.ai import (AI_BATCH, AI_BATCH_HELP, AI_HELP,
+                                AI_PROVIDERS,
+                                DEFAULT_AI_PROVIDER,
+                                run_chart_analysis)
+from pg_statviz.libs.dbconn import dbconn
+from pg_statviz.libs.html_report import (SINGLE_FILE_HELP, check_single_file,
+                                         finalize_module_report)
+from pg_statviz.libs.info import (SOURCE_HOST_HELP, ext_version_at_least,
+                                  getinfo, source_filter)
+from pg_statviz.libs.pivot import breakdown_frame
+
+
+# Collection taking more than this share of the interval between snapshots
+# is worth a warning
+OVERHEAD_WARNING = 0.01
+
+
+@arg('-d', '--dbname', help="database name to analyze")
+@arg('-h', '--host', metavar="HOSTNAME",
+     help="database server host or socket directory")
+@arg('-p', '--port', help="database server port")
+@arg('-U', '--username', help="database user name")
+@arg('-W', '--password', action='store_true',
+     help="force password prompt (should happen automatically)")
+@arg('-D', '--daterange', nargs=2, metavar=('FROM', 'TO'), type=str,
+     help="date range to be analyzed in ISO 8601 format e.g. 2026-01-01T00:00 "
+          + "2026-01-01T23:59")
+@arg('-O', '--outputdir', help="output directory")
+@arg('--ai', nargs='?', const=DEFAULT_AI_PROVIDER, default=None,
+     choices=AI_PROVIDERS, metavar='PROVIDER',
+     help=AI_HELP)
+@arg('--ai-batch', type=int, nargs='?', const=AI_BATCH, metavar='N',
+     help=AI_BATCH_HELP)
+@arg('--info', help=argparse.SUPPRESS)
+@arg('--conn', help=argparse.SUPPRESS)
+@arg('--max-points', type=int, metavar='N', help=plot.MAX_POINTS_HELP)
+@arg('--downsample', choices=plot.DOWNSAMPLERS, help=plot.DOWNSAMPLE_HELP)
+@arg('--dpi', type=int, help=plot.DPI_HELP)
+@arg('--format', choices=plot.FORMATS, help=plot.FORMAT_HELP)
+@arg('--optimize', action='store_true', help=plot.OPTIMIZE_HELP)
+@arg('--single-file', action='store_true', help=SINGLE_FILE_HELP)
+@arg('--incremental', action='store_true', help=manifest.INCREMENTAL_HELP)
+@arg('--cache-dir', metavar='DIR', help=snapcache.CACHE_DIR_HELP)
+@arg('--source-host', metavar='HOSTNAME', help=SOURCE_HOST_HELP)
+@arg('--profile', metavar='FILE', help=profiler.PROFILE_HELP)
+@profiler.command
+def overhead(*, dbname=getpass.getuser(), host="/var/run/postgresql",
+             port="5432", username=getpass.getuser(), password=None,
+             daterange=[], outputdir=None, ai=None, ai_batch=0, info=None,
+             conn=None, max_points=plot.MAX_POINTS,
+             downsample=plot.DOWNSAMPLE, dpi=plot.DPI, format=plot.FORMAT,
+             optimize=False, single_file=False, incremental=False,
+             cache_dir=None,
+             source_host=None, profile=None):
+    "run snapshot overhead analysis module"
+
+    logging.basicConfig()
+    _logger = logging.getLogger(__name__)
+    _logger.setLevel(logging.INFO)
+
+    check_single_file(single_file, ai)
+    if not conn:
+        conn_details = {'dbname': dbname, 'user': username,
+                        'password': getpass.getpass("Password: ") if password
+                        else password, 'host': host, 'port': port}
+        conn = dbconn(**conn_details)
+    if not info:
+        info = getinfo(conn, source_host)
+
+    _logger.info("Running snapshot overhead analysis")
+
+    if not ext_version_at_least(info, '1.3'):
+        _logger.warning("Snapshot overhead analysis is only available from "
+                        + "pg_statviz extension 1.3 onwards")
+        return
+
+    if daterange:
+        daterange = [isoparse(d) for d in daterange]
+        if daterange[0] > daterange[1]:
+            daterange = [daterange[1], daterange[0]]
+    else:
+        daterange = ['-infinity', 'now()']
+
+    fp = manifest.fingerprint(conn, ['snapshot_stats'], daterange, ai=ai,
+                              max_points=max_points, downsample=downsample,
+                              dpi=dpi, format=format, optimize=optimize,
+                              single_file=single_file, info=info)
+    if incremental and manifest.unchanged(outputdir, info, port, 'overhead',
+                                          fp):
+        _logger.info("Snapshots and options unchanged since the last run, "
+                     + "skipping")
+        return
+
+    # Retrieve the collection statistics from DB, one row per component of
+    # each snapshot
+    where, params = source_filter(info)
+    data = snapcache.fetch(
+        conn, info, 'overhead',
+        f"""SELECT snapshot_tstamp AS bucket, component, duration_ms,
+                   wal_bytes, skipped
+            FROM pgstatviz.snapshot_stats
+            WHERE snapshot_tstamp BETWEEN %s AND %s{where}
+            ORDER BY snapshot_tstamp, component""",
+        daterange, params, cache_dir, key='bucket')
+    if not data:
+        raise SystemExit("No pg_statviz snapshot statistics found in this "
+                         + "database")
+
+    durations = breakdown_frame(data, 'component', 'duration_ms')
+    wal = breakdown_frame(data, 'component', wal_kb)
+    findings = calc_findings(list(durations.index),
+                             list(durations.get('total', [])))
+    findings += calc_skipped(data)
+
+    report_sections = []
+
+    # Plot collection time per component
+    r = plot.downsample(durations, method=downsample, points=max_points)
+    plt, fig = plot.setup()
+    plt.suptitle(f"pg_statviz · {info['hostname']}:{port}",
+                 fontweight='semibold')
+    plt.title("Snapshot collection time")
+    for c in r.columns:
+        plt.plot(r.index, r[c], label="Total" if c == 'total' else c)
+    fig.axes[0].set_ylim(bottom=0)
+    plt.xlabel("Timestamp", fontweight='semibold')
+    plt.ylabel("Collection time per snapshot (ms)", fontweight='semibold')
+    outfile = f"""{
+        outputdir.rstrip("/") + "/" if outputdir
+        else ''}pg_statviz_{info['hostname']
+                            .replace("/", "-")}_{port}_overhead.{format}"""
+    _logger.info(f"Saving {outfile}")
+    fig.legend()
+    fig.tight_layout()
+    plot.save(outfile, dpi, optimize)
+    run_chart_analysis(
+        report_sections, ai, r, "Snapshot Collection Time",
+        metric_description="Time pg_statviz itself took to collect each "
+                           "snapshot, per component (the pgstatviz."
+                           "snapshot_* function) and in total. This is the "
+                           "monitoring overhead, not database load. A few "
+                           "to a few hundred ms is normal; 'io', 'conf' "
+                           "and 'wait' are usually the most expensive. "
+                           "Only a sustained rise or a total approaching "
+                           "the snapshot interval is a concern. Components "
+                           "skipped for going over their time budget or "
+                           "failing have no value for that snapshot.",
+        outfile=outfile,
+        info=info,
+        findings=findings,
+        batch=ai_batch,
+        # calc_findings check the share of the interval
+        limits={},
+    )
+
+    # Plot WAL generated per component
+    rr = plot.downsample(wal, method=downsample, points=max_points)
+    plt, fig = plot.setup()
+    plt.suptitle(f"pg_statviz · {info['hostname']}:{port}",
+                 fontweight='semibold')
+    plt.title("WAL generated by snapshots")
+    for c in rr.columns:
+        plt.plot(rr.index, rr[c], label="Total" if c == 'total' else c)
+    fig.axes[0].set_ylim(bottom=0)
+    plt.xlabel("Timestamp", fontweight='semibold')
+    plt.ylabel("WAL per snapshot (kB)", fontweight='semibold')
+    outfile = f"""{
+        outputdir.rstrip("/") + "/" if outputdir
+        else ''}pg_statviz_{info['hostname']
+                            .replace("/", "-")}_{port}_overhead_wal.{format}"""
+    _logger.info(f"Saving {outfile}")
+    fig.legend()
+    fig.tight_layout()
+    plot.save(outfile, dpi, optimize)
+    run_chart_analysis(
+        report_sections, ai, rr, "WAL Generated by Snapshots",
+        metric_description="WAL written by pg_statviz while storing each "
+                           "snapshot, per component and in total. Grows "
+                           "with the number of sessions, wait events and "
+                           "settings captured; full page images after a "
+                           "checkpoint make it spike. Compare with the "
+                           "server's WAL rate (wal module): snapshots "
+                           "should be a negligible share of it.",
+        outfile=outfile,
+        info=info,
+        batch=ai_batch,
+    )
+
+    finalize_module_report(outputdir, info, port, 'overhead',
+                           report_sections, single_file)
+    manifest.record(outputdir, info, port, 'overhead', fp)
+    mpclose('all')
+
+
+# WAL bytes of a snapshot_stats row in kB (NULL when taken during recovery)
+def wal_kb(row):
+    return float(row['wal_bytes'] or 0) / 1024
+
+
+# Deterministic rule findings handed to the LLM and used as a severity floor
+@profiler.traced()
+def calc_findings(tstamps, total_ms):
+    findings = []
+    if len(tstamps) < 2 or len(total_ms) != len(tstamps):
+        return findings
+    interval = statistics.median(
+        (b - a).total_seconds() for a, b in zip(tstamps, tstamps[1:]))
+    if interval <= 0:
+        return findings
+    share = statistics.mean(total_ms) / 1000 / interval
+    if share > OVERHEAD_WARNING:
+        findings.append({
+            'severity': 'WARNING',
+            'message': f'snapshots take {statistics.mean(total_ms):.0f} ms '
+                       f'on average, {share:.1%} of the {interval:.0f}s '
+                       f'interval between them',
+        })
+    return findings
+
+
+# Components pgstatviz.snapshot() skipped (over their time budget, or they
+# failed), leaving gaps in the charts of the modules that read them
+@profiler.traced()
+def calc_skipped(data):
+    skipped, snapshots = {}, set()
+    for row in data:
+        snapshots.add(row['bucket'])
+        if row.get('skipped'):
+            skipped.setdefault(row['component'], []).append(row['skipped'])
+    return [{
+        'severity': 'WARNING',
+        'message': f'{component} was skipped in {len(reasons)} of '
+                   f'{len(snapshots)} snapshots, most often because: '
+                   f'{max(sorted(set(reasons)), key=reasons.count)}',
+    } for component, reasons in sorted(skipped.items())]
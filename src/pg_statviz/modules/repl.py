@@ -13,13 +13,17 @@ from argh.decorators import arg
 from dateutil.parser import isoparse
 from matplotlib.pyplot import close as mpclose
 from pandas import DataFrame
-from pg_statviz.libs import plot
-from pg_statviz.libs.ai import (AI_HELP, AI_PROVIDERS,
+from pg_statviz.libs import manifest, plot, profiler, snapcache
+from pg_statviz.libs.ai import (AI_BATCH, AI_BATCH_HELP, AI_HELP,
+                                AI_PROVIDERS,
                                 DEFAULT_AI_PROVIDER,
                                 run_chart_analysis)
 from pg_statviz.libs.dbconn import dbconn
-from pg_statviz.libs.html_report import finalize_module_report
-from pg_statviz.libs.info import getinfo, get_settings
+from pg_statviz.libs.html_report import (SINGLE_FILE_HELP, check_single_file,
+                                         finalize_module_report)
+from pg_statviz.libs.info import (SOURCE_HOST_HELP, getinfo, get_settings,
+                                  get_skipped, source_filter)
+from pg_statviz.libs.pivot import pivot_frame, top_series
 
 
 @arg('-d', '--dbname', help="database name to analyze")
@@ -36,24 +40,44 @@ from pg_statviz.libs.info import getinfo, get_settings
 @arg('--ai', nargs='?', const=DEFAULT_AI_PROVIDER, default=None,
      choices=AI_PROVIDERS, metavar='PROVIDER',
      help=AI_HELP)
+@arg('--ai-batch', type=int, nargs='?', const=AI_BATCH, metavar='N',
+     help=AI_BATCH_HELP)
 @arg('--info', help=argparse.SUPPRESS)
 @arg('--conn', help=argparse.SUPPRESS)
+@arg('--max-series', type=int, metavar='N', help=plot.MAX_SERIES_HELP)
+@arg('--max-points', type=int, metavar='N', help=plot.MAX_POINTS_HELP)
+@arg('--downsample', choices=plot.DOWNSAMPLERS, help=plot.DOWNSAMPLE_HELP)
+@arg('--dpi', type=int, help=plot.DPI_HELP)
+@arg('--format', choices=plot.FORMATS, help=plot.FORMAT_HELP)
+@arg('--optimize', action='store_true', help=plot.OPTIMIZE_HELP)
+@arg('--single-file', action='store_true', help=SINGLE_FILE_HELP)
+@arg('--incremental', action='store_true', help=manifest.INCREMENTAL_HELP)
+@arg('--cache-dir', metavar='DIR', help=snapcache.CACHE_DIR_HELP)
+@arg('--source-host', metavar='HOSTNAME', help=SOURCE_HOST_HELP)
+@arg('--profile', metavar='FILE', help=profiler.PROFILE_HELP)
+@profiler.command
 def repl(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
          username=getpass.getuser(), password=None, daterange=[],
-         outputdir=None, ai=None, info=None, conn=None):
+         outputdir=None, ai=None, ai_batch=0, info=None, conn=None,
+         max_series=plot.MAX_SERIES, max_points=plot.MAX_POINTS,
+         downsample=plot.DOWNSAMPLE,
+         dpi=plot.DPI, format=plot.FORMAT, optimize=False,
+         single_file=False, incremental=False, cache_dir=None,
+         source_host=None, profile=None):
     "run replication analysis module"
 
     logging.basicConfig()
     _logger = logging.getLogger(__name__)
     _logger.setLevel(logging.INFO)
 
+    check_single_file(single_file, ai)
     if not conn:
         conn_details = {'dbname': dbname, 'user': username,
                         'password': getpass.getpass("Password: ") if password
                         else password, 'host': host, 'port': port}
         conn = dbconn(**conn_details)
     if not info:
-        info = getinfo(conn)
+        info = getinfo(conn, source_host)
 
     _logger.info("Running replication analysis")
 
@@ -64,26 +88,58 @@ def repl(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
     else:
         daterange = ['-infinity', 'now()']
 
+    fp = manifest.fingerprint(conn, ['repl'], daterange, ai=ai,
+                              max_series=max_series, max_points=max_points,
+                              downsample=downsample, dpi=dpi, format=format,
+                              optimize=optimize, single_file=single_file,
+                              info=info)
+    if incremental and manifest.unchanged(outputdir, info, port, 'repl', fp):
+        _logger.info("Snapshots and options unchanged since the last run, "
+                     + "skipping")
+        return
+
     # Retrieve the snapshots from DB
-    cur = conn.cursor()
-    cur.execute("""SELECT standby_lag, slot_stats, snapshot_tstamp
-                   FROM pgstatviz.repl
-                   WHERE snapshot_tstamp BETWEEN %s AND %s
-                   ORDER BY snapshot_tstamp""",
-                (daterange[0], daterange[1]))
-    data = cur.fetchall()
+    where, params = source_filter(info)
+    data = snapcache.fetch(
+        conn, info, 'repl',
+        f"""SELECT standby_lag, slot_stats, snapshot_tstamp
+            FROM pgstatviz.repl
+            WHERE snapshot_tstamp BETWEEN %s AND %s{where}
+            ORDER BY snapshot_tstamp""",
+        daterange, params, cache_dir)
     if not data:
         _logger.warning("No replication stats found, skipping")
         return
 
     tstamps = [t['snapshot_tstamp'] for t in data]
+    # Snapshots that skipped the repl component, drawn as gaps
+    skipped = get_skipped(conn, info, 'repl', daterange)
     standby_lag = [s['standby_lag'] for s in data]
     slot_stats = [s['slot_stats'] for s in data]
     settings = get_settings(conn, ['max_wal_senders', 'max_replication_slots',
-                                   'max_wal_size'])
+                                   'max_wal_size'], info)
+
+    # Pivot standby lag and slot WAL retention once, for both the chart
+    # and the AI frame, keeping the standbys and slots with the worst peaks.
+    # Standbys sharing an application_name (e.g. the default walreceiver)
+    # are charted by the worst lag among them, as lag doesn't add up
+    lag_frame = top_series(pivot_frame(standby_lag, tstamps,
+                                       'application_name', 'lag_bytes',
+                                       combine='max'),
+                           max_series, by='peak')
+    wal_frame = top_series(pivot_frame(slot_stats, tstamps, 'slot_name',
+                                       'wal_bytes'),
+                           max_series, by='peak')
 
     # Build flattened DataFrame for AI analysis
-    repl_df = build_repl_dataframe(standby_lag, slot_stats, tstamps)
+    repl_df = build_repl_dataframe(lag_frame, wal_frame)
+
+    # Downsample if needed
+    r = plot.downsample(lag_frame, 'max', method=downsample, points=max_points,
+                        gaps=skipped)
+    rr = plot.downsample(wal_frame, 'max',
+                         method=downsample, points=max_points,
+                         gaps=skipped)
 
     report_sections = []
 
@@ -94,40 +150,9 @@ def repl(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
 
     # Plot Standby lag
     splt1.set_title("Standby replication lag")
-    # Determine all standbys
-    standbys = []
-    for sl in standby_lag:
-        if sl:
-            for s in sl:
-                if s['application_name'] not in standbys:
-                    standbys += s['application_name'],
     # Plot lag for each standby
-    for sb in standbys:
-        lag_bytes = []
-        for sl in standby_lag:
-            if not sl:
-                lag_bytes += 0,
-            else:
-                found = False
-                for s in sl:
-                    if s['application_name'] == sb:
-                        lag_bytes += (s['lag_bytes']
-                                      if s['lag_bytes'] is not None
-                                      else 0),
-                        found = True
-                if not found:
-                    lag_bytes += 0,
-        if not all(c == 0 for c in lag_bytes):
-            # Downsample if needed
-            lag_frame = DataFrame(data={sb: lag_bytes}, index=tstamps,
-                                  copy=False)
-            if len(tstamps) > plot.MAX_POINTS:
-                q = str(round(
-                    (tstamps[-1] - tstamps[0]).total_seconds()
-                    / plot.MAX_POINTS, 2))
-                r = lag_frame.resample(q + "s").max()
-            else:
-                r = lag_frame
+    for sb in lag_frame.columns:
+        if not all(c == 0 for c in lag_frame[sb]):
             splt1.plot(r.index, r[sb], label=sb)
     splt1.set_xlabel("Timestamp", fontweight='semibold')
     splt1.set_ylabel("Lag (bytes)", fontweight='semibold')
@@ -136,41 +161,10 @@ def repl(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
 
     # Plot Slot WAL accumulation
     splt2.set_title("Replication slot WAL retention")
-    # Determine all slots
-    slots = []
-    for ss in slot_stats:
-        if ss:
-            for s in ss:
-                if s['slot_name'] not in slots:
-                    slots += s['slot_name'],
     # Plot WAL bytes for each slot
-    for slot in slots:
-        wal_bytes = []
-        for ss in slot_stats:
-            if not ss:
-                wal_bytes += 0,
-            else:
-                found = False
-                for s in ss:
-                    if s['slot_name'] == slot:
-                        wal_bytes += (s['wal_bytes']
-                                      if s['wal_bytes'] is not None
-                                      else 0),
-                        found = True
-                if not found:
-                    wal_bytes += 0,
-        if not all(c == 0 for c in wal_bytes):
-            # Downsample if needed
-            wal_frame = DataFrame(data={slot: wal_bytes}, index=tstamps,
-                                  copy=False)
-            if len(tstamps) > plot.MAX_POINTS:
-                q = str(round(
-                    (tstamps[-1] - tstamps[0]).total_seconds()
-                    / plot.MAX_POINTS, 2))
-                r = wal_frame.resample(q + "s").max()
-            else:
-                r = wal_frame
-            splt2.plot(r.index, r[slot], label=slot)
+    for slot in wal_frame.columns:
+        if not all(c == 0 for c in wal_frame[slot]):
+            splt2.plot(rr.index, rr[slot], label=slot)
     splt2.set_xlabel("Timestamp", fontweight='semibold')
     splt2.set_ylabel("WAL retention (bytes)", fontweight='semibold')
     splt2.set_ylim(bottom=0)
@@ -181,9 +175,9 @@ def repl(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
     outfile = f"""{
         outputdir.rstrip("/") + "/" if outputdir
         else ''}pg_statviz_{info['hostname']
-                            .replace("/", "-")}_{port}_repl.png"""
+                            .replace("/", "-")}_{port}_repl.{format}"""
     _logger.info(f"Saving {outfile}")
-    plt.savefig(outfile)
+    plot.save(outfile, dpi, optimize)
     if ai and not repl_df.empty:
         run_chart_analysis(
             report_sections, ai, repl_df, "Replication",
@@ -197,69 +191,25 @@ def repl(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
             outfile=outfile,
             info=info,
             settings=settings,
+            batch=ai_batch,
+            limits={'*_lag_bytes': 2**30, '*_wal_bytes': 10 * 2**30},
         )
 
     finalize_module_report(outputdir, info, port, 'repl',
-                           report_sections)
+                           report_sections, single_file)
+    manifest.record(outputdir, info, port, 'repl', fp)
     mpclose('all')
 
 
-# Build a flattened DataFrame from replication stats for AI analysis
-def build_repl_dataframe(standby_lag, slot_stats, tstamps):
+# Build a flattened DataFrame from the pivoted replication stats for AI
+# analysis
+@profiler.traced()
+def build_repl_dataframe(lag_frame, wal_frame):
     data = {}
-
-    # Determine all standbys
-    standbys = []
-    for sl in standby_lag:
-        if sl:
-            for s in sl:
-                if s['application_name'] not in standbys:
-                    standbys.append(s['application_name'])
-
-    # Build lag columns
-    for sb in standbys:
-        lag_bytes = []
-        for sl in standby_lag:
-            if not sl:
-                lag_bytes.append(0)
-            else:
-                found = False
-                for s in sl:
-                    if s['application_name'] == sb:
-                        lag_bytes.append(s['lag_bytes']
-                                         if s['lag_bytes'] is not None else 0)
-                        found = True
-                        break
-                if not found:
-                    lag_bytes.append(0)
-        if not all(v == 0 for v in lag_bytes):
-            data[f"{sb}_lag_bytes"] = lag_bytes
-
-    # Determine all slots
-    slots = []
-    for ss in slot_stats:
-        if ss:
-            for s in ss:
-                if s['slot_name'] not in slots:
-                    slots.append(s['slot_name'])
-
-    # Build slot WAL columns
-    for slot in slots:
-        wal_bytes = []
-        for ss in slot_stats:
-            if not ss:
-                wal_bytes.append(0)
-            else:
-                found = False
-                for s in ss:
-                    if s['slot_name'] == slot:
-                        wal_bytes.append(s['wal_bytes']
-                                         if s['wal_bytes'] is not None else 0)
-                        found = True
-                        break
-                if not found:
-                    wal_bytes.append(0)
-        if not all(v == 0 for v in wal_bytes):
-            data[f"{slot}_wal_bytes"] = wal_bytes
-
-    return DataFrame(data=data, index=tstamps, copy=False)
+    for sb in lag_frame.columns:
+        if not all(v == 0 for v in lag_frame[sb]):
+            data[f"{sb}_lag_bytes"] = lag_frame[sb]
+    for slot in wal_frame.columns:
+        if not all(v == 0 for v in wal_frame[slot]):
+            data[f"{slot}_wal_bytes"] = wal_frame[slot]
+    return DataFrame(data=data, index=lag_frame.index, copy=False)
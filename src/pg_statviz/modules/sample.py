@@ -0,0 +1,192 @@
+"""
+pg_statviz - stats visualization and time series analysis
+
+High-frequency activity sampler. Snapshots only see the wait events of the
+instant they're taken, every few minutes, so short storms go unnoticed.
+This polls pg_stat_activity many times a second with a prepared statement,
+aggregates the wait events and the query and transaction ages of the
+active sessions in memory, and writes one row per window to
+pgstatviz.wait_sample, which the wait module charts with --sampled.
+"""
+
+__author__ = "Jimmy Angelakos"
+__copyright__ = "Copyright (c) 2026 Jimmy Angelakos"
+__license__ = "PostgreSQL License"
+
+import getpass
+import logging
+import time
+import numpy
+from datetime import timedelta
+from argh.decorators import arg
+from psycopg.rows import tuple_row
+from psycopg.types.json import Jsonb
+from pg_statviz.libs import profiler
+from pg_statviz.libs.dbconn import dbconn
+from pg_statviz.modules.collect import (check_repository, conninfo_conn,
+                                        source_name)
+
+
+logging.basicConfig()
+_logger = logging.getLogger(__name__)
+_logger.setLevel(logging.INFO)
+
+
+HZ = 10
+MAX_HZ = 100
+WINDOW = 15
+
+# Upper bounds in seconds of the query and transaction age histogram
+# buckets, the last one catching everything older
+AGE_BOUNDS = (0.01, 0.1, 1, 10, 60, 300, 3600)
+
+# Polled with a prepared statement: the sampler's own session is left out
+ACTIVITY = """SELECT wait_event_type, wait_event,
+                     date_part('epoch', clock_timestamp() - query_start),
+                     date_part('epoch', clock_timestamp() - xact_start)
+              FROM pg_stat_activity
+              WHERE datname = current_database()
+              AND state = 'active'
+              AND pid != pg_backend_pid()"""
+
+
+@arg('-d', '--dbname', help="database name to sample")
+@arg('-h', '--host', metavar="HOSTNAME",
+     help="database server host or socket directory to sample")
+@arg('-p', '--port', help="database server port")
+@arg('-U', '--username', help="database user name")
+@arg('-W', '--password', action='store_true',
+     help="force password prompt (should happen automatically)")
+@arg('-R', '--repository', metavar='CONNINFO',
+     help="connection string of a repository database to write the "
+          + "samples to, e.g. 'host=central dbname=stats', instead of the "
+          + "sampled database (e.g. for a standby)")
+@arg('--source-host', metavar='HOSTNAME',
+     help="name to record the samples under in the repository, if not the "
+          + "host (or this machine's name, for a socket directory)")
+@arg('--hz', type=float, metavar='N',
+     help=f"times a second to sample (up to {MAX_HZ})")
+@arg('--window', type=float, metavar='SECONDS',
+     help="seconds of samples to aggregate into each row")
+@arg('--duration', type=float, metavar='SECONDS',
+     help="stop after SECONDS, instead of when interrupted")
+@arg('--profile', metavar='FILE', help=profiler.PROFILE_HELP)
+@profiler.command
+def sample(*, dbname=getpass.getuser(), host="/var/run/postgresql",
+           port="5432", username=getpass.getuser(), password=None,
+           repository=None, source_host=None, hz=HZ, window=WINDOW,
+           duration=None, profile=None):
+    "sample wait events many times a second into windows"
+
+    if not 0 < hz <= MAX_HZ:
+        raise SystemExit(f"--hz must be more than 0 and at most {MAX_HZ}")
+    if window * hz < 1:
+        raise SystemExit("--window must hold at least one sample")
+
+    conn_details = {'dbname': dbname, 'user': username,
+                    'password': getpass.getpass("Password: ") if password
+                    else password, 'host': host, 'port': port}
+    source = dbconn(**conn_details)
+    # pg_stat_activity is read once per transaction: every sample needs its
+    # own to see the sessions change
+    source.autocommit = True
+    if repository:
+        repo = conninfo_conn(repository)
+        source_host = source_host or source_name(host)
+    else:
+        repo = dbconn(**conn_details)
+        source_host = None
+    check_repository(repo)
+
+    _logger.info(f"Sampling {hz:g} times a second into {window:g}s windows")
+    run(source, repo, source_host, hz, window, duration)
+
+
+class Window:
+    """Aggregates of one window of samples: how many sessions were seen
+    waiting on each event, in total, and in each query and transaction age
+    bucket, summed over the samples."""
+
+    def __init__(self, start):
+        self.start = start
+        self.samples = 0
+        self.events = {}
+        self.query_ages = numpy.zeros(len(AGE_BOUNDS) + 1, dtype=numpy.int64)
+        self.xact_ages = numpy.zeros(len(AGE_BOUNDS) + 1, dtype=numpy.int64)
+
+    def add(self, rows):
+        self.samples += 1
+        for wait_event_type, wait_event, _, _ in rows:
+            if wait_event is not None:
+                key = (wait_event_type, wait_event)
+                self.events[key] = self.events.get(key, 0) + 1
+        _count(self.query_ages, [r[2] for r in rows if r[2] is not None])
+        _count(self.xact_ages, [r[3] for r in rows if r[3] is not None])
+
+    def row(self, seconds):
+        """The wait_sample columns after snapshot_tstamp: the wait events as
+        pgstatviz.wait has them, but averaged over the samples."""
+        events = [{'wait_event_type': t, 'wait_event': e,
+                   'wait_event_count': n / self.samples}
+                  for (t, e), n in sorted(self.events.items())]
+        return [self.samples, seconds,
+                sum(self.events.values()) / self.samples, Jsonb(events),
+                Jsonb(_hist(self.query_ages)), Jsonb(_hist(self.xact_ages))]
+
+
+def _count(hist, ages):
+    if ages:
+        hist += numpy.bincount(numpy.searchsorted(AGE_BOUNDS, ages),
+                               minlength=len(hist))
+
+
+def _hist(counts):
+    return {'bounds': list(AGE_BOUNDS), 'counts': counts.tolist()}
+
+
+@profiler.traced('db')
+def flush(repo, tstamp, current, seconds, source_host=None):
+    "Write a Window of samples as a snapshot of `source_host`."
+    cur = repo.cursor()
+    cur.execute("""INSERT INTO pgstatviz.snapshots (snapshot_tstamp, source)
+                   VALUES (%s, %s)""", (tstamp, source_host))
+    cur.execute("""INSERT INTO pgstatviz.wait_sample
+                   VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+                (tstamp, *current.row(seconds)))
+    repo.commit()
+    cur.close()
+
+
+def run(source, repo, source_host, hz, window, duration=None,
+        clock=time.monotonic, sleep=time.sleep):
+    """Sample `source` `hz` times a second, writing a window to `repo`
+    every `window` seconds, for `duration` seconds or until interrupted.
+    Windows are timestamped on the server's clock."""
+    cur = source.cursor(row_factory=tuple_row)
+    cur.execute("SELECT clock_timestamp()")
+    server_start, started = cur.fetchone()[0], clock()
+    period = 1 / hz
+    current = Window(started)
+    tick = started
+    try:
+        while duration is None or tick - started < duration:
+            now = clock()
+            if now >= current.start + window:
+                flush(repo, server_start
+                      + timedelta(seconds=current.start - started),
+                      current, window, source_host)
+                # Windows stay aligned, even after a stall
+                current = Window(current.start
+                                 + (now - current.start) // window * window)
+            cur.execute(ACTIVITY, prepare=True)
+            current.add(cur.fetchall())
+            # Poll again straight away when a slow poll or flush left no
+            # time to wait
+            tick = max(tick + period, clock())
+            sleep(max(0, tick - clock()))
+    except KeyboardInterrupt:
+        pass
+    if current.samples:
+        flush(repo, server_start + timedelta(seconds=current.start - started),
+              current, min(window, clock() - current.start), source_host)
+    cur.close()
@@ -13,13 +13,17 @@ from argh.decorators import arg
 from dateutil.parser import isoparse
 from matplotlib.pyplot import close as mpclose
 from pandas import DataFrame
-from pg_statviz.libs import plot
-from pg_statviz.libs.ai import (AI_HELP, AI_PROVIDERS,
+from pg_statviz.libs import manifest, plot, profiler, snapcache
+from pg_statviz.libs.ai import (AI_BATCH, AI_BATCH_HELP, AI_HELP,
+                                AI_PROVIDERS,
                                 DEFAULT_AI_PROVIDER,
                                 run_chart_analysis)
 from pg_statviz.libs.dbconn import dbconn
-from pg_statviz.libs.html_report import finalize_module_report
-from pg_statviz.libs.info import getinfo
+from pg_statviz.libs.html_report import (SINGLE_FILE_HELP, check_single_file,
+                                         finalize_module_report)
+from pg_statviz.libs.info import (SOURCE_HOST_HELP, ext_version_at_least,
+                                  getinfo, get_skipped, source_filter)
+from pg_statviz.libs.pivot import breakdown_frame, pivot
 
 
 @arg('-d', '--dbname', help="database name to analyze")
@@ -36,24 +40,42 @@ from pg_statviz.libs.info import getinfo
 @arg('--ai', nargs='?', const=DEFAULT_AI_PROVIDER, default=None,
      choices=AI_PROVIDERS, metavar='PROVIDER',
      help=AI_HELP)
+@arg('--ai-batch', type=int, nargs='?', const=AI_BATCH, metavar='N',
+     help=AI_BATCH_HELP)
 @arg('--info', help=argparse.SUPPRESS)
 @arg('--conn', help=argparse.SUPPRESS)
+@arg('--max-points', type=int, metavar='N', help=plot.MAX_POINTS_HELP)
+@arg('--downsample', choices=plot.DOWNSAMPLERS, help=plot.DOWNSAMPLE_HELP)
+@arg('--dpi', type=int, help=plot.DPI_HELP)
+@arg('--format', choices=plot.FORMATS, help=plot.FORMAT_HELP)
+@arg('--optimize', action='store_true', help=plot.OPTIMIZE_HELP)
+@arg('--single-file', action='store_true', help=SINGLE_FILE_HELP)
+@arg('--incremental', action='store_true', help=manifest.INCREMENTAL_HELP)
+@arg('--cache-dir', metavar='DIR', help=snapcache.CACHE_DIR_HELP)
+@arg('--source-host', metavar='HOSTNAME', help=SOURCE_HOST_HELP)
+@arg('--profile', metavar='FILE', help=profiler.PROFILE_HELP)
+@profiler.command
 def slru(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
          username=getpass.getuser(), password=None, daterange=[],
-         outputdir=None, ai=None, info=None, conn=None):
+         outputdir=None, ai=None, ai_batch=0, info=None, conn=None,
+         max_points=plot.MAX_POINTS, downsample=plot.DOWNSAMPLE,
+         dpi=plot.DPI, format=plot.FORMAT, optimize=False,
+         single_file=False, incremental=False, cache_dir=None,
+         source_host=None, profile=None):
     "run SLRU analysis module"
 
     logging.basicConfig()
     _logger = logging.getLogger(__name__)
     _logger.setLevel(logging.INFO)
 
+    check_single_file(single_file, ai)
     if not conn:
         conn_details = {'dbname': dbname, 'user': username,
                         'password': getpass.getpass("Password: ") if password
                         else password, 'host': host, 'port': port}
         conn = dbconn(**conn_details)
     if not info:
-        info = getinfo(conn)
+        info = getinfo(conn, source_host)
 
     _logger.info("Running SLRU analysis")
 
@@ -64,27 +86,59 @@ def slru(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
     else:
         daterange = ['-infinity', 'now()']
 
-    # Retrieve the snapshots from DB
+    fp = manifest.fingerprint(conn, ['slru'], daterange, ai=ai,
+                              max_points=max_points, downsample=downsample,
+                              dpi=dpi, format=format, optimize=optimize,
+                              single_file=single_file, info=info)
+    if incremental and manifest.unchanged(outputdir, info, port, 'slru', fp):
+        _logger.info("Snapshots and options unchanged since the last run, "
+                     + "skipping")
+        return
+
+    # Retrieve the snapshots from DB: bucketed server-side if the extension
+    # can and they are to be averaged, otherwise pivot hit ratios and block
+    # reads per SLRU in one pass
+    where, params = source_filter(info)
     cur = conn.cursor()
-    cur.execute("""SELECT slru_stats, snapshot_tstamp
-                   FROM pgstatviz.slru
-                   WHERE snapshot_tstamp BETWEEN %s AND %s
-                   ORDER BY snapshot_tstamp""",
-                (daterange[0], daterange[1]))
-    data = cur.fetchall()
-    if not data:
-        raise SystemExit("No pg_statviz snapshots found in this database")
-
-    tstamps = [t['snapshot_tstamp'] for t in data]
-    slru_stats = [s['slru_stats'] for s in data]
-
-    # Determine all SLRU names
-    slru_names = []
-    for ss in slru_stats:
-        if ss:
-            for s in ss:
-                if s['name'] not in slru_names:
-                    slru_names += s['name'],
+    if downsample == 'mean' and ext_version_at_least(info, '1.3'):
+        cur.execute("""SELECT bucket, name, hit_ratio, blks_read
+                       FROM pgstatviz.slru_breakdown(
+                           %s, %s, %s, source => %s)""",
+                    (daterange[0], daterange[1], max_points,
+                     info.get('source')))
+        data = cur.fetchall()
+        if not data:
+            raise SystemExit("No pg_statviz snapshots found in this database")
+        r = breakdown_frame(data, 'name', 'hit_ratio')
+        rr = breakdown_frame(data, 'name', 'blks_read')
+    else:
+        data = snapcache.fetch(
+            conn, info, 'slru',
+            f"""SELECT slru_stats, snapshot_tstamp
+                FROM pgstatviz.slru
+                WHERE snapshot_tstamp BETWEEN %s AND %s{where}
+                ORDER BY snapshot_tstamp""",
+            daterange, params, cache_dir)
+        if not data:
+            raise SystemExit("No pg_statviz snapshots found in this database")
+
+        tstamps = [t['snapshot_tstamp'] for t in data]
+        # Snapshots that skipped the slru component, drawn as gaps
+        skipped = get_skipped(conn, info, 'slru', daterange)
+        slru_stats = [s['slru_stats'] for s in data]
+        slru_names, hit_ratios, reads = pivot(slru_stats, 'name', hit_ratio,
+                                              'blks_read')
+        hr_frame = DataFrame(data=hit_ratios, index=tstamps,
+                             columns=slru_names, copy=False)
+        read_frame = DataFrame(data=reads, index=tstamps, columns=slru_names,
+                               copy=False)
+
+        # Downsample if needed
+        r = plot.downsample(hr_frame, method=downsample, points=max_points,
+                            gaps=skipped)
+        rr = plot.downsample(read_frame, 'sum',
+                             method=downsample, points=max_points,
+                             gaps=skipped)
 
     # Plot SLRU hit ratios and read rates
     plt, fig, splt1, splt2 = plot.setupdouble()
@@ -93,34 +147,8 @@ def slru(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
 
     # Plot SLRU hit ratios
     splt1.set_title("SLRU cache hit ratio")
-    for name in slru_names:
-        hit_ratios = []
-        for ss in slru_stats:
-            if not ss:
-                hit_ratios += 0,
-            else:
-                found = False
-                for s in ss:
-                    if s['name'] == name:
-                        total = s['blks_hit'] + s['blks_read']
-                        if total > 0:
-                            hit_ratios += (s['blks_hit'] / total) * 100,
-                        else:
-                            hit_ratios += 0,
-                        found = True
-                if not found:
-                    hit_ratios += 0,
-        if not all(c == 0 for c in hit_ratios):
-            # Downsample if needed
-            hr_frame = DataFrame(data={name: hit_ratios}, index=tstamps,
-                                 copy=False)
-            if len(tstamps) > plot.MAX_POINTS:
-                q = str(round(
-                    (tstamps[-1] - tstamps[0]).total_seconds()
-                    / plot.MAX_POINTS, 2))
-                r = hr_frame.resample(q + "s").mean()
-            else:
-                r = hr_frame
+    for name in r.columns:
+        if not all(c == 0 for c in r[name]):
             splt1.plot(r.index, r[name], label=name)
     splt1.set_xlabel("Timestamp", fontweight='semibold')
     splt1.set_ylabel("Hit ratio (%)", fontweight='semibold')
@@ -129,31 +157,9 @@ def slru(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
 
     # Plot SLRU reads
     splt2.set_title("SLRU block reads")
-    for name in slru_names:
-        reads = []
-        for ss in slru_stats:
-            if not ss:
-                reads += 0,
-            else:
-                found = False
-                for s in ss:
-                    if s['name'] == name:
-                        reads += s['blks_read'],
-                        found = True
-                if not found:
-                    reads += 0,
-        if not all(c == 0 for c in reads):
-            # Downsample if needed
-            read_frame = DataFrame(data={name: reads}, index=tstamps,
-                                   copy=False)
-            if len(tstamps) > plot.MAX_POINTS:
-                q = str(round(
-                    (tstamps[-1] - tstamps[0]).total_seconds()
-                    / plot.MAX_POINTS, 2))
-                r = read_frame.resample(q + "s").sum()
-            else:
-                r = read_frame
-            splt2.plot(r.index, r[name], label=name)
+    for name in rr.columns:
+        if not all(c == 0 for c in rr[name]):
+            splt2.plot(rr.index, rr[name], label=name)
     splt2.set_xlabel("Timestamp", fontweight='semibold')
     splt2.set_ylabel("Blocks read", fontweight='semibold')
     splt2.set_ylim(bottom=0)
@@ -164,14 +170,14 @@ def slru(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
     outfile = f"""{
         outputdir.rstrip("/") + "/" if outputdir
         else ''}pg_statviz_{info['hostname']
-                            .replace("/", "-")}_{port}_slru.png"""
+                            .replace("/", "-")}_{port}_slru.{format}"""
     _logger.info(f"Saving {outfile}")
-    plt.savefig(outfile)
+    plot.save(outfile, dpi, optimize)
 
     report_sections = []
     if ai:
         # Build flattened DataFrame for AI analysis
-        slru_df = build_slru_dataframe(slru_stats, slru_names, tstamps)
+        slru_df = build_slru_dataframe(r, rr)
         if not slru_df.empty:
             run_chart_analysis(
                 report_sections, ai, slru_df, "SLRU",
@@ -183,42 +189,28 @@ def slru(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
                                    "[HEALTHY].",
                 outfile=outfile,
                 info=info,
+                batch=ai_batch,
             )
 
     finalize_module_report(outputdir, info, port, 'slru',
-                           report_sections)
+                           report_sections, single_file)
+    manifest.record(outputdir, info, port, 'slru', fp)
     mpclose('all')
 
 
-# Build a flattened DataFrame from SLRU stats for AI analysis
-def build_slru_dataframe(slru_stats, slru_names, tstamps):
-    data = {}
+# Per-entry SLRU cache hit ratio in %
+def hit_ratio(s):
+    total = s['blks_hit'] + s['blks_read']
+    return (s['blks_hit'] / total) * 100 if total > 0 else 0
 
-    for name in slru_names:
-        hit_ratios = []
-        reads = []
-        for ss in slru_stats:
-            if not ss:
-                hit_ratios.append(0)
-                reads.append(0)
-            else:
-                found = False
-                for s in ss:
-                    if s['name'] == name:
-                        total = s['blks_hit'] + s['blks_read']
-                        if total > 0:
-                            hit_ratios.append((s['blks_hit'] / total) * 100)
-                        else:
-                            hit_ratios.append(0)
-                        reads.append(s['blks_read'])
-                        found = True
-                        break
-                if not found:
-                    hit_ratios.append(0)
-                    reads.append(0)
-        if not all(v == 0 for v in hit_ratios):
-            data[f"{name}_hit_ratio"] = hit_ratios
-        if not all(v == 0 for v in reads):
-            data[f"{name}_blks_read"] = reads
-
-    return DataFrame(data=data, index=tstamps, copy=False)
+
+# Build a flattened DataFrame from the pivoted SLRU stats for AI analysis
+@profiler.traced()
+def build_slru_dataframe(hr_frame, read_frame):
+    data = {}
+    for name in hr_frame.columns:
+        if not all(v == 0 for v in hr_frame[name]):
+            data[f"{name}_hit_ratio"] = hr_frame[name]
+        if not all(v == 0 for v in read_frame[name]):
+            data[f"{name}_blks_read"] = read_frame[name]
+    return DataFrame(data=data, index=hr_frame.index, copy=False)
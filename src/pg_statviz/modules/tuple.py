@@ -14,13 +14,17 @@ from argh.decorators import arg
 from dateutil.parser import isoparse
 from matplotlib.pyplot import close as mpclose
 from pandas import DataFrame
-from pg_statviz.libs import plot
-from pg_statviz.libs.ai import (AI_HELP, AI_PROVIDERS,
+from pg_statviz.libs import manifest, plot, profiler, snapcache
+from pg_statviz.libs.ai import (AI_BATCH, AI_BATCH_HELP, AI_HELP,
+                                AI_PROVIDERS,
                                 DEFAULT_AI_PROVIDER,
                                 run_chart_analysis)
 from pg_statviz.libs.dbconn import dbconn
-from pg_statviz.libs.html_report import finalize_module_report
-from pg_statviz.libs.info import getinfo, get_settings
+from pg_statviz.libs.html_report import (SINGLE_FILE_HELP, check_single_file,
+                                         finalize_module_report)
+from pg_statviz.libs.info import (SOURCE_HOST_HELP, getinfo, get_settings,
+                                  get_skipped, source_filter)
+from pg_statviz.libs.seasonal import report_seasonal
 
 
 @arg('-d', '--dbname', help="database name to analyze")
@@ -37,26 +41,47 @@ from pg_statviz.libs.info import getinfo, get_settings
 @arg('--ai', nargs='?', const=DEFAULT_AI_PROVIDER, default=None,
      choices=AI_PROVIDERS, metavar='PROVIDER',
      help=AI_HELP)
+@arg('--ai-batch', type=int, nargs='?', const=AI_BATCH, metavar='N',
+     help=AI_BATCH_HELP)
 @arg('--info', help=argparse.SUPPRESS)
 @arg('--conn', help=argparse.SUPPRESS)
+@arg('--max-points', type=int, metavar='N', help=plot.MAX_POINTS_HELP)
+@arg('--downsample', choices=plot.DOWNSAMPLERS, help=plot.DOWNSAMPLE_HELP)
+@arg('--dpi', type=int, help=plot.DPI_HELP)
+@arg('--format', choices=plot.FORMATS, help=plot.FORMAT_HELP)
+@arg('--optimize', action='store_true', help=plot.OPTIMIZE_HELP)
+@arg('--single-file', action='store_true', help=SINGLE_FILE_HELP)
+@arg('--incremental', action='store_true', help=manifest.INCREMENTAL_HELP)
+@arg('--cache-dir', metavar='DIR', help=snapcache.CACHE_DIR_HELP)
+@arg('--source-host', metavar='HOSTNAME', help=SOURCE_HOST_HELP)
+@arg('--seasonal', choices=plot.SEASONS, help=plot.SEASONAL_HELP)
+@arg('--profile', metavar='FILE', help=profiler.PROFILE_HELP)
+@profiler.command
 def tuple(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
           username=getpass.getuser(), password=None, daterange=[],
-          outputdir=None, ai=None, info=None, conn=None):
+          outputdir=None, ai=None, ai_batch=0, info=None, conn=None,
+          max_points=plot.MAX_POINTS, downsample=plot.DOWNSAMPLE,
+          dpi=plot.DPI, format=plot.FORMAT, optimize=False,
+          single_file=False, incremental=False, cache_dir=None,
+          source_host=None, seasonal=None, profile=None):
     "run tuple count analysis module"
 
     logging.basicConfig()
     _logger = logging.getLogger(__name__)
     _logger.setLevel(logging.INFO)
 
+    check_single_file(single_file, ai)
     if not conn:
         conn_details = {'dbname': dbname, 'user': username,
                         'password': getpass.getpass("Password: ") if password
                         else password, 'host': host, 'port': port}
         conn = dbconn(**conn_details)
     if not info:
-        info = getinfo(conn)
+        info = getinfo(conn, source_host)
 
     _logger.info("Running tuple count analysis")
+    # Seasonal charts are reported apart from the timelines
+    name = f"tuple-{seasonal}" if seasonal else 'tuple'
 
     if daterange:
         daterange = [isoparse(d) for d in daterange]
@@ -65,23 +90,37 @@ def tuple(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
     else:
         daterange = ['-infinity', 'now()']
 
-    cur = conn.cursor()
-    cur.execute("""SELECT tup_returned, tup_fetched, tup_inserted, tup_updated,
-                          tup_deleted, snapshot_tstamp, stats_reset
-                   FROM pgstatviz.db
-                   WHERE snapshot_tstamp BETWEEN %s AND %s
-                   ORDER BY snapshot_tstamp""",
-                (daterange[0], daterange[1]))
-    data = cur.fetchall()
+    fp = manifest.fingerprint(conn, ['db'], daterange, ai=ai,
+                              max_points=max_points, downsample=downsample,
+                              dpi=dpi, format=format, optimize=optimize,
+                              single_file=single_file, seasonal=seasonal,
+                              info=info)
+    if incremental and manifest.unchanged(outputdir, info, port, name, fp):
+        _logger.info("Snapshots and options unchanged since the last run, "
+                     + "skipping")
+        return
+
+    where, params = source_filter(info)
+    data = snapcache.fetch(
+        conn, info, 'tuple',
+        f"""SELECT tup_returned, tup_fetched, tup_inserted,
+                   tup_updated, tup_deleted, snapshot_tstamp,
+                   stats_reset
+            FROM pgstatviz.db
+            WHERE snapshot_tstamp BETWEEN %s AND %s{where}
+            ORDER BY snapshot_tstamp""",
+        daterange, params, cache_dir)
     if not data:
         raise SystemExit("No pg_statviz snapshots found in this database")
 
     tstamps = [t['snapshot_tstamp'] for t in data]
+    # Snapshots that skipped the db component, drawn as gaps
+    skipped = get_skipped(conn, info, 'db', daterange)
     settings = get_settings(conn, ['autovacuum', 'autovacuum_naptime',
                                    'autovacuum_max_workers',
                                    'autovacuum_work_mem',
                                    'vacuum_cost_delay',
-                                   'vacuum_cost_limit'])
+                                   'vacuum_cost_limit'], info)
     returned = [t['tup_returned'] for t in data]
     fetched = [t['tup_fetched'] for t in data]
     inserted = [t['tup_inserted'] for t in data]
@@ -101,14 +140,30 @@ def tuple(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
         data=tuplerates,
         columns=['returned', 'fetched', 'inserted', 'updated', 'deleted'],
         index=tstamps, copy=False)
-    if len(tstamps) > plot.MAX_POINTS:
-        q = str(round(
-            (tstamps[-1] - tstamps[0]).total_seconds() / plot.MAX_POINTS, 2))
-        r = tuple_frame.resample(q + "s").mean()
-        rr = tuplerate_frame.resample(q + "s").mean()
-    else:
-        r = tuple_frame
-        rr = tuplerate_frame
+
+    if seasonal:
+        # A typical week of the rates at full resolution, instead of the
+        # timelines
+        report_seasonal(
+            tuplerate_frame,
+            [("Tuple read rate by hour of the week",
+              {'returned': "returned", 'fetched': "fetched"}),
+             ("Tuple write rate by hour of the week",
+              {'inserted': "inserted", 'updated': "updated",
+               'deleted': "deleted"})],
+            "Avg. tuples per minute",
+            "Tuple Rate by Hour of the Week",
+            "Tuple operation RATES (derived from cumulative counters).",
+            name=name, fp=fp, info=info, port=port, outputdir=outputdir,
+            format=format, dpi=dpi, optimize=optimize, ai=ai,
+            ai_batch=ai_batch, single_file=single_file, settings=settings,
+            limits={})
+        return
+
+    r = plot.downsample(tuple_frame, method=downsample, points=max_points,
+                        gaps=skipped)
+    rr = plot.downsample(tuplerate_frame, method=downsample, points=max_points,
+                         gaps=skipped)
 
     report_sections = []
 
@@ -139,9 +194,9 @@ def tuple(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
     outfile = f"""{
         outputdir.rstrip("/") + "/" if outputdir
         else ''}pg_statviz_{info['hostname']
-                            .replace("/", "-")}_{port}_tuple.png"""
+                            .replace("/", "-")}_{port}_tuple.{format}"""
     _logger.info(f"Saving {outfile}")
-    plt.savefig(outfile)
+    plot.save(outfile, dpi, optimize)
     run_chart_analysis(
         report_sections, ai, r, "Tuple Statistics",
         metric_description="CUMULATIVE COUNTER — rising values are "
@@ -153,6 +208,8 @@ def tuple(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
         outfile=outfile,
         info=info,
         settings=settings,
+        batch=ai_batch,
+        limits={},
     )
 
     # Plot tuple read rates
@@ -187,9 +244,9 @@ def tuple(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
     outfile = f"""{
         outputdir.rstrip("/") + "/" if outputdir
         else ''}pg_statviz_{info['hostname']
-                            .replace("/", "-")}_{port}_tuple_rate.png"""
+                            .replace("/", "-")}_{port}_tuple_rate.{format}"""
     _logger.info(f"Saving {outfile}")
-    plt.savefig(outfile)
+    plot.save(outfile, dpi, optimize)
     run_chart_analysis(
         report_sections, ai, rr, "Tuple Rate",
         metric_description="Tuple operation RATES (derived from "
@@ -201,10 +258,13 @@ def tuple(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
         outfile=outfile,
         info=info,
         settings=settings,
+        batch=ai_batch,
+        limits={},
     )
 
-    finalize_module_report(outputdir, info, port, 'tuple',
-                           report_sections)
+    finalize_module_report(outputdir, info, port, name,
+                           report_sections, single_file)
+    manifest.record(outputdir, info, port, name, fp)
     mpclose('all')
 
 
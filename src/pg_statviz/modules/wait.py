@@ -14,13 +14,29 @@ from dateutil.parser import isoparse
 from matplotlib.pyplot import close as mpclose
 from matplotlib.ticker import MaxNLocator
 from pandas import DataFrame
-from pg_statviz.libs import plot
-from pg_statviz.libs.ai import (AI_HELP, AI_PROVIDERS,
+from pg_statviz.libs import manifest, plot, profiler, snapcache
+from pg_statviz.libs.ai import (AI_BATCH, AI_BATCH_HELP, AI_HELP,
+                                AI_PROVIDERS,
                                 DEFAULT_AI_PROVIDER,
                                 run_chart_analysis)
 from pg_statviz.libs.dbconn import dbconn
-from pg_statviz.libs.html_report import finalize_module_report
-from pg_statviz.libs.info import getinfo
+from pg_statviz.libs.html_report import (SINGLE_FILE_HELP, check_single_file,
+                                         finalize_module_report)
+from pg_statviz.libs.info import (SOURCE_HOST_HELP, ext_version_at_least,
+                                  getinfo, get_skipped, source_filter)
+from pg_statviz.libs.pivot import breakdown_frame, pivot_frame, top_series
+
+
+SAMPLED_DESCRIPTION = ("Wait events sampled many times a second, as the "
+                       "average number of active sessions waiting on each "
+                       "over each window of samples (active session "
+                       "history). Short storms the periodic snapshots miss "
+                       "show up here. 'LWLock' = internal contention. "
+                       "'Lock' = row/table lock waits. 'IO' = storage "
+                       "waits. 'Client' = waiting for client response. "
+                       "Compare the total with the number of CPU cores: "
+                       "warn only if it stays above them. Default to "
+                       "[HEALTHY].")
 
 
 @arg('-d', '--dbname', help="database name to analyze")
@@ -37,27 +53,62 @@ from pg_statviz.libs.info import getinfo
 @arg('--ai', nargs='?', const=DEFAULT_AI_PROVIDER, default=None,
      choices=AI_PROVIDERS, metavar='PROVIDER',
      help=AI_HELP)
+@arg('--ai-batch', type=int, nargs='?', const=AI_BATCH, metavar='N',
+     help=AI_BATCH_HELP)
 @arg('--info', help=argparse.SUPPRESS)
 @arg('--conn', help=argparse.SUPPRESS)
+@arg('--max-series', type=int, metavar='N', help=plot.MAX_SERIES_HELP)
+@arg('--max-points', type=int, metavar='N', help=plot.MAX_POINTS_HELP)
+@arg('--downsample', choices=plot.DOWNSAMPLERS, help=plot.DOWNSAMPLE_HELP)
+@arg('--dpi', type=int, help=plot.DPI_HELP)
+@arg('--format', choices=plot.FORMATS, help=plot.FORMAT_HELP)
+@arg('--optimize', action='store_true', help=plot.OPTIMIZE_HELP)
+@arg('--single-file', action='store_true', help=SINGLE_FILE_HELP)
+@arg('--incremental', action='store_true', help=manifest.INCREMENTAL_HELP)
+@arg('--cache-dir', metavar='DIR', help=snapcache.CACHE_DIR_HELP)
+@arg('--source-host', metavar='HOSTNAME', help=SOURCE_HOST_HELP)
+@arg('--sampled', action='store_true',
+     help="chart the wait events sampled many times a second by the sample "
+          + "command, averaged per window, instead of those of the snapshots")
+@arg('--heatmap', action='store_true', help=plot.HEATMAP_HELP)
+@arg('--profile', metavar='FILE', help=profiler.PROFILE_HELP)
+@profiler.command
 def wait(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
          username=getpass.getuser(), password=None, daterange=[],
-         outputdir=None, ai=None, info=None, conn=None):
+         outputdir=None, ai=None, ai_batch=0, info=None, conn=None,
+         max_series=plot.MAX_SERIES, max_points=plot.MAX_POINTS,
+         downsample=plot.DOWNSAMPLE,
+         dpi=plot.DPI, format=plot.FORMAT, optimize=False,
+         single_file=False, incremental=False, cache_dir=None,
+         source_host=None, sampled=False, heatmap=False, profile=None):
     "run wait events analysis module"
 
     logging.basicConfig()
     _logger = logging.getLogger(__name__)
     _logger.setLevel(logging.INFO)
 
+    check_single_file(single_file, ai)
     if not conn:
         conn_details = {'dbname': dbname, 'user': username,
                         'password': getpass.getpass("Password: ") if password
                         else password, 'host': host, 'port': port}
         conn = dbconn(**conn_details)
     if not info:
-        info = getinfo(conn)
+        info = getinfo(conn, source_host)
 
     _logger.info("Running wait events analysis")
 
+    # Sampled windows are in their own table, and named apart in the outputs
+    table, name = ('wait_sample', 'wait-sampled') if sampled \
+        else ('wait', 'wait')
+    if sampled and not ext_version_at_least(info, '1.3'):
+        _logger.warning("Sampled wait events are only available from "
+                        + "pg_statviz extension 1.3 onwards")
+        return
+    if heatmap and format == 'json':
+        _logger.info("Heatmaps are images, exporting the series instead")
+        heatmap = False
+
     if daterange:
         daterange = [isoparse(d) for d in daterange]
         if daterange[0] > daterange[1]:
@@ -65,102 +116,124 @@ def wait(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
     else:
         daterange = ['-infinity', 'now()']
 
-    # Retrieve the snapshots from DB
+    fp = manifest.fingerprint(conn, [table], daterange, ai=ai,
+                              max_series=max_series, max_points=max_points,
+                              downsample=downsample, dpi=dpi, format=format,
+                              optimize=optimize, single_file=single_file,
+                              heatmap=heatmap, info=info)
+    if incremental and manifest.unchanged(outputdir, info, port, name, fp):
+        _logger.info("Snapshots and options unchanged since the last run, "
+                     + "skipping")
+        return
+
+    # Retrieve the snapshots from DB, with their wait event counts when the
+    # extension can't bucket them server-side, or only by averaging
+    pivot = (sampled or downsample != 'mean'
+             or not ext_version_at_least(info, '1.3'))
+    where, params = source_filter(info)
     cur = conn.cursor()
-    cur.execute("""SELECT wait_events_total, wait_events, snapshot_tstamp
-                   FROM pgstatviz.wait
-                   WHERE snapshot_tstamp BETWEEN %s AND %s
-                   ORDER BY snapshot_tstamp""",
-                (daterange[0], daterange[1]))
-    data = cur.fetchall()
+    data = snapcache.fetch(
+        conn, info, name,
+        f"""SELECT wait_events_total, snapshot_tstamp{
+                ', wait_events' if pivot else ''}
+            FROM pgstatviz.{table}
+            WHERE snapshot_tstamp BETWEEN %s AND %s{where}
+            ORDER BY snapshot_tstamp""",
+        daterange, params, cache_dir)
     if not data:
         raise SystemExit("No pg_statviz snapshots found in this database")
 
     tstamps = [t['snapshot_tstamp'] for t in data]
-    wevents = [w['wait_events'] for w in data]
+    # Snapshots that skipped the wait component, drawn as gaps
+    skipped = [] if sampled else get_skipped(conn, info, 'wait', daterange)
     total = [t['wait_events_total'] for t in data]
 
-    # Determine all kinds of wait event for plotting
-    waitkinds = []
-    for w in wevents:
-        for e in w:
-            if 'wait_event' in e:
-                wk = {'wait_event_type': e['wait_event_type'],
-                      'wait_event': e['wait_event']}
-                if wk not in waitkinds:
-                    waitkinds += wk,
-
-    # Plot as many of each wait event kind we have per snapshot
-    plt, fig = plot.setup()
-    plt.suptitle(f"pg_statviz · {info['hostname']}:{port}",
-                 fontweight='semibold')
-    plt.title("Wait events")
-    for wk in waitkinds:
-        wc = []
-        for w in wevents:
-            if not w:
-                wc += 0,
-            else:
-                found = False
-                for e in w:
-                    if wk.items() <= e.items():
-                        wc += e['wait_event_count'],
-                        found = True
-                if not found:
-                    wc += 0,
-        wk = (wk['wait_event_type'], wk['wait_event'])
+    # Wait event counts per event type/name for the busiest events (all of
+    # them for a heatmap), bucketed server-side if the extension can,
+    # otherwise pivoted here in one pass and downsampled
+    if not pivot:
+        cur.execute("""SELECT bucket, wait_event, wait_event_count
+                       FROM pgstatviz.wait_breakdown(
+                           %s, %s, %s, %s, %s)""",
+                    (daterange[0], daterange[1], max_points,
+                     None if heatmap else max_series or None,
+                     info.get('source')))
+        r = breakdown_frame(cur.fetchall(), 'wait_event', 'wait_event_count')
+    else:
+        wevents = [w['wait_events'] for w in data]
+        wc_frame = pivot_frame(wevents, tstamps, wait_kind,
+                               'wait_event_count')
+        if not heatmap:
+            wc_frame = top_series(wc_frame, max_series)
         # Downsample if needed
-        wc_frame = DataFrame(data={wk: wc}, index=tstamps, copy=False)
-        if len(tstamps) > plot.MAX_POINTS:
-            q = str(round(
-                (tstamps[-1] - tstamps[0]).total_seconds()
-                / plot.MAX_POINTS, 2))
-            r = wc_frame.resample(q + "s").mean()
-        else:
-            r = wc_frame
-        if not all(c == 0 for c in r[wk]):
-            plt.plot(r.index, r[wk],
-                     label=f"{wk[0]}/{wk[1]}")
-    # Plot total wait events
+        r = plot.downsample(wc_frame, method=downsample, points=max_points,
+                            gaps=skipped)
+
+    # Total wait events
     # # Downsample if needed
     total_frame = DataFrame(data=total, index=tstamps, copy=False)
-    if len(tstamps) > plot.MAX_POINTS:
-        q = str(round(
-            (tstamps[-1] - tstamps[0]).total_seconds()
-            / plot.MAX_POINTS, 2))
-        rr = total_frame.resample(q + "s").mean()
-    else:
-        rr = total_frame
+    rr = plot.downsample(total_frame, method=downsample, points=max_points,
+                         gaps=skipped)
 
     report_sections = []
 
-    plt.plot(rr.index, rr, label='Total')
-    fig.axes[0].set_ylim(bottom=0)
-    fig.gca().yaxis.set_major_locator(MaxNLocator(integer=True))
-    plt.xlabel("Timestamp", fontweight='semibold')
-    plt.ylabel("Wait event count (at time of snapshot)", fontweight='semibold')
+    title = "Wait events (sampled)" if sampled else "Wait events"
+    ylabel = "Average sessions waiting (per window)" if sampled \
+        else "Wait event count (at time of snapshot)"
+    if heatmap:
+        # Every wait event kind as a row of one image, busiest first
+        plt, fig = plot.heatmap(r, rr, title, ylabel)
+    else:
+        # Plot as many of each wait event kind we have per snapshot
+        plt, fig = plot.setup()
+        plt.title(title)
+        for wk in r.columns:
+            if not all(c == 0 for c in r[wk]):
+                plt.plot(r.index, r[wk],
+                         label=wk)
+        plt.plot(rr.index, rr, label='Total')
+        fig.axes[0].set_ylim(bottom=0)
+        if not sampled:
+            fig.gca().yaxis.set_major_locator(MaxNLocator(integer=True))
+        plt.xlabel("Timestamp", fontweight='semibold')
+        plt.ylabel(ylabel, fontweight='semibold')
+        fig.legend()
+    plt.suptitle(f"pg_statviz · {info['hostname']}:{port}",
+                 fontweight='semibold')
     outfile = f"""{
         outputdir.rstrip("/") + "/" if outputdir
         else ''}pg_statviz_{info['hostname']
-                            .replace("/", "-")}_{port}_wait.png"""
+                            .replace("/", "-")}_{port}_{name}.{format}"""
     _logger.info(f"Saving {outfile}")
-    fig.legend()
     fig.tight_layout()
-    plt.savefig(outfile)
+    plot.save(outfile, dpi, optimize)
     run_chart_analysis(
-        report_sections, ai, rr, "Wait Events",
-        metric_description="Wait events (point-in-time snapshots). "
-                           "'LWLock' = internal contention. 'Lock' = "
-                           "row/table lock waits. 'IO' = storage "
-                           "waits. 'Client' = waiting for client "
-                           "response. Values <1.0 are fractional "
-                           "averages — essentially zero. Warn only "
-                           "if total wait count sustained >50. "
-                           "Default to [HEALTHY].",
+        report_sections, ai, rr,
+        "Sampled Wait Events" if sampled else "Wait Events",
+        metric_description=SAMPLED_DESCRIPTION if sampled else (
+            "Wait events (point-in-time snapshots). "
+            "'LWLock' = internal contention. 'Lock' = "
+            "row/table lock waits. 'IO' = storage "
+            "waits. 'Client' = waiting for client "
+            "response. Values <1.0 are fractional "
+            "averages — essentially zero. Warn only "
+            "if total wait count sustained >50. "
+            "Default to [HEALTHY]."),
         outfile=outfile,
         info=info,
+        batch=ai_batch,
+        # Sampled waits are judged against the CPU cores, unknown here
+        limits=None if sampled else {'*': 50},
     )
 
-    finalize_module_report(outputdir, info, port, 'wait',
-                           report_sections)
+    finalize_module_report(outputdir, info, port, name,
+                           report_sections, single_file)
+    manifest.record(outputdir, info, port, name, fp)
     mpclose('all')
+
+
+# Wait event series key: "<wait_event_type>/<wait_event>"
+def wait_kind(entry):
+    if 'wait_event' not in entry:
+        return None
+    return f"{entry['wait_event_type']}/{entry['wait_event']}"
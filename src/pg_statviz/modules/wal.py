@@ -15,13 +15,17 @@ from dateutil.parser import isoparse
 from matplotlib.pyplot import close as mpclose
 from matplotlib.ticker import MaxNLocator
 from pandas import DataFrame
-from pg_statviz.libs import plot
-from pg_statviz.libs.ai import (AI_HELP, AI_PROVIDERS,
+from pg_statviz.libs import manifest, plot, profiler, snapcache
+from pg_statviz.libs.ai import (AI_BATCH, AI_BATCH_HELP, AI_HELP,
+                                AI_PROVIDERS,
                                 DEFAULT_AI_PROVIDER,
                                 run_chart_analysis)
 from pg_statviz.libs.dbconn import dbconn
-from pg_statviz.libs.html_report import finalize_module_report
-from pg_statviz.libs.info import getinfo, get_settings
+from pg_statviz.libs.html_report import (SINGLE_FILE_HELP, check_single_file,
+                                         finalize_module_report)
+from pg_statviz.libs.info import (SOURCE_HOST_HELP, getinfo, get_settings,
+                                  get_skipped, source_filter)
+from pg_statviz.libs.seasonal import report_seasonal
 
 
 @arg('-d', '--dbname', help="database name to analyze")
@@ -38,26 +42,47 @@ from pg_statviz.libs.info import getinfo, get_settings
 @arg('--ai', nargs='?', const=DEFAULT_AI_PROVIDER, default=None,
      choices=AI_PROVIDERS, metavar='PROVIDER',
      help=AI_HELP)
+@arg('--ai-batch', type=int, nargs='?', const=AI_BATCH, metavar='N',
+     help=AI_BATCH_HELP)
 @arg('--info', help=argparse.SUPPRESS)
 @arg('--conn', help=argparse.SUPPRESS)
+@arg('--max-points', type=int, metavar='N', help=plot.MAX_POINTS_HELP)
+@arg('--downsample', choices=plot.DOWNSAMPLERS, help=plot.DOWNSAMPLE_HELP)
+@arg('--dpi', type=int, help=plot.DPI_HELP)
+@arg('--format', choices=plot.FORMATS, help=plot.FORMAT_HELP)
+@arg('--optimize', action='store_true', help=plot.OPTIMIZE_HELP)
+@arg('--single-file', action='store_true', help=SINGLE_FILE_HELP)
+@arg('--incremental', action='store_true', help=manifest.INCREMENTAL_HELP)
+@arg('--cache-dir', metavar='DIR', help=snapcache.CACHE_DIR_HELP)
+@arg('--source-host', metavar='HOSTNAME', help=SOURCE_HOST_HELP)
+@arg('--seasonal', choices=plot.SEASONS, help=plot.SEASONAL_HELP)
+@arg('--profile', metavar='FILE', help=profiler.PROFILE_HELP)
+@profiler.command
 def wal(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
         username=getpass.getuser(), password=None, daterange=[],
-        outputdir=None, ai=None, info=None, conn=None):
+        outputdir=None, ai=None, ai_batch=0, info=None, conn=None,
+        max_points=plot.MAX_POINTS, downsample=plot.DOWNSAMPLE,
+        dpi=plot.DPI, format=plot.FORMAT, optimize=False,
+        single_file=False, incremental=False, cache_dir=None,
+        source_host=None, seasonal=None, profile=None):
     "run WAL generation analysis module"
 
     logging.basicConfig()
     _logger = logging.getLogger(__name__)
     _logger.setLevel(logging.INFO)
 
+    check_single_file(single_file, ai)
     if not conn:
         conn_details = {'dbname': dbname, 'user': username,
                         'password': getpass.getpass("Password: ") if password
                         else password, 'host': host, 'port': port}
         conn = dbconn(**conn_details)
     if not info:
-        info = getinfo(conn)
+        info = getinfo(conn, source_host)
 
     _logger.info("Running WAL generation analysis")
+    # Seasonal charts are reported apart from the timelines
+    name = f"wal-{seasonal}" if seasonal else 'wal'
 
     if daterange:
         daterange = [isoparse(d) for d in daterange]
@@ -66,14 +91,26 @@ def wal(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
     else:
         daterange = ['-infinity', 'now()']
 
+    fp = manifest.fingerprint(conn, ['wal'], daterange, ai=ai,
+                              max_points=max_points, downsample=downsample,
+                              dpi=dpi, format=format, optimize=optimize,
+                              single_file=single_file, seasonal=seasonal,
+                              info=info)
+    if incremental and manifest.unchanged(outputdir, info, port, name, fp):
+        _logger.info("Snapshots and options unchanged since the last run, "
+                     + "skipping")
+        return
+
     # Retrieve the snapshots from DB
+    where, params = source_filter(info)
     cur = conn.cursor()
-    cur.execute("""SELECT wal_bytes, snapshot_tstamp, stats_reset
-                   FROM pgstatviz.wal
-                   WHERE snapshot_tstamp BETWEEN %s AND %s
-                   ORDER BY snapshot_tstamp""",
-                (daterange[0], daterange[1]))
-    data = cur.fetchall()
+    data = snapcache.fetch(
+        conn, info, 'wal',
+        f"""SELECT wal_bytes, snapshot_tstamp, stats_reset
+            FROM pgstatviz.wal
+            WHERE snapshot_tstamp BETWEEN %s AND %s{where}
+            ORDER BY snapshot_tstamp""",
+        daterange, params, cache_dir)
     if not data:
         cur.execute("""SELECT
                     (current_setting('server_version_num')::int >= 140000)
@@ -87,22 +124,36 @@ def wal(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
             raise SystemExit("No pg_statviz snapshots found in this database")
 
     tstamps = [t['snapshot_tstamp'] for t in data]
+    # Snapshots that skipped the wal component, drawn as gaps
+    skipped = get_skipped(conn, info, 'wal', daterange)
     walgb = calc_wal(data)
     walrates = calc_walrates(data)
     settings = get_settings(conn, ['max_wal_size', 'max_wal_senders',
-                                   'max_replication_slots'])
+                                   'max_replication_slots'], info)
 
     # Downsample if needed
     walgb_frame = DataFrame(data=walgb, index=tstamps, copy=False)
     walrates_frame = DataFrame(data=walrates, index=tstamps, copy=False)
-    if len(tstamps) > plot.MAX_POINTS:
-        q = str(round(
-            (tstamps[-1] - tstamps[0]).total_seconds() / plot.MAX_POINTS, 2))
-        r = walgb_frame.resample(q + "s").mean()
-        rr = walrates_frame.resample(q + "s").mean()
-    else:
-        r = walgb_frame
-        rr = walrates_frame
+
+    if seasonal:
+        # A typical week of the rates at full resolution, instead of the
+        # timelines
+        report_seasonal(
+            walrates_frame,
+            [("WAL generation rate by hour of the week", {0: "WAL"})],
+            "Avg. WAL generation rate (MB/s)",
+            "WAL Generation Rate by Hour of the Week",
+            "WAL generation RATE in MB/s (derived from cumulative counter).",
+            name=name, fp=fp, info=info, port=port, outputdir=outputdir,
+            format=format, dpi=dpi, optimize=optimize, ai=ai,
+            ai_batch=ai_batch, single_file=single_file, settings=settings,
+            limits={'*': 100})
+        return
+
+    r = plot.downsample(walgb_frame, method=downsample, points=max_points,
+                        gaps=skipped)
+    rr = plot.downsample(walrates_frame, method=downsample, points=max_points,
+                         gaps=skipped)
 
     report_sections = []
 
@@ -121,9 +172,9 @@ def wal(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
     outfile = f"""{
         outputdir.rstrip("/") + "/" if outputdir
         else ''}pg_statviz_{info['hostname']
-                            .replace("/", "-")}_{port}_wal.png"""
+                            .replace("/", "-")}_{port}_wal.{format}"""
     _logger.info(f"Saving {outfile}")
-    plt.savefig(outfile)
+    plot.save(outfile, dpi, optimize)
     run_chart_analysis(
         report_sections, ai, r, "WAL Generated",
         metric_description="CUMULATIVE COUNTER — rising values are "
@@ -135,6 +186,8 @@ def wal(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
         outfile=outfile,
         info=info,
         settings=settings,
+        batch=ai_batch,
+        limits={},
     )
 
     # Plot WAL rates
@@ -150,9 +203,9 @@ def wal(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
     outfile = f"""{
         outputdir.rstrip("/") + "/" if outputdir
         else ''}pg_statviz_{info['hostname']
-                            .replace("/", "-")}_{port}_wal_rate.png"""
+                            .replace("/", "-")}_{port}_wal_rate.{format}"""
     _logger.info(f"Saving {outfile}")
-    plt.savefig(outfile)
+    plot.save(outfile, dpi, optimize)
     run_chart_analysis(
         report_sections, ai, rr, "WAL Generation Rate",
         metric_description="WAL generation RATE (derived from "
@@ -166,19 +219,24 @@ def wal(*, dbname=getpass.getuser(), host="/var/run/postgresql", port="5432",
         outfile=outfile,
         info=info,
         settings=settings,
+        batch=ai_batch,
+        limits={'*': 100},
     )
 
-    finalize_module_report(outputdir, info, port, 'wal',
-                           report_sections)
+    finalize_module_report(outputdir, info, port, name,
+                           report_sections, single_file)
+    manifest.record(outputdir, info, port, name, fp)
     mpclose('all')
 
 
 # Gather WAL data & convert to GB
+@profiler.traced()
 def calc_wal(data):
     return [round(w['wal_bytes'] / 1073741824, 1) for w in data]
 
 
 # Calculate WAL rates
+@profiler.traced()
 def calc_walrates(data):
 
     # WAL diff generator - yields list of the rates in MB/s
@@ -17,11 +17,15 @@ from pg_statviz.modules.buf import buf
 from pg_statviz.modules.cache import cache
 from pg_statviz.modules.checkp import checkp
 from pg_statviz.modules.checksum import checksum
+from pg_statviz.modules.collect import collect
 from pg_statviz.modules.conf import conf
 from pg_statviz.modules.conn import conn
+from pg_statviz.modules.ingest import ingest
 from pg_statviz.modules.io import io
 from pg_statviz.modules.lock import lock
+from pg_statviz.modules.overhead import overhead
 from pg_statviz.modules.repl import repl
+from pg_statviz.modules.sample import sample
 from pg_statviz.modules.slru import slru
 from pg_statviz.modules.tuple import tuple
 from pg_statviz.modules.wait import wait
@@ -47,9 +51,9 @@ def main():
     p.add_argument('--version', action='version',
                    version=f"pg_statviz {__version__}")
 
-    p.add_commands([analyze, blocking, buf, cache, checkp, checksum, conf,
-                    conn, io, lock, repl, slru, tuple, wait, wal,
-                    xact],
+    p.add_commands([analyze, blocking, buf, cache, checkp, checksum, collect,
+                    conf, conn, ingest, io, lock, overhead, repl, sample,
+                    slru, tuple, wait, wal, xact],
                    func_kwargs={'add_help': False})
     for subparser in get_subparsers(p).choices.values():
         subparser.add_argument(*HELP_FLAGS, action='help', help=HELP_TEXT)
@@ -66,6 +66,24 @@ def test_run_chart_analysis_basename_strips_directory(tiny_df, clean_env):
     assert sections[0]['image_basename'] == "pg_statviz_host_5432_buf.png"
 
 
+def test_run_chart_analysis_keeps_findings_and_stats(tiny_df, clean_env):
+    sections = []
+    found = [{'severity': 'WARNING', 'message': 'x is high'}]
+    ai.run_chart_analysis(
+        sections, 'claude', tiny_df, "X", "desc",
+        outfile="/tmp/fake_chart.png", findings=found)
+    assert sections[0]['findings'] == found
+    assert sections[0]['stats'] == {
+        'x': {'min': 1.0, 'mean': 2.0, 'max': 3.0, 'last': 3.0}}
+
+
+def test_metric_stats_skips_non_finite_and_non_numeric():
+    df = pd.DataFrame({'a': [1.0, float('inf'), float('nan'), 2.0],
+                       'b': [float('nan')] * 4, 'c': list('wxyz')})
+    assert ai.metric_stats(df) == {
+        'a': {'min': 1.0, 'mean': 1.5, 'max': 2.0, 'last': 2.0}}
+
+
 def test_analyze_stats_unknown_provider_returns_none(tiny_df, caplog):
     assert ai.analyze_stats(
         tiny_df, "M", "desc", mode='bogus') is None
@@ -142,6 +160,18 @@ def test_read_images_handles_empty_and_none():
     assert ai._read_images(None) == []
 
 
+def test_read_images_skips_svg(tmp_path):
+    p = tmp_path / "img.svg"
+    p.write_bytes(b"<?xml version='1.0'?><svg/>")
+    assert ai._read_images([str(p)]) == []
+
+
+def test_image_mime_from_signature():
+    assert ai._image_mime(b"\x89PNG\r\n fake") == "image/png"
+    assert ai._image_mime(b"RIFF\x00\x00\x00\x00WEBPVP8L") == "image/webp"
+    assert ai._image_mime(b"<svg/>") is None
+
+
 def test_build_user_text_includes_module_and_metric(tiny_df):
     text = ai._build_user_text("Some Module", "a description", tiny_df)
     assert "Some Module" in text
@@ -159,6 +189,49 @@ def test_build_user_text_on_non_numeric_df():
     assert "N/A" in text
 
 
+def _wide_df():
+    # Dozens of ramps, one spike and one flat series, like a wide I/O frame
+    index = pd.date_range('2026-01-01', periods=200, freq='15min', tz='UTC')
+    df = pd.DataFrame({f"k{i}_read_GB": [j * (i + 1) for j in range(200)]
+                       for i in range(30)}, index=index)
+    df['spike'] = [50.0 if j == 100 else 1.0 + j % 3 for j in range(200)]
+    df['idle'] = 0.0
+    return df
+
+
+def test_summarize_numeric_ranks_spikes_and_lists_flat_series():
+    summary, trend = ai._summarize_numeric(_wide_df(), 10_000)
+    lines = summary.splitlines()
+    assert lines[0].startswith("200 samples, 2026-01-01 00:00 to")
+    assert lines[1] == "series|min|p50|mean|p95|max"
+    assert lines[2].startswith("spike|1|")
+    assert lines[-1] == "Constant: idle=0"
+    assert "  k0_read_GB: 0 -> 199" in trend.splitlines()
+
+
+def test_summarize_numeric_stays_within_budget():
+    summary, trend = ai._summarize_numeric(_wide_df(), 100)
+    assert ai.estimate_tokens(summary) + ai.estimate_tokens(trend) <= 100
+    assert "spike|" in summary
+    assert "Not shown (less variable): " in summary
+    # Even with no budget the most anomalous series is kept
+    summary, trend = ai._summarize_numeric(_wide_df(), 0)
+    assert "spike|" in summary and trend.startswith("  spike:")
+    assert "Not shown (less variable): 30 series" in summary
+
+
+def test_build_user_text_budget_from_env(monkeypatch, caplog):
+    full = ai._build_user_text("IO", "desc", _wide_df())
+    monkeypatch.setenv("PG_STATVIZ_AI_TOKENS", "100")
+    with caplog.at_level("INFO", logger="pg_statviz.libs.ai"):
+        small = ai._build_user_text("IO", "desc", _wide_df())
+    assert ai.estimate_tokens(small) < ai.estimate_tokens(full) / 3
+    assert f"AI prompt for IO: ~{ai.estimate_tokens(small)} tokens" \
+        in caplog.text
+    monkeypatch.setenv("PG_STATVIZ_AI_TOKENS", "lots")
+    assert ai._token_budget() == ai.TOKEN_BUDGET
+
+
 def test_timed_context_always_logs(caplog):
     import logging
     caplog.set_level(logging.INFO, logger='pg_statviz.libs.ai')
@@ -178,6 +251,34 @@ def test_timed_context_logs_even_on_exception(caplog):
     assert any("TestLabel" in r.message for r in caplog.records)
 
 
+def test_client_registry_creates_each_client_once(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    monkeypatch.setattr(ai, '_clients', {})
+    made = []
+
+    def factory():
+        made.append(object())
+        return made[-1]
+
+    with ThreadPoolExecutor(8) as pool:
+        clients = list(pool.map(lambda _: ai._client('x', factory),
+                                range(32)))
+    assert len(made) == 1
+    assert all(c is made[0] for c in clients)
+
+
+def test_timed_reports_connection_setup_then_reuse(monkeypatch, caplog):
+    import logging
+    caplog.set_level(logging.INFO, logger='pg_statviz.libs.ai')
+    monkeypatch.setattr(ai, '_clients', {})
+    for _ in range(2):
+        with ai._timed("TestLabel", 'x'):
+            ai._client('x', object)
+    first, second = [r.message for r in caplog.records]
+    assert "(new client, set up in " in first
+    assert second.endswith("(reused connection, request 2)")
+
+
 def test_log_provider_error_auth_message(caplog):
     import logging
     caplog.set_level(logging.ERROR, logger='pg_statviz.libs.ai')
@@ -361,3 +462,198 @@ def test_analyze_overview_dispatches_to_openai(openai_client):
         [{'title': 'T', 'verdict': 'HEALTHY', 'summary': 's'}],
         mode='openai')
     assert out == "**[HEALTHY]** all good"
+
+
+# --- Batched analysis ------------------------------------------------------
+
+def test_split_batch_at_markers():
+    md = ("=== CHART 1 ===\n**[HEALTHY]** fine\n\n"
+          "**=== CHART 3 ===**\n**[WARNING]** high\n"
+          "=== CHART 9 ===\nstray\n")
+    assert ai._split_batch(md, 3) == ["**[HEALTHY]** fine", None,
+                                      "**[WARNING]** high"]
+    assert ai._split_batch(None, 2) == [None, None]
+
+
+@pytest.fixture
+def batch_provider(monkeypatch):
+    """A provider answering all but the last chart of each batched request,
+    and every single-chart request."""
+    calls = []
+
+    def request(system_prompt, user_text, image_paths):
+        n = user_text.count("## Chart ")
+        calls.append(n)
+        return "\n".join(f"=== CHART {i} ===\n**[HEALTHY]** chart {i}"
+                         for i in range(1, n))
+
+    def single(df, module_name, *args):
+        calls.append(1)
+        return f"**[HEALTHY]** {module_name} alone"
+
+    monkeypatch.setitem(ai._PROVIDERS, 'claude', {
+        **ai._PROVIDERS['claude'], 'fn': single, 'request': request,
+        'available': lambda: True,
+    })
+    return calls
+
+
+def test_analyze_batch_retries_charts_missing_from_reply(tiny_df,
+                                                         batch_provider):
+    requests = [dict(df=tiny_df, title=f"T{i}", metric_description="d",
+                     outfile="/tmp/fake.png", info=None, settings=None,
+                     findings=None) for i in range(3)]
+    assert ai.analyze_batch(requests, 'claude') == [
+        "**[HEALTHY]** chart 1", "**[HEALTHY]** chart 2",
+        "**[HEALTHY]** T2 alone"]
+    assert batch_provider == [3, 1]
+
+
+def test_batched_sections_complete_when_batch_is_sent(tiny_df,
+                                                      batch_provider):
+    found = [{'severity': 'CRITICAL', 'message': 'x'}]
+    written = []
+    mod1, mod2 = [], []
+    with ai.batching():
+        for sections, title in ((mod1, "A"), (mod1, "B"), (mod2, "C")):
+            ai.run_chart_analysis(sections, 'claude', tiny_df, title, "d",
+                                  outfile="/tmp/fake.png", batch=4,
+                                  findings=found if title == "B" else None)
+        assert ai.when_analyzed(mod1, lambda: written.append(1))
+        assert ai.when_analyzed(mod2, lambda: written.append(2))
+        assert batch_provider == [] and mod1[0]['analysis_md'] is None
+    assert batch_provider == [3, 1]
+    assert written == [1, 2]
+    assert [s['analysis_md'] for s in mod1 + mod2] == [
+        "**[HEALTHY]** chart 1", "**[CRITICAL]** chart 2",
+        "**[HEALTHY]** C alone"]
+    assert not any('_request' in s for s in mod1 + mod2)
+
+
+def test_when_analyzed_flushes_outside_batching(tiny_df, batch_provider):
+    sections, written = [], []
+    ai.run_chart_analysis(sections, 'claude', tiny_df, "A", "d",
+                          outfile="/tmp/fake.png", batch=2)
+    assert not ai.when_analyzed(sections, lambda: written.append(1))
+    assert written == [1] and batch_provider == [1]
+
+
+# --- Streaming -------------------------------------------------------------
+
+class MockOpenAIStream:
+    """Mimics openai.OpenAI() with stream=True: yields delta chunks, then
+    optionally breaks off."""
+
+    def __init__(self, pieces, breaks=False):
+        self.pieces, self.breaks = pieces, breaks
+        self.chat = type('chat', (), {})()
+        self.chat.completions = self
+
+    def create(self, stream=False, **kwargs):
+        assert stream
+        for piece in self.pieces:
+            delta = type('delta', (), {'content': piece})()
+            yield type('chunk', (), {
+                'choices': [type('choice', (), {'delta': delta})()]})()
+        if self.breaks:
+            raise ConnectionError("connection reset")
+
+
+def test_request_openai_streams_text(monkeypatch, openai_env):
+    pieces = ["**[HEAL", "THY]** all", " good"]
+    monkeypatch.setattr(ai, '_openai_client',
+                        lambda: MockOpenAIStream(pieces))
+    seen = []
+    assert ai._request_openai("sys", "text", on_text=seen.append) \
+        == "**[HEALTHY]** all good"
+    assert seen == ["**[HEAL", "**[HEALTHY]** all", "**[HEALTHY]** all good"]
+
+
+def test_request_openai_keeps_truncated_stream(monkeypatch, openai_env):
+    monkeypatch.setattr(ai, '_openai_client', lambda: MockOpenAIStream(
+        ["**[WARNING]** half"], breaks=True))
+    assert ai._request_openai("sys", "text", on_text=lambda md: None) \
+        == "**[WARNING]** half" + ai.TRUNCATED_NOTE
+
+
+def test_run_chart_analysis_streams_into_module_report(tiny_df, tmp_path,
+                                                       monkeypatch):
+    info = {'hostname': 'db1'}
+    chart = tmp_path / "pg_statviz_db1_5432_buf_rate.png"
+    report = tmp_path / "pg_statviz_db1_5432_buf.html"
+    snapshots = []
+
+    def streaming(df, module_name, metric_description, image_paths,
+                  info=None, settings=None, findings=None, on_text=None):
+        for md in ("**[HEALTHY]**", "**[HEALTHY]** backends write a lot"):
+            on_text(md)
+            snapshots.append(report.read_text())
+        return md
+
+    monkeypatch.setitem(ai._PROVIDERS, 'claude', {
+        **ai._PROVIDERS['claude'], 'fn': streaming,
+        'available': lambda: True,
+    })
+    monkeypatch.setattr(ai, 'STREAM_FLUSH_SECONDS', 0)
+    sections = []
+    ai.run_chart_analysis(sections, 'claude', tiny_df, "Rate", "desc",
+                          outfile=str(chart), info=info,
+                          findings=[{'severity': 'WARNING', 'message': 'x'}])
+    # The floor applies from the first verdict on, and the report says the
+    # analysis is still coming until it is complete
+    assert all("WARNING" in s and "in progress" in s for s in snapshots)
+    assert "backends write a lot" in snapshots[-1]
+    assert sections[0]['analysis_md'] == \
+        "**[WARNING]** backends write a lot"
+    assert 'streaming' not in sections[0]
+
+
+# --- Local pre-filter ------------------------------------------------------
+
+@pytest.fixture
+def routine_df():
+    return pd.DataFrame({'x': [5.0, 5.1, 4.9, 5.0] * 6},
+                        index=pd.date_range('2026-01-01', periods=24,
+                                            freq='h'))
+
+
+def test_routine_chart_is_not_sent_to_provider(routine_df, monkeypatch):
+    monkeypatch.delenv('PG_STATVIZ_AI_PREFILTER', raising=False)
+    monkeypatch.setattr(ai, 'analyze_stats', lambda *a, **k: pytest.fail(
+        "routine chart sent to the provider"))
+    sections = []
+    ai.run_chart_analysis(sections, 'claude', routine_df, "X", "desc",
+                          outfile="/tmp/x.png", limits={'*': 10})
+    assert sections[0]['analysis_md'] == ai.LOCAL_HEALTHY_MD
+    assert ai._STATUS_RE.search(sections[0]['analysis_md']).group(1) \
+        == 'HEALTHY'
+
+
+@pytest.mark.parametrize('findings, prefilter, limits', [
+    ([{'severity': 'WARNING', 'message': "m"}], 'on', {}),
+    (None, 'off', {}),
+    # Without limits, nothing tells whether the level is acceptable
+    (None, 'on', None),
+    # Steady, but above the chart's threshold
+    (None, 'on', {'*': 4})])
+def test_routine_chart_is_sent_with_findings_or_prefilter_off(
+        routine_df, monkeypatch, findings, prefilter, limits):
+    monkeypatch.setenv('PG_STATVIZ_AI_PREFILTER', prefilter)
+    monkeypatch.setattr(ai, 'analyze_stats',
+                        lambda *a, **k: "**[WARNING]** sent")
+    sections = []
+    ai.run_chart_analysis(sections, 'claude', routine_df, "X", "desc",
+                          outfile="/tmp/x.png", findings=findings,
+                          limits=limits)
+    assert sections[0]['analysis_md'] == "**[WARNING]** sent"
+
+
+def test_analyze_overview_includes_correlated_events(monkeypatch):
+    prompts = []
+    monkeypatch.setitem(ai._CHAT_PROVIDERS, 'claude',
+                        lambda system, user: prompts.append(user) or "ok")
+    ai.analyze_overview([{'title': 'T', 'verdict': 'WARNING',
+                          'summary': 's'}],
+                        correlations="- **16:40** (conn, wal): surge")
+    assert "### Correlated events across modules" in prompts[0]
+    assert "(conn, wal): surge" in prompts[0]
@@ -0,0 +1,72 @@
+import numpy
+import pandas as pd
+import pytest
+from pg_statviz.libs import anomaly
+
+
+@pytest.fixture
+def quiet_df():
+    # Three days of 15-minute snapshots: a noisy gauge, a steadily growing
+    # counter, a constant, and a gauge that jumps every night at 03:00
+    rng = numpy.random.default_rng(1)
+    n = 300
+    index = pd.date_range('2026-01-01', periods=n, freq='15min', tz='UTC')
+    return pd.DataFrame({
+        'gauge': 50 + rng.normal(0, 2, n),
+        'counter': numpy.cumsum(rng.uniform(1, 2, n)),
+        'flat': 0.0,
+        'nightly': 10 + rng.normal(0, 1, n)
+        + (numpy.asarray(index.hour) == 3) * 30}, index=index)
+
+
+def test_quiet_series_are_routine(quiet_df):
+    assert anomaly.detect(quiet_df) == []
+    assert anomaly.is_routine(quiet_df)
+
+
+def test_spike_is_detected(quiet_df):
+    quiet_df.iloc[200, 0] = 90
+    found = anomaly.detect(quiet_df)
+    assert [(a['series'], a['kind']) for a in found] == [('gauge', 'spike')]
+    assert found[0]['time'] == quiet_df.index[200]
+    assert not anomaly.is_routine(quiet_df)
+
+
+def test_level_shift_is_detected(quiet_df):
+    quiet_df.iloc[150:, 0] += 10
+    found = anomaly.changepoints(quiet_df)
+    assert len(found) == 1
+    assert found[0]['series'] == 'gauge'
+    assert found[0]['time'] == quiet_df.index[150]
+    assert found[0]['after'] - found[0]['before'] == pytest.approx(10, 0.2)
+
+
+def test_counter_rate_change_is_detected(quiet_df):
+    quiet_df.iloc[150:, 1] += numpy.arange(150) * 3
+    found = anomaly.changepoints(quiet_df)
+    assert [a['series'] for a in found] == ['counter']
+
+
+def test_short_or_non_numeric_frames_are_not_routine():
+    assert not anomaly.is_routine(pd.DataFrame({'x': [1.0, 1.0, 1.0]}))
+    assert not anomaly.is_routine(pd.DataFrame({'name': ['a'] * 20}))
+
+
+def test_sustained_breach_and_growing_slot_are_over_limits(quiet_df):
+    # A wait total held around 120, a standby 30 GB behind and a slot
+    # retaining a steadily growing 50+ GB: no spikes nor shifts in any
+    rng = numpy.random.default_rng(2)
+    n = len(quiet_df)
+    breach = pd.DataFrame({
+        'total': 120 + rng.normal(0, 3, n),
+        'standby1_lag_bytes': 30 * 2**30 + rng.normal(0, 2**20, n),
+        'slot1_wal_bytes': 50 * 2**30
+        + numpy.cumsum(rng.uniform(1, 2, n)) * 2**20},
+        index=quiet_df.index)
+    assert anomaly.detect(breach) == []
+    assert anomaly.is_routine(breach)
+    limits = {'*_lag_bytes': 2**30, '*_wal_bytes': 10 * 2**30, '*': 50}
+    assert [a['series'] for a in anomaly.over_limits(breach, limits)] == [
+        'total', 'standby1_lag_bytes', 'slot1_wal_bytes']
+    assert not anomaly.is_routine(breach, limits)
+    assert anomaly.is_routine(quiet_df, {'gauge': 100, 'nightly': 50})
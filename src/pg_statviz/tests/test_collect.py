@@ -0,0 +1,61 @@
+from datetime import datetime, timezone
+import psycopg
+from psycopg.types.json import Jsonb
+from pg_statviz.modules import collect
+from pg_statviz.tests.util import FakeRepo, FakeSource, mock_dictrow
+
+
+tstamp = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def source_rows(sql, params):
+    if 'AS tstamp' in sql:
+        return [mock_dictrow({'tstamp': tstamp, 'version': 160000})]
+    if 'pg_stat_slru' in sql:
+        raise psycopg.errors.InsufficientPrivilege("permission denied")
+    if 'pg_settings' in sql:
+        return [mock_dictrow({'conf': {'work_mem': '4096'}})]
+    return [mock_dictrow({'total': 3, 'entries': [{'n': 3}]})]
+
+
+# A repository whose latest snapshot has the settings last_conf
+def repository(last_conf=None):
+    return FakeRepo(lambda sql, params:
+                    [mock_dictrow({'conf': last_conf})] if last_conf else [])
+
+
+def test_queries_follow_the_server_release():
+    assert list(collect.queries(130000)) == [
+        'buf', 'conf', 'conn', 'db', 'lock', 'blocking', 'repl', 'slru',
+        'wait']
+    pg16 = collect.queries(160000)
+    assert 'io' in pg16 and 'wal' in pg16
+    assert 'pg_stat_checkpointer' not in pg16['buf']
+    assert 'pg_stat_checkpointer' in collect.queries(170000)['buf']
+    assert 'wal_fpi_bytes' in collect.queries(190000)['wal']
+    assert 'wal_fpi_bytes' not in collect.queries(180000)['wal']
+
+
+def test_collect_snapshot_copies_components_and_skips_failures():
+    source, repo = FakeSource(source_rows), repository()
+    assert collect.collect_snapshot(source, repo, 'standby1') == tstamp
+    assert next(params for sql, params in repo.executed
+                if 'INSERT' in sql) == (tstamp, 'standby1')
+    assert repo.commits == 1 and source.rollbacks == 2
+    assert 'pgstatviz.slru' not in repo.copied
+    row = repo.copied['pgstatviz.lock'][0]
+    assert row[:2] == [tstamp, 3]
+    assert isinstance(row[2], Jsonb)
+    stats = {s[1]: s for s in repo.copied['pgstatviz.snapshot_stats']}
+    assert stats['slru'][4] == 'error: permission denied'
+    assert stats['lock'][3] == 1 and stats['lock'][4] is None
+    assert stats['total'][3] == len(stats) - 2
+
+
+def test_collect_snapshot_keeps_conf_only_when_changed():
+    repo = repository(last_conf={'work_mem': '4096'})
+    collect.collect_snapshot(FakeSource(source_rows), repo, 'standby1')
+    assert 'pgstatviz.conf' not in repo.copied
+    repo = repository(last_conf={'work_mem': '1024'})
+    collect.collect_snapshot(FakeSource(source_rows), repo, 'standby1')
+    assert len(repo.copied['pgstatviz.conf']) == 1
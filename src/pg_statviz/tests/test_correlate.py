@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta, timezone
+import numpy
+import pandas as pd
+import pytest
+from pg_statviz.libs import correlate
+
+
+@pytest.fixture
+def surge():
+    # 400 snapshots 5 minutes apart (with some jitter): connections jump by
+    # 30 for five hours, and the WAL rate quadruples two snapshots later
+    rng = numpy.random.default_rng(3)
+    t0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    ts = [t0 + timedelta(minutes=5 * i, seconds=int(rng.integers(0, 20)))
+          for i in range(400)]
+    conn = [{'snapshot_tstamp': t,
+             'conn_total': 20 + rng.poisson(3) + (30 if 200 <= i < 260
+                                                  else 0),
+             'conn_active': 3 + rng.poisson(1), 'conn_idle_trans': 0,
+             'max_query_age_seconds': rng.uniform(0, 5)}
+            for i, t in enumerate(ts)]
+    wal, total = [], 0
+    for i, t in enumerate(ts):
+        rate = (1e6 + rng.normal(0, 1e5)) * (4 if 202 <= i < 262 else 1)
+        total += 300 * rate
+        wal.append({'snapshot_tstamp': t, 'wal_bytes': total})
+    lock = [{'snapshot_tstamp': t, 'locks_total': 10 + rng.poisson(2)}
+            for t in ts]
+    return correlate.grid([correlate.table_frame('conn', conn),
+                           correlate.table_frame('wal', wal),
+                           correlate.table_frame('lock', lock),
+                           correlate.table_frame('io', [])])
+
+
+def test_grid_aligns_modules(surge):
+    assert surge.shape == (400, 6)
+    assert surge.index[1] - surge.index[0] == pd.Timedelta(minutes=5)
+    # Counters become per-second rates
+    assert surge['wal: WAL bytes/s'].median() == pytest.approx(1e6, 0.05)
+
+
+def test_table_frame_cache_hit_ratio_and_resets():
+    t0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    rows = [{'snapshot_tstamp': t0 + timedelta(seconds=10 * i),
+             'xact_commit': c, 'xact_rollback': 0, 'blks_hit': 90 * i,
+             'blks_read': 10 * i}
+            for i, c in enumerate([0, 100, 200, 50])]
+    frame = correlate.table_frame('db', rows)
+    # No rate for the first snapshot, nor across the stats reset
+    assert frame['db: commits/s'].tolist()[1:3] == [10, 10]
+    assert frame['db: commits/s'].isna().tolist() == [True, False, False,
+                                                      True]
+    assert frame['db: cache hit ratio %'].iloc[1] == pytest.approx(90)
+    assert 'db: blocks hit/s' not in frame
+
+
+def test_lagged_correlation_finds_the_lag():
+    rng = numpy.random.default_rng(0)
+    lead = rng.normal(size=300)
+    x = numpy.column_stack([lead, numpy.roll(lead, 4), rng.normal(size=300)])
+    r, lag = correlate.lagged_correlation(x, 6)
+    assert r[0, 1] > 0.9 and lag[0, 1] == 4 and lag[1, 0] == -4
+    assert abs(r[0, 2]) < 0.3
+
+
+def test_events_cluster_anomalies_across_modules(surge):
+    found = correlate.events(surge)
+    assert len(found) == 2
+    onset = found[0]
+    assert onset['modules'] == ['conn', 'wal']
+    assert onset['start'] == surge.index[200]
+    pair = onset['pairs'][0]
+    assert (pair['a'], pair['b']) == ('conn: connections',
+                                      'wal: WAL bytes/s')
+    assert pair['lag'] == pd.Timedelta(minutes=10)
+    text = correlate.describe(found)
+    assert text.startswith("- **2026-01-01 16:40 to 16:50** (conn, wal):")
+    assert "follows conn: connections by 10 min" in text
+
+
+def test_no_events_without_anomalies(surge):
+    assert correlate.events(surge.iloc[:150]) == []
+    assert correlate.events(pd.DataFrame()) == []
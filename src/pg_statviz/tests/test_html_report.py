@@ -1,7 +1,12 @@
+import json
 import os
+import pytest
 import tempfile
+from PIL import Image
 from pg_statviz.libs.html_report import (
-    md_to_html, finalize_module_report, write_module_report)
+    check_single_file, md_to_html, finalize_module_report, write_module_report,
+    finalize_index_report, _scan_module_reports, read_findings,
+    write_partial_report)
 
 
 def test_md_to_html_healthy_badge():
@@ -107,6 +112,16 @@ def test_finalize_module_report_builds_expected_path():
         assert os.path.exists(expected)
 
 
+def test_write_partial_report_of_a_variant_keeps_the_module_report(
+        tmp_path):
+    chart = tmp_path / 'pg_statviz_localhost_5432_wait-sampled.png'
+    write_partial_report(chart, {'hostname': 'localhost'},
+                         [{'title': 'A', 'image_basename': chart.name,
+                           'analysis_md': 'so far'}])
+    assert [p.name for p in tmp_path.iterdir()] == [
+        'pg_statviz_localhost_5432_wait-sampled.html']
+
+
 def test_finalize_module_report_handles_socket_dir_hostname():
     # Hostnames containing '/' (socket dirs) get their slashes normalised
     # so the output file is filesystem-safe.
@@ -126,3 +141,146 @@ def test_finalize_module_report_noop_on_empty_sections():
         finalize_module_report(
             d, {'hostname': 'localhost'}, '5432', 'buf', sections=[])
         assert os.listdir(d) == []
+
+
+def test_finalize_module_report_writes_findings_sidecar():
+    with tempfile.TemporaryDirectory() as d:
+        finalize_module_report(
+            d, {'hostname': 'localhost'}, '5432', 'buf',
+            sections=[
+                {'title': 'A', 'image_basename': 'a.png',
+                 'analysis_md': '**[WARNING]** Backends write *most*\n'
+                                'buffers.\n\nDetails follow.',
+                 'findings': [{'severity': 'WARNING', 'message': 'm'}],
+                 'stats': {'x': {'min': 0.0, 'mean': 1.0, 'max': 2.0,
+                                 'last': 2.0}}},
+                {'title': 'B', 'image_basename': 'b.png',
+                 'analysis_md': None},
+            ],
+        )
+        path = os.path.join(d, 'pg_statviz_localhost_5432_buf.findings.json')
+        doc = json.load(open(path, encoding='utf-8'))
+        assert doc['module'] == 'buf'
+        assert doc['module_html'] == 'pg_statviz_localhost_5432_buf.html'
+        a, b = doc['sections']
+        assert a['verdict'] == 'WARNING'
+        assert a['summary'] == 'Backends write most buffers.'
+        assert a['findings'] == [{'severity': 'WARNING', 'message': 'm'}]
+        assert a['stats']['x']['max'] == 2.0
+        assert b['verdict'] is None
+
+
+def test_scan_module_reports_merges_sidecars_for_host():
+    with tempfile.TemporaryDirectory() as d:
+        for host, module, md in (
+                ('h1', 'buf', '**[HEALTHY]** fine'),
+                ('h1', 'wal', '[CRITICAL] bad'),
+                ('h2', 'buf', '**[WARNING]** other host')):
+            finalize_module_report(
+                d, {'hostname': host}, '5432', module,
+                sections=[{'title': module, 'image_basename': 'x.png',
+                           'analysis_md': md},
+                          {'title': 'none', 'image_basename': 'y.png',
+                           'analysis_md': None}])
+        found = _scan_module_reports(d, {'hostname': 'h1'}, '5432')
+        assert [(f['title'], f['verdict'], f['summary']) for f in found] == [
+            ('buf', 'HEALTHY', 'fine'), ('wal', 'CRITICAL', 'bad')]
+        assert found[0]['module_html'] == 'pg_statviz_h1_5432_buf.html'
+
+
+def test_read_findings_skips_malformed_files():
+    with tempfile.TemporaryDirectory() as d:
+        bad = os.path.join(d, 'bad.findings.json')
+        with open(bad, 'w') as f:
+            f.write('<html>')
+        assert read_findings([bad, os.path.join(d, 'missing.json')]) == []
+
+
+def test_write_module_report_single_file_embeds_charts():
+    with tempfile.TemporaryDirectory() as d:
+        Image.new('RGB', (8, 8), 'red').save(os.path.join(d, 'a.png'))
+        with open(os.path.join(d, 'b.svg'), 'w') as f:
+            f.write('<?xml version="1.0"?>\n<svg viewBox="0 0 1 1"></svg>')
+        path = os.path.join(d, 'test.html')
+        write_module_report(
+            path, title="t", subtitle="s", single_file=True,
+            sections=[
+                {'title': 'A', 'image_basename': 'a.png', 'analysis_md': 'ok'},
+                {'title': 'B', 'image_basename': 'b.svg', 'analysis_md': 'ok'},
+                {'title': 'C', 'image_basename': 'gone.png',
+                 'analysis_md': 'ok'},
+            ],
+        )
+        html = open(path, encoding='utf-8').read()
+        assert '<img src="data:image/png;base64,' in html
+        assert 'loading="lazy"' in html
+        assert '<svg viewBox="0 0 1 1"></svg>' in html
+        assert '<?xml' not in html
+        # Charts that can't be read are still linked
+        assert '<img src="gone.png"' in html
+
+
+def test_finalize_index_report_single_file_embeds_modules(monkeypatch):
+    from pg_statviz.libs import ai
+    monkeypatch.setattr(ai, 'analyze_overview', lambda *a, **k: None)
+    with tempfile.TemporaryDirectory() as d:
+        info = {'hostname': 'h'}
+        Image.new('RGB', (8, 8), 'red').save(os.path.join(d, 'a.png'))
+        finalize_module_report(
+            d, info, '5432', 'buf',
+            sections=[{'title': 'Buffers', 'image_basename': 'a.png',
+                       'analysis_md': '**[HEALTHY]** Analysis text.'}])
+        finalize_index_report(d, info, '5432', 'claude', single_file=True)
+        html = open(os.path.join(d, 'pg_statviz_h_5432_index.html'),
+                    encoding='utf-8').read()
+        assert 'href="#module-buf"' in html
+        assert '<h2 id="module-buf">buf</h2>' in html
+        assert '<h3>Buffers</h3>' in html
+        assert 'Analysis text.' in html
+        assert 'data:image/png;base64,' in html
+
+
+def test_write_module_report_always_embeds_json_charts():
+    with tempfile.TemporaryDirectory() as d:
+        with open(os.path.join(d, 'a.json'), 'w') as f:
+            f.write('{"version":1,"title":"","axes":[]}')
+        path = os.path.join(d, 'test.html')
+        write_module_report(
+            path, title="t", subtitle="s",
+            sections=[{'title': 'A', 'image_basename': 'a.json',
+                       'analysis_md': 'ok'},
+                      {'title': 'B', 'image_basename': 'b.json',
+                       'analysis_md': 'ok'}])
+        html = open(path, encoding='utf-8').read()
+        assert html.count('class="pgsv-chart"') == 1
+        assert html.count('<script>') == 1
+        # Unreadable chart data falls back to the standalone page
+        assert '<a href="b.chart.html">B</a>' in html
+
+
+def test_finalize_index_report_lists_correlated_events(monkeypatch):
+    from pg_statviz.libs import ai
+    prompts = []
+    monkeypatch.setattr(ai, 'analyze_overview',
+                        lambda *a, **k: prompts.append(k) or None)
+    with tempfile.TemporaryDirectory() as d:
+        info = {'hostname': 'h'}
+        finalize_module_report(
+            d, info, '5432', 'conn',
+            sections=[{'title': 'Connections', 'image_basename': 'a.png',
+                       'analysis_md': '**[WARNING]** Surge.'}])
+        events = "- **2026-01-01 16:40** (conn, wal): connections 23 → 55"
+        finalize_index_report(d, info, '5432', 'claude',
+                              correlations=events)
+        html = open(os.path.join(d, 'pg_statviz_h_5432_index.html'),
+                    encoding='utf-8').read()
+        assert '<h2>Correlated events</h2>' in html
+        assert '<strong>2026-01-01 16:40</strong>' in html
+        assert prompts[0]['correlations'] == events
+
+
+def test_single_file_needs_ai():
+    with pytest.raises(SystemExit, match="--single-file needs --ai"):
+        check_single_file(True, None)
+    check_single_file(True, 'claude')
+    check_single_file(False, None)
@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from pg_statviz.modules import ingest
+from pg_statviz.tests.util import FakeRepo, FakeSource
+
+
+tstamps = [datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=i)
+           for i in range(3)]
+
+repo_tables = {
+    'snapshots': {'snapshot_tstamp': 1184, 'source': 25},
+    'lock': {'snapshot_tstamp': 1184, 'locks_total': 23, 'locks': 3802},
+    'wal': {'snapshot_tstamp': 1184, 'wal_bytes': 1700,
+            'wal_fpi_bytes': 1700},
+    'snapshot_stats': {'snapshot_tstamp': 1184, 'component': 25,
+                       'duration_ms': 701, 'skipped': 25},
+}
+
+# A server on pg_statviz 1.2: no source column, no snapshot_stats and
+# no wal_fpi_bytes
+source_tables = {
+    'snapshots': {'snapshot_tstamp': 1184},
+    'lock': {'snapshot_tstamp': 1184, 'locks_total': 23, 'locks': 3802},
+    'wal': {'snapshot_tstamp': 1184, 'wal_bytes': 1700},
+    'buf': {'snapshot_tstamp': 1184, 'buffers_alloc': 20},
+}
+
+
+def source_rows(sql, params):
+    if 'pg_attribute' in sql:
+        return [(t, c, oid) for t, cols in source_tables.items()
+                for c, oid in cols.items()]
+    if 'FROM pgstatviz.snapshots' in sql:
+        since, limit = params
+        return [(t,) for t in tstamps
+                if since == '-infinity' or t > since][:limit]
+    return [(t, 1) for t in params[0]]
+
+
+# A repository that has seen the snapshots of the server up to last_seen,
+# and those of others at `taken`
+def repository(last_seen=None, taken=()):
+    def respond(sql, params):
+        if 'max(snapshot_tstamp)' in sql:
+            return [(last_seen,)]
+        return [(t,) for t in params[0] if t in taken]
+    return FakeRepo(respond)
+
+
+def test_plan_copies_what_both_sides_have():
+    assert ingest.plan(source_tables, repo_tables) == {
+        'lock': ['snapshot_tstamp', 'locks_total', 'locks'],
+        'wal': ['snapshot_tstamp', 'wal_bytes']}
+
+
+def test_ingest_server_copies_new_snapshots_in_batches():
+    source, repo = FakeSource(source_rows), repository()
+    assert ingest.ingest_server(source, repo, 'db1', repo_tables,
+                                batch=2) == 3
+    assert repo.commits == 2
+    assert repo.copied['pgstatviz.snapshots'] == [(t, 'db1')
+                                                  for t in tstamps]
+    assert repo.types['pgstatviz.snapshots'] == [1184, 25]
+    assert repo.types['pgstatviz.wal'] == [1184, 1700]
+    assert len(repo.copied['pgstatviz.lock']) == 3
+    # A 1.2 server has no source column to tell its own snapshots by
+    assert not any('source IS NULL' in q for q in source.queries)
+
+
+def test_ingest_server_resumes_from_last_seen():
+    repo = repository(last_seen=tstamps[1])
+    assert ingest.ingest_server(FakeSource(source_rows), repo, 'db1',
+                                repo_tables) == 1
+    assert repo.copied['pgstatviz.snapshots'] == [(tstamps[2], 'db1')]
+    repo = repository(last_seen=tstamps[2])
+    assert ingest.ingest_server(FakeSource(source_rows), repo, 'db1',
+                                repo_tables) == 0
+    assert repo.commits == 0
+
+
+def test_fetch_batch_skips_snapshots_the_server_holds_as_a_repository():
+    source = FakeSource(source_rows)
+    ingest.fetch_batch(source, {}, None, True)
+    assert 'source IS NULL' in source.queries[0]
+
+
+def test_ingest_server_moves_snapshots_taken_at_the_same_time():
+    step = timedelta(microseconds=1)
+    # Another server's snapshots at the same time as the first one, and
+    # the microsecond after
+    repo = repository(taken={tstamps[0], tstamps[0] + step})
+    assert ingest.ingest_server(FakeSource(source_rows), repo, 'db1',
+                                repo_tables) == 3
+    moved = tstamps[0] + 2 * step
+    assert repo.copied['pgstatviz.snapshots'][0] == (moved, 'db1')
+    assert [r[0] for r in repo.copied['pgstatviz.lock']] == [moved,
+                                                             *tstamps[1:]]
+
+
+def test_ingest_goes_on_past_servers_it_cannot_reach(monkeypatch):
+    repo = repository()
+
+    def connect(conninfo):
+        if 'db2' in conninfo:
+            raise SystemExit("Could not connect to PostgreSQL server")
+        return repo if 'central' in conninfo else FakeSource(source_rows)
+
+    monkeypatch.setattr(ingest, 'conninfo_conn', connect)
+    monkeypatch.setattr(ingest, 'check_repository', lambda repo: None)
+    monkeypatch.setattr(ingest, 'columns',
+                        lambda conn: repo_tables if conn is repo
+                        else source_tables)
+    with pytest.raises(SystemExit, match="Could not ingest from db2"):
+        ingest.ingest('host=db2', 'host=db1', repository='host=central')
+    assert len(repo.copied['pgstatviz.snapshots']) == 3
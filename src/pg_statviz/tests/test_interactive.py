@@ -0,0 +1,64 @@
+import json
+import numpy
+from matplotlib.pyplot import close as mpclose
+from pandas import date_range
+from pg_statviz.libs import interactive, plot
+
+
+index = date_range('2026-01-01', periods=4, freq='15min', tz='UTC')
+
+
+def test_figure_data_is_columnar():
+    plt, fig = plot.setup()
+    plt.suptitle("pg_statviz · host:5432")
+    plt.title("Connections")
+    plt.plot(index, [1, 2, numpy.nan, 4], label="total")
+    plt.plot(index, [0.123456789, 0, 0, 0])
+    plt.axvline(x=index[1], label="change", color="red")
+    plt.ylabel("Connections")
+    data = interactive.figure_data(fig)
+    mpclose('all')
+    assert data['title'] == "pg_statviz · host:5432"
+    ax, = data['axes']
+    assert ax['title'] == "Connections" and ax['ylabel'] == "Connections"
+    assert ax['x'][0] == int(index[0].timestamp() * 1000)
+    assert ax['x'][1] - ax['x'][0] == 15 * 60 * 1000
+    total, unlabelled = ax['series']
+    assert total == {'label': 'total', 'color': '#1f77b4',
+                     'y': [1.0, 2.0, None, 4.0]}
+    assert unlabelled['label'] is None
+    assert unlabelled['y'][0] == 0.123457
+    assert ax['vlines'] == [{'x': ax['x'][1], 'label': 'change',
+                             'color': '#ff0000'}]
+    assert ax['ylim'] is None
+
+
+def test_figure_data_double_keeps_fixed_ylim():
+    plt, fig, splt1, splt2 = plot.setupdouble()
+    splt1.plot(index, [1, 2, 3, 4])
+    splt1.set_ylim(0, 10)
+    splt2.plot(index[:2], [1, 2])
+    splt2.plot(index, [1, 2, 3, 4])
+    data = interactive.figure_data(fig)
+    mpclose('all')
+    top, bottom = data['axes']
+    assert top['ylim'] == [0.0, 10.0]
+    # Series with different times keep their own time column
+    assert 'x' not in bottom
+    assert [len(s['x']) for s in bottom['series']] == [2, 4]
+
+
+def test_save_json_writes_data_and_page(tmp_path):
+    plt, fig = plot.setup()
+    plt.plot(index, [1, 2, 3, 4], label="a</script>")
+    outfile = tmp_path / "pg_statviz_h_5432_buf.json"
+    plot.save(str(outfile))
+    mpclose('all')
+    assert json.loads(outfile.read_text())['axes'][0]['series'][0][
+        'label'] == "a</script>"
+    page = (tmp_path / "pg_statviz_h_5432_buf.chart.html").read_text()
+    assert '<div class="pgsv-chart"' in page
+    assert 'a<\\/script>' in page
+    assert interactive.renderer_js() in page
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "pg_statviz_h_5432_buf.chart.html", "pg_statviz_h_5432_buf.json"]
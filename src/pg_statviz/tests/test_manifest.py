@@ -0,0 +1,107 @@
+from datetime import datetime, timezone
+from pg_statviz.libs import manifest
+from pg_statviz.tests.util import mock_dictrow
+
+
+info = {'hostname': 'localhost'}
+latest = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def execute(self, sql, params=None):
+        self.queries.append(sql)
+
+    def fetchone(self):
+        return mock_dictrow({'count': self.rows, 'latest': latest})
+
+    def close(self):
+        pass
+
+
+class FakeConn:
+    def __init__(self, rows=10):
+        self.cur = FakeCursor(rows)
+
+    def cursor(self):
+        return self.cur
+
+
+def test_fingerprint_covers_tables_daterange_and_options():
+    conn = FakeConn()
+    fp = manifest.fingerprint(conn, ['buf', 'db'], ['-infinity', 'now()'],
+                              max_points=100, users=('a', 'b'))
+    assert fp['tables'] == {'buf': [10, str(latest)], 'db': [10, str(latest)]}
+    assert fp['daterange'] == ['-infinity', 'now()']
+    assert fp['options'] == {'max_points': 100, 'users': ['a', 'b']}
+    assert any('pgstatviz.db' in q for q in conn.cur.queries)
+
+
+def test_fingerprint_of_a_source_host_only_counts_its_snapshots():
+    conn = FakeConn()
+    manifest.fingerprint(conn, ['wal'], ['-infinity', 'now()'])
+    manifest.fingerprint(conn, ['wal'], ['-infinity', 'now()'],
+                         info={**info, 'source': 'standby1'})
+    assert 'source = %s' not in conn.cur.queries[0]
+    assert 'source = %s' in conn.cur.queries[1]
+
+
+def test_fingerprint_without_source_host_only_counts_local_snapshots():
+    # A 1.3 repository holds the snapshots of other servers too, but 1.2
+    # has no source to tell them apart by
+    conn = FakeConn()
+    manifest.fingerprint(conn, ['wal'], ['-infinity', 'now()'],
+                         info={**info, 'ext_version': '1.3'})
+    manifest.fingerprint(conn, ['wal'], ['-infinity', 'now()'],
+                         info={**info, 'ext_version': '1.2'})
+    assert 'source IS NULL' in conn.cur.queries[0]
+    assert 'source' not in conn.cur.queries[1]
+
+
+def test_unchanged_after_record(tmp_path):
+    outputdir = str(tmp_path)
+    fp = manifest.fingerprint(FakeConn(), ['wal'], ['-infinity', 'now()'])
+    assert not manifest.unchanged(outputdir, info, '5432', 'wal', fp)
+    chart = tmp_path / 'pg_statviz_localhost_5432_wal_rate.png'
+    chart.write_bytes(b'')
+    manifest.record(outputdir, info, '5432', 'wal', fp)
+    assert manifest.unchanged(outputdir, info, '5432', 'wal', fp)
+    # New snapshots, other options or other hosts invalidate the entry
+    assert not manifest.unchanged(
+        outputdir, info, '5432', 'wal',
+        manifest.fingerprint(FakeConn(11), ['wal'], ['-infinity', 'now()']))
+    assert not manifest.unchanged(
+        outputdir, info, '5432', 'wal',
+        manifest.fingerprint(FakeConn(), ['wal'], ['-infinity', 'now()'],
+                             dpi=150))
+    assert not manifest.unchanged(outputdir, info, '5433', 'wal', fp)
+    # So does a missing output
+    chart.unlink()
+    assert not manifest.unchanged(outputdir, info, '5432', 'wal', fp)
+
+
+def test_record_leaves_out_the_outputs_of_variants(tmp_path):
+    fp = manifest.fingerprint(FakeConn(), ['wait'], ['-infinity', 'now()'])
+    for name in ('wait.png', 'wait.html', 'wait-sampled.png',
+                 'wait-sampled.html'):
+        (tmp_path / f"pg_statviz_localhost_5432_{name}").write_bytes(b'')
+    manifest.record(str(tmp_path), info, '5432', 'wait', fp)
+    assert manifest._load(str(tmp_path))[
+        manifest._key(str(tmp_path), info, '5432', 'wait')]['outputs'] == [
+        'pg_statviz_localhost_5432_wait.html',
+        'pg_statviz_localhost_5432_wait.png']
+
+
+def test_recorded_and_corrupt_manifest(tmp_path):
+    outputdir = str(tmp_path)
+    fp = manifest.fingerprint(FakeConn(), ['wal'], ['-infinity', 'now()'])
+    manifest.record(outputdir, info, '5432', 'wal', fp)
+    assert manifest.recorded(outputdir, info, '5432', ['wal', 'buf']) == {
+        'wal': fp, 'buf': None}
+    (tmp_path / manifest.MANIFEST).write_text('{not json')
+    assert not manifest.unchanged(outputdir, info, '5432', 'wal', fp)
+    manifest.record(outputdir, info, '5432', 'wal', fp)
+    assert manifest.unchanged(outputdir, info, '5432', 'wal', fp)
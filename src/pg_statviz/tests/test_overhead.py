@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from pg_statviz.modules.overhead import calc_findings, calc_skipped, wal_kb
+
+
+start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+tstamps = [start + timedelta(minutes=15 * i) for i in range(4)]
+
+
+def test_calc_findings_clean_for_cheap_snapshots():
+    # 50 ms every 15 minutes is well under the threshold
+    assert calc_findings(tstamps, [50, 60, 40, 50]) == []
+
+
+def test_calc_findings_warns_when_collection_is_a_large_share():
+    findings = calc_findings(tstamps, [12000, 11000, 13000, 12000])
+    assert len(findings) == 1
+    assert findings[0]['severity'] == 'WARNING'
+    assert '12000 ms' in findings[0]['message']
+    assert '1.3%' in findings[0]['message']
+    assert '900s' in findings[0]['message']
+
+
+def test_calc_findings_needs_two_snapshots():
+    assert calc_findings(tstamps[:1], [99999]) == []
+    assert calc_findings([], []) == []
+
+
+def test_calc_skipped_counts_components_and_reasons():
+    data = [{'bucket': t, 'component': c, 'skipped': s}
+            for t, skips in zip(tstamps, [{}, {'lock': 'over budget'},
+                                          {'lock': 'error: canceled',
+                                           'blocking': 'error: canceled'},
+                                          {'lock': 'over budget'}])
+            for c in ('blocking', 'buf', 'lock')
+            for s in [skips.get(c)]]
+    findings = calc_skipped(data)
+    assert [f['message'] for f in findings] == [
+        'blocking was skipped in 1 of 4 snapshots, most often because: '
+        'error: canceled',
+        'lock was skipped in 3 of 4 snapshots, most often because: '
+        'over budget']
+    assert calc_skipped(data[:3]) == []
+
+
+def test_wal_kb_reads_numeric_and_null():
+    assert wal_kb({'wal_bytes': Decimal(2048)}) == 2.0
+    assert wal_kb({'wal_bytes': None}) == 0.0
@@ -0,0 +1,188 @@
+import numpy
+from pg_statviz.modules.io import build_iorate_dataframe
+from pg_statviz.libs.info import ext_version_at_least
+from pandas import DataFrame
+from pg_statviz.libs.pivot import (breakdown_frame, pivot, pivot_frame,
+                                   top_series)
+from pg_statviz.modules.repl import build_repl_dataframe
+from pg_statviz.modules.slru import build_slru_dataframe, hit_ratio
+from pg_statviz.modules.wait import wait_kind
+
+
+locks = [[{'lock_mode': 'AccessShareLock', 'lock_count': 3},
+          {'lock_mode': 'RowExclusiveLock', 'lock_count': 1}],
+         [],
+         None,
+         [{'lock_mode': 'RowExclusiveLock', 'lock_count': 2},
+          {'lock_mode': 'ExclusiveLock', 'lock_count': 5}]]
+
+
+def test_pivot_keys_in_first_seen_order():
+    keys, _ = pivot(locks, 'lock_mode', 'lock_count')
+    assert keys == ['AccessShareLock', 'RowExclusiveLock', 'ExclusiveLock']
+
+
+def test_pivot_dense_matrix_zero_filled():
+    _, counts = pivot(locks, 'lock_mode', 'lock_count')
+    numpy.testing.assert_equal(counts, numpy.array([[3, 1, 0],
+                                                    [0, 0, 0],
+                                                    [0, 0, 0],
+                                                    [0, 2, 5]]))
+
+
+def test_pivot_sums_duplicate_keys_within_a_snapshot():
+    snapshots = [[{'k': 'a', 'v': 1}, {'k': 'a', 'v': 2}]]
+    _, m = pivot(snapshots, 'k', 'v')
+    numpy.testing.assert_equal(m, numpy.array([[3]]))
+
+
+def test_pivot_keeps_the_largest_of_duplicate_keys_with_combine_max():
+    # Two standbys sharing the default application_name, 600 MB behind each
+    lag = [[{'application_name': 'walreceiver', 'lag_bytes': 600 * 2**20},
+            {'application_name': 'walreceiver', 'lag_bytes': 600 * 2**20}],
+           [{'application_name': 'walreceiver', 'lag_bytes': 5},
+            {'application_name': 'walreceiver', 'lag_bytes': 7}]]
+    frame = pivot_frame(lag, [1, 2], 'application_name', 'lag_bytes',
+                        combine='max')
+    assert list(frame.columns) == ['walreceiver']
+    assert list(frame['walreceiver']) == [600 * 2**20, 7]
+
+
+def test_pivot_null_values_read_as_zero():
+    snapshots = [[{'k': 'a', 'v': None}, {'k': 'b'}]]
+    _, m = pivot(snapshots, 'k', 'v')
+    numpy.testing.assert_equal(m, numpy.array([[0, 0]]))
+
+
+def test_pivot_skips_entries_without_key():
+    keys, m = pivot([[{'v': 4}, {'k': 'a', 'v': 1}]], 'k', 'v')
+    assert keys == ['a']
+    numpy.testing.assert_equal(m, numpy.array([[1]]))
+
+
+def test_pivot_multiple_extractors_share_one_pass():
+    snapshots = [[{'k': 'a', 'x': 1, 'y': 10}],
+                 [{'k': 'a', 'x': 2, 'y': 20}]]
+    keys, x, y = pivot(snapshots, 'k', 'x', lambda e: e['y'] / 10)
+    assert keys == ['a']
+    numpy.testing.assert_equal(x, numpy.array([[1], [2]]))
+    numpy.testing.assert_equal(y, numpy.array([[1], [2]]))
+
+
+def test_pivot_fixed_keys_filter_and_keep_order():
+    keys, counts = pivot(locks, 'lock_mode', 'lock_count',
+                         keys=['ExclusiveLock', 'ShareLock'])
+    assert keys == ['ExclusiveLock', 'ShareLock']
+    numpy.testing.assert_equal(counts[:, 0], [0, 0, 0, 5])
+    numpy.testing.assert_equal(counts[:, 1], [0, 0, 0, 0])
+
+
+def test_pivot_empty_input():
+    keys, m = pivot([], 'k', 'v')
+    assert keys == []
+    assert m.shape == (0, 0)
+
+
+def test_pivot_frame_columns_and_index():
+    frame = pivot_frame(locks, [1, 2, 3, 4], 'lock_mode', 'lock_count')
+    assert list(frame.columns) == ['AccessShareLock', 'RowExclusiveLock',
+                                   'ExclusiveLock']
+    assert list(frame.index) == [1, 2, 3, 4]
+    assert list(frame['RowExclusiveLock']) == [1, 0, 0, 2]
+
+
+def test_wait_kind_joins_type_and_event():
+    assert wait_kind({'wait_event_type': 'LWLock',
+                      'wait_event': 'WALWrite'}) == 'LWLock/WALWrite'
+    assert wait_kind({'wait_event_type': 'LWLock'}) is None
+
+
+def test_hit_ratio_handles_idle_slru():
+    assert hit_ratio({'blks_hit': 3, 'blks_read': 1}) == 75
+    assert hit_ratio({'blks_hit': 0, 'blks_read': 0}) == 0
+
+
+def test_build_slru_dataframe_drops_all_zero_series():
+    stats = [[{'name': 'Xact', 'blks_hit': 9, 'blks_read': 1},
+              {'name': 'Subtrans', 'blks_hit': 0, 'blks_read': 0}],
+             [{'name': 'Xact', 'blks_hit': 10, 'blks_read': 0}]]
+    df = build_slru_dataframe(
+        pivot_frame(stats, [1, 2], 'name', hit_ratio),
+        pivot_frame(stats, [1, 2], 'name', 'blks_read'))
+    assert list(df.columns) == ['Xact_hit_ratio', 'Xact_blks_read']
+    assert list(df['Xact_hit_ratio']) == [90, 100]
+
+
+def test_build_repl_dataframe_suffixes_and_drops_zero_series():
+    lag = [[{'application_name': 'sb1', 'lag_bytes': 100}],
+           [{'application_name': 'sb1', 'lag_bytes': None}]]
+    slots = [[{'slot_name': 'idle', 'wal_bytes': 0}], None]
+    df = build_repl_dataframe(
+        pivot_frame(lag, [1, 2], 'application_name', 'lag_bytes'),
+        pivot_frame(slots, [1, 2], 'slot_name', 'wal_bytes'))
+    assert list(df.columns) == ['sb1_lag_bytes']
+    assert list(df['sb1_lag_bytes']) == [100, 0]
+
+
+def test_breakdown_frame_groups_rows_by_bucket():
+    rows = [{'bucket': 1, 'lock_mode': 'AccessShareLock', 'lock_count': 2.5},
+            {'bucket': 1, 'lock_mode': 'other', 'lock_count': 1},
+            {'bucket': 2, 'lock_mode': None, 'lock_count': 0},
+            {'bucket': 3, 'lock_mode': 'other', 'lock_count': 4}]
+    frame = breakdown_frame(rows, 'lock_mode', 'lock_count')
+    assert list(frame.index) == [1, 2, 3]
+    assert list(frame.columns) == ['AccessShareLock', 'other']
+    assert list(frame['AccessShareLock']) == [2.5, 0, 0]
+    assert list(frame['other']) == [1, 0, 4]
+
+
+def test_ext_version_at_least():
+    assert ext_version_at_least({'ext_version': '1.3'}, '1.3')
+    assert ext_version_at_least({'ext_version': '1.10'}, '1.3')
+    assert not ext_version_at_least({'ext_version': '1.2'}, '1.3')
+    assert not ext_version_at_least({}, '1.3')
+    assert not ext_version_at_least(None, '1.3')
+
+
+series = DataFrame({'a': [1, 1, 1], 'b': [0, 9, 0], 'c': [2, 2, 2],
+                    'd': [1, 0, 1]})
+
+
+def test_top_series_by_total_folds_rest_into_other():
+    top = top_series(series, 2)
+    assert list(top.columns) == ['b', 'c', 'other']
+    assert list(top['other']) == [2, 1, 2]
+
+
+def test_top_series_by_peak_keeps_row_maximum_of_rest():
+    top = top_series(series, 1, by='peak')
+    assert list(top.columns) == ['b', 'other']
+    assert list(top['other']) == [2, 2, 2]
+
+
+def test_top_series_keeps_a_real_other_apart_from_the_folded_rest():
+    users = DataFrame({'other': [5, 5], 'a': [9, 9], 'b': [1, 0], 'c': [0, 2]})
+    top = top_series(users, 2)
+    assert list(top.columns) == ['a', 'other', '(other)']
+    assert list(top['other']) == [5, 5]
+    assert list(top['(other)']) == [1, 2]
+    top = top_series(users, 1, by='peak')
+    assert list(top.columns) == ['a', '(other)']
+    assert list(top['(other)']) == [5, 5]
+
+
+def test_top_series_without_limit_or_under_limit():
+    assert top_series(series, 0) is series
+    assert top_series(series, 4) is series
+
+
+def test_build_iorate_dataframe_applies_series_limit():
+    iorates = {'reads': {f"k{i}/normal": [numpy.nan, i * 1048576]
+                         for i in range(1, 5)},
+               'writes': {'k1/normal': [numpy.nan, 0]}}
+    iokinds = [{'backend_type': f"k{i}", 'object': 'relation',
+                'context': 'normal'} for i in range(1, 5)]
+    df = build_iorate_dataframe(iorates, iokinds, [1, 2], max_series=2)
+    assert list(df.columns) == ['k4/normal_read_MBps', 'k3/normal_read_MBps',
+                                'other_read_MBps']
+    assert list(df['other_read_MBps']) == [0, 3]
@@ -0,0 +1,179 @@
+import numpy
+from matplotlib import dates as mdates
+from matplotlib.pyplot import close as mpclose
+from pandas import DataFrame, date_range
+from PIL import Image
+from pg_statviz.libs import manifest, plot
+from pg_statviz.libs.seasonal import report_seasonal
+
+
+index = date_range('2026-01-01', periods=1000, freq='15min', tz='UTC')
+values = numpy.sin(numpy.arange(1000) / 20)
+values[417] = 25
+frame = DataFrame({'a': values, 'b': numpy.cos(numpy.arange(1000) / 50)},
+                  index=index)
+
+
+def test_downsample_within_budget_is_unchanged():
+    small = frame.iloc[:50]
+    for method in plot.DOWNSAMPLERS:
+        assert plot.downsample(small, method=method) is small
+
+
+def test_downsample_mean_matches_fixed_interval_resample():
+    r = plot.downsample(frame, 'max', method='mean', points=100)
+    q = str(round((index[-1] - index[0]).total_seconds() / 100, 2))
+    assert r.equals(frame.resample(q + "s").max())
+
+
+def test_downsample_minmax_keeps_extremes_within_budget():
+    r = plot.downsample(frame, method='minmax', points=100)
+    assert len(r) <= 100
+    assert r.index.is_monotonic_increasing
+    assert r['a'].max() == 25
+    assert r['a'].min() == frame['a'].min()
+    assert r['b'].min() == frame['b'].min()
+
+
+def test_downsample_lttb_keeps_endpoints_and_spike():
+    r = plot.downsample(frame, method='lttb', points=100)
+    assert len(r) == 100
+    assert r.index[0] == index[0] and r.index[-1] == index[-1]
+    assert r.index.is_monotonic_increasing
+    assert r['a'].max() == 25
+
+
+def test_downsample_lttb_ignores_nan():
+    gappy = frame.copy()
+    gappy.iloc[:10, 0] = numpy.nan
+    gappy['c'] = numpy.nan
+    r = plot.downsample(gappy, method='lttb', points=50)
+    assert len(r) == 50
+    assert r['a'].max() == 25
+
+
+def test_downsample_gaps_break_lines_at_skipped_snapshots():
+    present = frame.iloc[:50].drop(index[[10, 11, 30]])
+    gaps = [index[10], index[11], index[30], index[60]]
+    r = plot.downsample(present, gaps=gaps)
+    assert len(r) == 50
+    assert r.iloc[[10, 11, 30]].isna().all().all()
+    assert r.iloc[[9, 12, 31]].notna().all().all()
+    assert plot.downsample(frame, gaps=gaps).equals(plot.downsample(frame))
+
+
+def _chart():
+    plt, fig = plot.setup()
+    plt.plot(index[:10], values[:10])
+    return plt
+
+
+def test_save_format_follows_extension(tmp_path):
+    for fmt, magic in (('png', b"\x89PNG"), ('webp', b"RIFF"),
+                       ('svg', b"<?xml")):
+        _chart()
+        outfile = tmp_path / f"chart.{fmt}"
+        plot.save(str(outfile))
+        assert outfile.read_bytes().startswith(magic)
+        mpclose('all')
+
+
+def test_save_dpi_scales_image_and_keeps_logo(tmp_path):
+    _chart()
+    outfile = tmp_path / "chart.png"
+    plot.save(str(outfile), dpi=150)
+    mpclose('all')
+    with Image.open(outfile) as im:
+        assert im.size == (2880, 1620)
+        # The logo stays in the top left corner
+        assert im.convert('L').crop((0, 0, 150, 150)).getextrema()[0] < 128
+
+
+def test_save_optimize_quantizes_png(tmp_path):
+    _chart()
+    outfile = tmp_path / "chart.png"
+    plot.save(str(outfile), optimize=True)
+    mpclose('all')
+    with Image.open(outfile) as im:
+        assert im.mode == 'P'
+
+
+def test_heatmap_sorts_rows_by_weight_in_one_image():
+    for columns in (3, 300):
+        wide = DataFrame(numpy.arange(columns) * numpy.ones((100, 1)),
+                         index=index[:100],
+                         columns=[f"IO/event{c}" for c in range(columns)])
+        wide.iloc[::2] = numpy.nan
+        plt, fig = plot.heatmap(wide, wide.sum(axis=1), "Wait events",
+                                "Wait event count")
+        top, ax = fig.axes[:2]
+        assert len(ax.collections) == 1 and not ax.lines
+        assert len(ax.get_yticks()) <= plot.HEATMAP_LABELS
+        # Busiest first, and the never waited on event last
+        assert ax.get_yticklabels()[0].get_text() == f"IO/event{columns - 1}"
+        image = ax.collections[0].get_array()
+        assert image[-1].mask.all() and image[0].mask[::2].all()
+        mpclose('all')
+
+
+def test_heatmap_cells_follow_the_times_of_the_rows():
+    # Buckets with nothing in them are left out of breakdowns
+    times = index[[0, 1, 2, 3, 10, 11, 12]]
+    wide = DataFrame({'IO/event': numpy.ones(len(times))}, index=times)
+    plt, fig = plot.heatmap(wide, wide.sum(axis=1), "Wait events",
+                            "Wait event count")
+    mesh = fig.axes[1].collections[0]
+    edges = mesh.get_coordinates()[0, :, 0]
+    step = 15 / 1440
+    x = mdates.date2num(times)
+    assert numpy.allclose(edges[:5], x[0] - step / 2
+                          + numpy.arange(5) * step)
+    # A blank cell across the gap, then cells around the later rows
+    assert numpy.allclose(edges[5], x[4] - step / 2)
+    assert mesh.get_array()[0, 4] is numpy.ma.masked
+    assert numpy.allclose(edges[-1], x[-1] + step / 2)
+    mpclose('all')
+
+
+def test_hour_of_week_folds_into_median_and_p95():
+    # Four weeks of hourly rates from a Monday midnight in the snapshots'
+    # time zone, a week apart by 1000
+    weeks = date_range('2026-01-05', periods=4 * plot.HOURS_OF_WEEK,
+                       freq='60min', tz='America/New_York')
+    rates = numpy.arange(len(weeks)) % plot.HOURS_OF_WEEK \
+        + numpy.arange(len(weeks)) // plot.HOURS_OF_WEEK * 1000.0
+    rates[numpy.arange(len(weeks)) % plot.HOURS_OF_WEEK == 38] = numpy.nan
+    folded = plot.hour_of_week(DataFrame({'committed': rates}, index=weeks))
+    assert list(folded.columns) == ['committed', 'committed p95']
+    assert len(folded) == plot.HOURS_OF_WEEK
+    assert folded.index[0] == plot.SEASONAL_WEEK
+    # Tuesday 14:00
+    assert numpy.isnan(folded['committed'].iloc[38])
+    assert folded['committed'].iloc[37] == 37 + 1500
+    assert round(folded['committed p95'].iloc[37], 6) == 37 + 2850
+
+
+def test_seasonal_reports_apart_from_the_module(tmp_path):
+    info = {'hostname': 'localhost'}
+    rates = DataFrame({'committed': values}, index=index)
+    report_seasonal(rates, [("Rate by hour of the week",
+                             {'committed': "Committed"})],
+                    "Per minute", "Rate by Hour of the Week", "Rates.",
+                    name='xact-hour-of-week', fp='fp', info=info, port=5432,
+                    outputdir=str(tmp_path))
+    assert (tmp_path / "pg_statviz_localhost_5432_xact-hour-of-week.png") \
+        .exists()
+    assert manifest.unchanged(str(tmp_path), info, 5432,
+                              'xact-hour-of-week', 'fp')
+    assert not manifest.unchanged(str(tmp_path), info, 5432, 'xact', 'fp')
+
+
+def test_downsample_carries_gaps_through_lttb_and_minmax():
+    present = frame.drop(index[[300, 301, 302, 700]])
+    gaps = [index[300], index[301], index[302], index[700]]
+    for method in ('lttb', 'minmax'):
+        r = plot.downsample(present, method=method, points=100, gaps=gaps)
+        kept = plot.downsample(present, method=method, points=100)
+        assert r.dropna().equals(kept)
+        nan = r.index[r.isna().all(axis=1)]
+        assert list(nan) == [index[300], index[700]]
@@ -0,0 +1,100 @@
+import json
+from pg_statviz.libs import profiler
+
+
+@profiler.traced()
+def calc_squares(n):
+    return [i * i for i in range(n)]
+
+
+@profiler.command
+def fake_module(*, n=10, profile=None):
+    with profiler.span("query fake", 'db') as s:
+        s['rows'], s['bytes'] = n, 8 * n
+    return calc_squares(n)
+
+
+def test_spans_are_noops_when_not_recording():
+    assert not profiler.recording()
+    with profiler.span("idle") as s:
+        s['rows'] = 1
+    assert calc_squares(3) == [0, 1, 4]
+    assert not profiler.recording()
+
+
+def test_spans_nest_and_record_rows_and_memory():
+    profiler.start()
+    try:
+        with profiler.span("outer", 'module'):
+            calc_squares(10000)
+    finally:
+        spans = profiler.stop()
+    inner, outer = spans
+    assert inner['name'] == 'test_profiler.calc_squares'
+    assert inner['args']['rows'] == 10000
+    assert inner['parent'] is outer
+    assert outer['children'] == inner['dur'] <= outer['dur']
+    assert profiler.trace_events(spans)['traceEvents'][-1]['args'][
+        'peak_bytes'] > 10000 * 28
+
+
+def test_memory_tracing_can_be_turned_off(monkeypatch):
+    monkeypatch.setenv("PG_STATVIZ_PROFILE_MEMORY", "off")
+    profiler.start()
+    try:
+        calc_squares(10)
+    finally:
+        spans = profiler.stop()
+    assert 'peak_bytes' not in profiler.trace_events(spans)[
+        'traceEvents'][-1]['args']
+
+
+def test_command_writes_chrome_trace_and_summary(tmp_path, caplog):
+    path = tmp_path / "trace.json"
+    with caplog.at_level('INFO', logger='pg_statviz.libs.profiler'):
+        assert fake_module(n=5, profile=str(path)) == [0, 1, 4, 9, 16]
+    assert not profiler.recording()
+    events = json.loads(path.read_text())['traceEvents']
+    spans = [e for e in events if e['ph'] == 'X']
+    assert [e['name'] for e in spans] == [
+        'test_profiler.fake_module', 'query fake',
+        'test_profiler.calc_squares']
+    assert spans[1]['cat'] == 'db'
+    assert spans[1]['args']['bytes'] == 40
+    assert all(e['ts'] >= 0 and e['dur'] >= 0 for e in spans)
+    assert "by stage (self time)" in caplog.text
+    assert "query fake" in caplog.text
+
+
+def test_summary_stage_self_times_add_up():
+    spans = [{'name': 'mod', 'cat': 'module', 'start': 0, 'dur': 10 ** 9,
+              'children': 6 * 10 ** 8, 'args': {}, 'mem': None, 'top': None},
+             {'name': 'plot.save', 'cat': 'render', 'start': 10 ** 8,
+              'dur': 6 * 10 ** 8, 'children': 0, 'args': {'bytes': 1048576},
+              'mem': None, 'top': None}]
+    text = profiler.summary(spans)
+    assert "Profile of 1.00s run" in text
+    assert "module          0.40s   40.0%" in text
+    assert "render          0.60s   60.0%" in text
+    assert "plot.save" in text and "1.0" in text
+
+
+class FakeResult:
+    # A pgresult whose row r is r bytes long over two fields
+    def __init__(self, ntuples):
+        self.ntuples, self.nfields, self.lengths = ntuples, 2, 0
+
+    def get_length(self, r, c):
+        self.lengths += 1
+        return r if c else 0
+
+
+def test_result_bytes_exact_for_small_results_estimated_for_large():
+    small = FakeResult(profiler.SAMPLE_ROWS)
+    assert profiler._result_bytes(small) == sum(range(profiler.SAMPLE_ROWS))
+    large = FakeResult(100000)
+    size = profiler._result_bytes(large)
+    assert abs(size - sum(range(100000))) / sum(range(100000)) < 0.01
+    assert large.lengths <= 2 * 2 * profiler.SAMPLE_ROWS
+    assert profiler._result_bytes(None) == 0
+    assert profiler._result_bytes(FakeResult(0)) == 0
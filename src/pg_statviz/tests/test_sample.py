@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta, timezone
+from pg_statviz.modules import sample
+from pg_statviz.tests.util import FakeRepo, FakeSource
+
+
+server_start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+# A server whose clock started at server_start, where each poll takes
+# about 16 ms and finds two sessions waiting on a lock (times are powers of
+# 2 to add up exactly)
+def server(clock):
+    def respond(sql, params):
+        if 'clock_timestamp()' == sql.split()[-1]:
+            return [(server_start,)]
+        clock.now += 1 / 64
+        return [('Lock', 'tuple', 0.5, 2.0),
+                ('Lock', 'tuple', 0.005, 0.005),
+                (None, None, 30.0, 4000.0)]
+    return FakeSource(respond)
+
+
+def windows(repo):
+    return [params for sql, params in repo.executed if 'wait_sample' in sql]
+
+
+def test_window_averages_waits_and_counts_ages():
+    w = sample.Window(0)
+    w.add([('Lock', 'tuple', 0.5, 2.0), ('IO', 'DataFileRead', 20.0, 20.0),
+           (None, None, 5000.0, None)])
+    w.add([('Lock', 'tuple', 0.05, 0.05)])
+    samples, seconds, total, events, query_ages, xact_ages = w.row(1.0)
+    assert (samples, total) == (2, 1.5)
+    assert events.obj == [
+        {'wait_event_type': 'IO', 'wait_event': 'DataFileRead',
+         'wait_event_count': 0.5},
+        {'wait_event_type': 'Lock', 'wait_event': 'tuple',
+         'wait_event_count': 1.0}]
+    assert query_ages.obj == {'bounds': list(sample.AGE_BOUNDS),
+                              'counts': [0, 1, 1, 0, 1, 0, 0, 1]}
+    assert sum(xact_ages.obj['counts']) == 3
+
+
+def test_run_flushes_windows_on_the_server_clock():
+    clock, repo = FakeClock(), FakeRepo()
+    source = server(clock)
+    sample.run(source, repo, 'db1', hz=8, window=1, duration=3,
+               clock=clock, sleep=clock.sleep)
+    assert [w[0] for w in windows(repo)] == [
+        server_start + timedelta(seconds=s) for s in (0, 1, 2)]
+    assert all(w[1] == 8 for w in windows(repo))
+    assert all(w[3] == 2 for w in windows(repo))
+    assert source.cur.prepared == 24
+
+
+def test_run_skips_samples_it_has_no_time_for():
+    clock, repo = FakeClock(), FakeRepo()
+    # Polls of 16 ms can't keep up with 100 a second
+    sample.run(server(clock), repo, None, hz=100, window=1,
+               duration=1, clock=clock, sleep=clock.sleep)
+    assert sum(w[1] for w in windows(repo)) == 64
@@ -0,0 +1,136 @@
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+from pg_statviz.libs import snapcache
+
+
+start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+SQL = """SELECT n, snapshot_tstamp
+         FROM pgstatviz.db
+         WHERE snapshot_tstamp BETWEEN %s AND %s
+         ORDER BY snapshot_tstamp"""
+
+
+def snapshots(first, last):
+    return [{'n': i, 'snapshot_tstamp': start + timedelta(hours=i)}
+            for i in range(first, last)]
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params):
+        lo, hi = (None if p == '-infinity' else self.conn.now if p == 'now()'
+                  else p for p in params[:2])
+        if 'range_from' in sql:
+            self.rows = [{'range_from': lo, 'range_to': hi}]
+            return
+        rows = [r for r in self.conn.rows
+                if (lo is None or r['snapshot_tstamp'] >= lo)
+                and r['snapshot_tstamp'] <= hi]
+        if 'count(*)' in sql:
+            self.rows = [{'count': len(rows)}]
+        else:
+            self.rows = [dict(r) for r in rows]
+            self.conn.transferred += len(rows)
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.now = rows[-1]['snapshot_tstamp']
+        self.transferred = 0
+        self.info = SimpleNamespace(host='db1', port=5432, dbname='app')
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+def fetch(conn, cache_dir, daterange=('-infinity', 'now()')):
+    conn.transferred = 0
+    return snapcache.fetch(conn, {}, 'db', SQL, daterange,
+                           cache_dir=cache_dir)
+
+
+def test_later_runs_only_fetch_newer_snapshots(tmp_path):
+    conn = FakeConnection(snapshots(0, 720))
+    assert fetch(conn, tmp_path) == snapshots(0, 720)
+    assert conn.transferred == 720
+    conn.rows += snapshots(720, 721)
+    conn.now = conn.rows[-1]['snapshot_tstamp']
+    assert fetch(conn, tmp_path) == snapshots(0, 721)
+    # The latest cached snapshot, and the new one
+    assert conn.transferred == 2
+    assert fetch(conn, tmp_path) == snapshots(0, 721)
+    assert conn.transferred == 0
+    window = (start + timedelta(hours=700), 'now()')
+    assert fetch(conn, tmp_path, window) == snapshots(700, 721)
+    assert conn.transferred == 0
+
+
+def test_changed_snapshots_are_fetched_again(tmp_path):
+    conn = FakeConnection(snapshots(0, 10))
+    fetch(conn, tmp_path)
+    del conn.rows[3]
+    assert fetch(conn, tmp_path) == conn.rows
+    assert conn.transferred == 9
+    # A cache of a later start can't serve an earlier one
+    conn = FakeConnection(snapshots(0, 10))
+    fetch(conn, tmp_path / 'b', (start + timedelta(hours=5), 'now()'))
+    assert fetch(conn, tmp_path / 'b') == snapshots(0, 10)
+    assert conn.transferred == 10
+
+
+def test_without_cache_dir_everything_is_fetched(tmp_path):
+    conn = FakeConnection(snapshots(0, 10))
+    fetch(conn, None)
+    fetch(conn, None)
+    assert conn.transferred == 10
+    assert not any(tmp_path.iterdir())
+
+
+def test_evict_by_age_then_size(tmp_path):
+    server = tmp_path / 'db1_5432_app'
+    server.mkdir()
+    now = time.time()
+    for name, age, size in (('old', 40, 10), ('lru', 2, 600 * 1024),
+                            ('new', 1, 600 * 1024)):
+        path = server / f"{name}.json.gz"
+        path.write_bytes(b'x' * size)
+        os.utime(path, (now - age * 86400, now - age * 86400))
+    (server / 'db_0123456789ab.pickle').write_bytes(b'x')
+    snapcache.evict(tmp_path, max_age=35, max_size=1)
+    assert [p.name for p in server.iterdir()] == ['new.json.gz']
+
+
+def test_cache_files_are_json_and_keep_types(tmp_path):
+    tz = ZoneInfo('Europe/Athens')
+    rows = [{'n': i, 'wal_bytes': Decimal('1.5') * i if i else None,
+             'locks': [{'lock_mode': 'AccessShareLock', 'lock_count': i}],
+             'stats_reset': None if i else start,
+             'snapshot_tstamp': (start + timedelta(hours=i)).astimezone(tz)}
+            for i in range(3)]
+    conn = FakeConnection(rows)
+    fetch(conn, tmp_path)
+    path, = tmp_path.glob('*/*.json.gz')
+    with gzip.open(path, 'rt') as f:
+        assert json.load(f)['tz'] == 'Europe/Athens'
+    cached = fetch(conn, tmp_path)
+    assert conn.transferred == 0
+    assert cached == rows
+    assert cached[2]['snapshot_tstamp'].tzinfo == tz
@@ -3,3 +3,94 @@
 # via __getitem__ only, which dict satisfies.
 def mock_dictrow(plaindict):
     return dict(plaindict)
+
+
+# Fake source server and repository database connections for the modules
+# that copy snapshots between servers (collect, ingest, sample). Both answer
+# queries with respond(sql, params), returning the rows (or raising), and
+# keep what they were asked.
+class FakeSourceCursor:
+    def __init__(self, source):
+        self.source = source
+        self.prepared = 0
+
+    def execute(self, sql, params=None, prepare=None):
+        self.source.queries.append(sql)
+        self.prepared += bool(prepare)
+        self.rows = self.source.respond(sql, params)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeSource:
+    def __init__(self, respond):
+        self.respond = respond
+        self.queries = []
+        self.rollbacks = 0
+        self.cur = FakeSourceCursor(self)
+
+    def cursor(self, row_factory=None):
+        return self.cur
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        pass
+
+
+class FakeCopy:
+    def __init__(self, repo, sql):
+        self.repo, self.table = repo, sql.split()[1]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def set_types(self, types):
+        self.repo.types[self.table] = types
+
+    def write_row(self, row):
+        self.repo.copied.setdefault(self.table, []).append(row)
+
+
+class FakeRepo:
+    def __init__(self, respond=lambda sql, params: []):
+        self.respond = respond
+        self.executed = []
+        self.copied, self.types = {}, {}
+        self.commits = self.rollbacks = 0
+
+    def cursor(self, row_factory=None):
+        return self
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+        self.rows = self.respond(sql, params)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+    def copy(self, sql):
+        return FakeCopy(self, sql)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        pass